@@ -0,0 +1,90 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Client Pool Benchmark Module
+
+Compares a fresh OpenAI client per call against the pooled client registry
+on a local stub server. Run with ``python -m saw.benchmarks.client_pool``.
+"""
+import asyncio
+import time
+from typing import Dict
+
+from saw.benchmarks.stub_server import StubServer
+from saw.core.clients import ClientRegistry
+from saw.providers.openai import (async_generate_content, create_async_client,
+                                  create_client, generate_content)
+
+
+def _result(server: StubServer, connections: int, elapsed: float,
+            n_calls: int) -> Dict[str, float]:
+    """
+    Summarizes one benchmark run.
+
+    Args:
+        server (StubServer): The stub server.
+        connections (int): The connection count before the run.
+        elapsed (float): The wall time of the run in seconds.
+        n_calls (int): The number of calls made.
+
+    Returns:
+        Dict[str, float]: The connections opened and mean latency.
+    """
+    return {
+        "connections": server.connections - connections,
+        "mean_ms": 1000 * elapsed / n_calls,
+    }
+
+
+def run_benchmark(n_calls: int = 50,
+                  latency: float = 0.0) -> Dict[str, Dict[str, float]]:
+    """
+    Runs the fresh-client and pooled-client benchmarks.
+
+    Args:
+        n_calls (int): The number of calls per mode.
+        latency (float): The simulated server latency in seconds.
+
+    Returns:
+        Dict[str, Dict[str, float]]: The results keyed by mode.
+    """
+    results = {}
+    with StubServer(latency=latency) as server:
+        settings = {"base_url": f"{server.url}/v1", "api_key": "stub"}
+        registry = ClientRegistry()
+        registry.register_factory("openai", create_client,
+                                  create_async_client)
+        registry.configure("openai", **settings)
+
+        connections, start = server.connections, time.perf_counter()
+        for _ in range(n_calls):
+            client = create_client(**settings)
+            generate_content(client, "stub", "ping", "")
+            client.close()
+        results["fresh"] = _result(server, connections,
+                                   time.perf_counter() - start, n_calls)
+
+        connections, start = server.connections, time.perf_counter()
+        for _ in range(n_calls):
+            generate_content(registry.get_client("openai"), "stub",
+                             "ping", "")
+        results["pooled"] = _result(server, connections,
+                                    time.perf_counter() - start, n_calls)
+
+        async def _apooled():
+            for _ in range(n_calls):
+                await async_generate_content(
+                    registry.get_async_client("openai"), "stub", "ping", "")
+            await registry.aclose()
+
+        connections, start = server.connections, time.perf_counter()
+        asyncio.run(_apooled())
+        results["async_pooled"] = _result(
+            server, connections, time.perf_counter() - start, n_calls)
+        registry.close()
+    return results
+
+
+if __name__ == '__main__':
+    for mode, stats in run_benchmark().items():
+        print(f"{mode:>14}: {stats['connections']:4d} connections, "
+              f"{stats['mean_ms']:.2f} ms/call")
@@ -0,0 +1,288 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Fake Provider Backend Module
+
+"""
+import ast
+import asyncio
+import math
+import random
+import re
+import threading
+import time
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple
+
+from saw.core.backend import (aregister_backend, aregister_stream_backend,
+                              register_backend, register_stream_backend)
+
+# Draws a latency in seconds from a random number generator
+Latency_Sampler = Callable[[random.Random], float]
+
+
+def constant(seconds: float) -> Latency_Sampler:
+    """
+    Latency distribution always returning the same value.
+
+    Args:
+        seconds (float): The latency in seconds.
+
+    Returns:
+        Latency_Sampler: The latency sampler.
+    """
+    return lambda rng: seconds
+
+
+def uniform(low: float, high: float) -> Latency_Sampler:
+    """
+    Uniform latency distribution.
+
+    Args:
+        low (float): The minimum latency in seconds.
+        high (float): The maximum latency in seconds.
+
+    Returns:
+        Latency_Sampler: The latency sampler.
+    """
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal(median: float, sigma: float = 0.5) -> Latency_Sampler:
+    """
+    Log-normal latency distribution, the usual shape of model latencies
+    with a long tail.
+
+    Args:
+        median (float): The median latency in seconds.
+        sigma (float): The standard deviation of the latency logarithm.
+
+    Returns:
+        Latency_Sampler: The latency sampler.
+    """
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+
+class FakeProviderError(Exception):
+    """
+    Transient error raised by a FakeBackend call chosen to fail.
+
+    Attributes:
+        status_code (int): The HTTP status code of the simulated error.
+    """
+
+    def __init__(self, status_code: int = 503):
+        super().__init__(f"Simulated provider error {status_code}")
+        self.status_code = status_code
+
+
+def echo_input(prompt: str) -> str:
+    """
+    Answers with the text following the last ``Input:`` of the prompt.
+
+    Args:
+        prompt (str): The input prompt.
+
+    Returns:
+        str: The echoed input.
+    """
+    return prompt.rsplit("Input: ", 1)[-1]
+
+
+def scripted_response(prompt: str) -> str:
+    """
+    Answers the prompts of the built-in workflows in their expected format.
+
+    Route selectors pick the first route, evaluators pass, generators,
+    composers and workers answer in their XML tags, and other prompts are
+    echoed.
+
+    Args:
+        prompt (str): The input prompt.
+
+    Returns:
+        str: The scripted response.
+    """
+    if "<selection>" in prompt:
+        routes = re.search(r"Available route options: (\[.*?\])", prompt)
+        selection = ast.literal_eval(routes.group(1))[0] if routes else ""
+        return (f"<reasoning>fake reasoning</reasoning>\n"
+                f"<selection>{selection}</selection>")
+    if "<evaluation>" in prompt:
+        return "<evaluation>PASS</evaluation>\n<feedback>none</feedback>"
+    if "<thoughts>" in prompt:
+        return ("<thoughts>fake thoughts</thoughts>\n"
+                "<response>fake response</response>")
+    if "<tasks>" in prompt:
+        tasks = "".join(re.findall(r"<task>.*?</task>", prompt, re.DOTALL))
+        return f"<analysis>fake analysis</analysis>\n<tasks>{tasks}</tasks>"
+    if "<response>" in prompt:
+        return "<response>fake response</response>"
+    return echo_input(prompt)
+
+
+class FakeBackend:
+    """
+    Provider backend simulating model latency without a network.
+
+    A response takes ``ttft`` seconds until its first token and
+    ``token_delay`` seconds for every further token. Tokens are the
+    whitespace-separated words of the response. Latencies and failures are
+    drawn from a random number generator seeded with ``seed``, so a run is
+    repeatable.
+
+    Attributes:
+        calls (int): The number of calls made.
+        failures (int): The number of calls that failed.
+        busy_time (float): The simulated latency of all calls in seconds.
+    """
+
+    def __init__(self, name: str = "fake", ttft: float = 0.05,
+                 token_delay: float = 0.005,
+                 respond: Optional[Callable[[str], str]] = None,
+                 latency: Optional[Latency_Sampler] = None,
+                 tokens_per_second: Optional[float] = None,
+                 failure_rate: float = 0.0,
+                 seed: Optional[int] = 0):
+        """
+        Initializes a FakeBackend.
+
+        Args:
+            name (str): The provider name to register the backend under.
+            ttft (float): Seconds until the first token.
+            token_delay (float): Seconds between tokens.
+            respond (Optional[Callable[[str], str]]): Builds the response of
+                a prompt. Echoes the prompt input by default.
+            latency (Optional[Latency_Sampler]): The distribution of the
+                seconds until the first token, overriding ``ttft``.
+            tokens_per_second (Optional[float]): The token throughput,
+                overriding ``token_delay``.
+            failure_rate (float): The probability of a call raising
+                ``FakeProviderError`` before its first token.
+            seed (Optional[int]): The seed of the random number generator.
+        """
+        self.name = name
+        self.latency = latency or constant(ttft)
+        self.token_delay = (1 / tokens_per_second if tokens_per_second
+                            else token_delay)
+        self.respond = respond or echo_input
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.failures = 0
+        self.busy_time = 0.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _plan(self, prompt: str) -> Tuple[float, Optional[List[str]]]:
+        """
+        Draws the latency and builds the response tokens of a call.
+
+        Args:
+            prompt (str): The input prompt.
+
+        Returns:
+            Tuple[float, Optional[List[str]]]: The seconds until the first
+                token or the failure, and the response tokens with their
+                trailing whitespace, or None if the call is chosen to fail.
+        """
+        with self._lock:
+            self.calls += 1
+            ttft = self.latency(self._random)
+            self.busy_time += ttft
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                self.failures += 1
+                return ttft, None
+            tokens = self.respond(prompt).split(" ")
+            self.busy_time += self.token_delay * (len(tokens) - 1)
+        return ttft, [f"{token} " for token in tokens[:-1]] + tokens[-1:]
+
+    def call(self, model: str, prompt: str, system_prompt: str,
+             **params) -> str:
+        """Fake LLM call function.
+
+        Args:
+            model (str): The model name.
+            prompt (str): The user's prompt.
+            system_prompt (str): The system prompt.
+            params (dict): A dictionary of other parameters.
+
+        Returns:
+            str: The generated text.
+        """
+        return "".join(self.stream(model, prompt, system_prompt, **params))
+
+    def stream(self, model: str, prompt: str, system_prompt: str,
+               **params) -> Iterator[str]:
+        """Fake LLM streaming function yielding text chunks.
+
+        Args:
+            model (str): The model name.
+            prompt (str): The user's prompt.
+            system_prompt (str): The system prompt.
+            params (dict): A dictionary of other parameters.
+
+        Yields:
+            str: The generated text chunks.
+        """
+        ttft, tokens = self._plan(prompt)
+        if ttft:
+            time.sleep(ttft)
+        if tokens is None:
+            raise FakeProviderError()
+        for i, token in enumerate(tokens):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            yield token
+
+    async def acall(self, model: str, prompt: str, system_prompt: str,
+                    **params) -> str:
+        """Asynchronous fake LLM call function.
+
+        Args:
+            model (str): The model name.
+            prompt (str): The user's prompt.
+            system_prompt (str): The system prompt.
+            params (dict): A dictionary of other parameters.
+
+        Returns:
+            str: The generated text.
+        """
+        return "".join([chunk async for chunk in self.astream(
+            model, prompt, system_prompt, **params)])
+
+    async def astream(self, model: str, prompt: str, system_prompt: str,
+                      **params) -> AsyncIterator[str]:
+        """Asynchronous fake LLM streaming function yielding text chunks.
+
+        Args:
+            model (str): The model name.
+            prompt (str): The user's prompt.
+            system_prompt (str): The system prompt.
+            params (dict): A dictionary of other parameters.
+
+        Yields:
+            str: The generated text chunks.
+        """
+        ttft, tokens = self._plan(prompt)
+        await asyncio.sleep(ttft)
+        if tokens is None:
+            raise FakeProviderError()
+        for i, token in enumerate(tokens):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
+    def register(self) -> "FakeBackend":
+        """
+        Registers the backend for calls and streams in both modes.
+
+        Returns:
+            FakeBackend: The registered backend.
+        """
+        register_backend(self.name, self.call)
+        aregister_backend(self.name, self.acall)
+        register_stream_backend(self.name, self.stream)
+        aregister_stream_backend(self.name, self.astream)
+        return self
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,106 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Ollama Batching Benchmark Module
+
+Compares sending every Ollama request on its own against the Ollama
+micro-batcher on a local stub server that serves a few requests at once,
+reloads the model when the options change and unloads it once its
+keep_alive runs out. Each round fans out requests with mixed options, then
+waits longer than the server's default keep_alive. Run with
+``python -m saw.benchmarks.ollama_batching``.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from saw.benchmarks.stub_server import FakeOllamaAPI, StubServer
+from saw.core.clients import client_registry
+from saw.providers.ollama import OllamaBatcher, generate_response
+
+MODEL = "llama3:latest"
+
+
+def _run_rounds(generate: Callable[..., object], n_rounds: int,
+                n_requests: int, idle: float) -> float:
+    """
+    Fans out the requests of every round and waits between rounds.
+
+    Args:
+        generate (Callable[..., object]): Sends one request.
+        n_rounds (int): The number of rounds.
+        n_requests (int): The number of requests per round.
+        idle (float): Seconds to wait between rounds.
+
+    Returns:
+        float: The seconds spent serving requests, without the waits.
+    """
+    elapsed = 0.0
+    with ThreadPoolExecutor(max_workers=n_requests) as executor:
+        for _ in range(n_rounds):
+            start = time.perf_counter()
+            list(executor.map(
+                lambda i: generate(MODEL, f"q{i}", "",
+                                   num_ctx=2048 * (1 + i % 2)),
+                range(n_requests)))
+            elapsed += time.perf_counter() - start
+            time.sleep(idle)
+    return elapsed
+
+
+def run_benchmark(n_rounds: int = 3, n_requests: int = 32, slots: int = 4,
+                  generate_time: float = 0.01, load_time: float = 0.05,
+                  keep_alive: float = 0.1
+                  ) -> Dict[str, Dict[str, float]]:
+    """
+    Runs the per-request and batched benchmarks.
+
+    Args:
+        n_rounds (int): The number of fan-out rounds per mode.
+        n_requests (int): The number of requests per round.
+        slots (int): The requests the server serves at once.
+        generate_time (float): Seconds the server takes per request.
+        load_time (float): Seconds the server takes to load the model.
+        keep_alive (float): The server's default keep_alive in seconds.
+            Rounds are twice as far apart.
+
+    Returns:
+        Dict[str, Dict[str, float]]: The model loads and throughput in
+            requests per second, keyed by mode.
+    """
+    results = {}
+    host = os.environ.get("OLLAMA_HOST")
+    try:
+        for mode in ("per_request", "batched"):
+            api = FakeOllamaAPI(models=[MODEL], slots=slots,
+                                generate_time=generate_time,
+                                load_time=load_time, keep_alive=keep_alive)
+            with StubServer(routes=api.routes) as server:
+                os.environ["OLLAMA_HOST"] = server.url
+                client_registry.close()
+                batcher = OllamaBatcher(n_slots=slots) \
+                    if mode == "batched" else None
+                try:
+                    elapsed = _run_rounds(
+                        batcher.generate if batcher else generate_response,
+                        n_rounds, n_requests, 2 * keep_alive)
+                finally:
+                    if batcher:
+                        batcher.close()
+                    client_registry.close()
+            results[mode] = {
+                "loads": api.loads,
+                "throughput": n_rounds * n_requests / elapsed,
+            }
+    finally:
+        if host is None:
+            os.environ.pop("OLLAMA_HOST", None)
+        else:
+            os.environ["OLLAMA_HOST"] = host
+    return results
+
+
+if __name__ == '__main__':
+    for mode, stats in run_benchmark().items():
+        print(f"{mode:>12}: {stats['loads']:3d} model loads, "
+              f"{stats['throughput']:.1f} requests/s")
@@ -0,0 +1,56 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Pipelined Chain Benchmark Module
+
+Compares the end-to-end latency of a serial chain against a pipelined chain
+on a fake backend with simulated latency. Run with
+``python -m saw.benchmarks.pipelined_chain``.
+"""
+import asyncio
+import time
+from typing import Dict
+
+from saw.benchmarks.fake_backend import FakeBackend
+from saw.workflows.multi_llm.chaining import achain, chain
+
+
+def run_benchmark(n_steps: int = 3, n_paragraphs: int = 4,
+                  paragraph_tokens: int = 20, ttft: float = 0.05,
+                  token_delay: float = 0.005) -> Dict[str, float]:
+    """
+    Runs a chain serially and pipelined by paragraph, in both modes.
+
+    Args:
+        n_steps (int): The number of chain steps.
+        n_paragraphs (int): The number of paragraphs in the query.
+        paragraph_tokens (int): The number of tokens per paragraph.
+        ttft (float): Seconds until the first token of each call.
+        token_delay (float): Seconds between tokens.
+
+    Returns:
+        Dict[str, float]: The wall time in seconds keyed by mode.
+    """
+    FakeBackend(name="fake-pipeline", ttft=ttft,
+                token_delay=token_delay).register()
+    paragraph = " ".join(["token"] * paragraph_tokens)
+    query = "\n\n".join([paragraph] * n_paragraphs)
+    prompts = [{"prompt": "Rewrite the input.", "functions": [],
+                "provider": "fake-pipeline", "model": "fake",
+                "system_prompt": ""}] * n_steps
+
+    results = {}
+    for mode, pipeline in (("serial", None), ("pipelined", "paragraph")):
+        start = time.perf_counter()
+        chain(query=query, prompts=prompts, pipeline=pipeline, cache=False)
+        results[mode] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        asyncio.run(achain(query=query, prompts=prompts, pipeline=pipeline,
+                           cache=False))
+        results[f"async_{mode}"] = time.perf_counter() - start
+    return results
+
+
+if __name__ == '__main__':
+    for mode, seconds in run_benchmark().items():
+        print(f"{mode:>16}: {seconds:.3f} s")
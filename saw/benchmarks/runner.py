@@ -0,0 +1,469 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Workflow Benchmark Runner Module
+
+Measures the latency, throughput and framework overhead of the built-in
+workflows on a seeded fake backend, without any network access. Results are
+written as JSON together with the commit they were measured on, and can be
+compared against an earlier run. Run with
+``python -m saw.benchmarks.runner --help``.
+"""
+import asyncio
+import json
+import math
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import (Any, Awaitable, Callable, Dict, List, Optional, Sequence,
+                    Tuple)
+
+import click
+
+from saw.benchmarks.fake_backend import (FakeBackend, constant, lognormal,
+                                         scripted_response)
+from saw.core.retry import RetryPolicy, get_retry_policy, set_retry_policy
+from saw.workflows.adaptive_llm.adaptive import aadaptive, adaptive
+from saw.workflows.multi_llm.chaining import achain, chain
+from saw.workflows.multi_llm.parallelization import aparallel, parallel
+from saw.workflows.multi_llm.routing import aroute, route
+from saw.workflows.symphonic_llm.symphonic import asymphony, symphony
+
+WORKFLOWS = ("chain", "parallel", "route", "adaptive", "symphony")
+MODES = ("sync", "async")
+
+QUERY = ("Summarize the quarterly report for the board and list the three "
+         "most important risks")
+
+Workflow_Run = Callable[[str], Any]
+Async_Workflow_Run = Callable[[str], Awaitable[Any]]
+
+
+def _prompt(provider: str, prompt: str) -> Dict[str, Any]:
+    """
+    Builds the prompt details of a workflow step.
+
+    Args:
+        provider (str): The provider of the step.
+        prompt (str): The prompt of the step.
+
+    Returns:
+        Dict[str, Any]: The prompt details.
+    """
+    return {"prompt": prompt, "functions": [], "provider": provider,
+            "model": "fake", "system_prompt": ""}
+
+
+def workflow_runs(
+        provider: str
+) -> Dict[str, Tuple[Workflow_Run, Async_Workflow_Run]]:
+    """
+    Builds one run of each workflow on a provider, in both modes.
+
+    Each run takes the query to process, so that concurrent runs do not
+    share their requests.
+
+    Args:
+        provider (str): The provider of every step.
+
+    Returns:
+        Dict[str, Tuple[Workflow_Run, Async_Workflow_Run]]: The synchronous
+            and asynchronous runs keyed by workflow.
+    """
+    def steps(name: str, n: int) -> List[Dict[str, Any]]:
+        return [_prompt(provider, f"{name} {i}.") for i in range(n)]
+
+    def route_args(query: str) -> Dict[str, Any]:
+        return {"prompt": _prompt(provider, query),
+                "reasoning_prompt": "Explain the choice.",
+                "route_prompt": "Pick the team for the query.",
+                "routes": {"billing": _prompt(provider, "Billing team."),
+                           "technical": _prompt(provider, "Tech team.")}}
+
+    def adaptive_args(query: str) -> Dict[str, Any]:
+        return {"evaluator_prompt_details": _prompt(provider, "Evaluate."),
+                "generator_prompt_details": _prompt(provider, "Generate."),
+                "ratings": ["PASS", "NEEDS_IMPROVEMENT", "FAIL"],
+                "task": query, "max_iterations": 2}
+
+    def symphony_args(query: str) -> Dict[str, Any]:
+        return {
+            "composer_details": {
+                **_prompt(provider, "Compose."),
+                "tasks": {"task": query, "functions": []}},
+            "worker_details": {
+                **_prompt(provider, f"Work on: {query}"),
+                "tasks": [{"type": "formal", "description": "Formal tone.",
+                           "functions": []},
+                          {"type": "casual", "description": "Casual tone.",
+                           "functions": []}]},
+        }
+
+    return {
+        "chain": (
+            lambda query: chain(query, steps("Step", 3)),
+            lambda query: achain(query, steps("Step", 3))),
+        "parallel": (
+            lambda query: parallel(query, steps("Branch", 3), n_workers=3),
+            lambda query: aparallel(query, steps("Branch", 3))),
+        "route": (
+            lambda query: route(**route_args(query)),
+            lambda query: aroute(**route_args(query))),
+        "adaptive": (
+            lambda query: adaptive(**adaptive_args(query)),
+            lambda query: aadaptive(**adaptive_args(query))),
+        "symphony": (
+            lambda query: symphony(**symphony_args(query)),
+            lambda query: asymphony(**symphony_args(query))),
+    }
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    """
+    Returns a nearest-rank percentile.
+
+    Args:
+        samples (Sequence[float]): The samples.
+        q (float): The percentile between 0 and 100.
+
+    Returns:
+        float: The percentile of the samples.
+    """
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """
+    Summarizes latencies in milliseconds.
+
+    Args:
+        samples (Sequence[float]): The latencies in seconds.
+
+    Returns:
+        Dict[str, float]: The mean, p50, p95 and p99 in milliseconds.
+    """
+    return {
+        "mean": 1000 * sum(samples) / len(samples),
+        "p50": 1000 * percentile(samples, 50),
+        "p95": 1000 * percentile(samples, 95),
+        "p99": 1000 * percentile(samples, 99),
+    }
+
+
+def _latencies(run: Workflow_Run, iterations: int,
+               warmup: int) -> List[float]:
+    """
+    Times sequential runs of a workflow.
+
+    Args:
+        run (Workflow_Run): The workflow run.
+        iterations (int): The number of timed runs.
+        warmup (int): The number of untimed runs before.
+
+    Returns:
+        List[float]: The latency of every timed run in seconds.
+    """
+    latencies = []
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        run(f"{QUERY} #{i}")
+        if i >= warmup:
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def _alatencies(run: Async_Workflow_Run, iterations: int,
+                      warmup: int) -> List[float]:
+    """
+    Times sequential runs of an asynchronous workflow.
+
+    Args:
+        run (Async_Workflow_Run): The workflow run.
+        iterations (int): The number of timed runs.
+        warmup (int): The number of untimed runs before.
+
+    Returns:
+        List[float]: The latency of every timed run in seconds.
+    """
+    latencies = []
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        await run(f"{QUERY} #{i}")
+        if i >= warmup:
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _throughput(run: Workflow_Run, runs: int, concurrency: int) -> float:
+    """
+    Measures the runs per second of a workflow run from several threads.
+
+    Args:
+        run (Workflow_Run): The workflow run.
+        runs (int): The number of runs.
+        concurrency (int): The number of concurrent runs.
+
+    Returns:
+        float: The completed runs per second.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, [f"{QUERY} @{i}" for i in range(runs)]))
+    return runs / (time.perf_counter() - start)
+
+
+async def _athroughput(run: Async_Workflow_Run, runs: int,
+                       concurrency: int) -> float:
+    """
+    Measures the runs per second of an asynchronous workflow run from
+    several tasks.
+
+    Args:
+        run (Async_Workflow_Run): The workflow run.
+        runs (int): The number of runs.
+        concurrency (int): The number of concurrent runs.
+
+    Returns:
+        float: The completed runs per second.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(i: int):
+        async with semaphore:
+            await run(f"{QUERY} @{i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*[bounded(i) for i in range(runs)])
+    return runs / (time.perf_counter() - start)
+
+
+def _commit() -> Dict[str, Any]:
+    """
+    Identifies the commit of the working tree.
+
+    Returns:
+        Dict[str, Any]: The commit hash and whether the tree has local
+            changes, or None values outside a git checkout.
+    """
+    root = Path(__file__).resolve().parent
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, capture_output=True,
+            text=True, check=True).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=root, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": bool(status.strip())}
+
+
+def run_benchmarks(workflows: Sequence[str] = WORKFLOWS,
+                   modes: Sequence[str] = MODES,
+                   iterations: int = 30,
+                   warmup: int = 3,
+                   concurrency: int = 8,
+                   median_latency: float = 0.02,
+                   sigma: float = 0.3,
+                   tokens_per_second: float = 1000.0,
+                   failure_rate: float = 0.0,
+                   seed: int = 0) -> Dict[str, Any]:
+    """
+    Benchmarks workflows on a fake backend.
+
+    Latency percentiles come from sequential runs on a backend with
+    log-normal latency. Throughput comes from ``concurrency`` runs in
+    flight at once. Framework overhead is the wall time per model call on a
+    backend without latency, which is everything ``saw`` adds on top of the
+    provider.
+
+    Args:
+        workflows (Sequence[str]): The workflows to benchmark.
+        modes (Sequence[str]): The modes to benchmark, sync and/or async.
+        iterations (int): The number of runs per measurement.
+        warmup (int): The number of untimed runs before latency runs.
+        concurrency (int): The number of concurrent throughput runs.
+        median_latency (float): The median seconds until the first token.
+        sigma (float): The log-normal shape of the latency.
+        tokens_per_second (float): The token throughput of the backend.
+        failure_rate (float): The probability of a call failing with a
+            transient error, which the retry policy retries.
+        seed (int): The seed of the backend's random number generator.
+
+    Returns:
+        Dict[str, Any]: The run metadata and the results keyed by workflow
+            and mode.
+    """
+    config = {"iterations": iterations, "warmup": warmup,
+              "concurrency": concurrency, "median_latency": median_latency,
+              "sigma": sigma, "tokens_per_second": tokens_per_second,
+              "failure_rate": failure_rate, "seed": seed}
+    backend = FakeBackend(
+        name="bench", latency=lognormal(median_latency, sigma),
+        tokens_per_second=tokens_per_second, respond=scripted_response,
+        failure_rate=failure_rate, seed=seed).register()
+    zero = FakeBackend(name="bench-zero", latency=constant(0.0),
+                       token_delay=0.0, respond=scripted_response).register()
+    runs = workflow_runs(backend.name)
+    zero_runs = workflow_runs(zero.name)
+
+    policy = get_retry_policy()
+    set_retry_policy(RetryPolicy(max_attempts=10, base_delay=0.001,
+                                 max_delay=0.01))
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for workflow in workflows:
+            for mode in modes:
+                index = MODES.index(mode)
+                run = runs[workflow][index]
+                zero_run = zero_runs[workflow][index]
+
+                calls = backend.calls
+                if mode == "sync":
+                    latencies = _latencies(run, iterations, warmup)
+                    throughput = _throughput(run, iterations, concurrency)
+                    zero_latencies = _latencies(zero_run, iterations, warmup)
+                else:
+                    latencies = asyncio.run(
+                        _alatencies(run, iterations, warmup))
+                    throughput = asyncio.run(
+                        _athroughput(run, iterations, concurrency))
+                    zero_latencies = asyncio.run(
+                        _alatencies(zero_run, iterations, warmup))
+                calls_per_run = ((backend.calls - calls)
+                                 / (2 * iterations + warmup))
+
+                results.setdefault(workflow, {})[mode] = {
+                    "calls_per_run": calls_per_run,
+                    "latency_ms": summarize(latencies),
+                    "throughput_rps": throughput,
+                    "overhead_us_per_call": (
+                        1e6 * sum(zero_latencies) / len(zero_latencies)
+                        / max(calls_per_run, 1)),
+                }
+    finally:
+        set_retry_policy(policy)
+
+    return {
+        "metadata": {
+            **_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": config,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: Dict[str, Any],
+            current: Dict[str, Any]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Compares two benchmark runs.
+
+    Args:
+        baseline (Dict[str, Any]): The earlier run.
+        current (Dict[str, Any]): The later run.
+
+    Returns:
+        Dict[str, Dict[str, Dict[str, float]]]: The ratio of the current to
+            the baseline p50, p95, p99 and overhead, keyed by workflow and
+            mode, for the measurements present in both runs.
+    """
+    ratios: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for workflow, modes in current["results"].items():
+        for mode, result in modes.items():
+            base = baseline["results"].get(workflow, {}).get(mode)
+            if base is None:
+                continue
+            ratios.setdefault(workflow, {})[mode] = {
+                **{q: result["latency_ms"][q] / base["latency_ms"][q]
+                   for q in ("p50", "p95", "p99")},
+                "overhead": (result["overhead_us_per_call"]
+                             / base["overhead_us_per_call"]),
+            }
+    return ratios
+
+
+def format_results(report: Dict[str, Any],
+                   ratios: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Formats benchmark results as a table.
+
+    Args:
+        report (Dict[str, Any]): The benchmark run.
+        ratios (Optional[Dict[str, Any]]): The comparison with a baseline.
+
+    Returns:
+        str: The table.
+    """
+    header = (f"{'workflow':<10}{'mode':<7}{'calls':>6}{'p50 ms':>9}"
+              f"{'p95 ms':>9}{'p99 ms':>9}{'runs/s':>9}{'ovh us':>9}")
+    if ratios:
+        header += f"{'p95 x':>8}{'ovh x':>8}"
+    lines = [header]
+    for workflow, modes in report["results"].items():
+        for mode, result in modes.items():
+            latency = result["latency_ms"]
+            line = (f"{workflow:<10}{mode:<7}{result['calls_per_run']:>6.1f}"
+                    f"{latency['p50']:>9.1f}{latency['p95']:>9.1f}"
+                    f"{latency['p99']:>9.1f}{result['throughput_rps']:>9.1f}"
+                    f"{result['overhead_us_per_call']:>9.0f}")
+            ratio = (ratios or {}).get(workflow, {}).get(mode)
+            if ratio:
+                line += f"{ratio['p95']:>8.2f}{ratio['overhead']:>8.2f}"
+            lines.append(line)
+    return "\n".join(lines)
+
+
+@click.command()
+@click.option('-w', '--workflow', 'workflows', multiple=True,
+              type=click.Choice(WORKFLOWS),
+              help='Workflow to benchmark, repeatable. Defaults to all.')
+@click.option('-m', '--mode', 'modes', multiple=True,
+              type=click.Choice(MODES),
+              help='Mode to benchmark, repeatable. Defaults to both.')
+@click.option('--iterations', default=30, show_default=True,
+              help='Runs per measurement.')
+@click.option('--concurrency', default=8, show_default=True,
+              help='Concurrent runs when measuring throughput.')
+@click.option('--median-latency', default=0.02, show_default=True,
+              help='Median seconds until the first token.')
+@click.option('--sigma', default=0.3, show_default=True,
+              help='Log-normal shape of the latency.')
+@click.option('--tokens-per-second', default=1000.0, show_default=True,
+              help='Token throughput of the fake backend.')
+@click.option('--failure-rate', default=0.0, show_default=True,
+              help='Probability of a transient call failure.')
+@click.option('--seed', default=0, show_default=True,
+              help='Seed of the fake backend.')
+@click.option('-o', '--output', type=click.Path(dir_okay=False),
+              help='File to write the JSON results to.')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False),
+              help='Earlier JSON results to compare against.')
+def main(workflows, modes, iterations, concurrency, median_latency, sigma,
+         tokens_per_second, failure_rate, seed, output, baseline):
+    """
+    Benchmark the built-in workflows on a fake backend.
+    """
+    report = run_benchmarks(
+        workflows=workflows or WORKFLOWS, modes=modes or MODES,
+        iterations=iterations, concurrency=concurrency,
+        median_latency=median_latency, sigma=sigma,
+        tokens_per_second=tokens_per_second, failure_rate=failure_rate,
+        seed=seed)
+    ratios = None
+    if baseline:
+        ratios = compare(json.loads(Path(baseline).read_text()), report)
+        report["comparison"] = ratios
+    click.echo(format_results(report, ratios))
+    if output:
+        Path(output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
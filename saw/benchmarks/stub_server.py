@@ -0,0 +1,603 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Stub HTTP Server Module
+
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from saw.providers.ollama import LOAD_OPTIONS
+
+# Define a type alias for the stub route handlers
+Route_Handler = Callable[[str, Dict[str, Any]], Tuple[int, Any]]
+
+
+def chat_completion_handler(path: str,
+                            body: Dict[str, Any]) -> Tuple[int, Any]:
+    """
+    Answers an OpenAI-compatible chat completion request.
+
+    The reply echoes the last message so results can be checked.
+
+    Args:
+        path (str): The request path.
+        body (Dict[str, Any]): The JSON request body.
+
+    Returns:
+        Tuple[int, Any]: The status code and JSON payload.
+    """
+    prompt = body.get("messages", [{}])[-1].get("content", "")
+    return 200, {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": f"echo: {prompt}"},
+        }],
+        "usage": {
+            "prompt_tokens": len(prompt.split()),
+            "completion_tokens": len(prompt.split()) + 1,
+            "total_tokens": 2 * len(prompt.split()) + 1,
+        },
+    }
+
+
+def parse_keep_alive(keep_alive: Any, default: float) -> float:
+    """
+    Converts an Ollama keep_alive value to seconds.
+
+    Args:
+        keep_alive (Any): Seconds, a duration such as "10m" or "1h30m",
+            or None for the default.
+        default (float): The seconds used when keep_alive is None.
+
+    Returns:
+        float: The seconds, infinite for a negative keep_alive.
+    """
+    if keep_alive is None:
+        return default
+    if isinstance(keep_alive, str):
+        units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+        parts = re.findall(r"(-?[\d.]+)(ms|h|m|s)?", keep_alive)
+        seconds = sum(float(value) * units[unit or "s"]
+                      for value, unit in parts)
+    else:
+        seconds = float(keep_alive)
+    return float("inf") if seconds < 0 else seconds
+
+
+class FakeOllamaAPI:
+    """
+    Route handlers standing in for the Ollama HTTP API.
+
+    Generate requests may be served like a local Ollama server: at most
+    ``slots`` at once, each taking ``generate_time`` seconds. A request
+    whose model or load options differ from the loaded ones, or that arrives
+    after the model's keep_alive ran out, first waits ``load_time`` seconds
+    for the model to load.
+
+    Attributes:
+        models (List[str]): The models available on the fake server.
+        calls (Dict[str, int]): The number of requests per API path.
+        loads (int): The number of model loads.
+        max_active (int): The most generate requests served at once.
+        keep_alives (List[Any]): The keep_alive of every generate request.
+    """
+
+    def __init__(self, models: Optional[List[str]] = None,
+                 slots: Optional[int] = None, generate_time: float = 0.0,
+                 load_time: float = 0.0, keep_alive: float = 300.0):
+        """
+        Initializes a FakeOllamaAPI.
+
+        Args:
+            models (Optional[List[str]]): The models available initially.
+            slots (Optional[int]): The generate requests served at once,
+                or None for no limit.
+            generate_time (float): Seconds to serve a generate request.
+            load_time (float): Seconds to load a model.
+            keep_alive (float): Seconds a model stays loaded after a
+                request that sets no keep_alive.
+        """
+        self.models = list(models or [])
+        self.calls: Dict[str, int] = {}
+        self.generate_time = generate_time
+        self.load_time = load_time
+        self.keep_alive = keep_alive
+        self.loads = 0
+        self.max_active = 0
+        self.keep_alives: List[Any] = []
+        self._active = 0
+        self._loaded: Optional[str] = None
+        self._expires = 0.0
+        self._slots = threading.Semaphore(slots) if slots else None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    @property
+    def routes(self) -> Dict[Tuple[str, str], Route_Handler]:
+        """
+        The route handlers of the fake API.
+
+        Returns:
+            Dict[Tuple[str, str], Route_Handler]: The route handlers.
+        """
+        return {
+            ("GET", "/api/tags"): self.tags,
+            ("POST", "/api/pull"): self.pull,
+            ("POST", "/api/generate"): self.generate,
+        }
+
+    def _count(self, path: str):
+        """
+        Counts a request to an API path.
+
+        Args:
+            path (str): The request path.
+        """
+        with self._lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+
+    def tags(self, path: str, body: Dict[str, Any]) -> Tuple[int, Any]:
+        """
+        Lists the available models.
+
+        Args:
+            path (str): The request path.
+            body (Dict[str, Any]): The JSON request body.
+
+        Returns:
+            Tuple[int, Any]: The status code and payload.
+        """
+        self._count(path)
+        return 200, {"models": [{"model": m, "name": m}
+                                for m in self.models]}
+
+    def pull(self, path: str, body: Dict[str, Any]) -> Tuple[int, Any]:
+        """
+        Pulls a model, streaming its progress.
+
+        Args:
+            path (str): The request path.
+            body (Dict[str, Any]): The JSON request body.
+
+        Returns:
+            Tuple[int, Any]: The status code and payload.
+        """
+        self._count(path)
+        self.models.append(body["model"])
+        return 200, iter([json.dumps({"status": status}).encode() + b"\n"
+                          for status in ("pulling manifest", "success")])
+
+    def generate(self, path: str, body: Dict[str, Any]) -> Tuple[int, Any]:
+        """
+        Echoes the prompt of a generate request.
+
+        Args:
+            path (str): The request path.
+            body (Dict[str, Any]): The JSON request body.
+
+        Returns:
+            Tuple[int, Any]: The status code and payload.
+        """
+        self._count(path)
+        if self._slots is not None:
+            self._slots.acquire()
+        with self._lock:
+            self.keep_alives.append(body.get("keep_alive"))
+            self._active += 1
+            self.max_active = max(self.max_active, self._active)
+        try:
+            self._load(body)
+            time.sleep(self.generate_time)
+        finally:
+            with self._lock:
+                self._active -= 1
+            if self._slots is not None:
+                self._slots.release()
+        return 200, {
+            "model": body["model"],
+            "created_at": "2025-01-01T00:00:00Z",
+            "response": f"echo: {body.get('prompt', '')}",
+            "done": True,
+        }
+
+    def _load(self, body: Dict[str, Any]):
+        """
+        Loads the model and load options of a generate request unless they
+        are loaded, then extends their keep_alive.
+
+        Args:
+            body (Dict[str, Any]): The JSON request body.
+        """
+        options = {name: value
+                   for name, value in (body.get("options") or {}).items()
+                   if name in LOAD_OPTIONS}
+        loaded = json.dumps([body["model"], options], sort_keys=True)
+        with self._load_lock:
+            if loaded != self._loaded or time.monotonic() > self._expires:
+                time.sleep(self.load_time)
+                self._loaded = loaded
+                self.loads += 1
+            self._expires = time.monotonic() + parse_keep_alive(
+                body.get("keep_alive"), self.keep_alive)
+
+
+class FakeBatchAPI:
+    """
+    Route handlers standing in for the OpenAI and Groq batch APIs.
+
+    A batch completes once it has been polled ``polls`` times; its requests
+    are answered like ``chat_completion_handler`` and requests whose prompt
+    contains "fail" are written to the error file instead. A batch whose
+    requests use more than one model fails, like on the real APIs.
+
+    Attributes:
+        polls (int): The status checks after which a batch completes.
+        files (Dict[str, bytes]): The uploaded and generated files.
+        batches (Dict[str, Dict[str, Any]]): The batches by ID.
+        batch_sizes (List[int]): The number of requests of every batch.
+    """
+
+    def __init__(self, polls: int = 1):
+        """
+        Initializes a FakeBatchAPI.
+
+        Args:
+            polls (int): The status checks after which a batch completes.
+        """
+        self.polls = polls
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.batch_sizes: List[int] = []
+        self._polled: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def routes(self) -> Dict[Tuple[str, str], Route_Handler]:
+        """
+        The route handlers of the fake API, under the OpenAI ``/v1`` and the
+        Groq ``/openai/v1`` prefixes.
+
+        Returns:
+            Dict[Tuple[str, str], Route_Handler]: The route handlers.
+        """
+        routes = {}
+        for prefix in ("/v1", "/openai/v1"):
+            routes.update({
+                ("POST", f"{prefix}/files"): self.upload,
+                ("GET", f"{prefix}/files/*"): self.content,
+                ("POST", f"{prefix}/batches"): self.create,
+                ("GET", f"{prefix}/batches/*"): self.retrieve,
+            })
+        return routes
+
+    def _add_file(self, data: bytes) -> Dict[str, Any]:
+        """
+        Stores a file.
+
+        Args:
+            data (bytes): The file content.
+
+        Returns:
+            Dict[str, Any]: The file object.
+        """
+        with self._lock:
+            file_id = f"file-{len(self.files) + 1}"
+            self.files[file_id] = data
+        return {"id": file_id, "object": "file", "bytes": len(data),
+                "created_at": int(time.time()), "filename": "batch.jsonl",
+                "purpose": "batch", "status": "processed"}
+
+    def upload(self, path: str, body: Dict[str, Any]) -> Tuple[int, Any]:
+        """
+        Stores the file of a multipart upload.
+
+        Args:
+            path (str): The request path.
+            body (Dict[str, Any]): The raw multipart request body.
+
+        Returns:
+            Tuple[int, Any]: The status code and file object.
+        """
+        raw = body["raw"]
+        boundary = raw.split(b"\r\n", 1)[0]
+        for part in raw.split(boundary):
+            headers, _, data = part.partition(b"\r\n\r\n")
+            if b'name="file"' in headers:
+                return 200, self._add_file(data.rstrip(b"\r\n-"))
+        return 400, {"error": {"message": "missing file"}}
+
+    def content(self, path: str, body: Dict[str, Any]) -> Tuple[int, Any]:
+        """
+        Returns the content of a file.
+
+        Args:
+            path (str): The request path, ending in ``/{id}/content``.
+            body (Dict[str, Any]): The JSON request body.
+
+        Returns:
+            Tuple[int, Any]: The status code and file content.
+        """
+        file_id = path.split("?", 1)[0].split("/")[-2]
+        if file_id not in self.files:
+            return 404, {"error": {"message": "file not found"}}
+        return 200, self.files[file_id]
+
+    def create(self, path: str, body: Dict[str, Any]) -> Tuple[int, Any]:
+        """
+        Creates a batch from an uploaded file.
+
+        Args:
+            path (str): The request path.
+            body (Dict[str, Any]): The JSON request body.
+
+        Returns:
+            Tuple[int, Any]: The status code and batch object.
+        """
+        with self._lock:
+            batch_id = f"batch_{len(self.batches) + 1}"
+            batch = self.batches[batch_id] = {
+                "id": batch_id, "object": "batch",
+                "endpoint": body["endpoint"],
+                "input_file_id": body["input_file_id"],
+                "completion_window": body["completion_window"],
+                "status": "validating", "created_at": int(time.time()),
+                "output_file_id": None, "error_file_id": None,
+            }
+            self._polled[batch_id] = 0
+        return 200, batch
+
+    def _complete(self, batch: Dict[str, Any]):
+        """
+        Answers the requests of a batch and writes its result files.
+
+        Args:
+            batch (Dict[str, Any]): The batch object.
+        """
+        outputs, errors = [], []
+        lines = self.files[batch["input_file_id"]].decode().splitlines()
+        self.batch_sizes.append(len(lines))
+        requests = [json.loads(line) for line in lines]
+        if len({request["body"]["model"] for request in requests}) > 1:
+            batch["status"] = "failed"
+            batch["errors"] = {"object": "list", "data": [{
+                "code": "mismatched_model",
+                "message": "All requests must use the same model."}]}
+            return
+        for i, request in enumerate(requests):
+            prompt = request["body"]["messages"][-1]["content"]
+            record = {"id": f"batch_req_{i}",
+                      "custom_id": request["custom_id"], "error": None}
+            if "fail" in prompt:
+                record["response"] = {"status_code": 400, "body": {
+                    "error": {"message": "invalid request"}}}
+                errors.append(record)
+            else:
+                _, completion = chat_completion_handler(
+                    request["url"], request["body"])
+                record["response"] = {"status_code": 200, "body": completion}
+                outputs.append(record)
+        for key, records in (("output_file_id", outputs),
+                             ("error_file_id", errors)):
+            if records:
+                batch[key] = self._add_file("".join(
+                    json.dumps(r) + "\n" for r in records).encode())["id"]
+        batch["status"] = "completed"
+
+    def retrieve(self, path: str, body: Dict[str, Any]) -> Tuple[int, Any]:
+        """
+        Returns a batch, completing it once it has been polled enough.
+
+        Args:
+            path (str): The request path, ending in the batch ID.
+            body (Dict[str, Any]): The JSON request body.
+
+        Returns:
+            Tuple[int, Any]: The status code and batch object.
+        """
+        batch_id = path.split("?", 1)[0].rstrip("/").split("/")[-1]
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return 404, {"error": {"message": "batch not found"}}
+            self._polled[batch_id] += 1
+            if batch["status"] != "completed":
+                batch["status"] = "in_progress"
+                if self._polled[batch_id] >= self.polls:
+                    self._complete(batch)
+            return 200, dict(batch)
+
+
+class StubServer:
+    """
+    Local HTTP server standing in for a provider API.
+
+    Requests are answered by route handlers returning a status code and a
+    payload. Dict payloads are sent as JSON, bytes as-is and any other
+    iterable as a chunked stream of its ``bytes`` items. The server speaks
+    HTTP/1.1 with keep-alive and counts accepted TCP connections, so tests
+    and benchmarks can observe connection reuse.
+    """
+
+    def __init__(self, routes: Optional[Dict[Tuple[str, str],
+                                             Route_Handler]] = None,
+                 latency: float = 0.0):
+        """
+        Initializes a StubServer.
+
+        Args:
+            routes (Optional[Dict[Tuple[str, str], Route_Handler]]): Handlers
+                keyed by HTTP method and path. Paths ending in ``*`` match
+                by prefix.
+            latency (float): Seconds to wait before answering a request.
+        """
+        self.routes = dict(routes or {
+            ("POST", "/v1/chat/completions"): chat_completion_handler,
+            ("POST", "/chat/completions"): chat_completion_handler,
+        })
+        self.latency = latency
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """
+        The base URL of the running server.
+
+        Returns:
+            str: The base URL.
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def route(self, method: str, path: str, handler: Route_Handler):
+        """
+        Registers a route handler.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The request path, or a prefix ending in ``*``.
+            handler (Route_Handler): The route handler.
+        """
+        self.routes[(method, path)] = handler
+
+    def _find_handler(self, method: str,
+                      path: str) -> Optional[Route_Handler]:
+        """
+        Finds the handler of a request.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The request path.
+
+        Returns:
+            Optional[Route_Handler]: The matching handler, if any.
+        """
+        path = path.split("?", 1)[0]
+        if (method, path) in self.routes:
+            return self.routes[(method, path)]
+        prefixes = [(m, p) for m, p in self.routes
+                    if m == method and p.endswith("*")
+                    and path.startswith(p[:-1])]
+        if prefixes:
+            return self.routes[max(prefixes, key=lambda r: len(r[1]))]
+        return None
+
+    def _make_handler(self) -> type:
+        """
+        Builds the request handler class bound to this server.
+
+        Returns:
+            type: The request handler class.
+        """
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    body = {"raw": raw}
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                handler = stub._find_handler(method, self.path)
+                if handler is None:
+                    status, payload = 404, {"error": "not found"}
+                else:
+                    status, payload = handler(self.path, body)
+                self._send(status, payload)
+
+            def _send(self, status: int, payload: Any):
+                if isinstance(payload, (bytes, dict, list)):
+                    data = (payload if isinstance(payload, bytes)
+                            else json.dumps(payload).encode())
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                self._send_chunked(status, payload)
+
+            def _send_chunked(self, status: int, chunks: Iterable[bytes]):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in chunks:
+                    self.wfile.write(f"{len(chunk):X}\r\n".encode()
+                                     + chunk + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def do_DELETE(self):
+                self._respond("DELETE")
+
+        return Handler
+
+    def start(self) -> "StubServer":
+        """
+        Starts serving on a free local port in a background thread.
+
+        Returns:
+            StubServer: The running server.
+        """
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0),
+                                           self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,97 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" XML Extraction Benchmark Module
+
+Compares extracting several tags from a large response with one regex
+search per tag, as ``extract_xml`` used to, against the single-pass
+``extract_tags``, and against feeding the response chunk by chunk to an
+``XMLTagExtractor``. Run with ``python -m saw.benchmarks.xml_extraction``.
+"""
+import re
+import timeit
+from typing import Dict, List
+
+from saw.core.processor import XMLTagExtractor, extract_tags
+
+TAGS = ["thoughts", "response", "evaluation", "feedback"]
+
+
+def regex_extract(text: str, tag: str) -> str:
+    """
+    Extracts a tag with a regex built for the call, the former
+    ``extract_xml``.
+
+    Args:
+        text (str): The text containing the XML.
+        tag (str): The XML tag to extract content from.
+
+    Returns:
+        str: The content of the tag.
+    """
+    match = re.search(f'<{tag}>(.*?)</{tag}>', text, re.DOTALL)
+    return match.group(1) if match else ""
+
+
+def make_response(n_words: int) -> str:
+    """
+    Builds a response with the tags spread over ``n_words`` words of text.
+
+    Args:
+        n_words (int): The number of words.
+
+    Returns:
+        str: The response.
+    """
+    filler = " ".join(["word"] * (n_words // len(TAGS)))
+    return "\n".join(f"<{tag}>{filler}</{tag}>" for tag in TAGS)
+
+
+def stream_extract(text: str, tags: List[str],
+                   chunk_size: int = 16) -> Dict[str, str]:
+    """
+    Extracts tags by feeding the text to an XMLTagExtractor in chunks.
+
+    Args:
+        text (str): The text containing the XML.
+        tags (List[str]): The XML tags to extract.
+        chunk_size (int): The number of characters per chunk.
+
+    Returns:
+        Dict[str, str]: The content of each tag.
+    """
+    extractor = XMLTagExtractor(tags)
+    for i in range(0, len(text), chunk_size):
+        extractor.feed(text[i:i + chunk_size])
+    return {tag: extractor.get(tag) for tag in tags}
+
+
+def run_benchmark(n_words: int = 20000,
+                  number: int = 50) -> Dict[str, float]:
+    """
+    Times the extraction of every tag from one response.
+
+    Args:
+        n_words (int): The number of words in the response.
+        number (int): The number of extractions timed.
+
+    Returns:
+        Dict[str, float]: The microseconds per extraction keyed by method.
+    """
+    text = make_response(n_words)
+    expected = {tag: regex_extract(text, tag) for tag in TAGS}
+    assert extract_tags(text, *TAGS) == expected
+    assert stream_extract(text, TAGS) == expected
+
+    methods = {
+        "regex per tag": lambda: [regex_extract(text, tag) for tag in TAGS],
+        "extract_tags": lambda: extract_tags(text, *TAGS),
+        "streamed": lambda: stream_extract(text, TAGS),
+    }
+    return {name: 1e6 * timeit.timeit(method, number=number) / number
+            for name, method in methods.items()}
+
+
+if __name__ == '__main__':
+    for n_words in (1000, 20000, 200000):
+        for method, us in run_benchmark(n_words, number=20).items():
+            print(f"{n_words:>7} words {method:>14}: {us:10.1f} us")
@@ -3,12 +3,16 @@
 """ LLM Backend Module
 
 """
-from typing import Any, Callable, Dict
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
 
-from ..providers.google import gemini_call, agemini_call
-from ..providers.groq import groq_call, agroq_call
-from ..providers.ollama import ollama_call, aollama_call
-from ..providers.openai import openai_call, aopenai_call
+from .clients import ClientRegistry, PoolLimits, client_registry
+from ..providers.google import (gemini_call, agemini_call, gemini_stream,
+                                agemini_stream)
+from ..providers.groq import groq_call, agroq_call, groq_stream, agroq_stream
+from ..providers.ollama import (ollama_call, aollama_call, ollama_stream,
+                                aollama_stream)
+from ..providers.openai import (openai_call, aopenai_call, openai_stream,
+                                aopenai_stream)
 
 
 # Define a type alias for the LLM provider call function
@@ -17,9 +21,16 @@ Provider_Call_Function = Callable[
 Async_Provider_Call_Function = Callable[
     [str, str, str, Dict[str, dict]], Any]
 
+Provider_Stream_Function = Callable[
+    [str, str, str, Dict[str, dict]], Iterator[str]]
+Async_Provider_Stream_Function = Callable[
+    [str, str, str, Dict[str, dict]], AsyncIterator[str]]
+
 # Dictionary to store available LLM backends
 provider_backends: Dict[str, Provider_Call_Function] = {}
 async_provider_backends: Dict[str, Async_Provider_Call_Function] = {}
+stream_provider_backends: Dict[str, Provider_Stream_Function] = {}
+async_stream_provider_backends: Dict[str, Async_Provider_Stream_Function] = {}
 
 
 def register_backend(name: str, func: Provider_Call_Function):
@@ -45,30 +56,90 @@ def aregister_backend(name: str, func: Async_Provider_Call_Function):
     async_provider_backends[name] = func
 
 
+def register_stream_backend(name: str, func: Provider_Stream_Function):
+    """
+    Registers a streaming provider backend with the interface.
+
+    Args:
+        name (str): The name of the backend.
+        func (Provider_Stream_Function): The provider stream function.
+    """
+    stream_provider_backends[name] = func
+
+
+def aregister_stream_backend(name: str,
+                             func: Async_Provider_Stream_Function):
+    """
+    Registers an asynchronous streaming provider backend with the interface.
+
+    Args:
+        name (str): The name of the backend.
+        func (Async_Provider_Stream_Function): \
+            The asynchronous provider stream function.
+    """
+    async_stream_provider_backends[name] = func
+
+
+def configure_client_pool(provider: str,
+                          limits: Optional[PoolLimits] = None,
+                          **settings):
+    """
+    Configures the pooled clients shared by a provider backend.
+
+    Args:
+        provider (str): The name of the provider.
+        limits (Optional[PoolLimits]): The connection pool limits.
+        settings (dict): Default keyword arguments for the provider client.
+    """
+    client_registry.configure(provider, limits=limits, **settings)
+
+
+def close_clients():
+    """
+    Closes the pooled synchronous provider clients.
+    """
+    client_registry.close()
+
+
+async def aclose_clients():
+    """
+    Closes the pooled provider clients of the running event loop.
+    """
+    await client_registry.aclose()
+
+
 def select_backend(provider: str, async_mode: bool = False):
     if provider == "google":
         if async_mode:
             aregister_backend("google", agemini_call)
+            aregister_stream_backend("google", agemini_stream)
         else:
             register_backend("google", gemini_call)
+            register_stream_backend("google", gemini_stream)
 
     if provider == "groq":
         if async_mode:
             aregister_backend("groq", agroq_call)
+            aregister_stream_backend("groq", agroq_stream)
         else:
             register_backend("groq", groq_call)
+            register_stream_backend("groq", groq_stream)
 
     if provider == "ollama":
         if async_mode:
             aregister_backend("ollama", aollama_call)
+            aregister_stream_backend("ollama", aollama_stream)
         else:
             register_backend("ollama", ollama_call)
+            register_stream_backend("ollama", ollama_stream)
 
     if provider == "openai":
         if async_mode:
             aregister_backend("openai", aopenai_call)
+            aregister_stream_backend("openai", aopenai_stream)
         else:
             register_backend("openai", openai_call)
+            register_stream_backend("openai", openai_stream)
 
 
 if __name__ == '__main__':
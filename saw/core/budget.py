@@ -0,0 +1,153 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Budget Module
+
+Bounds the wall time, tokens and cost a workflow run may spend. A run
+charges the usage of its model calls to a ``BudgetTracker`` and checks it
+before every call; once a limit is reached, the run stops with the reason.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from .rate_limit import CHARS_PER_TOKEN
+from .usage import Usage
+
+# Reasons a run stopped because of its budget
+STOP_TIME = "time"
+STOP_TOKENS = "tokens"
+STOP_COST = "cost"
+
+
+@dataclass
+class Budget:
+    """
+    Limits of a workflow run. Limits left as None are not enforced.
+
+    Attributes:
+        max_seconds (Optional[float]): The maximum wall time in seconds.
+        max_tokens (Optional[int]): The maximum prompt and generated tokens.
+        max_cost (Optional[float]): The maximum cost.
+        input_price (float): The cost of a million prompt tokens.
+        output_price (float): The cost of a million generated tokens.
+    """
+    max_seconds: Optional[float] = None
+    max_tokens: Optional[int] = None
+    max_cost: Optional[float] = None
+    input_price: float = 0.0
+    output_price: float = 0.0
+
+    def cost(self, usage: Usage) -> float:
+        """
+        Prices the usage of model calls.
+
+        Args:
+            usage (Usage): The token usage.
+
+        Returns:
+            float: The cost of the usage.
+        """
+        return (usage.prompt_tokens * self.input_price
+                + usage.completion_tokens * self.output_price) / 1e6
+
+
+def estimate_usage(usage: Usage, prompt: str, response: str) -> Usage:
+    """
+    Returns the usage of a model call, estimated from the lengths of its
+    prompt and response when the provider reported none.
+
+    Args:
+        usage (Usage): The usage recorded during the call.
+        prompt (str): The prompt, including any system prompt.
+        response (str): The response.
+
+    Returns:
+        Usage: The reported or estimated usage.
+    """
+    if usage.reported:
+        return usage
+    return Usage(prompt_tokens=math.ceil(len(prompt) / CHARS_PER_TOKEN),
+                 completion_tokens=math.ceil(len(response) / CHARS_PER_TOKEN))
+
+
+class BudgetTracker:
+    """
+    Tracks the time, tokens and cost a run has spent against its budget.
+
+    Attributes:
+        budget (Budget): The limits of the run.
+        usage (Usage): The tokens charged so far.
+        cost (float): The cost charged so far.
+    """
+
+    def __init__(self, budget: Optional[Budget] = None):
+        """
+        Initializes a BudgetTracker, starting the clock.
+
+        Args:
+            budget (Optional[Budget]): The limits, or None for no limits.
+        """
+        self.budget = budget or Budget()
+        self.usage = Usage()
+        self.cost = 0.0
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        """
+        The seconds since the run started.
+
+        Returns:
+            float: The elapsed wall time.
+        """
+        return time.monotonic() - self._start
+
+    def remaining_seconds(self) -> Optional[float]:
+        """
+        Returns the wall time left.
+
+        Returns:
+            Optional[float]: The seconds left, at least zero, or None
+                without a time limit.
+        """
+        if self.budget.max_seconds is None:
+            return None
+        return max(0.0, self.budget.max_seconds - self.elapsed)
+
+    def charge(self, usage: Usage):
+        """
+        Adds the usage of model calls.
+
+        Args:
+            usage (Usage): The token usage.
+        """
+        with self._lock:
+            self.usage.prompt_tokens += usage.prompt_tokens
+            self.usage.completion_tokens += usage.completion_tokens
+            self.cost += self.budget.cost(usage)
+
+    def exceeded(self) -> Optional[str]:
+        """
+        Checks the limits.
+
+        Returns:
+            Optional[str]: ``STOP_TIME``, ``STOP_TOKENS`` or ``STOP_COST``
+                for the first limit reached, or None within budget.
+        """
+        budget = self.budget
+        if budget.max_seconds is not None and \
+                self.elapsed >= budget.max_seconds:
+            return STOP_TIME
+        if budget.max_tokens is not None and \
+                self.usage.total_tokens >= budget.max_tokens:
+            return STOP_TOKENS
+        if budget.max_cost is not None and self.cost >= budget.max_cost:
+            return STOP_COST
+        return None
+
+
+if __name__ == '__main__':
+    pass
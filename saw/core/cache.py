@@ -0,0 +1,344 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Response Cache Module
+
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+def make_cache_key(provider: str, model: str, system_prompt: str,
+                   prompt: str, params: Dict[str, Any]) -> str:
+    """
+    Builds a stable content hash of a model request.
+
+    Args:
+        provider (str): The provider to use.
+        model (str): The model to use.
+        system_prompt (str): The system prompt.
+        prompt (str): The input prompt.
+        params (Dict[str, Any]): The other model parameters.
+
+    Returns:
+        str: The hex digest identifying the request.
+    """
+    payload = json.dumps([provider, model, system_prompt, prompt, params],
+                         sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """
+    Hit and miss counters of a response cache.
+
+    Attributes:
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups not found in the cache.
+        evictions (int): The number of entries evicted.
+    """
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        The fraction of lookups answered from the cache.
+
+        Returns:
+            float: The hit rate.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResponseCache:
+    """
+    Base class of the response caches used by ``model_call``.
+
+    Subclasses implement ``_get``, ``_set`` and ``clear``; the base class
+    keeps the hit and miss counters.
+    """
+
+    def __init__(self):
+        """
+        Initializes a ResponseCache.
+        """
+        self.stats = CacheStats()
+
+    def _get(self, key: str) -> Optional[str]:
+        """
+        Reads an entry without touching the counters.
+
+        Args:
+            key (str): The request key.
+
+        Returns:
+            Optional[str]: The cached response, or None if absent.
+        """
+        raise NotImplementedError
+
+    def _set(self, key: str, value: str):
+        """
+        Writes an entry.
+
+        Args:
+            key (str): The request key.
+            value (str): The response.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Looks up a cached response.
+
+        Args:
+            key (str): The request key.
+
+        Returns:
+            Optional[str]: The cached response, or None on a miss.
+        """
+        value = self._get(key)
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        """
+        Stores a response.
+
+        Args:
+            key (str): The request key.
+            value (str): The response.
+        """
+        self._set(key, value)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """
+        Asynchronously looks up a cached response.
+
+        Args:
+            key (str): The request key.
+
+        Returns:
+            Optional[str]: The cached response, or None on a miss.
+        """
+        return self.get(key)
+
+    async def aset(self, key: str, value: str):
+        """
+        Asynchronously stores a response.
+
+        Args:
+            key (str): The request key.
+            value (str): The response.
+        """
+        self.set(key, value)
+
+
+class LRUCache(ResponseCache):
+    """
+    In-memory least-recently-used response cache.
+
+    Entries are evicted once the cache holds more than ``max_entries``
+    responses or ``max_bytes`` bytes of response text, and expire
+    ``ttl`` seconds after they were stored.
+    """
+
+    def __init__(self, max_entries: int = 1024,
+                 max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        """
+        Initializes an LRUCache.
+
+        Args:
+            max_entries (int): The maximum number of cached responses.
+            max_bytes (Optional[int]): The maximum total response size.
+            ttl (Optional[float]): Seconds before an entry expires.
+        """
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: OrderedDict[str, Tuple[str, int, float]] = \
+            OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, _, expiry = entry
+            if expiry < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: str):
+        expiry = (time.monotonic() + self.ttl
+                  if self.ttl is not None else float("inf"))
+        size = len(value.encode())
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expiry)
+            self.size += size
+            while self._entries and (
+                    len(self._entries) > self.max_entries
+                    or (self.max_bytes is not None
+                        and self.size > self.max_bytes)):
+                self._remove(next(iter(self._entries)))
+                self.stats.evictions += 1
+
+    def _remove(self, key: str):
+        """
+        Removes an entry while holding the lock.
+
+        Args:
+            key (str): The request key.
+        """
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class SQLiteCache(ResponseCache):
+    """
+    On-disk response cache backed by SQLite that survives restarts.
+
+    Entries expire ``ttl`` seconds after they were stored and the least
+    recently used entries are evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, path: Union[Path, str],
+                 ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        """
+        Initializes a SQLiteCache.
+
+        Args:
+            path (Union[Path, str]): The database file.
+            ttl (Optional[float]): Seconds before an entry expires.
+            max_entries (Optional[int]): The maximum number of entries.
+        """
+        super().__init__()
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path),
+                                           check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expiry REAL NOT NULL, used REAL NOT NULL)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value, expiry FROM responses WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._connection.execute(
+                    "DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._connection.execute(
+                "UPDATE responses SET used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def _set(self, key: str, value: str):
+        now = time.time()
+        expiry = now + self.ttl if self.ttl is not None else float("inf")
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, value, expiry, now))
+            if self.max_entries is not None:
+                evicted = self._connection.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY used DESC "
+                    "LIMIT -1 OFFSET ?)", (self.max_entries,)).rowcount
+                self.stats.evictions += evicted
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str):
+        await asyncio.to_thread(self.set, key, value)
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        with self._lock:
+            self._connection.close()
+
+
+# Response cache consulted by model_call, disabled until one is set
+_response_cache: Optional[ResponseCache] = None
+
+
+def set_response_cache(cache: Optional[ResponseCache]):
+    """
+    Sets the response cache used by ``model_call`` and ``amodel_call``.
+
+    Args:
+        cache (Optional[ResponseCache]): The cache, or None to disable.
+    """
+    global _response_cache
+    _response_cache = cache
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Returns the response cache used by ``model_call`` and ``amodel_call``.
+
+    Returns:
+        Optional[ResponseCache]: The cache, or None when disabled.
+    """
+    return _response_cache
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,606 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Checkpoint Module
+
+Records the model calls of a workflow run so that an interrupted run can
+resume without repeating them. Within a ``checkpoint_run`` context, every
+completed model call is saved with its inputs and response under the run
+ID; running the same workflow again with that run ID replays the recorded
+responses and only calls the models from the first step that did not
+complete.
+
+Checkpoints are written by a background thread that groups them into
+batches, so model calls never wait for the disk. A checkpoint is durable
+once its batch is written, at most ``flush_interval`` seconds after the
+call, and every pending checkpoint is written when the run exits.
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (Any, AsyncIterator, Awaitable, Callable, Dict, Iterator,
+                    List, Optional, Union)
+from urllib.parse import quote
+
+from .cache import make_cache_key
+
+logger = logging.getLogger(__name__)
+
+# Queue markers asking the writer to write its batch now, or to stop
+_FLUSH = object()
+_STOP = object()
+
+
+@dataclass
+class Checkpoint:
+    """
+    A completed step of a workflow run.
+
+    Attributes:
+        run_id (str): The workflow run ID.
+        step (str): The key of the step within the run.
+        inputs (Dict[str, Any]): The provider, model, prompts and parameters
+            of the model call.
+        output (Any): The response of the model call.
+    """
+    run_id: str
+    step: str
+    inputs: Dict[str, Any]
+    output: Any
+
+
+class CheckpointStore:
+    """
+    Base class of the checkpoint stores used by ``checkpoint_run``.
+
+    ``save`` only queues a checkpoint; a background writer collects up to
+    ``batch_size`` checkpoints, waiting at most ``flush_interval`` seconds
+    for more, and writes them together. Subclasses implement ``_write``,
+    ``_load`` and ``delete``.
+    """
+
+    def __init__(self, batch_size: int = 64, flush_interval: float = 0.05):
+        """
+        Initializes a CheckpointStore.
+
+        Args:
+            batch_size (int): The maximum number of checkpoints per write.
+            flush_interval (float): Seconds a batch waits for more
+                checkpoints before it is written.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+    def _write(self, checkpoints: List[Checkpoint]):
+        """
+        Durably writes a batch of checkpoints.
+
+        Args:
+            checkpoints (List[Checkpoint]): The checkpoints, in order.
+        """
+        raise NotImplementedError
+
+    def _load(self, run_id: str) -> List[Checkpoint]:
+        """
+        Reads the written checkpoints of a run.
+
+        Args:
+            run_id (str): The workflow run ID.
+
+        Returns:
+            List[Checkpoint]: The checkpoints, in the order they were saved.
+        """
+        raise NotImplementedError
+
+    def delete(self, run_id: str):
+        """
+        Removes the checkpoints of a run.
+
+        Args:
+            run_id (str): The workflow run ID.
+        """
+        raise NotImplementedError
+
+    def _close(self):
+        """
+        Releases the resources of the store once the writer has stopped.
+        """
+
+    def _run_writer(self):
+        """
+        Writes the queued checkpoints in batches until the store is closed.
+        """
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(items) < self.batch_size and \
+                    items[-1] is not _FLUSH and items[-1] is not _STOP:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            checkpoints = [item for item in items
+                           if isinstance(item, Checkpoint)]
+            try:
+                if checkpoints:
+                    self._write(checkpoints)
+            except Exception:
+                logger.exception("Failed to write %d checkpoints",
+                                 len(checkpoints))
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            if items[-1] is _STOP:
+                return
+
+    def save(self, checkpoint: Checkpoint):
+        """
+        Queues a checkpoint for the background writer.
+
+        Args:
+            checkpoint (Checkpoint): The completed step.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._run_writer, name="saw-checkpoint-writer",
+                    daemon=True)
+                self._writer.start()
+        self._queue.put(checkpoint)
+
+    def flush(self):
+        """
+        Blocks until every queued checkpoint is written.
+        """
+        if self._writer is None:
+            return
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def load(self, run_id: str) -> List[Checkpoint]:
+        """
+        Returns the checkpoints of a run, including the queued ones.
+
+        Args:
+            run_id (str): The workflow run ID.
+
+        Returns:
+            List[Checkpoint]: The checkpoints, in the order they were saved.
+        """
+        self.flush()
+        return self._load(run_id)
+
+    def close(self):
+        """
+        Writes the queued checkpoints and stops the writer.
+        """
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(_STOP)
+            writer.join()
+        self._close()
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """
+    Checkpoint store backed by a SQLite database, with one transaction per
+    batch.
+    """
+
+    def __init__(self, path: Union[Path, str], batch_size: int = 64,
+                 flush_interval: float = 0.05):
+        """
+        Initializes a SQLiteCheckpointStore.
+
+        Args:
+            path (Union[Path, str]): The database file.
+            batch_size (int): The maximum number of checkpoints per write.
+            flush_interval (float): Seconds a batch waits for more
+                checkpoints before it is written.
+        """
+        super().__init__(batch_size=batch_size, flush_interval=flush_interval)
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path),
+                                           check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=FULL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "run_id TEXT NOT NULL, step TEXT NOT NULL, "
+                "inputs TEXT NOT NULL, output TEXT NOT NULL, "
+                "PRIMARY KEY (run_id, step))")
+
+    def _write(self, checkpoints: List[Checkpoint]):
+        rows = [(c.run_id, c.step, json.dumps(c.inputs, default=repr),
+                 json.dumps(c.output, default=repr)) for c in checkpoints]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?)",
+                rows)
+
+    def _load(self, run_id: str) -> List[Checkpoint]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT step, inputs, output FROM checkpoints "
+                "WHERE run_id = ? ORDER BY rowid", (run_id,)).fetchall()
+        return [Checkpoint(run_id, step, json.loads(inputs),
+                           json.loads(output))
+                for step, inputs, output in rows]
+
+    def delete(self, run_id: str):
+        self.flush()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+
+    def _close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class FileCheckpointStore(CheckpointStore):
+    """
+    Checkpoint store writing one append-only JSON lines file per run, with
+    one fsync per file and batch.
+
+    A line cut short by a crash is ignored when the run is loaded.
+    """
+
+    def __init__(self, directory: Union[Path, str], batch_size: int = 64,
+                 flush_interval: float = 0.05):
+        """
+        Initializes a FileCheckpointStore.
+
+        Args:
+            directory (Union[Path, str]): The directory of the run files,
+                created if missing.
+            batch_size (int): The maximum number of checkpoints per write.
+            flush_interval (float): Seconds a batch waits for more
+                checkpoints before it is written.
+        """
+        super().__init__(batch_size=batch_size, flush_interval=flush_interval)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, run_id: str) -> Path:
+        """
+        Returns the file of a run.
+
+        Args:
+            run_id (str): The workflow run ID.
+
+        Returns:
+            Path: The JSON lines file of the run.
+        """
+        return self.directory / f"{quote(run_id, safe='')}.jsonl"
+
+    def _write(self, checkpoints: List[Checkpoint]):
+        lines: Dict[str, List[str]] = {}
+        for c in checkpoints:
+            lines.setdefault(c.run_id, []).append(json.dumps(
+                {"step": c.step, "inputs": c.inputs, "output": c.output},
+                default=repr) + "\n")
+        for run_id, run_lines in lines.items():
+            with open(self._path(run_id), "a", encoding="utf-8") as f:
+                f.writelines(run_lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _load(self, run_id: str) -> List[Checkpoint]:
+        path = self._path(run_id)
+        if not path.exists():
+            return []
+        checkpoints = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("Skipping a partial checkpoint of run %s",
+                                   run_id)
+                    continue
+                checkpoints.append(Checkpoint(run_id, record["step"],
+                                              record["inputs"],
+                                              record["output"]))
+        return checkpoints
+
+    def delete(self, run_id: str):
+        self.flush()
+        self._path(run_id).unlink(missing_ok=True)
+
+
+class CheckpointRun:
+    """
+    Replays and records the model calls of one workflow run.
+
+    A step is identified by its request and how many identical requests
+    the run made before it, so a resumed run finds the responses of its
+    completed steps as long as it makes the same calls.
+
+    Attributes:
+        store (CheckpointStore): The checkpoint store.
+        run_id (str): The workflow run ID.
+        resumed (int): The number of steps completed by earlier attempts.
+        replayed (int): The number of calls answered from checkpoints.
+        recorded (int): The number of calls recorded by this attempt.
+    """
+
+    def __init__(self, store: CheckpointStore, run_id: str):
+        """
+        Initializes a CheckpointRun, loading the completed steps.
+
+        Args:
+            store (CheckpointStore): The checkpoint store.
+            run_id (str): The workflow run ID.
+        """
+        self.store = store
+        self.run_id = run_id
+        self._outputs = {c.step: c.output for c in store.load(run_id)}
+        self.resumed = len(self._outputs)
+        self.replayed = 0
+        self.recorded = 0
+        self._occurrences: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def step(self, provider: str, model: str, system_prompt: str,
+             prompt: str, params: Dict[str, Any]) -> str:
+        """
+        Returns the key of the next step making a request.
+
+        Args:
+            provider (str): The provider to use.
+            model (str): The model to use.
+            system_prompt (str): The system prompt.
+            prompt (str): The input prompt.
+            params (Dict[str, Any]): The other model parameters.
+
+        Returns:
+            str: The step key.
+        """
+        key = make_cache_key(provider, model, system_prompt, prompt, params)
+        with self._lock:
+            occurrence = self._occurrences.get(key, 0)
+            self._occurrences[key] = occurrence + 1
+        return f"{key}-{occurrence}"
+
+    def replay(self, step: str) -> Optional[Any]:
+        """
+        Returns the recorded response of a step.
+
+        Args:
+            step (str): The step key.
+
+        Returns:
+            Optional[Any]: The response, or None if the step has not
+                completed before.
+        """
+        output = self._outputs.get(step)
+        if output is not None:
+            with self._lock:
+                self.replayed += 1
+            logger.debug("Replaying step %s of run %s", step, self.run_id)
+        return output
+
+    def record(self, step: str, inputs: Dict[str, Any], output: Any):
+        """
+        Records the response of a completed step.
+
+        Args:
+            step (str): The step key.
+            inputs (Dict[str, Any]): The inputs of the model call.
+            output (Any): The response.
+        """
+        if output is None:
+            return
+        with self._lock:
+            self._outputs[step] = output
+            self.recorded += 1
+        self.store.save(Checkpoint(self.run_id, step, inputs, output))
+
+    def call(self, provider: str, model: str, system_prompt: str,
+             prompt: str, params: Dict[str, Any],
+             func: Callable[[], Any]) -> Any:
+        """
+        Replays a model call, or makes and records it.
+
+        Args:
+            provider (str): The provider to use.
+            model (str): The model to use.
+            system_prompt (str): The system prompt.
+            prompt (str): The input prompt.
+            params (Dict[str, Any]): The other model parameters.
+            func (Callable[[], Any]): Makes the model call.
+
+        Returns:
+            Any: The response.
+        """
+        step = self.step(provider, model, system_prompt, prompt, params)
+        response = self.replay(step)
+        if response is None:
+            response = func()
+            self.record(step, checkpoint_inputs(provider, model,
+                                                system_prompt, prompt,
+                                                params), response)
+        return response
+
+    async def acall(self, provider: str, model: str, system_prompt: str,
+                    prompt: str, params: Dict[str, Any],
+                    func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Asynchronously replays a model call, or makes and records it.
+
+        Args:
+            provider (str): The provider to use.
+            model (str): The model to use.
+            system_prompt (str): The system prompt.
+            prompt (str): The input prompt.
+            params (Dict[str, Any]): The other model parameters.
+            func (Callable[[], Awaitable[Any]]): Makes the model call.
+
+        Returns:
+            Any: The response.
+        """
+        step = self.step(provider, model, system_prompt, prompt, params)
+        response = self.replay(step)
+        if response is None:
+            response = await func()
+            self.record(step, checkpoint_inputs(provider, model,
+                                                system_prompt, prompt,
+                                                params), response)
+        return response
+
+
+def checkpoint_inputs(provider: str, model: str, system_prompt: str,
+                      prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the recorded inputs of a model call.
+
+    Args:
+        provider (str): The provider to use.
+        model (str): The model to use.
+        system_prompt (str): The system prompt.
+        prompt (str): The input prompt.
+        params (Dict[str, Any]): The other model parameters.
+
+    Returns:
+        Dict[str, Any]: The inputs.
+    """
+    return {"provider": provider, "model": model,
+            "system_prompt": system_prompt, "prompt": prompt,
+            "params": params}
+
+
+# Checkpoint store used by AgentWorkflow runs, disabled until one is set
+_checkpoint_store: Optional[CheckpointStore] = None
+
+_current_run: ContextVar[Optional[CheckpointRun]] = ContextVar(
+    "saw_checkpoint_run", default=None)
+
+
+def set_checkpoint_store(store: Optional[CheckpointStore]):
+    """
+    Sets the checkpoint store used by ``checkpoint_run``.
+
+    Args:
+        store (Optional[CheckpointStore]): The store, or None to disable.
+    """
+    global _checkpoint_store
+    _checkpoint_store = store
+
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    """
+    Returns the checkpoint store used by ``checkpoint_run``.
+
+    Returns:
+        Optional[CheckpointStore]: The store, or None when disabled.
+    """
+    return _checkpoint_store
+
+
+def current_run() -> Optional[CheckpointRun]:
+    """
+    Returns the checkpointed run of the current context.
+
+    Returns:
+        Optional[CheckpointRun]: The run, or None outside ``checkpoint_run``.
+    """
+    return _current_run.get()
+
+
+def _resolve_store(store: Optional[CheckpointStore]) -> CheckpointStore:
+    """
+    Returns the given store, or the one set with ``set_checkpoint_store``.
+
+    Args:
+        store (Optional[CheckpointStore]): The store, if given.
+
+    Returns:
+        CheckpointStore: The store.
+
+    Raises:
+        ValueError: If no store is given or set.
+    """
+    store = store or _checkpoint_store
+    if store is None:
+        raise ValueError("No checkpoint store set. Please call "
+                         "set_checkpoint_store before running with a run_id.")
+    return store
+
+
+@contextmanager
+def checkpoint_run(run_id: str, store: Optional[CheckpointStore] = None
+                   ) -> Iterator[CheckpointRun]:
+    """
+    Checkpoints the model calls made while the context is active, resuming
+    the run if it has checkpoints already. Pending checkpoints are written
+    on exit, also when the run fails.
+
+    Args:
+        run_id (str): The workflow run ID.
+        store (Optional[CheckpointStore]): The store, or None for the store
+            set with ``set_checkpoint_store``.
+
+    Yields:
+        CheckpointRun: The run.
+
+    Raises:
+        ValueError: If no store is given or set.
+    """
+    run = CheckpointRun(_resolve_store(store), run_id)
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+        run.store.flush()
+
+
+@asynccontextmanager
+async def acheckpoint_run(run_id: str,
+                          store: Optional[CheckpointStore] = None
+                          ) -> AsyncIterator[CheckpointRun]:
+    """
+    Asynchronous ``checkpoint_run`` that loads and writes checkpoints
+    without blocking the event loop.
+
+    Args:
+        run_id (str): The workflow run ID.
+        store (Optional[CheckpointStore]): The store, or None for the store
+            set with ``set_checkpoint_store``.
+
+    Yields:
+        CheckpointRun: The run.
+
+    Raises:
+        ValueError: If no store is given or set.
+    """
+    run = await asyncio.to_thread(CheckpointRun, _resolve_store(store),
+                                  run_id)
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+        await asyncio.to_thread(run.store.flush)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,295 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Provider Client Registry Module
+
+"""
+import asyncio
+import inspect
+import threading
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+
+# Define a type alias for the provider client factory functions
+Client_Factory = Callable[..., Any]
+
+
+@dataclass(frozen=True)
+class PoolLimits:
+    """
+    Connection pool limits applied to the HTTP client of a provider.
+
+    Attributes:
+        max_connections (int): The maximum number of open connections.
+        max_keepalive_connections (int): The maximum number of idle
+            connections kept alive for reuse.
+        keepalive_expiry (float): Seconds an idle connection is kept alive.
+    """
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+
+    def to_httpx(self) -> httpx.Limits:
+        """
+        Converts the pool limits to httpx limits.
+
+        Returns:
+            httpx.Limits: The httpx connection limits.
+        """
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+
+def _settings_key(settings: Dict[str, Any]) -> Tuple:
+    """
+    Builds a hashable key from client settings.
+
+    Args:
+        settings (Dict[str, Any]): The client settings.
+
+    Returns:
+        Tuple: The hashable settings key.
+    """
+    key = []
+    for name, value in sorted(settings.items()):
+        try:
+            hash(value)
+        except TypeError:
+            value = repr(value)
+        key.append((name, value))
+    return tuple(key)
+
+
+def _close_client(client: Any):
+    """
+    Closes a synchronous provider client.
+
+    Args:
+        client (Any): The provider client.
+    """
+    closer = getattr(client, "close", None)
+    if closer is None:
+        # Ollama clients only expose their underlying httpx client
+        closer = getattr(getattr(client, "_client", None), "close", None)
+    if closer is not None:
+        closer()
+
+
+async def _aclose_client(client: Any):
+    """
+    Closes an asynchronous provider client.
+
+    Args:
+        client (Any): The provider client.
+    """
+    closer = getattr(client, "close", None)
+    if closer is None:
+        closer = getattr(getattr(client, "_client", None), "aclose", None)
+    if closer is not None:
+        result = closer()
+        if inspect.isawaitable(result):
+            await result
+
+
+class ClientRegistry:
+    """
+    Registry of long-lived provider clients.
+
+    One synchronous client is kept per provider and settings. Asynchronous
+    clients hold connections bound to an event loop, so one is kept per
+    provider, settings and running event loop.
+    """
+
+    def __init__(self, limits: Optional[PoolLimits] = None):
+        """
+        Initializes a ClientRegistry.
+
+        Args:
+            limits (Optional[PoolLimits]): The default pool limits.
+        """
+        self.default_limits = limits or PoolLimits()
+        self._factories: Dict[str, Tuple[Client_Factory, Client_Factory]] = {}
+        self._limits: Dict[str, PoolLimits] = {}
+        self._settings: Dict[str, Dict[str, Any]] = {}
+        self._clients: Dict[Tuple, Any] = {}
+        self._async_clients: Dict[Tuple, Tuple[Any, Any]] = {}
+        self._lock = threading.Lock()
+
+    def register_factory(self, provider: str, factory: Client_Factory,
+                         async_factory: Client_Factory):
+        """
+        Registers the client factories of a provider.
+
+        Factories are called with a ``limits`` keyword holding the
+        ``httpx.Limits`` of the pool and the configured client settings.
+
+        Args:
+            provider (str): The name of the provider.
+            factory (Client_Factory): Builds the synchronous client.
+            async_factory (Client_Factory): Builds the asynchronous client.
+        """
+        self._factories[provider] = (factory, async_factory)
+
+    def configure(self, provider: str, limits: Optional[PoolLimits] = None,
+                  **settings):
+        """
+        Configures the pool limits and default settings of a provider.
+
+        The configuration applies to clients built afterwards. Call
+        ``close`` or ``aclose`` to rebuild clients that already exist.
+
+        Args:
+            provider (str): The name of the provider.
+            limits (Optional[PoolLimits]): The pool limits of the provider.
+            settings (dict): Default keyword arguments for the client.
+        """
+        if limits is not None:
+            self._limits[provider] = limits
+        self._settings.setdefault(provider, {}).update(settings)
+
+    def set_pool_limits(self, provider: Optional[str] = None, **limits):
+        """
+        Updates the pool limits of one provider or the registry default.
+
+        Args:
+            provider (Optional[str]): The provider, or None for the default.
+            limits (dict): The ``PoolLimits`` fields to update.
+        """
+        if provider is None:
+            self.default_limits = replace(self.default_limits, **limits)
+        else:
+            current = self._limits.get(provider, self.default_limits)
+            self._limits[provider] = replace(current, **limits)
+
+    def limits(self, provider: str) -> PoolLimits:
+        """
+        Returns the pool limits of a provider.
+
+        Args:
+            provider (str): The name of the provider.
+
+        Returns:
+            PoolLimits: The pool limits.
+        """
+        return self._limits.get(provider, self.default_limits)
+
+    def _build_args(self, provider: str,
+                    settings: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Merges the configured settings of a provider with call overrides.
+
+        Args:
+            provider (str): The name of the provider.
+            settings (Dict[str, Any]): The settings overrides.
+
+        Returns:
+            Dict[str, Any]: The client settings.
+        """
+        if provider not in self._factories:
+            raise ValueError(f"No client factory registered for "
+                             f"'{provider}'.")
+        return {**self._settings.get(provider, {}), **settings}
+
+    def get_client(self, provider: str, **settings) -> Any:
+        """
+        Returns the shared synchronous client of a provider.
+
+        Args:
+            provider (str): The name of the provider.
+            settings (dict): Client settings overriding the configured ones.
+
+        Returns:
+            Any: The provider client.
+        """
+        settings = self._build_args(provider, settings)
+        key = (provider, _settings_key(settings))
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    factory = self._factories[provider][0]
+                    client = factory(
+                        limits=self.limits(provider).to_httpx(), **settings)
+                    self._clients[key] = client
+        return client
+
+    def get_async_client(self, provider: str, **settings) -> Any:
+        """
+        Returns the shared asynchronous client of a provider for the
+        running event loop.
+
+        Args:
+            provider (str): The name of the provider.
+            settings (dict): Client settings overriding the configured ones.
+
+        Returns:
+            Any: The asynchronous provider client.
+        """
+        settings = self._build_args(provider, settings)
+        loop = asyncio.get_running_loop()
+        key = (provider, _settings_key(settings), id(loop))
+        entry = self._async_clients.get(key)
+        if entry is None or entry[0] is not loop:
+            with self._lock:
+                self._prune_closed_loops()
+                entry = self._async_clients.get(key)
+                if entry is None or entry[0] is not loop:
+                    factory = self._factories[provider][1]
+                    client = factory(
+                        limits=self.limits(provider).to_httpx(), **settings)
+                    entry = (loop, client)
+                    self._async_clients[key] = entry
+        return entry[1]
+
+    def _prune_closed_loops(self):
+        """
+        Drops asynchronous clients whose event loop has been closed.
+        """
+        for key, (loop, _) in list(self._async_clients.items()):
+            if loop.is_closed():
+                del self._async_clients[key]
+
+    def close(self):
+        """
+        Closes all synchronous clients.
+
+        Asynchronous clients of closed event loops are dropped. Use
+        ``aclose`` from inside a running loop to close its clients.
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._prune_closed_loops()
+        for client in clients:
+            _close_client(client)
+
+    async def aclose(self):
+        """
+        Closes all synchronous clients and the asynchronous clients of the
+        running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = [client for key, (client_loop, client)
+                       in self._async_clients.items()
+                       if client_loop is loop]
+            self._async_clients = {
+                key: entry for key, entry in self._async_clients.items()
+                if entry[0] is not loop
+            }
+        for client in clients:
+            await _aclose_client(client)
+        self.close()
+
+
+# Registry shared by every provider module
+client_registry = ClientRegistry()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,304 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Concurrency Control Module
+
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import (AsyncIterator, Deque, Dict, Iterator, List, Optional,
+                    Tuple, Union)
+
+# Key of a limiter: "global", a provider, or a (provider, model) pair
+Limiter_Key = Union[str, Tuple[str, str]]
+
+
+@dataclass
+class LimiterStats:
+    """
+    Counters of a concurrency limiter.
+
+    Attributes:
+        limit (int): The maximum number of concurrent calls.
+        in_flight (int): The number of calls holding a slot.
+        queue_depth (int): The number of calls waiting for a slot.
+        acquired (int): The number of slots granted so far.
+        total_wait (float): Seconds spent waiting for slots in total.
+        max_wait (float): The longest wait for a slot in seconds.
+    """
+    limit: int
+    in_flight: int = 0
+    queue_depth: int = 0
+    acquired: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        """
+        The mean wait for a slot in seconds.
+
+        Returns:
+            float: The mean wait.
+        """
+        return self.total_wait / self.acquired if self.acquired else 0.0
+
+
+class _Waiter:
+    """
+    A thread or task waiting for a limiter slot.
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """
+        Initializes a _Waiter.
+
+        Args:
+            loop (Optional[asyncio.AbstractEventLoop]): The event loop of an
+                asynchronous waiter, or None for a thread.
+        """
+        self.loop = loop
+        self.granted = False
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def wake(self):
+        """
+        Wakes the waiter after its slot has been granted.
+        """
+        if self.event is not None:
+            self.event.set()
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+        except RuntimeError:
+            # The event loop of the waiter is closed
+            pass
+
+    def _resolve(self):
+        """
+        Resolves the future of an asynchronous waiter in its event loop.
+        """
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class Limiter:
+    """
+    First-in-first-out counting semaphore shared by threads and event loops.
+
+    A released slot is handed directly to the oldest waiter, whether it is
+    a thread or a task on any event loop.
+    """
+
+    def __init__(self, limit: int):
+        """
+        Initializes a Limiter.
+
+        Args:
+            limit (int): The maximum number of concurrent holders.
+        """
+        if limit < 1:
+            raise ValueError("Concurrency limits must be positive.")
+        self.stats = LimiterStats(limit=limit)
+        self._waiters: Deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+
+    def _try_acquire(
+            self,
+            waiter_loop: Optional[asyncio.AbstractEventLoop]
+    ) -> Optional[_Waiter]:
+        """
+        Takes a free slot or enqueues a waiter.
+
+        Args:
+            waiter_loop (Optional[asyncio.AbstractEventLoop]): The event loop
+                of an asynchronous caller.
+
+        Returns:
+            Optional[_Waiter]: The enqueued waiter, or None if a slot was
+                taken.
+        """
+        with self._lock:
+            if self.stats.in_flight < self.stats.limit and not self._waiters:
+                self.stats.in_flight += 1
+                self.stats.acquired += 1
+                return None
+            waiter = _Waiter(waiter_loop)
+            self._waiters.append(waiter)
+            self.stats.queue_depth += 1
+            return waiter
+
+    def _record_wait(self, started: float):
+        """
+        Records the wait of a granted slot.
+
+        Args:
+            started (float): The time the wait started.
+        """
+        wait = time.perf_counter() - started
+        with self._lock:
+            self.stats.acquired += 1
+            self.stats.total_wait += wait
+            self.stats.max_wait = max(self.stats.max_wait, wait)
+
+    def acquire(self):
+        """
+        Blocks until a slot is free and takes it.
+        """
+        started = time.perf_counter()
+        waiter = self._try_acquire(None)
+        if waiter is not None:
+            waiter.event.wait()
+            self._record_wait(started)
+
+    async def aacquire(self):
+        """
+        Waits until a slot is free and takes it.
+        """
+        started = time.perf_counter()
+        waiter = self._try_acquire(asyncio.get_running_loop())
+        if waiter is None:
+            return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+                    self.stats.queue_depth -= 1
+            if granted:
+                self.release()
+            raise
+        self._record_wait(started)
+
+    def release(self):
+        """
+        Releases a slot, handing it to the oldest waiter if there is one.
+        """
+        with self._lock:
+            if not self._waiters:
+                self.stats.in_flight -= 1
+                return
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self.stats.queue_depth -= 1
+        waiter.wake()
+
+
+class ConcurrencyController:
+    """
+    Process-wide concurrency limits for model calls.
+
+    A call takes a slot from its (provider, model) limiter, its provider
+    limiter and the global limiter, in that order, for each one that is
+    configured. Calls without any configured limit are not held back.
+    """
+
+    def __init__(self, global_limit: Optional[int] = None):
+        """
+        Initializes a ConcurrencyController.
+
+        Args:
+            global_limit (Optional[int]): The limit over all model calls.
+        """
+        self._limiters: Dict[Limiter_Key, Limiter] = {}
+        if global_limit is not None:
+            self.set_limit(global_limit)
+
+    def set_limit(self, limit: Optional[int], provider: Optional[str] = None,
+                  model: Optional[str] = None):
+        """
+        Sets or removes a concurrency limit.
+
+        Args:
+            limit (Optional[int]): The limit, or None to remove it.
+            provider (Optional[str]): The provider, or None for the global
+                limit.
+            model (Optional[str]): The model, or None for a limit shared by
+                every model of the provider.
+        """
+        if provider is None:
+            key = "global"
+        else:
+            key = (provider, model) if model is not None else provider
+        if limit is None:
+            self._limiters.pop(key, None)
+        else:
+            self._limiters[key] = Limiter(limit)
+
+    def _limiters_for(self, provider: str, model: str) -> List[Limiter]:
+        """
+        Returns the limiters of a call in acquisition order.
+
+        Args:
+            provider (str): The provider of the call.
+            model (str): The model of the call.
+
+        Returns:
+            List[Limiter]: The configured limiters.
+        """
+        if not self._limiters:
+            return []
+        keys = ((provider, model), provider, "global")
+        return [self._limiters[key] for key in keys if key in self._limiters]
+
+    @contextmanager
+    def slot(self, provider: str, model: str) -> Iterator[None]:
+        """
+        Holds a slot for a model call while the context is active.
+
+        Args:
+            provider (str): The provider of the call.
+            model (str): The model of the call.
+        """
+        acquired = []
+        try:
+            for limiter in self._limiters_for(provider, model):
+                limiter.acquire()
+                acquired.append(limiter)
+            yield
+        finally:
+            for limiter in reversed(acquired):
+                limiter.release()
+
+    @asynccontextmanager
+    async def aslot(self, provider: str, model: str) -> AsyncIterator[None]:
+        """
+        Holds a slot for an asynchronous model call while the context is
+        active.
+
+        Args:
+            provider (str): The provider of the call.
+            model (str): The model of the call.
+        """
+        acquired = []
+        try:
+            for limiter in self._limiters_for(provider, model):
+                await limiter.aacquire()
+                acquired.append(limiter)
+            yield
+        finally:
+            for limiter in reversed(acquired):
+                limiter.release()
+
+    def stats(self) -> Dict[Limiter_Key, LimiterStats]:
+        """
+        Returns the counters of every configured limiter.
+
+        Returns:
+            Dict[Limiter_Key, LimiterStats]: The counters keyed by limiter.
+        """
+        return {key: limiter.stats for key, limiter in self._limiters.items()}
+
+
+# Controller applied to every model_call and amodel_call
+concurrency_controller = ConcurrencyController()
+
+
+if __name__ == '__main__':
+    pass
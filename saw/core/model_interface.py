@@ -3,8 +3,40 @@
 """ LLM Interface Module
 
 """
-from typing import Any
-from .backend import provider_backends, async_provider_backends, select_backend
+import asyncio
+import time
+from dataclasses import replace
+from itertools import count
+from typing import Any, AsyncIterator, Iterator, Optional
+from .backend import (provider_backends, async_provider_backends,
+                      stream_provider_backends, async_stream_provider_backends,
+                      select_backend)
+from .cache import get_response_cache, make_cache_key
+from .checkpoint import checkpoint_inputs, current_run
+from .concurrency import concurrency_controller
+from .offload import current_offloader
+from .rate_limit import rate_limiter
+from .retry import (RetryPolicy, acall_with_retry, call_with_retry,
+                    get_retry_policy, retry_delay)
+from .singleflight import AsyncSingleFlight, SingleFlight
+from .tracing import tracer
+
+# Coalesces identical requests that are in flight at the same time
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
+
+
+def is_deterministic(params: dict) -> bool:
+    """
+    Checks whether a request asks for a single, reproducible response.
+
+    Args:
+        params (dict): The request parameters.
+
+    Returns:
+        bool: True if no temperature is set or the temperature is zero.
+    """
+    return not params.get("temperature")
 
 
 def model_call(
@@ -12,6 +44,9 @@ def model_call(
         provider: str,
         model: str = "",
         system_prompt: str = "",
+        cache: bool = True,
+        coalesce: Optional[bool] = None,
+        retry: Optional[RetryPolicy] = None,
         **params
 ) -> str:
     """
@@ -22,10 +57,21 @@ def model_call(
         provider (str): The provider to use.
         model (str): The model to use.
         system_prompt (str): The system prompt.
+        cache (bool): Whether to use the response cache, if one is set.
+        coalesce (Optional[bool]): Whether to share one upstream call with
+            identical requests already in flight, or None to share it only
+            when the request is deterministic. Sampled requests, with a
+            non-zero ``temperature``, then each get their own response.
+        retry (Optional[RetryPolicy]): The retry policy, or None for the
+            policy set with ``set_retry_policy``.
         params (dict): A dictionary of other parameters.
 
     Returns:
         str: The response from the LLM backend.
+
+    Raises:
+        ProviderError: If the backend fails with a fatal error or on every
+            attempt.
     """
     select_backend(provider=provider, async_mode=False)
 
@@ -33,8 +79,59 @@ def model_call(
         raise ValueError(f"Backend '{provider}' not registered. Please "
                          f"register '{provider}' before calling the model.")
 
-    return provider_backends[provider](
-        model, prompt, system_prompt, **params)
+    if coalesce is None:
+        coalesce = is_deterministic(params)
+
+    offloader = current_offloader(provider)
+    latency_key = None
+    if offloader is not None:
+        # A hedge would queue a duplicate in the next batch, and batch
+        # latencies must not set the hedging delay of interactive calls
+        retry = replace(retry or get_retry_policy(), hedge=False)
+        latency_key = ("batch", provider, model)
+
+    def attempt() -> str:
+        if offloader is not None:
+            with tracer.span("provider_batch_call", provider=provider,
+                             model=model):
+                return offloader.call(provider, model, prompt,
+                                      system_prompt, **params)
+        with tracer.span("provider_call", provider=provider, model=model), \
+                rate_limiter.limit(provider, model, prompt, system_prompt,
+                                   params), \
+                concurrency_controller.slot(provider, model):
+            return provider_backends[provider](
+                model, prompt, system_prompt, **params)
+
+    def respond() -> str:
+        with tracer.span("model_call", provider=provider,
+                         model=model) as span:
+            response_cache = get_response_cache() if cache else None
+            if response_cache is None and not coalesce:
+                return call_with_retry(provider, model, attempt, retry,
+                                       latency_key)
+
+            key = make_cache_key(provider, model, system_prompt, prompt,
+                                 params)
+            if response_cache is not None:
+                response = response_cache.get(key)
+                span.set_attribute("cache_hit", response is not None)
+                if response is not None:
+                    return response
+
+            def call() -> str:
+                response = call_with_retry(provider, model, attempt, retry,
+                                           latency_key)
+                if response_cache is not None and response is not None:
+                    response_cache.set(key, response)
+                return response
+
+            return single_flight.do(key, call) if coalesce else call()
+
+    run = current_run()
+    if run is None:
+        return respond()
+    return run.call(provider, model, system_prompt, prompt, params, respond)
 
 
 async def amodel_call(
@@ -42,6 +139,9 @@ async def amodel_call(
         provider: str,
         model: str = "",
         system_prompt: str = "",
+        cache: bool = True,
+        coalesce: Optional[bool] = None,
+        retry: Optional[RetryPolicy] = None,
         **params
 ) -> Any:
     """
@@ -52,10 +152,21 @@ async def amodel_call(
         provider (str): The provider to use.
         model (str): The model to use.
         system_prompt (str): The system prompt.
+        cache (bool): Whether to use the response cache, if one is set.
+        coalesce (Optional[bool]): Whether to share one upstream call with
+            identical requests already in flight, or None to share it only
+            when the request is deterministic. Sampled requests, with a
+            non-zero ``temperature``, then each get their own response.
+        retry (Optional[RetryPolicy]): The retry policy, or None for the
+            policy set with ``set_retry_policy``.
         params (dict): A dictionary of other parameters.
 
     Returns:
         str: The response from the LLM backend.
+
+    Raises:
+        ProviderError: If the backend fails with a fatal error or on every
+            attempt.
     """
     select_backend(provider=provider, async_mode=True)
 
@@ -63,8 +174,257 @@ async def amodel_call(
         raise ValueError(f"Backend '{provider}' not registered. Please "
                          f"register '{provider}' before calling the model.")
 
-    return await async_provider_backends[provider](
-        model, prompt, system_prompt, **params)
+    if coalesce is None:
+        coalesce = is_deterministic(params)
+
+    offloader = current_offloader(provider)
+    latency_key = None
+    if offloader is not None:
+        # A hedge would queue a duplicate in the next batch, and batch
+        # latencies must not set the hedging delay of interactive calls
+        retry = replace(retry or get_retry_policy(), hedge=False)
+        latency_key = ("batch", provider, model)
+
+    async def attempt() -> str:
+        if offloader is not None:
+            with tracer.span("provider_batch_call", provider=provider,
+                             model=model):
+                return await offloader.acall(provider, model, prompt,
+                                             system_prompt, **params)
+        with tracer.span("provider_call", provider=provider, model=model):
+            async with rate_limiter.alimit(provider, model, prompt,
+                                           system_prompt, params), \
+                    concurrency_controller.aslot(provider, model):
+                return await async_provider_backends[provider](
+                    model, prompt, system_prompt, **params)
+
+    async def respond() -> str:
+        with tracer.span("model_call", provider=provider,
+                         model=model) as span:
+            response_cache = get_response_cache() if cache else None
+            if response_cache is None and not coalesce:
+                return await acall_with_retry(provider, model, attempt,
+                                              retry, latency_key)
+
+            key = make_cache_key(provider, model, system_prompt, prompt,
+                                 params)
+            if response_cache is not None:
+                response = await response_cache.aget(key)
+                span.set_attribute("cache_hit", response is not None)
+                if response is not None:
+                    return response
+
+            async def call() -> str:
+                response = await acall_with_retry(provider, model, attempt,
+                                                  retry, latency_key)
+                if response_cache is not None and response is not None:
+                    await response_cache.aset(key, response)
+                return response
+
+            if coalesce:
+                return await async_single_flight.do(key, call)
+            return await call()
+
+    run = current_run()
+    if run is None:
+        return await respond()
+    return await run.acall(provider, model, system_prompt, prompt, params,
+                           respond)
+
+
+def model_call_stream(
+        prompt: str,
+        provider: str,
+        model: str = "",
+        system_prompt: str = "",
+        cache: bool = True,
+        retry: Optional[RetryPolicy] = None,
+        **params
+) -> Iterator[str]:
+    """
+    Calls the specified LLM backend and yields the response as it arrives.
+
+    Backends without a registered stream function yield their full response
+    as a single chunk. A stream failing before its first chunk is retried
+    under the retry policy; a failure after that raises ``ProviderError``.
+
+    Args:
+        prompt (str): The input prompt.
+        provider (str): The provider to use.
+        model (str): The model to use.
+        system_prompt (str): The system prompt.
+        cache (bool): Whether to use the response cache, if one is set.
+        retry (Optional[RetryPolicy]): The retry policy, or None for the
+            policy set with ``set_retry_policy``.
+        params (dict): A dictionary of other parameters.
+
+    Yields:
+        str: The response chunks from the LLM backend.
+    """
+    select_backend(provider=provider, async_mode=False)
+
+    # Offloaded calls are answered by their batch as a whole
+    if provider not in stream_provider_backends or \
+            current_offloader(provider) is not None:
+        response = model_call(prompt, provider, model, system_prompt,
+                              cache=cache, retry=retry, **params)
+        if response:
+            yield response
+        return
+
+    run = current_run()
+    if run is not None:
+        step = run.step(provider, model, system_prompt, prompt, params)
+        response = run.replay(step)
+        if response is not None:
+            yield response
+            return
+
+    with tracer.span("model_call_stream", provider=provider,
+                     model=model) as span:
+        response_cache = get_response_cache() if cache else None
+        if response_cache is not None:
+            key = make_cache_key(provider, model, system_prompt, prompt,
+                                 params)
+            response = response_cache.get(key)
+            span.set_attribute("cache_hit", response is not None)
+            if response is not None:
+                if run is not None:
+                    run.record(step, checkpoint_inputs(
+                        provider, model, system_prompt, prompt, params),
+                        response)
+                yield response
+                return
+
+        policy = retry or get_retry_policy()
+        for attempt in count(1):
+            chunks = []
+            reservation = rate_limiter.acquire(
+                provider, model,
+                rate_limiter.estimate_tokens(prompt, system_prompt, params))
+            try:
+                with concurrency_controller.slot(provider, model):
+                    for chunk in stream_provider_backends[provider](
+                            model, prompt, system_prompt, **params):
+                        chunks.append(chunk)
+                        yield chunk
+            except Exception as e:
+                # Only a stream that has not yielded anything can be retried
+                if chunks:
+                    policy = RetryPolicy(max_attempts=attempt)
+                time.sleep(retry_delay(policy, provider, model, attempt, e))
+                continue
+            finally:
+                rate_limiter.settle(reservation, rate_limiter.estimate_tokens(
+                    prompt + "".join(chunks), system_prompt))
+            span.set_attribute("attempts", attempt)
+            break
+
+        if response_cache is not None and chunks:
+            response_cache.set(key, "".join(chunks))
+
+    if run is not None and chunks:
+        run.record(step, checkpoint_inputs(provider, model, system_prompt,
+                                           prompt, params), "".join(chunks))
+
+
+async def amodel_call_stream(
+        prompt: str,
+        provider: str,
+        model: str = "",
+        system_prompt: str = "",
+        cache: bool = True,
+        retry: Optional[RetryPolicy] = None,
+        **params
+) -> AsyncIterator[str]:
+    """
+    Calls the specified asynchronous LLM backend and yields the response as
+    it arrives.
+
+    Backends without a registered stream function yield their full response
+    as a single chunk. A stream failing before its first chunk is retried
+    under the retry policy; a failure after that raises ``ProviderError``.
+
+    Args:
+        prompt (str): The input prompt.
+        provider (str): The provider to use.
+        model (str): The model to use.
+        system_prompt (str): The system prompt.
+        cache (bool): Whether to use the response cache, if one is set.
+        retry (Optional[RetryPolicy]): The retry policy, or None for the
+            policy set with ``set_retry_policy``.
+        params (dict): A dictionary of other parameters.
+
+    Yields:
+        str: The response chunks from the LLM backend.
+    """
+    select_backend(provider=provider, async_mode=True)
+
+    # Offloaded calls are answered by their batch as a whole
+    if provider not in async_stream_provider_backends or \
+            current_offloader(provider) is not None:
+        response = await amodel_call(prompt, provider, model, system_prompt,
+                                     cache=cache, retry=retry, **params)
+        if response:
+            yield response
+        return
+
+    run = current_run()
+    if run is not None:
+        step = run.step(provider, model, system_prompt, prompt, params)
+        response = run.replay(step)
+        if response is not None:
+            yield response
+            return
+
+    with tracer.span("model_call_stream", provider=provider,
+                     model=model) as span:
+        response_cache = get_response_cache() if cache else None
+        if response_cache is not None:
+            key = make_cache_key(provider, model, system_prompt, prompt,
+                                 params)
+            response = await response_cache.aget(key)
+            span.set_attribute("cache_hit", response is not None)
+            if response is not None:
+                if run is not None:
+                    run.record(step, checkpoint_inputs(
+                        provider, model, system_prompt, prompt, params),
+                        response)
+                yield response
+                return
+
+        policy = retry or get_retry_policy()
+        for attempt in count(1):
+            chunks = []
+            reservation = await rate_limiter.aacquire(
+                provider, model,
+                rate_limiter.estimate_tokens(prompt, system_prompt, params))
+            try:
+                async with concurrency_controller.aslot(provider, model):
+                    stream = async_stream_provider_backends[provider](
+                        model, prompt, system_prompt, **params)
+                    async for chunk in stream:
+                        chunks.append(chunk)
+                        yield chunk
+            except Exception as e:
+                # Only a stream that has not yielded anything can be retried
+                if chunks:
+                    policy = RetryPolicy(max_attempts=attempt)
+                await asyncio.sleep(
+                    retry_delay(policy, provider, model, attempt, e))
+                continue
+            finally:
+                rate_limiter.settle(reservation, rate_limiter.estimate_tokens(
+                    prompt + "".join(chunks), system_prompt))
+            span.set_attribute("attempts", attempt)
+            break
+
+        if response_cache is not None and chunks:
+            await response_cache.aset(key, "".join(chunks))
+
+    if run is not None and chunks:
+        run.record(step, checkpoint_inputs(provider, model, system_prompt,
+                                           prompt, params), "".join(chunks))
 
 
 if __name__ == '__main__':
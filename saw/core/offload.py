@@ -0,0 +1,413 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Batch Offload Module
+
+Sends the model calls of bulk, non-latency-sensitive runs through the
+discounted asynchronous batch APIs of OpenAI and Groq. Within a
+``batch_offload`` context, every ``model_call`` to an offloaded provider
+is queued instead of sent. The queued requests of a provider and model,
+since a batch holds one model, are written as batch JSON lines once
+``window`` seconds pass or ``max_batch_size`` requests are queued,
+submitted, polled until the batch ends, and each waiting call gets its own
+result.
+
+Offloaded calls skip the rate limiter and concurrency slots, which bound
+interactive requests, so a whole bulk run fits in a few batches.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Tuple)
+
+from .clients import client_registry
+from .usage import report_usage
+from ..providers.groq import batch_request as groq_batch_request
+from ..providers.openai import batch_request as openai_batch_request
+from ..utils.exceptions import BatchRequestError
+
+logger = logging.getLogger(__name__)
+
+# Endpoint of the chat completion requests in a batch
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Statuses of a batch that has ended
+FINAL_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
+
+# Define a type alias for the functions building batch request bodies
+Batch_Request_Builder = Callable[..., Dict[str, Any]]
+
+# Request body builders of the providers with a batch API
+batch_request_builders: Dict[str, Batch_Request_Builder] = {
+    "openai": openai_batch_request,
+    "groq": groq_batch_request,
+}
+
+
+def register_batch_provider(name: str, builder: Batch_Request_Builder):
+    """
+    Registers a provider with an OpenAI-compatible batch API.
+
+    Args:
+        name (str): The name of the provider, whose pooled client exposes
+            ``files`` and ``batches`` like the OpenAI client.
+        builder (Batch_Request_Builder): Builds the body of a request from
+            the model, prompt, system prompt and parameters.
+    """
+    batch_request_builders[name] = builder
+
+
+@dataclass
+class _Request:
+    """
+    A queued request and the future its caller waits on.
+
+    Attributes:
+        custom_id (str): The ID of the request within its batch.
+        body (Dict[str, Any]): The chat completion request body.
+        future (Future): Resolves to the response text and token usage.
+    """
+    custom_id: str
+    body: Dict[str, Any]
+    future: Future
+
+
+def _read_text(content: Any) -> str:
+    """
+    Returns the text of a downloaded batch file.
+
+    Args:
+        content (Any): The file content, as text or as an OpenAI binary
+            response.
+
+    Returns:
+        str: The text.
+    """
+    return content if isinstance(content, str) else content.text
+
+
+def _result(record: Dict[str, Any]
+            ) -> Tuple[Any, Optional[BatchRequestError]]:
+    """
+    Reads the outcome of a request from a line of a batch output or error
+    file.
+
+    Args:
+        record (Dict[str, Any]): The line.
+
+    Returns:
+        Tuple[Any, Optional[BatchRequestError]]: The response text and
+            token usage, or the error.
+    """
+    response = record.get("response") or {}
+    status = response.get("status_code")
+    body = response.get("body") or {}
+    if status == 200 and body.get("choices"):
+        usage = body.get("usage")
+        tokens = ((usage.get("prompt_tokens"), usage.get("completion_tokens"))
+                  if usage else None)
+        return (body["choices"][0]["message"]["content"], tokens), None
+    error = record.get("error") or body.get("error") or {}
+    message = error.get("message") or f"Request failed with status {status}"
+    return None, BatchRequestError(record.get("custom_id"), message,
+                                   status_code=status)
+
+
+class BatchOffloader:
+    """
+    Collects model calls and runs them as provider batches.
+
+    Attributes:
+        providers (Tuple[str, ...]): The offloaded providers.
+        batches (List[str]): The IDs of the submitted batches.
+    """
+
+    def __init__(self, providers: Iterable[str] = ("openai", "groq"),
+                 max_batch_size: int = 50000, window: float = 5.0,
+                 poll_interval: float = 30.0,
+                 completion_window: str = "24h",
+                 client_settings: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Initializes a BatchOffloader.
+
+        Args:
+            providers (Iterable[str]): The providers to offload, each with a
+                registered batch request builder.
+            max_batch_size (int): The maximum number of requests per batch.
+            window (float): Seconds a batch collects requests after its
+                first one before it is submitted.
+            poll_interval (float): Seconds between status checks of a
+                submitted batch.
+            completion_window (str): The time frame the provider has to
+                complete a batch.
+            client_settings (Optional[Dict[str, Dict[str, Any]]]): Client
+                settings per provider, e.g. a ``base_url``, overriding the
+                configured ones.
+
+        Raises:
+            ValueError: If a provider has no batch API.
+        """
+        self.providers = tuple(providers)
+        unknown = set(self.providers) - set(batch_request_builders)
+        if unknown:
+            raise ValueError(f"No batch API registered for "
+                             f"{', '.join(sorted(unknown))}.")
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        self.client_settings = client_settings or {}
+        self.batches: List[str] = []
+        self._queued: Dict[Tuple[str, str], List[_Request]] = {}
+        self._timers: Dict[Tuple[str, str], threading.Timer] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _enqueue(self, provider: str, model: str, prompt: str,
+                 system_prompt: str, params: Dict[str, Any]) -> Future:
+        """
+        Queues a request, submitting the batch once it is full.
+
+        Requests are batched per provider and model, as the batch APIs
+        reject input files that mix models.
+
+        Args:
+            provider (str): The provider to use.
+            model (str): The model to use.
+            prompt (str): The input prompt.
+            system_prompt (str): The system prompt.
+            params (Dict[str, Any]): The other model parameters.
+
+        Returns:
+            Future: Resolves to the response text and token usage.
+        """
+        body = batch_request_builders[provider](model, prompt, system_prompt,
+                                                **params)
+        future = Future()
+        key = (provider, model)
+        full = None
+        with self._lock:
+            queued = self._queued.setdefault(key, [])
+            queued.append(_Request(f"saw-{next(self._ids)}", body, future))
+            if len(queued) >= self.max_batch_size:
+                full = self._take(key)
+            elif key not in self._timers:
+                timer = threading.Timer(self.window, self._flush, [[key]])
+                timer.daemon = True
+                self._timers[key] = timer
+                timer.start()
+        if full:
+            self._submit(provider, full)
+        return future
+
+    def _take(self, key: Tuple[str, str]) -> List[_Request]:
+        """
+        Removes the queued requests of a provider and model while holding
+        the lock.
+
+        Args:
+            key (Tuple[str, str]): The provider and model.
+
+        Returns:
+            List[_Request]: The queued requests.
+        """
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        return self._queued.pop(key, [])
+
+    def _flush(self, keys: Iterable[Tuple[str, str]]):
+        """
+        Submits the queued requests of some providers and models.
+
+        Args:
+            keys (Iterable[Tuple[str, str]]): The providers and models.
+        """
+        with self._lock:
+            batches = {key: self._take(key) for key in keys}
+        for (provider, _), requests in batches.items():
+            if requests:
+                self._submit(provider, requests)
+
+    def flush(self, provider: Optional[str] = None):
+        """
+        Submits the queued requests without waiting for the window.
+
+        Args:
+            provider (Optional[str]): The provider, or None for all.
+        """
+        with self._lock:
+            keys = [key for key in self._queued
+                    if provider is None or key[0] == provider]
+        self._flush(keys)
+
+    def _submit(self, provider: str, requests: List[_Request]):
+        """
+        Runs a batch in a background thread.
+
+        Args:
+            provider (str): The provider.
+            requests (List[_Request]): The requests of the batch.
+        """
+        threading.Thread(target=self._run, args=(provider, requests),
+                         name=f"saw-batch-{provider}", daemon=True).start()
+
+    def _run(self, provider: str, requests: List[_Request]):
+        """
+        Submits a batch, polls it until it ends and resolves its requests.
+
+        Args:
+            provider (str): The provider.
+            requests (List[_Request]): The requests of the batch.
+        """
+        waiting = {request.custom_id: request.future for request in requests}
+        try:
+            client = client_registry.get_client(
+                provider, **self.client_settings.get(provider, {}))
+            lines = "".join(
+                json.dumps({"custom_id": request.custom_id, "method": "POST",
+                            "url": BATCH_ENDPOINT, "body": request.body})
+                + "\n" for request in requests)
+            file = client.files.create(
+                file=("saw-batch.jsonl", lines.encode()), purpose="batch")
+            batch = client.batches.create(
+                input_file_id=file.id, endpoint=BATCH_ENDPOINT,
+                completion_window=self.completion_window)
+            self.batches.append(batch.id)
+            logger.info("Submitted %s batch %s with %d requests", provider,
+                        batch.id, len(requests))
+            while batch.status not in FINAL_STATUSES:
+                time.sleep(self.poll_interval)
+                batch = client.batches.retrieve(batch.id)
+            logger.info("%s batch %s %s", provider, batch.id, batch.status)
+
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if not file_id:
+                    continue
+                content = _read_text(client.files.content(file_id))
+                for line in content.splitlines():
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    future = waiting.pop(record.get("custom_id"), None)
+                    if future is None:
+                        continue
+                    result, error = _result(record)
+                    if error is None:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(error)
+            # Expired requests may succeed in a later batch
+            error = BatchRequestError(
+                batch.id, f"Batch {batch.status} without a result",
+                status_code=408 if batch.status == "expired" else None)
+        except Exception as e:
+            logger.warning("%s batch failed: %s", provider, e)
+            error = e
+        for future in waiting.values():
+            future.set_exception(error)
+
+    def call(self, provider: str, model: str, prompt: str,
+             system_prompt: str, **params) -> str:
+        """
+        Runs a model call in a batch, waiting for the batch to end.
+
+        Args:
+            provider (str): The provider to use.
+            model (str): The model to use.
+            prompt (str): The input prompt.
+            system_prompt (str): The system prompt.
+            params (dict): A dictionary of other parameters.
+
+        Returns:
+            str: The response.
+
+        Raises:
+            BatchRequestError: If the request failed or got no result.
+        """
+        future = self._enqueue(provider, model, prompt, system_prompt,
+                               params)
+        response, usage = future.result()
+        if usage:
+            report_usage(*usage)
+        return response
+
+    async def acall(self, provider: str, model: str, prompt: str,
+                    system_prompt: str, **params) -> str:
+        """
+        Asynchronously runs a model call in a batch.
+
+        Args:
+            provider (str): The provider to use.
+            model (str): The model to use.
+            prompt (str): The input prompt.
+            system_prompt (str): The system prompt.
+            params (dict): A dictionary of other parameters.
+
+        Returns:
+            str: The response.
+
+        Raises:
+            BatchRequestError: If the request failed or got no result.
+        """
+        future = self._enqueue(provider, model, prompt, system_prompt,
+                               params)
+        response, usage = await asyncio.wrap_future(future)
+        if usage:
+            report_usage(*usage)
+        return response
+
+
+_current_offloader: ContextVar[Optional[BatchOffloader]] = ContextVar(
+    "saw_batch_offloader", default=None)
+
+
+def current_offloader(provider: str) -> Optional[BatchOffloader]:
+    """
+    Returns the batch offloader of the current context for a provider.
+
+    Args:
+        provider (str): The provider.
+
+    Returns:
+        Optional[BatchOffloader]: The offloader, or None if calls to the
+            provider are sent interactively.
+    """
+    offloader = _current_offloader.get()
+    if offloader is not None and provider in offloader.providers:
+        return offloader
+    return None
+
+
+@contextmanager
+def batch_offload(offloader: Optional[BatchOffloader] = None
+                  ) -> Iterator[BatchOffloader]:
+    """
+    Offloads the model calls made while the context is active to provider
+    batches. Requests still queued are submitted on exit.
+
+    Args:
+        offloader (Optional[BatchOffloader]): The offloader, or None for
+            one with the default settings.
+
+    Yields:
+        BatchOffloader: The offloader.
+    """
+    offloader = offloader or BatchOffloader()
+    token = _current_offloader.set(offloader)
+    try:
+        yield offloader
+    finally:
+        _current_offloader.reset(token)
+        offloader.flush()
+
+
+if __name__ == '__main__':
+    pass
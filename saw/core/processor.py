@@ -4,7 +4,170 @@
 
 """
 import re
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple, Union
+
+# Longest opening or closing tag, with its attributes, that may be split
+# across chunks
+MAX_TAG_LENGTH = 256
+
+
+@lru_cache(maxsize=128)
+def tag_pattern(tags: Tuple[str, ...]) -> Pattern:
+    """
+    Returns the compiled pattern matching the opening and closing tags of
+    a set of XML tags.
+
+    Opening tags may carry attributes. Patterns are cached, so repeated
+    extractions of the same tags do not compile them again.
+
+    Args:
+        tags (Tuple[str, ...]): The XML tag names.
+
+    Returns:
+        Pattern: The pattern, with the closing slash and the tag name as
+            groups.
+    """
+    names = "|".join(re.escape(tag) for tag in tags)
+    return re.compile(rf"<(/?)({names})(?:\s[^<>]*)?>")
+
+
+class XMLTagExtractor:
+    """
+    Extracts the content of XML tags from text in a single pass.
+
+    Text may be fed all at once or chunk by chunk from a stream; every
+    chunk is scanned once. Like ``extract_xml``, the content of a tag is
+    the text between its first opening tag and the following closing tag.
+    Tags nested in other requested tags are extracted too, closing tags
+    without an opening tag are ignored, and tags left unclosed are empty.
+
+    Attributes:
+        results (Dict[str, str]): The content of the tags closed so far.
+    """
+
+    def __init__(self, tags: Iterable[str]):
+        """
+        Initializes an XMLTagExtractor.
+
+        Args:
+            tags (Iterable[str]): The XML tag names to extract.
+        """
+        self.tags = tuple(dict.fromkeys(tags))
+        self.results: Dict[str, str] = {}
+        self._pattern = tag_pattern(self.tags)
+        self._open: Dict[str, int] = {}
+        self._chunks: List[str] = []
+        self._length = 0
+        # Start of a tag cut off at the end of the last chunk
+        self._carry = ""
+
+    @property
+    def text(self) -> str:
+        """
+        The text received so far.
+
+        Returns:
+            str: The concatenated chunks.
+        """
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    @property
+    def done(self) -> bool:
+        """
+        Whether every tag has been extracted.
+
+        Returns:
+            bool: True if every tag was closed.
+        """
+        return len(self.results) == len(self.tags)
+
+    def feed(self, chunk: str) -> Dict[str, str]:
+        """
+        Adds a chunk of text and returns the tags it closes.
+
+        Args:
+            chunk (str): The next chunk of text.
+
+        Returns:
+            Dict[str, str]: The content of the newly closed tags.
+        """
+        window = self._carry + chunk
+        offset = self._length - len(self._carry)
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+
+        closed = {}
+        position = 0
+        for match in self._pattern.finditer(window):
+            position = match.end()
+            is_closing, tag = match.groups()
+            if tag in self.results or tag in closed:
+                continue
+            if not is_closing:
+                self._open.setdefault(tag, offset + match.end())
+            elif tag in self._open:
+                closed[tag] = self.text[self._open.pop(tag):
+                                        offset + match.start()]
+
+        partial = window.rfind("<", position)
+        if (partial != -1 and ">" not in window[partial:]
+                and len(window) - partial <= MAX_TAG_LENGTH):
+            self._carry = window[partial:]
+        else:
+            self._carry = ""
+        self.results.update(closed)
+        return closed
+
+    def partial(self, tag: str) -> str:
+        """
+        Returns the content received so far of a tag that is still open.
+
+        Args:
+            tag (str): The XML tag name.
+
+        Returns:
+            str: The content after the opening tag, without the start of a
+                tag cut off at the end, or an empty string if the tag is not
+                open.
+        """
+        if tag not in self._open:
+            return ""
+        content = self.text[self._open[tag]:]
+        return content[:len(content) - len(self._carry)]
+
+    def get(self, tag: str) -> str:
+        """
+        Returns the content of a tag.
+
+        Args:
+            tag (str): The XML tag name.
+
+        Returns:
+            str: The content of the tag, or an empty string if it has not
+                been closed.
+        """
+        return self.results.get(tag, "")
+
+
+def extract_tags(text: str, *tags: str) -> Dict[str, str]:
+    """
+    Extracts the content of several XML tags from the given text in a
+    single scan.
+
+    Args:
+        text (str): The text containing the XML.
+        tags (str): The XML tags to extract content from.
+
+    Returns:
+        Dict[str, str]: The content of each tag, or an empty string for the
+            tags that are missing.
+    """
+    extractor = XMLTagExtractor(tags)
+    extractor.feed(text)
+    return {tag: extractor.get(tag) for tag in tags}
 
 
 def extract_xml(text: str, tag: str) -> str:
@@ -18,8 +181,14 @@ def extract_xml(text: str, tag: str) -> str:
     Returns:
         str: The content of the specified XML tag
     """
-    match = re.search(f'<{tag}>(.*?)</{tag}>', text, re.DOTALL)
-    return match.group(1) if match else ""
+    return extract_tags(text, tag)[tag]
+
+
+# A complete task element of the composer response
+TASK_PATTERN = re.compile(
+    r'<task><type>(.*?)</type><description>(.*?)</description></task>',
+    re.DOTALL
+)
 
 
 def parse_tasks(tasks_xml: str) -> List[Dict]:
@@ -33,11 +202,7 @@ def parse_tasks(tasks_xml: str) -> List[Dict]:
         List[Dict]: A list of task dictionaries.
     """
     tasks = []
-    task_pattern = re.compile(
-        r'<task><type>(.*?)</type><description>(.*?)</description></task>',
-        re.DOTALL
-    )
-    matches = task_pattern.findall(tasks_xml)
+    matches = TASK_PATTERN.findall(tasks_xml)
 
     for match in matches:
         task = {
@@ -47,3 +212,124 @@ def parse_tasks(tasks_xml: str) -> List[Dict]:
         tasks.append(task)
 
     return tasks
+
+
+class TaskStreamParser:
+    """
+    Parses the tasks of a streamed composer response as they complete.
+
+    Tasks are read from the first ``<tasks>`` element, like
+    ``parse_tasks(extract_xml(text, "tasks"))`` does on the full response,
+    but each task is returned as soon as its ``</task>`` tag arrives.
+
+    Attributes:
+        text (str): The text received so far.
+        tasks (List[Dict]): The tasks parsed so far.
+    """
+
+    def __init__(self):
+        """
+        Initializes a TaskStreamParser.
+        """
+        self.text = ""
+        self.tasks: List[Dict] = []
+        self._position: Optional[int] = None
+        self._closed = False
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        Adds a chunk of text and returns the tasks it completes.
+
+        Args:
+            chunk (str): The next chunk of streamed text.
+
+        Returns:
+            List[Dict]: The completed task dictionaries.
+        """
+        # Tags may be split across chunks, so searches restart a tag length
+        # before the new text
+        search_from = max(0, len(self.text) - len("</tasks>"))
+        self.text += chunk
+        if self._closed:
+            return []
+        if self._position is None:
+            start = self.text.find("<tasks>", search_from)
+            if start == -1:
+                return []
+            self._position = start + len("<tasks>")
+
+        end = self.text.find("</tasks>", self._position)
+        if end != -1:
+            self._closed = True
+        else:
+            end = len(self.text)
+        if self.text.find("</task>", self._position, end) == -1:
+            return []
+
+        tasks = []
+        for match in TASK_PATTERN.finditer(self.text, self._position, end):
+            tasks.append({"type": match.group(1).strip(),
+                          "description": match.group(2).strip()})
+            self._position = match.end()
+        self.tasks.extend(tasks)
+        return tasks
+
+
+class StreamSegmenter:
+    """
+    Splits streamed text into segments at a boundary.
+
+    The boundary is a number of whitespace-separated tokens, ``"paragraph"``
+    for blank-line separated paragraphs, or any other string such as a
+    closing XML tag, which ends a segment right after it.
+    """
+
+    def __init__(self, boundary: Union[int, str] = "paragraph"):
+        """
+        Initializes a StreamSegmenter.
+
+        Args:
+            boundary (Union[int, str]): The segment boundary.
+        """
+        if isinstance(boundary, int) and boundary < 1:
+            raise ValueError("Token boundaries must be positive.")
+        self.boundary = "\n\n" if boundary == "paragraph" else boundary
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Adds a chunk of text and returns the segments it completes.
+
+        Args:
+            chunk (str): The next chunk of streamed text.
+
+        Returns:
+            List[str]: The completed segments.
+        """
+        self._buffer += chunk
+        segments = []
+        if isinstance(self.boundary, int):
+            tokens = list(re.finditer(r"\S+\s+", self._buffer))
+            while len(tokens) >= self.boundary:
+                end = tokens[self.boundary - 1].end()
+                segments.append(self._buffer[:end])
+                self._buffer = self._buffer[end:]
+                tokens = tokens[self.boundary:]
+            return segments
+
+        while (index := self._buffer.find(self.boundary)) != -1:
+            end = index + len(self.boundary)
+            if self._buffer[:index].strip():
+                segments.append(self._buffer[:end])
+            self._buffer = self._buffer[end:]
+        return segments
+
+    def flush(self) -> Optional[str]:
+        """
+        Returns the text left after the last boundary.
+
+        Returns:
+            Optional[str]: The remaining segment, or None if it is blank.
+        """
+        remainder, self._buffer = self._buffer, ""
+        return remainder if remainder.strip() else None
@@ -0,0 +1,380 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Rate Limit Module
+
+"""
+import asyncio
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import (Any, AsyncIterator, Dict, Iterator, List, Optional,
+                    Tuple, Union)
+
+from .usage import Usage, record_usage
+
+# Key of a rate limit: a provider, or a (provider, model) pair
+Rate_Limit_Key = Union[str, Tuple[str, str]]
+
+# Parameters bounding the number of generated tokens
+MAX_TOKEN_PARAMS = ("max_tokens", "max_completion_tokens",
+                    "max_output_tokens", "num_predict")
+
+# Approximate number of characters per token
+CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """
+    Token bucket refilling its capacity evenly over a period.
+
+    Reservations are always granted and may overdraw the bucket; the caller
+    then waits until the refill has paid back the overdraft. Reservations
+    are therefore served in the order they were made.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        """
+        Initializes a TokenBucket.
+
+        Args:
+            capacity (float): The number of units per period.
+            period (float): The refill period in seconds.
+        """
+        if capacity <= 0:
+            raise ValueError("Rate limits must be positive.")
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.level = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """
+        Adds the units refilled since the last update.
+        """
+        now = time.monotonic()
+        self.level = min(self.capacity,
+                         self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes units from the bucket.
+
+        Args:
+            amount (float): The number of units.
+
+        Returns:
+            float: The seconds to wait before the units may be used.
+        """
+        with self._lock:
+            self._refill()
+            self.level -= amount
+            return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount: float):
+        """
+        Corrects an earlier reservation.
+
+        Args:
+            amount (float): The number of units to take, or to give back if
+                negative.
+        """
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level - amount)
+
+
+@dataclass
+class RateLimitStats:
+    """
+    Counters of a rate limit.
+
+    Attributes:
+        requests (int): The number of requests admitted.
+        tokens (int): The number of tokens charged after settlement.
+        delayed (int): The number of requests that had to wait.
+        total_wait (float): Seconds spent waiting in total.
+    """
+    requests: int = 0
+    tokens: int = 0
+    delayed: int = 0
+    total_wait: float = 0.0
+
+
+@dataclass
+class _RateLimit:
+    """
+    Request and token buckets of a provider or model.
+    """
+    requests: Optional[TokenBucket]
+    tokens: Optional[TokenBucket]
+    stats: RateLimitStats = field(default_factory=RateLimitStats)
+
+
+@dataclass
+class Reservation:
+    """
+    Budget taken for a model call.
+
+    Attributes:
+        tokens (int): The number of tokens reserved.
+        delay (float): The seconds the call has to wait.
+    """
+    tokens: int
+    delay: float
+    limits: List[_RateLimit]
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits for model calls.
+
+    A call reserves one request and its estimated tokens from its
+    (provider, model) limit and its provider limit, for each one that is
+    configured, and waits until both budgets allow it. Once the call has
+    finished, the reservation is corrected with the usage reported by the
+    provider. Calls without any configured limit are not held back.
+    """
+
+    def __init__(self):
+        """
+        Initializes a RateLimiter.
+        """
+        self._limits: Dict[Rate_Limit_Key, _RateLimit] = {}
+
+    def set_limits(self, provider: str, model: Optional[str] = None,
+                   rpm: Optional[float] = None, tpm: Optional[float] = None):
+        """
+        Sets or removes the rate limits of a provider or model.
+
+        Args:
+            provider (str): The provider.
+            model (Optional[str]): The model, or None for limits shared by
+                every model of the provider.
+            rpm (Optional[float]): The requests per minute.
+            tpm (Optional[float]): The tokens per minute.
+        """
+        key = (provider, model) if model is not None else provider
+        if rpm is None and tpm is None:
+            self._limits.pop(key, None)
+            return
+        self._limits[key] = _RateLimit(
+            requests=TokenBucket(rpm) if rpm is not None else None,
+            tokens=TokenBucket(tpm) if tpm is not None else None)
+
+    @staticmethod
+    def estimate_tokens(prompt: str, system_prompt: str = "",
+                        params: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Estimates the tokens a model call will use.
+
+        Prompt tokens are approximated from the prompt length, and generated
+        tokens from the maximum output parameter, if one is given.
+
+        Args:
+            prompt (str): The input prompt.
+            system_prompt (str): The system prompt.
+            params (Optional[Dict[str, Any]]): The call parameters.
+
+        Returns:
+            int: The estimated number of tokens.
+        """
+        tokens = math.ceil((len(prompt) + len(system_prompt or ""))
+                           / CHARS_PER_TOKEN)
+        for name in MAX_TOKEN_PARAMS:
+            if (params or {}).get(name):
+                return tokens + int(params[name])
+        return tokens
+
+    def _limits_for(self, provider: str, model: str) -> List[_RateLimit]:
+        """
+        Returns the rate limits of a call.
+
+        Args:
+            provider (str): The provider of the call.
+            model (str): The model of the call.
+
+        Returns:
+            List[_RateLimit]: The configured limits.
+        """
+        if not self._limits:
+            return []
+        keys = ((provider, model), provider)
+        return [self._limits[key] for key in keys if key in self._limits]
+
+    def reserve(self, provider: str, model: str,
+                tokens: int) -> Optional[Reservation]:
+        """
+        Reserves a request and its tokens without waiting.
+
+        Args:
+            provider (str): The provider of the call.
+            model (str): The model of the call.
+            tokens (int): The estimated number of tokens.
+
+        Returns:
+            Optional[Reservation]: The reservation, or None if the call is
+                not limited.
+        """
+        limits = self._limits_for(provider, model)
+        if not limits:
+            return None
+        delay = 0.0
+        for limit in limits:
+            if limit.requests is not None:
+                delay = max(delay, limit.requests.reserve(1))
+            if limit.tokens is not None:
+                delay = max(delay, limit.tokens.reserve(tokens))
+        for limit in limits:
+            limit.stats.requests += 1
+            limit.stats.tokens += tokens
+            if delay:
+                limit.stats.delayed += 1
+                limit.stats.total_wait += delay
+        return Reservation(tokens=tokens, delay=delay, limits=limits)
+
+    def settle(self, reservation: Optional[Reservation],
+               tokens: Optional[int]):
+        """
+        Corrects a reservation with the tokens a call actually used.
+
+        Args:
+            reservation (Optional[Reservation]): The reservation.
+            tokens (Optional[int]): The tokens used, or None to keep the
+                estimate.
+        """
+        if reservation is None or tokens is None:
+            return
+        difference = tokens - reservation.tokens
+        for limit in reservation.limits:
+            if limit.tokens is not None:
+                limit.tokens.adjust(difference)
+            limit.stats.tokens += difference
+
+    def acquire(self, provider: str, model: str,
+                tokens: int) -> Optional[Reservation]:
+        """
+        Reserves a request and its tokens, and waits until they are allowed.
+
+        Args:
+            provider (str): The provider of the call.
+            model (str): The model of the call.
+            tokens (int): The estimated number of tokens.
+
+        Returns:
+            Optional[Reservation]: The reservation, or None if the call is
+                not limited.
+        """
+        reservation = self.reserve(provider, model, tokens)
+        if reservation is not None and reservation.delay:
+            time.sleep(reservation.delay)
+        return reservation
+
+    async def aacquire(self, provider: str, model: str,
+                       tokens: int) -> Optional[Reservation]:
+        """
+        Reserves a request and its tokens, and waits asynchronously until
+        they are allowed.
+
+        Args:
+            provider (str): The provider of the call.
+            model (str): The model of the call.
+            tokens (int): The estimated number of tokens.
+
+        Returns:
+            Optional[Reservation]: The reservation, or None if the call is
+                not limited.
+        """
+        reservation = self.reserve(provider, model, tokens)
+        if reservation is not None and reservation.delay:
+            await asyncio.sleep(reservation.delay)
+        return reservation
+
+    @contextmanager
+    def limit(self, provider: str, model: str, prompt: str,
+              system_prompt: str,
+              params: Dict[str, Any]) -> Iterator[Optional[Usage]]:
+        """
+        Waits for the budget of a model call and settles it with the usage
+        reported while the context is active.
+
+        Args:
+            provider (str): The provider of the call.
+            model (str): The model of the call.
+            prompt (str): The input prompt.
+            system_prompt (str): The system prompt.
+            params (Dict[str, Any]): The call parameters.
+
+        Yields:
+            Optional[Usage]: The reported usage, or None if the call is not
+                limited.
+        """
+        if not self._limits_for(provider, model):
+            yield None
+            return
+        reservation = self.acquire(
+            provider, model,
+            self.estimate_tokens(prompt, system_prompt, params))
+        # The reservation is settled even when the call raises, e.g. with
+        # the usage a failed stream reported before the error
+        with record_usage() as usage:
+            try:
+                yield usage
+            finally:
+                self.settle(reservation,
+                            usage.total_tokens if usage.reported else None)
+
+    @asynccontextmanager
+    async def alimit(self, provider: str, model: str, prompt: str,
+                     system_prompt: str,
+                     params: Dict[str, Any]) -> AsyncIterator[Optional[Usage]]:
+        """
+        Waits asynchronously for the budget of a model call and settles it
+        with the usage reported while the context is active.
+
+        Args:
+            provider (str): The provider of the call.
+            model (str): The model of the call.
+            prompt (str): The input prompt.
+            system_prompt (str): The system prompt.
+            params (Dict[str, Any]): The call parameters.
+
+        Yields:
+            Optional[Usage]: The reported usage, or None if the call is not
+                limited.
+        """
+        if not self._limits_for(provider, model):
+            yield None
+            return
+        reservation = await self.aacquire(
+            provider, model,
+            self.estimate_tokens(prompt, system_prompt, params))
+        # The reservation is settled even when the call raises, e.g. with
+        # the usage a failed stream reported before the error
+        with record_usage() as usage:
+            try:
+                yield usage
+            finally:
+                self.settle(reservation,
+                            usage.total_tokens if usage.reported else None)
+
+    def stats(self) -> Dict[Rate_Limit_Key, RateLimitStats]:
+        """
+        Returns the counters of every configured rate limit.
+
+        Returns:
+            Dict[Rate_Limit_Key, RateLimitStats]: The counters keyed by
+                limit.
+        """
+        return {key: limit.stats for key, limit in self._limits.items()}
+
+
+# Rate limiter applied to every model_call and amodel_call
+rate_limiter = RateLimiter()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,482 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Retry Policy Module
+
+"""
+import asyncio
+import contextvars
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                wait)
+from dataclasses import dataclass
+from typing import (Any, Awaitable, Callable, Deque, Dict, Hashable, Optional,
+                    Set)
+
+import groq
+import httpx
+import openai
+
+from ..utils.exceptions import ProviderError
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes worth retrying
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+
+# Exceptions raised for transient connection failures and timeouts
+RETRYABLE_EXCEPTIONS = (ConnectionError, TimeoutError, asyncio.TimeoutError,
+                        httpx.TransportError, openai.APIConnectionError,
+                        groq.APIConnectionError)
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """
+    Returns the HTTP status code of a provider error.
+
+    Args:
+        error (BaseException): The error.
+
+    Returns:
+        Optional[int]: The status code, or None if the error has none.
+    """
+    for name in ("status_code", "code"):
+        code = getattr(error, name, None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Classifies a provider error as transient or fatal.
+
+    Args:
+        error (BaseException): The error.
+
+    Returns:
+        bool: Whether the call may succeed when retried.
+    """
+    if isinstance(error, RETRYABLE_EXCEPTIONS):
+        return True
+    code = status_code(error)
+    return code is not None and (code in RETRYABLE_STATUS_CODES
+                                 or code >= 500)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Returns the delay requested by the ``Retry-After`` header of an error.
+
+    Args:
+        error (BaseException): The error.
+
+    Returns:
+        Optional[float]: The delay in seconds, or None if none was given.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+
+class LatencyTracker:
+    """
+    Rolling window of call latencies per key.
+    """
+
+    def __init__(self, window: int = 200):
+        """
+        Initializes a LatencyTracker.
+
+        Args:
+            window (int): The number of latest latencies kept per key.
+        """
+        self.window = window
+        self._latencies: Dict[Hashable, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: Hashable, seconds: float):
+        """
+        Records the latency of a successful call.
+
+        Args:
+            key (Hashable): The key of the call.
+            seconds (float): The latency in seconds.
+        """
+        with self._lock:
+            latencies = self._latencies.get(key)
+            if latencies is None:
+                latencies = self._latencies[key] = deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def quantile(self, key: Hashable, q: float,
+                 min_samples: int = 1) -> Optional[float]:
+        """
+        Returns a latency quantile of a key.
+
+        Args:
+            key (Hashable): The key of the calls.
+            q (float): The quantile between 0 and 1.
+            min_samples (int): The number of latencies required.
+
+        Returns:
+            Optional[float]: The quantile in seconds, or None if there are
+                fewer latencies than required.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(key, ()))
+        if not latencies or len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1,
+                             math.ceil(q * len(latencies)) - 1)]
+
+    def clear(self):
+        """
+        Forgets every recorded latency.
+        """
+        with self._lock:
+            self._latencies.clear()
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Retry and hedging behaviour of model calls.
+
+    Retryable errors are retried with capped exponential backoff and full
+    jitter, honouring ``Retry-After`` headers up to ``max_delay``. Once
+    ``hedge_min_samples`` latencies of a (provider, model) are known, a call
+    still running after their ``hedge_quantile`` is duplicated, and the
+    first successful answer is taken.
+
+    Attributes:
+        max_attempts (int): The maximum number of attempts, including the
+            first.
+        base_delay (float): The backoff before the first retry in seconds.
+        max_delay (float): The maximum backoff in seconds.
+        jitter (bool): Whether to draw backoffs uniformly up to their cap.
+        hedge (bool): Whether to send hedged requests.
+        hedge_quantile (float): The latency quantile after which to hedge.
+        hedge_min_samples (int): The latencies needed before hedging.
+        hedge_after (Optional[float]): A fixed hedging delay in seconds,
+            overriding the latency quantile.
+        max_hedges (int): The maximum number of duplicate requests per
+            attempt.
+    """
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+    jitter: bool = True
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+    hedge_after: Optional[float] = None
+    max_hedges: int = 1
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """
+        Returns the delay before retrying a failed attempt.
+
+        Args:
+            attempt (int): The number of the failed attempt, from 1.
+            error (BaseException): The error of the attempt.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        requested = retry_after(error)
+        if requested is not None:
+            return min(requested, self.max_delay)
+        cap = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, cap) if self.jitter else cap
+
+    def hedge_delay(self, key: Hashable) -> Optional[float]:
+        """
+        Returns the delay after which to hedge a call.
+
+        Args:
+            key (Hashable): The (provider, model) of the call.
+
+        Returns:
+            Optional[float]: The delay in seconds, or None not to hedge.
+        """
+        if not self.hedge or self.max_hedges < 1:
+            return None
+        if self.hedge_after is not None:
+            return self.hedge_after
+        return latency_tracker.quantile(key, self.hedge_quantile,
+                                        self.hedge_min_samples)
+
+
+# Latencies of successful model calls keyed by (provider, model)
+latency_tracker = LatencyTracker()
+
+_retry_policy = RetryPolicy()
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+
+def set_retry_policy(policy: RetryPolicy):
+    """
+    Sets the retry policy used by ``model_call`` and ``amodel_call``.
+
+    Args:
+        policy (RetryPolicy): The retry policy.
+    """
+    global _retry_policy
+    _retry_policy = policy
+
+
+def get_retry_policy() -> RetryPolicy:
+    """
+    Returns the retry policy used by ``model_call`` and ``amodel_call``.
+
+    Returns:
+        RetryPolicy: The retry policy.
+    """
+    return _retry_policy
+
+
+def retry_delay(policy: RetryPolicy, provider: str, model: str,
+                attempt: int, error: Exception) -> float:
+    """
+    Returns the delay before retrying a failed attempt, or raises if the
+    call should not be retried.
+
+    Args:
+        policy (RetryPolicy): The retry policy.
+        provider (str): The provider of the call.
+        model (str): The model of the call.
+        attempt (int): The number of the failed attempt, from 1.
+        error (Exception): The error of the attempt.
+
+    Returns:
+        float: The delay in seconds.
+
+    Raises:
+        ProviderError: If the error is fatal or no attempts are left.
+    """
+    if not is_retryable(error) or attempt >= policy.max_attempts:
+        raise ProviderError(f"{provider}/{model}",
+                            f"{type(error).__name__}: {error}",
+                            attempts=attempt) from error
+    delay = policy.backoff(attempt, error)
+    logger.warning("Retrying %s/%s in %.2f s after attempt %d failed: %r",
+                   provider, model, delay, attempt, error)
+    return delay
+
+
+def _executor() -> ThreadPoolExecutor:
+    """
+    Returns the thread pool running hedged synchronous calls.
+
+    Returns:
+        ThreadPoolExecutor: The thread pool.
+    """
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(
+                thread_name_prefix="saw-hedge")
+        return _hedge_executor
+
+
+def _timed(key: Hashable, func: Callable[[], Any]) -> Any:
+    """
+    Calls a function and records its latency if it succeeds.
+
+    Args:
+        key (Hashable): The (provider, model) of the call.
+        func (Callable[[], Any]): The function to call.
+
+    Returns:
+        Any: The result of the function.
+    """
+    start = time.perf_counter()
+    result = func()
+    latency_tracker.record(key, time.perf_counter() - start)
+    return result
+
+
+async def _atimed(key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Awaits a coroutine function and records its latency if it succeeds.
+
+    Args:
+        key (Hashable): The (provider, model) of the call.
+        func (Callable[[], Awaitable[Any]]): The coroutine function.
+
+    Returns:
+        Any: The result of the coroutine.
+    """
+    start = time.perf_counter()
+    result = await func()
+    latency_tracker.record(key, time.perf_counter() - start)
+    return result
+
+
+def _hedged(key: Hashable, func: Callable[[], Any], delay: float,
+            max_hedges: int) -> Any:
+    """
+    Calls a function, duplicating it whenever it is slower than ``delay``.
+
+    Duplicates that lose the race keep running in the background and their
+    results are discarded.
+
+    Args:
+        key (Hashable): The (provider, model) of the call.
+        func (Callable[[], Any]): The function to call.
+        delay (float): The seconds to wait before each duplicate.
+        max_hedges (int): The maximum number of duplicates.
+
+    Returns:
+        Any: The first successful result.
+    """
+    pending: Set[Future] = set()
+    error = None
+    for launched in range(max_hedges + 1):
+        context = contextvars.copy_context()
+        pending.add(_executor().submit(context.run, _timed, key, func))
+        last = launched == max_hedges
+        while pending:
+            done, pending = wait(pending, None if last else delay,
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+                if not is_retryable(error):
+                    raise error
+            if not last:
+                break
+    raise error
+
+
+async def _ahedged(key: Hashable, func: Callable[[], Awaitable[Any]],
+                   delay: float, max_hedges: int) -> Any:
+    """
+    Awaits a coroutine function, duplicating it whenever it is slower than
+    ``delay``. The duplicates that lose the race are cancelled.
+
+    Args:
+        key (Hashable): The (provider, model) of the call.
+        func (Callable[[], Awaitable[Any]]): The coroutine function.
+        delay (float): The seconds to wait before each duplicate.
+        max_hedges (int): The maximum number of duplicates.
+
+    Returns:
+        Any: The first successful result.
+    """
+    pending: Set[asyncio.Task] = set()
+    error = None
+    try:
+        for launched in range(max_hedges + 1):
+            pending.add(asyncio.ensure_future(_atimed(key, func)))
+            last = launched == max_hedges
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=None if last else delay,
+                    return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                    if not is_retryable(error):
+                        raise error
+                if not last:
+                    break
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def call_with_retry(provider: str, model: str, func: Callable[[], Any],
+                    policy: Optional[RetryPolicy] = None,
+                    latency_key: Optional[Hashable] = None) -> Any:
+    """
+    Calls a provider function under a retry policy.
+
+    Args:
+        provider (str): The provider of the call.
+        model (str): The model of the call.
+        func (Callable[[], Any]): The function making one upstream request.
+        policy (Optional[RetryPolicy]): The retry policy, or None for the
+            policy set with ``set_retry_policy``.
+        latency_key (Optional[Hashable]): The key the latencies of the
+            attempts are recorded and hedged under, or None for the
+            (provider, model) of the call.
+
+    Returns:
+        Any: The result of the first successful attempt.
+
+    Raises:
+        ProviderError: If an attempt fails with a fatal error or every
+            attempt fails.
+    """
+    policy = policy or get_retry_policy()
+    key = latency_key or (provider, model)
+    for attempt in range(1, policy.max_attempts + 1):
+        delay = policy.hedge_delay(key)
+        try:
+            if delay is None:
+                return _timed(key, func)
+            return _hedged(key, func, delay, policy.max_hedges)
+        except Exception as e:
+            time.sleep(retry_delay(policy, provider, model, attempt, e))
+
+
+async def acall_with_retry(provider: str, model: str,
+                           func: Callable[[], Awaitable[Any]],
+                           policy: Optional[RetryPolicy] = None,
+                           latency_key: Optional[Hashable] = None) -> Any:
+    """
+    Awaits a provider coroutine function under a retry policy.
+
+    Args:
+        provider (str): The provider of the call.
+        model (str): The model of the call.
+        func (Callable[[], Awaitable[Any]]): The coroutine function making
+            one upstream request.
+        policy (Optional[RetryPolicy]): The retry policy, or None for the
+            policy set with ``set_retry_policy``.
+        latency_key (Optional[Hashable]): The key the latencies of the
+            attempts are recorded and hedged under, or None for the
+            (provider, model) of the call.
+
+    Returns:
+        Any: The result of the first successful attempt.
+
+    Raises:
+        ProviderError: If an attempt fails with a fatal error or every
+            attempt fails.
+    """
+    policy = policy or get_retry_policy()
+    key = latency_key or (provider, model)
+    for attempt in range(1, policy.max_attempts + 1):
+        delay = policy.hedge_delay(key)
+        try:
+            if delay is None:
+                return await _atimed(key, func)
+            return await _ahedged(key, func, delay, policy.max_hedges)
+        except Exception as e:
+            await asyncio.sleep(
+                retry_delay(policy, provider, model, attempt, e))
+
+
+if __name__ == '__main__':
+    pass
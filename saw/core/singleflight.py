@@ -0,0 +1,130 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Single-Flight Module
+
+"""
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls made from different threads.
+
+    The first caller of a key runs the call; callers arriving while it is
+    in flight wait for and share its result or exception.
+
+    Attributes:
+        coalesced (int): The number of calls that joined an in-flight call.
+    """
+
+    def __init__(self):
+        """
+        Initializes a SingleFlight.
+        """
+        self.coalesced = 0
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Runs ``func`` once for all concurrent callers of ``key``.
+
+        Args:
+            key (str): The key identifying the call.
+            func (Callable[..., Any]): The function to call.
+            args (tuple): The positional arguments of the function.
+            kwargs (dict): The keyword arguments of the function.
+
+        Returns:
+            Any: The result of the call.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces identical in-flight coroutine calls within an event loop.
+
+    The first caller of a key starts a task; callers arriving while it is
+    in flight await the same task. Cancelling one caller leaves the shared
+    task running for the others, and it is cancelled once every caller has
+    gone.
+
+    Attributes:
+        coalesced (int): The number of calls that joined an in-flight call.
+    """
+
+    def __init__(self):
+        """
+        Initializes an AsyncSingleFlight.
+        """
+        self.coalesced = 0
+        self._calls: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    async def do(self, key: str, func: Callable[..., Awaitable[Any]],
+                 *args, **kwargs) -> Any:
+        """
+        Awaits ``func`` once for all concurrent callers of ``key``.
+
+        Args:
+            key (str): The key identifying the call.
+            func (Callable[..., Awaitable[Any]]): The coroutine function.
+            args (tuple): The positional arguments of the function.
+            kwargs (dict): The keyword arguments of the function.
+
+        Returns:
+            Any: The result of the call.
+        """
+        calls: Dict[str, Tuple[asyncio.Task, list]] = self._calls.setdefault(
+            asyncio.get_running_loop(), {})
+        if key in calls:
+            self.coalesced += 1
+            task, waiters = calls[key]
+        else:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            waiters = []
+            calls[key] = (task, waiters)
+
+            def forget(done: asyncio.Task):
+                if calls.get(key, (None,))[0] is done:
+                    del calls[key]
+
+            task.add_done_callback(forget)
+
+        waiters.append(None)
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and len(waiters) == 1:
+                task.cancel()
+            raise
+        finally:
+            waiters.pop()
+
+
+if __name__ == '__main__':
+    pass
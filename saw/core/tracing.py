@@ -0,0 +1,331 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Tracing Module
+
+Spans record workflows, workflow steps and provider calls with their
+latency and attributes. Spans are only recorded while an exporter is added
+to the tracer; otherwise ``tracer.span`` returns a shared no-op span, so
+instrumented code costs close to nothing. Attributes that are expensive to
+build should be guarded with ``span.recording``.
+"""
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+
+class Span:
+    """
+    A timed operation with attributes.
+
+    Attributes:
+        name (str): The name of the operation.
+        attributes (Dict[str, Any]): The attributes of the operation.
+        span_id (int): The identifier of the span.
+        trace_id (int): The identifier of the root span of the trace.
+        parent_id (Optional[int]): The identifier of the parent span.
+        start_ns (int): The start time in nanoseconds since the epoch.
+        end_ns (Optional[int]): The end time in nanoseconds since the epoch.
+        error (Optional[BaseException]): The exception ending the span.
+    """
+    recording = True
+
+    def __init__(self, tracer: "Tracer", name: str,
+                 attributes: Dict[str, Any]):
+        """
+        Initializes a Span.
+
+        Args:
+            tracer (Tracer): The tracer exporting the span.
+            name (str): The name of the operation.
+            attributes (Dict[str, Any]): The initial attributes.
+        """
+        parent = _current_span.get()
+        self.name = name
+        self.attributes = attributes
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.start_ns = 0
+        self.end_ns: Optional[int] = None
+        self.error: Optional[BaseException] = None
+        self._tracer = tracer
+        self._token = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        """
+        The duration of the span in seconds.
+
+        Returns:
+            Optional[float]: The duration, or None while the span is open.
+        """
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def set_attribute(self, key: str, value: Any):
+        """
+        Sets an attribute of the span.
+
+        Args:
+            key (str): The attribute name.
+            value (Any): The attribute value.
+        """
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any):
+        """
+        Sets several attributes of the span.
+
+        Args:
+            attributes (dict): The attributes by name.
+        """
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        for exporter in self._tracer.exporters:
+            exporter.on_start(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        self.error = exc
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # A generator span closed from another context
+            pass
+        for exporter in self._tracer.exporters:
+            exporter.on_end(self)
+
+
+class _NoopSpan:
+    """
+    Span returned while tracing is disabled.
+    """
+    recording = False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, **attributes: Any):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("saw_span",
+                                                       default=None)
+_span_ids = itertools.count(1)
+
+
+class SpanExporter:
+    """
+    Base class of span exporters.
+    """
+
+    def on_start(self, span: Span):
+        """
+        Receives a span when it starts.
+
+        Args:
+            span (Span): The started span.
+        """
+
+    def on_end(self, span: Span):
+        """
+        Receives a span when it ends.
+
+        Args:
+            span (Span): The ended span.
+        """
+
+
+class InMemoryExporter(SpanExporter):
+    """
+    Exporter keeping ended spans in memory.
+
+    Attributes:
+        spans (List[Span]): The ended spans in the order they ended.
+    """
+
+    def __init__(self):
+        """
+        Initializes an InMemoryExporter.
+        """
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def find(self, name: str) -> List[Span]:
+        """
+        Returns the ended spans with a name.
+
+        Args:
+            name (str): The span name.
+
+        Returns:
+            List[Span]: The matching spans.
+        """
+        return [span for span in self.spans if span.name == name]
+
+    def clear(self):
+        """
+        Forgets every span.
+        """
+        with self._lock:
+            self.spans.clear()
+
+
+class OpenTelemetryExporter(SpanExporter):
+    """
+    Exporter mirroring spans into OpenTelemetry.
+
+    Requires the ``opentelemetry-api`` package, installed with the ``otel``
+    extra. Spans keep their parent relationships, timestamps, attributes
+    and error status.
+    """
+
+    def __init__(self, tracer_provider: Any = None,
+                 instrumentation_name: str = "saw"):
+        """
+        Initializes an OpenTelemetryExporter.
+
+        Args:
+            tracer_provider (Any): The OpenTelemetry tracer provider, or None
+                for the global tracer provider.
+            instrumentation_name (str): The instrumentation scope name.
+        """
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError("OpenTelemetryExporter requires the "
+                              "opentelemetry-api package. Install it with "
+                              "`pip install simple-agentic-workflow[otel]`."
+                              ) from e
+        self._trace = trace
+        self._tracer = trace.get_tracer(instrumentation_name,
+                                        tracer_provider=tracer_provider)
+        self._spans: Dict[int, Any] = {}
+
+    @staticmethod
+    def _attribute(value: Any) -> Any:
+        """
+        Converts an attribute value to an OpenTelemetry attribute type.
+
+        Args:
+            value (Any): The attribute value.
+
+        Returns:
+            Any: The value, or its string form if it is not a primitive.
+        """
+        if isinstance(value, (bool, int, float, str)):
+            return value
+        return str(value)
+
+    def on_start(self, span: Span):
+        parent = self._spans.get(span.parent_id)
+        context = self._trace.set_span_in_context(parent) if parent else None
+        self._spans[span.span_id] = self._tracer.start_span(
+            span.name, context=context, start_time=span.start_ns)
+
+    def on_end(self, span: Span):
+        otel_span = self._spans.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        otel_span.set_attributes({key: self._attribute(value)
+                                  for key, value in span.attributes.items()
+                                  if value is not None})
+        if span.error is not None:
+            otel_span.record_exception(span.error)
+            otel_span.set_status(self._trace.Status(
+                self._trace.StatusCode.ERROR, str(span.error)))
+        otel_span.end(end_time=span.end_ns)
+
+
+class Tracer:
+    """
+    Creates spans and hands them to the added exporters.
+
+    Attributes:
+        exporters (List[SpanExporter]): The exporters receiving spans.
+    """
+
+    def __init__(self):
+        """
+        Initializes a Tracer.
+        """
+        self.exporters: List[SpanExporter] = []
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether spans are recorded.
+
+        Returns:
+            bool: True if an exporter is added.
+        """
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter: SpanExporter):
+        """
+        Adds an exporter, enabling tracing.
+
+        Args:
+            exporter (SpanExporter): The exporter.
+        """
+        self.exporters = [*self.exporters, exporter]
+
+    def remove_exporter(self, exporter: SpanExporter):
+        """
+        Removes an exporter. Tracing is disabled once none is left.
+
+        Args:
+            exporter (SpanExporter): The exporter.
+        """
+        self.exporters = [e for e in self.exporters if e is not exporter]
+
+    def span(self, name: str, **attributes: Any) -> Any:
+        """
+        Creates a span to be used as a context manager.
+
+        Args:
+            name (str): The name of the operation.
+            attributes (dict): The initial attributes.
+
+        Returns:
+            Span: The span, or a no-op span while tracing is disabled.
+        """
+        if not self.exporters:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+
+    @staticmethod
+    def current_span() -> Any:
+        """
+        Returns the innermost active span.
+
+        Returns:
+            Span: The active span, or a no-op span if there is none.
+        """
+        return _current_span.get() or _NOOP_SPAN
+
+
+# Tracer used by the workflows, model_call and the providers
+tracer = Tracer()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,91 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Token Usage Module
+
+Providers report the token usage of their responses with ``report_usage``.
+The report is added to the ``Usage`` of the enclosing ``record_usage``
+context, if there is one, and ignored otherwise.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from .tracing import tracer
+
+
+@dataclass
+class Usage:
+    """
+    Token usage of one or more model calls.
+
+    Attributes:
+        prompt_tokens (int): The number of prompt tokens.
+        completion_tokens (int): The number of generated tokens.
+        reported (bool): Whether a provider reported any usage.
+    """
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    reported: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        """
+        The number of prompt and generated tokens.
+
+        Returns:
+            int: The total number of tokens.
+        """
+        return self.prompt_tokens + self.completion_tokens
+
+
+_current_usage: ContextVar[Optional[Usage]] = ContextVar("saw_usage",
+                                                         default=None)
+
+
+@contextmanager
+def record_usage() -> Iterator[Usage]:
+    """
+    Collects the usage reported by providers while the context is active.
+
+    The usage is also added to the enclosing context, if there is one.
+
+    Yields:
+        Usage: The usage reported so far.
+    """
+    outer = _current_usage.get()
+    usage = Usage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+        if outer is not None and usage.reported:
+            outer.prompt_tokens += usage.prompt_tokens
+            outer.completion_tokens += usage.completion_tokens
+            outer.reported = True
+
+
+def report_usage(prompt_tokens: Optional[int],
+                 completion_tokens: Optional[int]):
+    """
+    Reports the token usage of a provider response.
+
+    The usage is also set on the active span.
+
+    Args:
+        prompt_tokens (Optional[int]): The number of prompt tokens.
+        completion_tokens (Optional[int]): The number of generated tokens.
+    """
+    tracer.current_span().set_attributes(prompt_tokens=prompt_tokens,
+                                         completion_tokens=completion_tokens)
+    usage = _current_usage.get()
+    if usage is None:
+        return
+    usage.prompt_tokens += prompt_tokens or 0
+    usage.completion_tokens += completion_tokens or 0
+    usage.reported = True
+
+
+if __name__ == '__main__':
+    pass
@@ -3,18 +3,36 @@
 """ Google Call Module
 
 """
+from typing import AsyncIterator, Iterator, Optional
+
+import httpx
 from google import genai
 from google.genai import types
 
+from saw.core.clients import client_registry
+from saw.core.tracing import tracer
+from saw.core.usage import report_usage
+
 
-def create_client() -> genai.Client:
+def create_client(limits: Optional[httpx.Limits] = None,
+                  **settings) -> genai.Client:
     """
     Creates and returns a Google genai client.
 
+    The genai SDK manages its own HTTP sessions, so ``limits`` is accepted
+    for a uniform factory signature but not applied.
+
+    Args:
+        limits (Optional[httpx.Limits]): The connection pool limits.
+        settings (dict): Other Google genai client arguments.
+
     Returns:
         genai.Client: The Google genai client.
     """
-    return genai.Client()
+    return genai.Client(**settings)
+
+
+client_registry.register_factory("google", create_client, create_client)
 
 
 def generate_content(
@@ -80,7 +98,7 @@ async def async_generate_content(
 
 
 def gemini_call(model: str, prompt: str, system_prompt: str,
-                **params) -> str | None:
+                **params) -> str:
     """Google LLM call function, now with params support.
 
     Args:
@@ -90,23 +108,21 @@ def gemini_call(model: str, prompt: str, system_prompt: str,
         params (dict): A dictionary of other Google parameters.
 
     Returns:
-        str: The generated text, or None on error.
+        str: The generated text.
     """
-    try:
-        client = create_client()
-        response = generate_content(client, model, prompt,
-                                    system_prompt, **params)
-        print(f"Response: {response.__dict__.keys()}")
-        print(f"Model: {response.model_version}")
-        print(f"Usage: {response.usage_metadata}")
-        return response.text
-    except Exception as e:
-        print(f"Google Error: {e}")
-        return None
+    client = client_registry.get_client("google")
+    response = generate_content(client, model, prompt,
+                                system_prompt, **params)
+    tracer.current_span().set_attribute("response_model",
+                                        response.model_version)
+    if response.usage_metadata:
+        report_usage(response.usage_metadata.prompt_token_count,
+                     response.usage_metadata.candidates_token_count)
+    return response.text
 
 
 async def agemini_call(model: str, prompt: str, system_prompt: str,
-                       **params) -> str | None:
+                       **params) -> str:
     """Asynchronous Google LLM call function, now with params support.
 
     Args:
@@ -116,19 +132,73 @@ async def agemini_call(model: str, prompt: str, system_prompt: str,
         params (dict): A dictionary of other Google parameters.
 
     Returns:
-        str: The generated text, or None on error.
+        str: The generated text.
+    """
+    client = client_registry.get_async_client("google")
+    response = await async_generate_content(client, model, prompt,
+                                            system_prompt, **params)
+    tracer.current_span().set_attribute("response_model",
+                                        response.model_version)
+    if response.usage_metadata:
+        report_usage(response.usage_metadata.prompt_token_count,
+                     response.usage_metadata.candidates_token_count)
+    return response.text
+
+
+def gemini_stream(model: str, prompt: str, system_prompt: str,
+                  **params) -> Iterator[str]:
+    """Google LLM streaming function yielding text chunks.
+
+    Args:
+        model (str): The Google model name.
+        prompt (str): The user's prompt.
+        system_prompt (str): The system prompt.
+        params (dict): A dictionary of other Google parameters.
+
+    Yields:
+        str: The generated text chunks.
     """
-    try:
-        client = create_client()
-        response = await async_generate_content(client, model, prompt,
-                                                system_prompt, **params)
-        print(f"Response: {response.__dict__.keys()}")
-        print(f"Model: {response.model_version}")
-        print(f"Usage: {response.usage_metadata}")
-        return response.text
-    except Exception as e:
-        print(f"Google Error: {e}")
-        return None
+    client = client_registry.get_client("google")
+    response = client.models.generate_content_stream(
+        model=model,
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            system_instruction=system_prompt if system_prompt
+            else "You are a helpful assistant.",
+            **params
+        ),
+    )
+    for chunk in response:
+        if chunk.text:
+            yield chunk.text
+
+
+async def agemini_stream(model: str, prompt: str, system_prompt: str,
+                         **params) -> AsyncIterator[str]:
+    """Asynchronous Google LLM streaming function yielding text chunks.
+
+    Args:
+        model (str): The Google model name.
+        prompt (str): The user's prompt.
+        system_prompt (str): The system prompt.
+        params (dict): A dictionary of other Google parameters.
+
+    Yields:
+        str: The generated text chunks.
+    """
+    client = client_registry.get_async_client("google")
+    response = await client.aio.models.generate_content_stream(
+        model=model,
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            system_instruction=system_prompt if system_prompt
+            else "You are a helpful assistant.",
+            **params
+        ),
+    )
+    async for chunk in response:
+        if chunk.text:
+            yield chunk.text
 
 
 if __name__ == '__main__':
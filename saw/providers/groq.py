@@ -3,20 +3,58 @@
 """ Groq Call Module
 
 """
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+import groq
+import httpx
 from groq import AsyncGroq, Groq
 from groq._streaming import Stream, AsyncStream
 from groq.types.chat.chat_completion import ChatCompletion
 from groq.types.chat.chat_completion_chunk import ChatCompletionChunk
 
+from saw.core.clients import client_registry
+from saw.core.tracing import tracer
+from saw.core.usage import report_usage
+
 
-def create_client() -> Groq:
+def create_client(limits: Optional[httpx.Limits] = None,
+                  **settings) -> Groq:
     """
     Creates and returns a Groq client.
 
+    Args:
+        limits (Optional[httpx.Limits]): The connection pool limits.
+        settings (dict): Other Groq client arguments.
+
     Returns:
         Groq: The Groq client.
     """
-    return Groq()
+    http_client = groq.DefaultHttpxClient(limits=limits) if limits else None
+    # Retries are handled by the retry policy of model_call
+    settings.setdefault("max_retries", 0)
+    return Groq(http_client=http_client, **settings)
+
+
+def create_async_client(limits: Optional[httpx.Limits] = None,
+                        **settings) -> AsyncGroq:
+    """
+    Creates and returns an asynchronous Groq client.
+
+    Args:
+        limits (Optional[httpx.Limits]): The connection pool limits.
+        settings (dict): Other Groq client arguments.
+
+    Returns:
+        AsyncGroq: The asynchronous Groq client.
+    """
+    http_client = (groq.DefaultAsyncHttpxClient(limits=limits)
+                   if limits else None)
+    # Retries are handled by the retry policy of model_call
+    settings.setdefault("max_retries", 0)
+    return AsyncGroq(http_client=http_client, **settings)
+
+
+client_registry.register_factory("groq", create_client, create_async_client)
 
 
 def generate_content(
@@ -82,7 +120,7 @@ async def async_generate_content(
 
 
 def groq_call(model: str, prompt: str, system_prompt: str,
-              **params) -> str | None:
+              **params) -> str:
     """Groq LLM call function, now with params support.
 
     Args:
@@ -92,23 +130,20 @@ def groq_call(model: str, prompt: str, system_prompt: str,
         params (dict): A dictionary of other Groq parameters.
 
     Returns:
-        str: The generated text, or None on error.
+        str: The generated text.
     """
-    try:
-        client = create_client()
-        response = generate_content(client, model, prompt,
-                                    system_prompt, **params)
-        print(f"Response: {response.__dict__.keys()}")
-        print(f"Model: {response.model}")
-        print(f"Usage: {response.usage}")
-        return response.choices[0].message.content
-    except Exception as e:
-        print(f"Groq Error: {e}")
-        return None
+    client = client_registry.get_client("groq")
+    response = generate_content(client, model, prompt,
+                                system_prompt, **params)
+    tracer.current_span().set_attribute("response_model", response.model)
+    if response.usage:
+        report_usage(response.usage.prompt_tokens,
+                     response.usage.completion_tokens)
+    return response.choices[0].message.content
 
 
 async def agroq_call(model: str, prompt: str, system_prompt: str,
-                     **params) -> str | None:
+                     **params) -> str:
     """Asynchronous Groq LLM call function, now with params support.
 
     Args:
@@ -118,19 +153,83 @@ async def agroq_call(model: str, prompt: str, system_prompt: str,
         params (dict): A dictionary of other Groq parameters.
 
     Returns:
-        str: The generated text, or None on error.
+        str: The generated text.
+    """
+    client = client_registry.get_async_client("groq")
+    response = await async_generate_content(client, model, prompt,
+                                            system_prompt, **params)
+    tracer.current_span().set_attribute("response_model", response.model)
+    if response.usage:
+        report_usage(response.usage.prompt_tokens,
+                     response.usage.completion_tokens)
+    return response.choices[0].message.content
+
+
+def groq_stream(model: str, prompt: str, system_prompt: str,
+                **params) -> Iterator[str]:
+    """Groq LLM streaming function yielding text chunks.
+
+    Args:
+        model (str): The Groq model name.
+        prompt (str): The user's prompt.
+        system_prompt (str): The system prompt.
+        params (dict): A dictionary of other Groq parameters.
+
+    Yields:
+        str: The generated text chunks.
+    """
+    client = client_registry.get_client("groq")
+    response = generate_content(client, model, prompt, system_prompt,
+                                stream=True, **params)
+    for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def agroq_stream(model: str, prompt: str, system_prompt: str,
+                       **params) -> AsyncIterator[str]:
+    """Asynchronous Groq LLM streaming function yielding text chunks.
+
+    Args:
+        model (str): The Groq model name.
+        prompt (str): The user's prompt.
+        system_prompt (str): The system prompt.
+        params (dict): A dictionary of other Groq parameters.
+
+    Yields:
+        str: The generated text chunks.
+    """
+    client = client_registry.get_async_client("groq")
+    response = await async_generate_content(client, model, prompt,
+                                            system_prompt, stream=True,
+                                            **params)
+    async for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def batch_request(model: str, prompt: str, system_prompt: str,
+                  **params) -> Dict[str, Any]:
+    """
+    Builds the body of a chat completion request in a Groq batch.
+
+    Args:
+        model (str): The Groq model name.
+        prompt (str): The user's prompt.
+        system_prompt (str): The system prompt.
+        params (dict): A dictionary of other Groq parameters.
+
+    Returns:
+        Dict[str, Any]: The request body.
     """
-    try:
-        client = AsyncGroq()
-        response = await async_generate_content(client, model, prompt,
-                                                system_prompt, **params)
-        print(f"Response: {response.__dict__.keys()}")
-        print(f"Model: {response.model}")
-        print(f"Usage: {response.usage}")
-        return response.choices[0].message.content
-    except Exception as e:
-        print(f"Groq Error: {e}")
-        return None
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        **params
+    }
 
 
 if __name__ == '__main__':
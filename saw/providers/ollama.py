@@ -3,34 +3,253 @@
 """ Ollama Call Module
 
 """
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (Any, AsyncIterator, Dict, Iterable, Iterator, List,
+                    Optional, Union)
+
+import httpx
 import ollama
 
+from saw.core.clients import client_registry
+from saw.core.tracing import tracer
+from saw.core.usage import report_usage
+
+logger = logging.getLogger(__name__)
+
+# Define a type alias for how long the server keeps a model loaded, e.g. "10m"
+Keep_Alive = Union[float, str]
+
+# Options the server loads the model with; changing one reloads the model,
+# while sampling options such as temperature apply per request
+LOAD_OPTIONS = frozenset({"num_ctx", "num_batch", "num_gpu", "main_gpu",
+                          "num_thread", "low_vram", "use_mmap", "use_mlock",
+                          "vocab_only", "numa"})
+
+
+def create_client(limits: Optional[httpx.Limits] = None,
+                  **settings) -> ollama.Client:
+    """
+    Creates and returns an Ollama client.
+
+    Args:
+        limits (Optional[httpx.Limits]): The connection pool limits.
+        settings (dict): Other Ollama client arguments.
+
+    Returns:
+        ollama.Client: The Ollama client.
+    """
+    if limits:
+        settings["limits"] = limits
+    return ollama.Client(**settings)
+
+
+def create_async_client(limits: Optional[httpx.Limits] = None,
+                        **settings) -> ollama.AsyncClient:
+    """
+    Creates and returns an asynchronous Ollama client.
+
+    Args:
+        limits (Optional[httpx.Limits]): The connection pool limits.
+        settings (dict): Other Ollama client arguments.
+
+    Returns:
+        ollama.AsyncClient: The asynchronous Ollama client.
+    """
+    if limits:
+        settings["limits"] = limits
+    return ollama.AsyncClient(**settings)
+
+
+client_registry.register_factory("ollama", create_client,
+                                 create_async_client)
+
+
+class ModelAvailabilityCache:
+    """
+    Process-wide record of the Ollama models known to be available.
+
+    A model is checked against the server at most once per ``ttl`` seconds.
+    Concurrent checks of the same model share one lock so only the first
+    caller talks to the server.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        """
+        Initializes a ModelAvailabilityCache.
+
+        Args:
+            ttl (float): Seconds a model stays marked as available.
+        """
+        self.ttl = ttl
+        self._expiry: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._async_locks: weakref.WeakKeyDictionary = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(model: str) -> str:
+        """
+        Normalizes a model name to the ``name:tag`` form listed by Ollama.
+
+        Args:
+            model (str): The Ollama model name.
+
+        Returns:
+            str: The normalized model name.
+        """
+        return model if ":" in model else f"{model}:latest"
+
+    def is_available(self, model: str) -> bool:
+        """
+        Checks whether a model is marked as available and not expired.
+
+        Args:
+            model (str): The Ollama model name.
+
+        Returns:
+            bool: Whether the model is available.
+        """
+        expiry = self._expiry.get(self.normalize(model))
+        return expiry is not None and expiry > time.monotonic()
+
+    def mark_available(self, models: Iterable[str]):
+        """
+        Marks models as available for the next ``ttl`` seconds.
+
+        Args:
+            models (Iterable[str]): The Ollama model names.
+        """
+        expiry = time.monotonic() + self.ttl
+        for model in models:
+            self._expiry[self.normalize(model)] = expiry
+
+    def invalidate(self, model: Optional[str] = None):
+        """
+        Forgets one model, or every model when none is given.
+
+        Args:
+            model (Optional[str]): The Ollama model name.
+        """
+        if model is None:
+            self._expiry.clear()
+        else:
+            self._expiry.pop(self.normalize(model), None)
+
+    def lock(self, model: str) -> threading.Lock:
+        """
+        Returns the thread lock guarding the check of a model.
+
+        Args:
+            model (str): The Ollama model name.
+
+        Returns:
+            threading.Lock: The model lock.
+        """
+        with self._lock:
+            return self._locks.setdefault(self.normalize(model),
+                                          threading.Lock())
+
+    def async_lock(self, model: str) -> asyncio.Lock:
+        """
+        Returns the asyncio lock guarding the check of a model in the
+        running event loop.
+
+        Args:
+            model (str): The Ollama model name.
+
+        Returns:
+            asyncio.Lock: The model lock.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            locks = self._async_locks.setdefault(loop, {})
+            return locks.setdefault(self.normalize(model), asyncio.Lock())
+
+
+model_cache = ModelAvailabilityCache()
+
+
+def _log_progress(progress: ollama.ProgressResponse,
+                  progress_states: set):
+    """
+    Logs each distinct status of a pull once.
+
+    Args:
+        progress (ollama.ProgressResponse): The pull progress.
+        progress_states (set): The statuses logged so far.
+    """
+    if progress.get('status') not in progress_states:
+        progress_states.add(progress.get('status'))
+        logger.info("Ollama pull: %s", progress.get('status'))
+
 
 def ollama_pull(model: str):
     """
-    Pulls the specified Ollama model.
+    Pulls the specified Ollama model unless it is known to be available.
 
     Args:
         model (str): The Ollama model name.
     """
-    try:
-        list_response: ollama.ListResponse = ollama.list()
-        model_list = [m.model for m in list_response.models]
-        if model not in model_list:
-            print(f"Model {model} not found. Pulling model...")
-            response = ollama.pull(model, stream=True)
-            progress_states = set()
-            for progress in response:
-                if progress.get('status') in progress_states:
-                    continue
-                progress_states.add(progress.get('status'))
-                print(progress.get('status'))
-            print(f"Updated Model List: {ollama.list().models[0].model}")
-    except Exception as e:
-        print(f"Unable to pull {model} from Ollama. {e}")
+    if model_cache.is_available(model):
+        return
+    with model_cache.lock(model):
+        if model_cache.is_available(model):
+            return
+        try:
+            client = client_registry.get_client("ollama")
+            list_response: ollama.ListResponse = client.list()
+            listed = [model_cache.normalize(m.model)
+                      for m in list_response.models]
+            model_cache.mark_available(listed)
+            if model_cache.normalize(model) not in listed:
+                logger.info("Model %s not found. Pulling model...", model)
+                progress_states = set()
+                for progress in client.pull(model, stream=True):
+                    _log_progress(progress, progress_states)
+                model_cache.mark_available([model])
+        except Exception as e:
+            logger.warning("Unable to pull %s from Ollama. %s", model, e)
+
+
+async def aollama_pull(model: str):
+    """
+    Asynchronously pulls the specified Ollama model unless it is known to
+    be available.
+
+    Args:
+        model (str): The Ollama model name.
+    """
+    if model_cache.is_available(model):
+        return
+    async with model_cache.async_lock(model):
+        if model_cache.is_available(model):
+            return
+        try:
+            client = client_registry.get_async_client("ollama")
+            list_response: ollama.ListResponse = await client.list()
+            listed = [model_cache.normalize(m.model)
+                      for m in list_response.models]
+            model_cache.mark_available(listed)
+            if model_cache.normalize(model) not in listed:
+                logger.info("Model %s not found. Pulling model...", model)
+                progress_states = set()
+                async for progress in await client.pull(model, stream=True):
+                    _log_progress(progress, progress_states)
+                model_cache.mark_available([model])
+        except Exception as e:
+            logger.warning("Unable to pull %s from Ollama. %s", model, e)
 
 
 def generate_response(model: str, prompt: str, system_prompt: str,
+                      keep_alive: Optional[Keep_Alive] = None,
                       **params) -> ollama.GenerateResponse:
     """
     Generates a response from the Ollama model.
@@ -39,21 +258,26 @@ def generate_response(model: str, prompt: str, system_prompt: str,
         model (str): The Ollama model name.
         prompt (str): The user's prompt.
         system_prompt (str): The system prompt.
+        keep_alive (Optional[Keep_Alive]): How long the server keeps
+            the model loaded, or None for its default.
         params (dict): A dictionary of other Ollama parameters.
 
     Returns:
         ollama.GenerateResponse: The generated response.
     """
-    return ollama.generate(
+    client = client_registry.get_client("ollama")
+    return client.generate(
         model=model,
         prompt=prompt,
         system=system_prompt if system_prompt
         else "You are a helpful assistant.",
-        options=params
+        options=params,
+        keep_alive=keep_alive
     )
 
 
 async def async_generate_response(model: str, prompt: str, system_prompt: str,
+                                  keep_alive: Optional[Keep_Alive] = None,
                                   **params) -> ollama.GenerateResponse:
     """
     Asynchronously generates a response from the Ollama model.
@@ -62,23 +286,284 @@ async def async_generate_response(model: str, prompt: str, system_prompt: str,
         model (str): The Ollama model name.
         prompt (str): The user's prompt.
         system_prompt (str): The system prompt.
+        keep_alive (Optional[Keep_Alive]): How long the server keeps
+            the model loaded, or None for its default.
         params (dict): A dictionary of other Ollama parameters.
 
     Returns:
         ollama.GenerateResponse: The generated response.
     """
-    async_client = ollama.AsyncClient()  # Create an instance of AsyncClient
+    async_client = client_registry.get_async_client("ollama")
     return await async_client.generate(
         model=model,
         prompt=prompt,
         system=system_prompt if system_prompt
         else "You are a helpful assistant.",
-        options=params
+        options=params,
+        keep_alive=keep_alive
     )
 
 
+class _PendingRequest:
+    """
+    A request waiting in the queue of a model.
+
+    Attributes:
+        prompt (str): The user's prompt.
+        system_prompt (str): The system prompt.
+        params (Dict[str, Any]): The Ollama options.
+        key (str): The load options of the request, as grouped in a batch.
+        future (Future): Resolves to the generated response.
+        arrived (float): The monotonic time the request was queued.
+    """
+
+    def __init__(self, prompt: str, system_prompt: str,
+                 params: Dict[str, Any]):
+        self.prompt = prompt
+        self.system_prompt = system_prompt
+        self.params = params
+        self.key = json.dumps({name: value for name, value in params.items()
+                               if name in LOAD_OPTIONS},
+                              sort_keys=True, default=repr)
+        self.future: Future = Future()
+        self.arrived = time.monotonic()
+
+
+class OllamaBatcher:
+    """
+    Micro-batcher of the requests sent to a local Ollama server.
+
+    Requests for the same model are gathered for up to ``window`` seconds
+    after the first one, or until ``max_batch_size`` are waiting. The batch
+    is sorted so that requests with the same load options, such as
+    ``num_ctx``, run together. Ollama reloads a model when those change, so
+    interleaved requests would reload it again and again. Sampling options
+    such as temperature do not reload it. Requests are then sent as the
+    model's ``n_slots`` parallel slots free up, so the server never queues
+    them itself, and requests with new load options wait for the ones
+    before them.
+    While every slot is busy, new requests gather into the next batch, so
+    batches grow with the load.
+
+    Every request asks the server to keep the model loaded for
+    ``keep_alive``, so that it is not unloaded between fan-outs.
+
+    Attributes:
+        batch_sizes (List[int]): The number of requests of every batch.
+    """
+
+    def __init__(self, n_slots: Optional[int] = None,
+                 max_batch_size: int = 16, window: float = 0.005,
+                 keep_alive: Keep_Alive = "10m"):
+        """
+        Initializes an OllamaBatcher.
+
+        Args:
+            n_slots (Optional[int]): The parallel requests the server runs
+                per model, or None for ``OLLAMA_NUM_PARALLEL``, which
+                defaults to 4.
+            max_batch_size (int): The maximum number of requests per batch.
+            window (float): Seconds a batch waits for more requests after
+                its first one.
+            keep_alive (Keep_Alive): How long the server keeps the
+                model loaded after a request, e.g. "10m", or -1 for ever.
+        """
+        self.n_slots = n_slots or int(os.environ.get("OLLAMA_NUM_PARALLEL",
+                                                     "4"))
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self.keep_alive = keep_alive
+        self.batch_sizes: List[int] = []
+        self._queues: Dict[str, List[_PendingRequest]] = {}
+        self._dispatchers: Dict[str, threading.Thread] = {}
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def submit(self, model: str, prompt: str, system_prompt: str,
+               **params) -> Future:
+        """
+        Queues a request.
+
+        Args:
+            model (str): The Ollama model name.
+            prompt (str): The user's prompt.
+            system_prompt (str): The system prompt.
+            params (dict): A dictionary of other Ollama parameters.
+
+        Returns:
+            Future: Resolves to the ``ollama.GenerateResponse``.
+
+        Raises:
+            RuntimeError: If the batcher is closed.
+        """
+        request = _PendingRequest(prompt, system_prompt, params)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The Ollama batcher is closed.")
+            self._queues.setdefault(model, []).append(request)
+            if model not in self._dispatchers:
+                dispatcher = threading.Thread(
+                    target=self._dispatch, args=(model,),
+                    name=f"saw-ollama-{model}", daemon=True)
+                self._dispatchers[model] = dispatcher
+                dispatcher.start()
+            self._condition.notify_all()
+        return request.future
+
+    def generate(self, model: str, prompt: str, system_prompt: str,
+                 **params) -> ollama.GenerateResponse:
+        """
+        Generates a response within a batch.
+
+        Args:
+            model (str): The Ollama model name.
+            prompt (str): The user's prompt.
+            system_prompt (str): The system prompt.
+            params (dict): A dictionary of other Ollama parameters.
+
+        Returns:
+            ollama.GenerateResponse: The generated response.
+        """
+        return self.submit(model, prompt, system_prompt, **params).result()
+
+    async def agenerate(self, model: str, prompt: str, system_prompt: str,
+                        **params) -> ollama.GenerateResponse:
+        """
+        Asynchronously generates a response within a batch.
+
+        Args:
+            model (str): The Ollama model name.
+            prompt (str): The user's prompt.
+            system_prompt (str): The system prompt.
+            params (dict): A dictionary of other Ollama parameters.
+
+        Returns:
+            ollama.GenerateResponse: The generated response.
+        """
+        return await asyncio.wrap_future(
+            self.submit(model, prompt, system_prompt, **params))
+
+    def _next_batch(self, model: str) -> Optional[List[_PendingRequest]]:
+        """
+        Waits for the next batch of a model.
+
+        Args:
+            model (str): The Ollama model name.
+
+        Returns:
+            Optional[List[_PendingRequest]]: The batch, or None once the
+                batcher is closed.
+        """
+        with self._condition:
+            queue = self._queues.setdefault(model, [])
+            while not queue and not self._closed:
+                self._condition.wait()
+            if not queue:
+                return None
+            deadline = queue[0].arrived + self.window
+            while len(queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = queue[:self.max_batch_size]
+            del queue[:self.max_batch_size]
+        self.batch_sizes.append(len(batch))
+        # The sort is stable, so requests keep their order within a group
+        return sorted(batch, key=lambda request: request.key)
+
+    def _dispatch(self, model: str):
+        """
+        Sends the batches of a model as its slots free up.
+
+        Args:
+            model (str): The Ollama model name.
+        """
+        slots = threading.BoundedSemaphore(self.n_slots)
+        loaded = None
+        with ThreadPoolExecutor(max_workers=self.n_slots,
+                                thread_name_prefix=f"saw-ollama-{model}"
+                                ) as executor:
+            while True:
+                batch = self._next_batch(model)
+                if batch is None:
+                    return
+                for request in batch:
+                    if request.key != loaded:
+                        # The server reloads the model for new load options,
+                        # so let the requests with the old ones finish first
+                        for _ in range(self.n_slots):
+                            slots.acquire()
+                        for _ in range(self.n_slots):
+                            slots.release()
+                        loaded = request.key
+                    slots.acquire()
+                    executor.submit(self._send, model, request, slots)
+
+    def _send(self, model: str, request: _PendingRequest,
+              slots: threading.BoundedSemaphore):
+        """
+        Sends one request and resolves its future.
+
+        Args:
+            model (str): The Ollama model name.
+            request (_PendingRequest): The request.
+            slots (threading.BoundedSemaphore): The slot to release.
+        """
+        try:
+            # A keep_alive of the caller takes precedence over the batcher's
+            keep_alive = request.params.pop("keep_alive", self.keep_alive)
+            response = generate_response(model, request.prompt,
+                                         request.system_prompt,
+                                         keep_alive=keep_alive,
+                                         **request.params)
+        except Exception as e:
+            request.future.set_exception(e)
+        else:
+            request.future.set_result(response)
+        finally:
+            slots.release()
+
+    def close(self):
+        """
+        Sends the queued requests and stops the dispatchers.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            dispatchers = list(self._dispatchers.values())
+        for dispatcher in dispatchers:
+            dispatcher.join()
+
+
+# Micro-batcher of the Ollama calls, disabled until one is set
+_batcher: Optional[OllamaBatcher] = None
+
+
+def set_ollama_batcher(batcher: Optional[OllamaBatcher]):
+    """
+    Sets the micro-batcher used by ``ollama_call`` and ``aollama_call``.
+
+    Args:
+        batcher (Optional[OllamaBatcher]): The batcher, or None to send
+            every request on its own.
+    """
+    global _batcher
+    _batcher = batcher
+
+
+def get_ollama_batcher() -> Optional[OllamaBatcher]:
+    """
+    Returns the micro-batcher used by ``ollama_call`` and ``aollama_call``.
+
+    Returns:
+        Optional[OllamaBatcher]: The batcher, or None when disabled.
+    """
+    return _batcher
+
+
 def ollama_call(model: str, prompt: str, system_prompt: str,
-                **params) -> str | None:
+                **params) -> str:
     """Ollama LLM call function, now with params support.
 
     Args:
@@ -88,21 +573,20 @@ def ollama_call(model: str, prompt: str, system_prompt: str,
         params (dict): A dictionary of other Ollama parameters.
 
     Returns:
-        str: The generated text, or None on error.
+        str: The generated text.
     """
-    try:
-        ollama_pull(model)
+    ollama_pull(model)
+    if _batcher is not None:
+        response = _batcher.generate(model, prompt, system_prompt, **params)
+    else:
         response = generate_response(model, prompt, system_prompt, **params)
-        print(f"Response: {response.__dict__.keys()}")
-        print(f"Using model: {response['model']}")
-        return response.response
-    except Exception as e:
-        print(f"Ollama Error: {e}")
-        return None
+    tracer.current_span().set_attribute("response_model", response.model)
+    report_usage(response.prompt_eval_count, response.eval_count)
+    return response.response
 
 
 async def aollama_call(model: str, prompt: str, system_prompt: str,
-                       **params) -> str | None:
+                       **params) -> str:
     """Asynchronous Ollama LLM call function, now with params support.
 
     Args:
@@ -112,18 +596,74 @@ async def aollama_call(model: str, prompt: str, system_prompt: str,
         params (dict): A dictionary of other Ollama parameters.
 
     Returns:
-        str: The generated text, or None on error.
+        str: The generated text.
     """
-    try:
-        ollama_pull(model)
+    await aollama_pull(model)
+    if _batcher is not None:
+        response = await _batcher.agenerate(model, prompt, system_prompt,
+                                            **params)
+    else:
         response = await async_generate_response(model, prompt,
                                                  system_prompt, **params)
-        print(f"Response: {response.__dict__.keys()}")
-        print(f"Using model: {response['model']}")
-        return response.response
-    except Exception as e:
-        print(f"Ollama Error: {e}")
-        return None
+    tracer.current_span().set_attribute("response_model", response.model)
+    report_usage(response.prompt_eval_count, response.eval_count)
+    return response.response
+
+
+def ollama_stream(model: str, prompt: str, system_prompt: str,
+                  **params) -> Iterator[str]:
+    """Ollama LLM streaming function yielding text chunks.
+
+    Args:
+        model (str): The Ollama model name.
+        prompt (str): The user's prompt.
+        system_prompt (str): The system prompt.
+        params (dict): A dictionary of other Ollama parameters.
+
+    Yields:
+        str: The generated text chunks.
+    """
+    ollama_pull(model)
+    client = client_registry.get_client("ollama")
+    response = client.generate(
+        model=model,
+        prompt=prompt,
+        system=system_prompt if system_prompt
+        else "You are a helpful assistant.",
+        options=params,
+        stream=True
+    )
+    for part in response:
+        if part.response:
+            yield part.response
+
+
+async def aollama_stream(model: str, prompt: str, system_prompt: str,
+                         **params) -> AsyncIterator[str]:
+    """Asynchronous Ollama LLM streaming function yielding text chunks.
+
+    Args:
+        model (str): The Ollama model name.
+        prompt (str): The user's prompt.
+        system_prompt (str): The system prompt.
+        params (dict): A dictionary of other Ollama parameters.
+
+    Yields:
+        str: The generated text chunks.
+    """
+    await aollama_pull(model)
+    client = client_registry.get_async_client("ollama")
+    response = await client.generate(
+        model=model,
+        prompt=prompt,
+        system=system_prompt if system_prompt
+        else "You are a helpful assistant.",
+        options=params,
+        stream=True
+    )
+    async for part in response:
+        if part.response:
+            yield part.response
 
 
 if __name__ == '__main__':
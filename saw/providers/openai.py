@@ -3,20 +3,58 @@
 """ OpenAI Call Module
 
 """
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+import httpx
 import openai
 from openai._streaming import Stream, AsyncStream
 from openai.types.chat.chat_completion import ChatCompletion
 from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
 
+from saw.core.clients import client_registry
+from saw.core.tracing import tracer
+from saw.core.usage import report_usage
+
 
-def create_client() -> openai.Client:
+def create_client(limits: Optional[httpx.Limits] = None,
+                  **settings) -> openai.Client:
     """
     Creates and returns an OpenAI client.
 
+    Args:
+        limits (Optional[httpx.Limits]): The connection pool limits.
+        settings (dict): Other OpenAI client arguments.
+
     Returns:
         openai.Client: The OpenAI client.
     """
-    return openai.Client()
+    http_client = openai.DefaultHttpxClient(limits=limits) if limits else None
+    # Retries are handled by the retry policy of model_call
+    settings.setdefault("max_retries", 0)
+    return openai.Client(http_client=http_client, **settings)
+
+
+def create_async_client(limits: Optional[httpx.Limits] = None,
+                        **settings) -> openai.AsyncClient:
+    """
+    Creates and returns an asynchronous OpenAI client.
+
+    Args:
+        limits (Optional[httpx.Limits]): The connection pool limits.
+        settings (dict): Other OpenAI client arguments.
+
+    Returns:
+        openai.AsyncClient: The asynchronous OpenAI client.
+    """
+    http_client = (openai.DefaultAsyncHttpxClient(limits=limits)
+                   if limits else None)
+    # Retries are handled by the retry policy of model_call
+    settings.setdefault("max_retries", 0)
+    return openai.AsyncClient(http_client=http_client, **settings)
+
+
+client_registry.register_factory("openai", create_client,
+                                 create_async_client)
 
 
 def generate_content(
@@ -50,7 +88,7 @@ def generate_content(
 
 
 async def async_generate_content(
-        client: openai.Client,
+        client: openai.AsyncClient,
         model: str,
         prompt: str,
         system_prompt: str,
@@ -60,7 +98,7 @@ async def async_generate_content(
     Asynchronously generates content using the OpenAI client.
 
     Args:
-        client (openai.Client): The OpenAI client.
+        client (openai.AsyncClient): The asynchronous OpenAI client.
         model (str): The OpenAI model name.
         prompt (str): The user's prompt.
         system_prompt (str): The system prompt.
@@ -80,7 +118,7 @@ async def async_generate_content(
 
 
 def openai_call(model: str, prompt: str, system_prompt: str,
-                **params) -> str | None:
+                **params) -> str:
     """OpenAI LLM call function, now with params support.
 
     Args:
@@ -90,23 +128,20 @@ def openai_call(model: str, prompt: str, system_prompt: str,
         params (dict): A dictionary of other OpenAI parameters.
 
     Returns:
-        str: The generated text, or None on error.
+        str: The generated text.
     """
-    try:
-        client = create_client()
-        response = generate_content(client, model, prompt,
-                                    system_prompt, **params)
-        print(f"Response: {response.__dict__.keys()}")
-        print(f"Model: {response.model}")
-        print(f"Usage: {response.usage}")
-        return response.choices[0].text
-    except Exception as e:
-        print(f"OpenAI Error: {e}")
-        return None
+    client = client_registry.get_client("openai")
+    response = generate_content(client, model, prompt,
+                                system_prompt, **params)
+    tracer.current_span().set_attribute("response_model", response.model)
+    if response.usage:
+        report_usage(response.usage.prompt_tokens,
+                     response.usage.completion_tokens)
+    return response.choices[0].message.content
 
 
 async def aopenai_call(model: str, prompt: str, system_prompt: str,
-                       **params) -> str | None:
+                       **params) -> str:
     """Asynchronous OpenAI LLM call function, now with params support.
 
     Args:
@@ -116,19 +151,83 @@ async def aopenai_call(model: str, prompt: str, system_prompt: str,
         params (dict): A dictionary of other OpenAI parameters.
 
     Returns:
-        str: The generated text, or None on error.
+        str: The generated text.
+    """
+    client = client_registry.get_async_client("openai")
+    response = await async_generate_content(client, model, prompt,
+                                            system_prompt, **params)
+    tracer.current_span().set_attribute("response_model", response.model)
+    if response.usage:
+        report_usage(response.usage.prompt_tokens,
+                     response.usage.completion_tokens)
+    return response.choices[0].message.content
+
+
+def openai_stream(model: str, prompt: str, system_prompt: str,
+                  **params) -> Iterator[str]:
+    """OpenAI LLM streaming function yielding text chunks.
+
+    Args:
+        model (str): The OpenAI model name.
+        prompt (str): The user's prompt.
+        system_prompt (str): The system prompt.
+        params (dict): A dictionary of other OpenAI parameters.
+
+    Yields:
+        str: The generated text chunks.
+    """
+    client = client_registry.get_client("openai")
+    response = generate_content(client, model, prompt, system_prompt,
+                                stream=True, **params)
+    for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def aopenai_stream(model: str, prompt: str, system_prompt: str,
+                         **params) -> AsyncIterator[str]:
+    """Asynchronous OpenAI LLM streaming function yielding text chunks.
+
+    Args:
+        model (str): The OpenAI model name.
+        prompt (str): The user's prompt.
+        system_prompt (str): The system prompt.
+        params (dict): A dictionary of other OpenAI parameters.
+
+    Yields:
+        str: The generated text chunks.
+    """
+    client = client_registry.get_async_client("openai")
+    response = await async_generate_content(client, model, prompt,
+                                            system_prompt, stream=True,
+                                            **params)
+    async for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def batch_request(model: str, prompt: str, system_prompt: str,
+                  **params) -> Dict[str, Any]:
+    """
+    Builds the body of a chat completion request in a OpenAI batch.
+
+    Args:
+        model (str): The OpenAI model name.
+        prompt (str): The user's prompt.
+        system_prompt (str): The system prompt.
+        params (dict): A dictionary of other OpenAI parameters.
+
+    Returns:
+        Dict[str, Any]: The request body.
     """
-    try:
-        client = create_client()
-        response = await async_generate_content(client, model, prompt,
-                                                system_prompt, **params)
-        print(f"Response: {response.__dict__.keys()}")
-        print(f"Model: {response.model}")
-        print(f"Usage: {response.usage}")
-        return response.choices[0].text
-    except Exception as e:
-        print(f"OpenAI Error: {e}")
-        return None
+    return {
+        "model": model,
+        "messages": [
+            {"role": "developer", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        **params
+    }
 
 
 if __name__ == '__main__':
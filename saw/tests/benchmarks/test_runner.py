@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Benchmark Runner Unit Tests
+
+"""
+import pytest
+
+from saw.benchmarks.fake_backend import (FakeBackend, FakeProviderError,
+                                         lognormal, scripted_response)
+from saw.benchmarks.runner import (MODES, WORKFLOWS, compare, percentile,
+                                   run_benchmarks)
+from saw.core.model_interface import model_call
+from saw.core.retry import RetryPolicy
+
+
+def test_seeded_backend_is_repeatable():
+    first = FakeBackend(latency=lognormal(0.02), failure_rate=0.3, seed=7)
+    second = FakeBackend(latency=lognormal(0.02), failure_rate=0.3, seed=7)
+    assert ([first._plan("a b c") for _ in range(20)]
+            == [second._plan("a b c") for _ in range(20)])
+
+
+def test_failure_rate_is_retried():
+    backend = FakeBackend(name="bench-flaky", ttft=0, token_delay=0,
+                          failure_rate=0.5, seed=1).register()
+    with pytest.raises(FakeProviderError):
+        for _ in range(20):
+            backend.call("fake", "Input: x", "")
+    policy = RetryPolicy(max_attempts=20, base_delay=0, jitter=False)
+    for i in range(10):
+        assert model_call(f"Input: {i}", "bench-flaky", retry=policy,
+                          cache=False) == str(i)
+    assert backend.failures > 0
+
+
+@pytest.mark.parametrize(
+    "prompt, expected",
+    [
+        ("<selection>\nAvailable route options: ['billing', 'tech']",
+         "<selection>billing</selection>"),
+        ("<evaluation>PASS or FAIL</evaluation>",
+         "<evaluation>PASS</evaluation>"),
+        ("<tasks><task><type>a</type></task></tasks>",
+         "<tasks><task><type>a</type></task></tasks>"),
+        ("Step.\nInput: hello", "hello"),
+    ],
+    ids=["selection", "evaluation", "tasks", "echo"],
+)
+def test_scripted_response(prompt, expected):
+    assert expected in scripted_response(prompt)
+
+
+def test_percentile_is_nearest_rank():
+    samples = list(range(1, 101))
+    assert percentile(samples, 50) == 50
+    assert percentile(samples, 99) == 99
+    assert percentile([3.0], 95) == 3.0
+
+
+def test_runner_covers_every_workflow_and_mode():
+    report = run_benchmarks(iterations=2, warmup=0, concurrency=2,
+                            median_latency=0.001, tokens_per_second=1e5)
+    assert report["metadata"]["config"]["seed"] == 0
+    assert set(report["results"]) == set(WORKFLOWS)
+    for workflow in WORKFLOWS:
+        for mode in MODES:
+            result = report["results"][workflow][mode]
+            assert result["calls_per_run"] >= 2
+            assert set(result["latency_ms"]) == {"mean", "p50", "p95", "p99"}
+            assert result["overhead_us_per_call"] > 0
+
+    ratios = compare(report, report)
+    assert ratios["chain"]["sync"] == {"p50": 1.0, "p95": 1.0, "p99": 1.0,
+                                       "overhead": 1.0}
@@ -0,0 +1,45 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Budget Unit Tests
+
+"""
+import time
+
+import pytest
+
+from saw.core.budget import (STOP_COST, STOP_TIME, STOP_TOKENS, Budget,
+                             BudgetTracker, estimate_usage)
+from saw.core.usage import Usage
+
+
+@pytest.mark.parametrize("budget, usage, reason", [
+    (Budget(), Usage(10 ** 6, 10 ** 6), None),
+    (Budget(max_tokens=100), Usage(60, 39), None),
+    (Budget(max_tokens=100), Usage(60, 40), STOP_TOKENS),
+    (Budget(max_cost=1.0, input_price=2.0, output_price=8.0),
+     Usage(100_000, 50_000), None),
+    (Budget(max_cost=1.0, input_price=2.0, output_price=8.0),
+     Usage(100_000, 100_000), STOP_COST),
+], ids=["unlimited", "under-tokens", "tokens", "under-cost", "cost"])
+def test_tracker_limits(budget, usage, reason):
+    tracker = BudgetTracker(budget)
+    tracker.charge(usage)
+    assert tracker.exceeded() == reason
+
+
+def test_tracker_time():
+    tracker = BudgetTracker(Budget(max_seconds=0.05))
+    assert tracker.exceeded() is None
+    assert 0 < tracker.remaining_seconds() <= 0.05
+    time.sleep(0.06)
+    assert tracker.exceeded() == STOP_TIME
+    assert tracker.remaining_seconds() == 0
+    assert BudgetTracker().remaining_seconds() is None
+
+
+def test_estimate_usage():
+    estimated = estimate_usage(Usage(), "x" * 40, "y" * 9)
+    assert (estimated.prompt_tokens, estimated.completion_tokens) == (10, 3)
+
+    reported = Usage(5, 6, reported=True)
+    assert estimate_usage(reported, "x" * 40, "y" * 9) is reported
@@ -0,0 +1,113 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Response Cache Unit Tests
+
+"""
+import asyncio
+
+import pytest
+
+from saw.core import cache as cache_module
+from saw.core.backend import aregister_backend, register_backend
+from saw.core.cache import (LRUCache, SQLiteCache, make_cache_key,
+                            set_response_cache)
+from saw.core.model_interface import amodel_call, model_call
+
+
+@pytest.fixture
+def counting_backend():
+    calls = []
+
+    def call(model, prompt, system_prompt, **params):
+        calls.append(prompt)
+        return f"answer {len(calls)}"
+
+    async def acall(model, prompt, system_prompt, **params):
+        return call(model, prompt, system_prompt, **params)
+
+    register_backend("counting", call)
+    aregister_backend("counting", acall)
+    yield calls
+    set_response_cache(None)
+
+
+# Test make_cache_key()
+def test_make_cache_key_stable():
+    assert (make_cache_key("p", "m", "s", "q", {"a": 1, "b": 2})
+            == make_cache_key("p", "m", "s", "q", {"b": 2, "a": 1}))
+    assert (make_cache_key("p", "m", "s", "q", {"a": 1})
+            != make_cache_key("p", "m", "s", "q", {"a": 2}))
+
+
+# Test LRUCache
+def test_lru_cache_max_entries():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats.evictions == 1
+
+
+def test_lru_cache_max_bytes():
+    cache = LRUCache(max_bytes=5)
+    cache.set("a", "123")
+    cache.set("b", "456")
+    assert len(cache) == 1
+    assert cache.size == 3
+
+
+def test_lru_cache_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = LRUCache(ttl=10)
+    cache.set("a", "1")
+    assert cache.get("a") == "1"
+    now[0] += 11
+    assert cache.get("a") is None
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+
+# Test SQLiteCache
+def test_sqlite_cache_persists(tmp_path):
+    cache = SQLiteCache(tmp_path / "cache.db")
+    cache.set("a", "1")
+    cache.close()
+    assert SQLiteCache(tmp_path / "cache.db").get("a") == "1"
+
+
+def test_sqlite_cache_max_entries(tmp_path):
+    cache = SQLiteCache(tmp_path / "cache.db", max_entries=2)
+    for key in "abc":
+        cache.set(key, key)
+    assert len(cache) == 2
+    assert cache.get("a") is None
+
+
+# Test model_call() caching
+def test_model_call_cached(counting_backend):
+    set_response_cache(LRUCache())
+    first = model_call("q", "counting", model="m")
+    assert model_call("q", "counting", model="m") == first
+    assert model_call("q", "counting", model="m", temperature=1) != first
+    assert len(counting_backend) == 2
+
+
+def test_model_call_cache_opt_out(counting_backend):
+    set_response_cache(LRUCache())
+    model_call("q", "counting")
+    model_call("q", "counting", cache=False)
+    assert len(counting_backend) == 2
+
+
+def test_amodel_call_cached(counting_backend, tmp_path):
+    response_cache = SQLiteCache(tmp_path / "cache.db")
+    set_response_cache(response_cache)
+
+    async def calls():
+        return [await amodel_call("q", "counting") for _ in range(3)]
+
+    assert asyncio.run(calls()) == ["answer 1"] * 3
+    assert response_cache.stats.hits == 2
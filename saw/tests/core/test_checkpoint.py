@@ -0,0 +1,182 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Checkpoint Unit Tests
+
+"""
+import asyncio
+
+import pytest
+
+from saw.core.backend import (aregister_backend, aregister_stream_backend,
+                              register_backend, register_stream_backend)
+from saw.core.checkpoint import (Checkpoint, FileCheckpointStore,
+                                 SQLiteCheckpointStore, acheckpoint_run,
+                                 checkpoint_run, set_checkpoint_store)
+from saw.core.model_interface import (amodel_call, amodel_call_stream,
+                                      model_call, model_call_stream)
+from saw.workflow import AgentWorkflow
+
+
+@pytest.fixture(params=["sqlite", "files"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        store = SQLiteCheckpointStore(tmp_path / "checkpoints.db")
+    else:
+        store = FileCheckpointStore(tmp_path / "checkpoints")
+    set_checkpoint_store(store)
+    yield store
+    set_checkpoint_store(None)
+    store.close()
+
+
+@pytest.fixture
+def flaky_backend():
+    """Numbers its answers and fails on the prompts listed in ``fail``."""
+    state = {"calls": [], "fail": set()}
+
+    def call(model, prompt, system_prompt, **params):
+        step = prompt.split("\n")[0]
+        if step in state["fail"]:
+            raise KeyError(f"{step} failed")
+        state["calls"].append(step)
+        return f"{step} answer {len(state['calls'])}"
+
+    async def acall(model, prompt, system_prompt, **params):
+        return call(model, prompt, system_prompt, **params)
+
+    register_backend("flaky", call)
+    aregister_backend("flaky", acall)
+    return state
+
+
+def steps(*names):
+    return [{"prompt": name, "functions": [], "provider": "flaky",
+             "model": "m", "system_prompt": ""} for name in names]
+
+
+def test_store_round_trip(store):
+    for i in range(5):
+        store.save(Checkpoint("run", f"step-{i}", {"prompt": str(i)},
+                              f"out-{i}"))
+    store.save(Checkpoint("other", "step-0", {}, "other"))
+
+    checkpoints = store.load("run")
+    assert [c.output for c in checkpoints] == [f"out-{i}" for i in range(5)]
+    assert checkpoints[2].inputs == {"prompt": "2"}
+
+    store.delete("run")
+    assert store.load("run") == []
+    assert [c.output for c in store.load("other")] == ["other"]
+
+
+def test_writes_are_batched(tmp_path):
+    store = SQLiteCheckpointStore(tmp_path / "checkpoints.db", batch_size=10,
+                                  flush_interval=1.0)
+    batches = []
+    write = store._write
+    store._write = lambda checkpoints: (batches.append(len(checkpoints)),
+                                        write(checkpoints))
+    for i in range(25):
+        store.save(Checkpoint("run", f"step-{i}", {}, i))
+    store.close()
+    assert batches == [10, 10, 5]
+
+
+def test_partial_line_is_skipped(tmp_path):
+    store = FileCheckpointStore(tmp_path)
+    store.save(Checkpoint("run/1", "a", {}, "done"))
+    store.flush()
+    with open(store._path("run/1"), "a") as f:
+        f.write('{"step": "b", "inpu')
+    assert [c.step for c in store.load("run/1")] == ["a"]
+    store.close()
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_chain_resumes_from_failed_step(store, flaky_backend, async_mode):
+    agent = AgentWorkflow(operation="chaining")
+
+    def execute():
+        kwargs = {"query": "cats", "prompts": steps("one", "two", "three"),
+                  "run_id": "chain-1"}
+        if async_mode:
+            return asyncio.run(agent.execute(async_mode=True, **kwargs))
+        return agent.execute(**kwargs)
+
+    flaky_backend["fail"] = {"three"}
+    with pytest.raises(Exception, match="three failed"):
+        execute()
+    assert flaky_backend["calls"] == ["one", "two"]
+
+    flaky_backend["fail"] = set()
+    assert execute() == "three answer 3"
+    # The completed steps were replayed
+    assert flaky_backend["calls"] == ["one", "two", "three"]
+
+    assert execute() == "three answer 3"
+    assert len(flaky_backend["calls"]) == 3
+    assert [c.inputs["prompt"].split("\n")[0]
+            for c in store.load("chain-1")] == ["one", "two", "three"]
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_repeated_requests_replay_in_order(store, flaky_backend, async_mode):
+    async def acalls():
+        async with acheckpoint_run("repeat") as run:
+            return [await amodel_call("same", "flaky") for _ in range(3)], run
+
+    def calls():
+        if async_mode:
+            return asyncio.run(acalls())
+        with checkpoint_run("repeat") as run:
+            return [model_call("same", "flaky") for _ in range(3)], run
+
+    first, _ = calls()
+    assert first == ["same answer 1", "same answer 2", "same answer 3"]
+    replayed, run = calls()
+    assert replayed == first
+    assert (run.resumed, run.replayed, run.recorded) == (3, 3, 0)
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_streams_are_checkpointed(store, async_mode):
+    calls = []
+
+    def stream(model, prompt, system_prompt, **params):
+        calls.append(prompt)
+        yield from ["a ", "b"]
+
+    async def astream(model, prompt, system_prompt, **params):
+        for chunk in stream(model, prompt, system_prompt, **params):
+            yield chunk
+
+    register_stream_backend("checkpoint-stream", stream)
+    aregister_stream_backend("checkpoint-stream", astream)
+
+    async def acollect():
+        async with acheckpoint_run("stream"):
+            return [c async for c in amodel_call_stream(
+                "hi", "checkpoint-stream")]
+
+    def collect():
+        if async_mode:
+            return asyncio.run(acollect())
+        with checkpoint_run("stream"):
+            return list(model_call_stream("hi", "checkpoint-stream"))
+
+    assert collect() == ["a ", "b"]
+    # Replayed as a single chunk
+    assert collect() == ["a b"]
+    assert len(calls) == 1
+
+
+def test_run_id_requires_a_store():
+    agent = AgentWorkflow(operation="chaining")
+    with pytest.raises(ValueError, match="No checkpoint store"):
+        agent.execute(query="cats", prompts=steps("one"), run_id="run")
+    with pytest.raises(ValueError, match="No checkpoint store"):
+        asyncio.run(agent.execute(query="cats", prompts=steps("one"),
+                                  run_id="run", async_mode=True))
+    with pytest.raises(ValueError, match="streaming"):
+        agent.execute(query="cats", prompts=steps("one"), run_id="run",
+                      stream=True)
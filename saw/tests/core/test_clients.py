@@ -0,0 +1,92 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Provider Client Registry Unit Tests
+
+"""
+import asyncio
+
+import pytest
+
+from saw.benchmarks.stub_server import StubServer
+from saw.core.clients import ClientRegistry, PoolLimits
+from saw.providers.openai import (async_generate_content, create_async_client,
+                                  create_client, generate_content)
+
+
+class FakeClient:
+
+    def __init__(self, limits=None, **settings):
+        self.limits = limits
+        self.settings = settings
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def registry():
+    registry = ClientRegistry()
+    registry.register_factory("fake", FakeClient, FakeClient)
+    return registry
+
+
+def test_get_client_reused(registry):
+    assert registry.get_client("fake") is registry.get_client("fake")
+
+
+def test_get_client_per_settings(registry):
+    assert (registry.get_client("fake", host="a")
+            is not registry.get_client("fake", host="b"))
+
+
+def test_get_client_unregistered(registry):
+    with pytest.raises(ValueError):
+        registry.get_client("missing")
+
+
+def test_pool_limits(registry):
+    registry.configure("fake", limits=PoolLimits(max_connections=7))
+    registry.set_pool_limits("fake", keepalive_expiry=1.0)
+    limits = registry.get_client("fake").limits
+    assert limits.max_connections == 7
+    assert limits.keepalive_expiry == 1.0
+
+
+def test_get_async_client_per_loop(registry):
+
+    async def get():
+        first = registry.get_async_client("fake")
+        assert registry.get_async_client("fake") is first
+        return first
+
+    assert asyncio.run(get()) is not asyncio.run(get())
+
+
+def test_close(registry):
+    client = registry.get_client("fake")
+    registry.close()
+    assert client.closed
+    assert registry.get_client("fake") is not client
+
+
+def test_connection_reuse():
+    registry = ClientRegistry()
+    registry.register_factory("openai", create_client, create_async_client)
+    with StubServer() as server:
+        registry.configure("openai", base_url=f"{server.url}/v1",
+                           api_key="stub")
+        for _ in range(5):
+            response = generate_content(registry.get_client("openai"),
+                                        "stub", "ping", "")
+        assert response.choices[0].message.content == "echo: ping"
+
+        async def acall():
+            for _ in range(5):
+                await async_generate_content(
+                    registry.get_async_client("openai"), "stub", "ping", "")
+            await registry.aclose()
+
+        asyncio.run(acall())
+        assert server.requests == 10
+        assert server.connections == 2
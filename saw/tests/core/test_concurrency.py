@@ -0,0 +1,122 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Concurrency Control Unit Tests
+
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from saw.core.backend import aregister_backend, register_backend
+from saw.core.concurrency import (ConcurrencyController, Limiter,
+                                  concurrency_controller)
+from saw.core.model_interface import amodel_call, model_call
+from saw.workflows.multi_llm.parallelization import aparallel
+
+
+class Gauge:
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.current -= 1
+
+
+@pytest.fixture
+def gauge():
+    gauge = Gauge()
+
+    def call(model, prompt, system_prompt, **params):
+        with gauge:
+            time.sleep(0.02)
+        return prompt
+
+    async def acall(model, prompt, system_prompt, **params):
+        with gauge:
+            await asyncio.sleep(0.02)
+        return prompt
+
+    register_backend("gauged", call)
+    aregister_backend("gauged", acall)
+    yield gauge
+    concurrency_controller._limiters.clear()
+
+
+def test_model_call_global_limit(gauge):
+    concurrency_controller.set_limit(2)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: model_call(f"q{i}", "gauged"), range(8)))
+    assert gauge.peak == 2
+    stats = concurrency_controller.stats()["global"]
+    assert stats.acquired == 8
+    assert stats.in_flight == 0
+    assert stats.max_wait > 0
+
+
+def test_amodel_call_model_limit(gauge):
+    concurrency_controller.set_limit(3, provider="gauged", model="m")
+
+    async def calls():
+        return await asyncio.gather(
+            *[amodel_call(f"q{i}", "gauged", model="m") for i in range(9)],
+            *[amodel_call(f"q{i}", "gauged", model="n") for i in range(9)])
+
+    asyncio.run(calls())
+    assert gauge.peak == 12
+
+
+def test_aparallel_n_workers(gauge):
+    prompts = [{"prompt": f"p{i}", "functions": [], "provider": "gauged",
+                "model": "", "system_prompt": ""} for i in range(6)]
+    results = asyncio.run(aparallel("q", prompts, n_workers=2))
+    assert [inp for inp, _ in results] == [f"p{i}" for i in range(6)]
+    assert gauge.peak == 2
+
+
+def test_limiter_queue_depth_and_cancel():
+    limiter = Limiter(1)
+
+    async def run():
+        await limiter.aacquire()
+        waiter = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0)
+        assert limiter.stats.queue_depth == 1
+        waiter.cancel()
+        await asyncio.sleep(0)
+        assert limiter.stats.queue_depth == 0
+        limiter.release()
+
+    asyncio.run(run())
+    assert limiter.stats.in_flight == 0
+
+
+def test_limiter_shared_by_threads_and_tasks():
+    limiter = Limiter(1)
+    limiter.acquire()
+    threading.Timer(0.05, limiter.release).start()
+
+    async def run():
+        await limiter.aacquire()
+        limiter.release()
+
+    asyncio.run(run())
+    assert limiter.stats.acquired == 2
+    assert limiter.stats.in_flight == 0
+
+
+def test_controller_remove_limit():
+    controller = ConcurrencyController(global_limit=1)
+    controller.set_limit(None)
+    assert controller.stats() == {}
@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Batch Offload Unit Tests
+
+"""
+import asyncio
+
+import pytest
+
+from saw.benchmarks.stub_server import FakeBatchAPI, StubServer
+from saw.core.backend import register_backend
+from saw.core.model_interface import amodel_call, model_call
+from saw.core.offload import BatchOffloader, batch_offload
+from saw.core.retry import RetryPolicy, latency_tracker
+from saw.core.usage import record_usage
+from saw.utils.exceptions import ProviderError
+from saw.workflow import AgentWorkflow
+
+
+@pytest.fixture
+def batch_api():
+    api = FakeBatchAPI(polls=2)
+    with StubServer(routes=api.routes) as server:
+        api.url = server.url
+        yield api
+
+
+def offloader(api, **kwargs):
+    settings = {"openai": {"base_url": f"{api.url}/v1", "api_key": "test"},
+                "groq": {"base_url": api.url, "api_key": "test"}}
+    return BatchOffloader(window=0.1, poll_interval=0.01,
+                          client_settings=settings, **kwargs)
+
+
+@pytest.mark.parametrize("provider", ["openai", "groq"])
+def test_batch_run_is_one_batch(batch_api, provider):
+    prompts = [{"prompt": "Echo", "functions": [], "provider": provider,
+                "model": "m", "system_prompt": ""}]
+    agent = AgentWorkflow(operation="chaining")
+    with batch_offload(offloader(batch_api)) as batches, \
+            record_usage() as usage:
+        results = list(agent.execute_batch(
+            [f"q{i}" for i in range(6)], prompts=prompts))
+
+    assert [r.result for r in results] == [f"echo: Echo\nInput: q{i}"
+                                           for i in range(6)]
+    assert batch_api.batch_sizes == [6]
+    assert len(batches.batches) == 1
+    assert usage.prompt_tokens > 0
+
+
+def test_async_calls_are_batched(batch_api):
+    async def fan_out():
+        with batch_offload(offloader(batch_api)):
+            return await asyncio.gather(*[
+                amodel_call(f"q{i}", "groq", "m") for i in range(4)])
+
+    assert asyncio.run(fan_out()) == [f"echo: q{i}" for i in range(4)]
+    assert batch_api.batch_sizes == [4]
+
+
+def test_max_batch_size(batch_api):
+    async def fan_out():
+        with batch_offload(offloader(batch_api, max_batch_size=2)):
+            return await asyncio.gather(*[
+                amodel_call(f"q{i}", "openai", "m") for i in range(5)])
+
+    asyncio.run(fan_out())
+    assert sorted(batch_api.batch_sizes) == [1, 2, 2]
+
+
+def test_batches_are_per_model(batch_api):
+    async def fan_out():
+        with batch_offload(offloader(batch_api)):
+            return await asyncio.gather(*[
+                amodel_call(f"q{i}", "openai", f"m{i % 2}")
+                for i in range(6)])
+
+    assert asyncio.run(fan_out()) == [f"echo: q{i}" for i in range(6)]
+    assert batch_api.batch_sizes == [3, 3]
+    assert {batch["status"] for batch in batch_api.batches.values()} == {
+        "completed"}
+
+
+def test_offloaded_calls_are_not_hedged(batch_api):
+    policy = RetryPolicy(hedge=True, hedge_after=0.01)
+    with batch_offload(offloader(batch_api)):
+        assert model_call("q", "openai", "hedged", retry=policy) == "echo: q"
+    assert batch_api.batch_sizes == [1]
+    assert latency_tracker.quantile(("openai", "hedged"), 0.5, 1) is None
+
+
+def test_failed_requests_raise(batch_api):
+    with batch_offload(offloader(batch_api)):
+        with pytest.raises(ProviderError, match="invalid request"):
+            model_call("please fail", "openai", "m",
+                       retry=RetryPolicy(max_attempts=1))
+
+
+def test_other_providers_are_not_offloaded(batch_api):
+    calls = []
+
+    def call(model, prompt, system_prompt, **params):
+        calls.append(prompt)
+        return "direct"
+
+    register_backend("offload-direct", call)
+    with batch_offload(offloader(batch_api)):
+        assert model_call("hi", "offload-direct") == "direct"
+    assert batch_api.batch_sizes == []
+
+
+def test_unknown_provider():
+    with pytest.raises(ValueError, match="No batch API"):
+        BatchOffloader(providers=["ollama"])
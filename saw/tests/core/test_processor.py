@@ -0,0 +1,55 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Output Processor Unit Tests
+
+"""
+import pytest
+
+from saw.benchmarks.xml_extraction import make_response, regex_extract
+from saw.core.processor import (XMLTagExtractor, extract_tags, extract_xml,
+                                tag_pattern)
+
+# Test extract_tags
+extract_tags_cases = {
+    'plain': ("<a>x</a><b>y</b>", {"a": "x", "b": "y"}),
+    'attributes': ('<a id="1">x</a><b\ntype=\'t\'>y</b >',
+                   {"a": "x", "b": "y"}),
+    'nested': ("<a>x<b>y</b>z</a>", {"a": "x<b>y</b>z", "b": "y"}),
+    'first occurrence': ("<a>x</a><a>y</a>", {"a": "x", "b": ""}),
+    'unclosed': ("<a>x<b>y</b>", {"a": "", "b": "y"}),
+    'stray closing tag': ("</a><a>x</a>", {"a": "x", "b": ""}),
+    'similar names': ("<ab>x</ab><a>y</a>", {"a": "y", "b": ""}),
+    'missing': ("no tags here", {"a": "", "b": ""}),
+}
+
+
+@pytest.mark.parametrize('text, expected',
+                         list(extract_tags_cases.values()),
+                         ids=list(extract_tags_cases.keys()))
+def test_extract_tags(text, expected):
+    assert extract_tags(text, *expected) == expected
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 64],
+                         ids=['characters', 'small', 'large'])
+def test_xml_tag_extractor_streaming(chunk_size):
+    text = make_response(400)
+    tags = ["thoughts", "response", "evaluation", "feedback"]
+    extractor = XMLTagExtractor(tags)
+    closed = {}
+    for i in range(0, len(text), chunk_size):
+        new = extractor.feed(text[i:i + chunk_size])
+        # Tags are returned with the chunk completing their closing tag
+        for tag in new:
+            assert f"</{tag}>" in text[:i + chunk_size]
+            assert f"</{tag}>" not in text[:i]
+        closed.update(new)
+    assert extractor.done
+    assert extractor.text == text
+    assert closed == {tag: regex_extract(text, tag) for tag in tags}
+
+
+def test_extract_xml_matches_regex():
+    text = make_response(100)
+    assert extract_xml(text, "feedback") == regex_extract(text, "feedback")
+    assert tag_pattern(("a", "b")) is tag_pattern(("a", "b"))
@@ -0,0 +1,151 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Rate Limit Unit Tests
+
+"""
+import asyncio
+
+import pytest
+
+from saw.core import rate_limit as rate_limit_module
+from saw.core.backend import aregister_backend, register_backend
+from saw.core.model_interface import amodel_call, model_call
+from saw.core.rate_limit import RateLimiter, TokenBucket, rate_limiter
+from saw.core.usage import record_usage, report_usage
+from saw.utils.exceptions import ProviderError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    async def asleep(seconds):
+        sleep(seconds)
+
+    monkeypatch.setattr(rate_limit_module.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(rate_limit_module.time, "sleep", sleep)
+    monkeypatch.setattr(rate_limit_module.asyncio, "sleep", asleep)
+    return sleeps
+
+
+@pytest.fixture
+def usage_backend():
+    def call(model, prompt, system_prompt, **params):
+        report_usage(10, 90)
+        return prompt
+
+    async def acall(model, prompt, system_prompt, **params):
+        return call(model, prompt, system_prompt, **params)
+
+    register_backend("metered", call)
+    aregister_backend("metered", acall)
+    yield
+    rate_limiter._limits.clear()
+
+
+# Test TokenBucket
+def test_token_bucket_waits_for_overdraft(clock):
+    bucket = TokenBucket(60)
+    assert bucket.reserve(60) == 0
+    assert bucket.reserve(2) == pytest.approx(2)
+    assert bucket.reserve(1) == pytest.approx(3)
+
+
+def test_token_bucket_adjust(clock):
+    bucket = TokenBucket(60)
+    bucket.reserve(60)
+    bucket.adjust(-30)
+    assert bucket.reserve(30) == 0
+
+
+# Test RateLimiter
+@pytest.mark.parametrize(
+    "params, expected",
+    [
+        ({}, 3),
+        ({"max_tokens": 100}, 103),
+        ({"max_output_tokens": 50}, 53),
+    ],
+    ids=["prompt_only", "max_tokens", "max_output_tokens"]
+)
+def test_estimate_tokens(params, expected):
+    assert RateLimiter.estimate_tokens("a" * 10, "b", params) == expected
+
+
+def test_rate_limiter_requests_per_minute(clock):
+    limiter = RateLimiter()
+    limiter.set_limits("p", rpm=2)
+    for _ in range(4):
+        limiter.acquire("p", "m", 1)
+    assert clock == [pytest.approx(30), pytest.approx(30)]
+    assert limiter.stats()["p"].delayed == 2
+
+
+def test_rate_limiter_model_and_provider_limits(clock):
+    limiter = RateLimiter()
+    limiter.set_limits("p", tpm=1000)
+    limiter.set_limits("p", "m", tpm=100)
+    assert limiter.acquire("p", "m", 100).delay == 0
+    assert limiter.acquire("p", "n", 100).delay == 0
+    assert limiter.acquire("p", "m", 100).delay == pytest.approx(60)
+
+
+def test_unlimited_calls_not_reserved():
+    assert RateLimiter().reserve("p", "m", 10) is None
+
+
+def test_record_usage():
+    report_usage(1, 1)
+    with record_usage() as usage:
+        report_usage(3, 4)
+        report_usage(None, 1)
+    assert (usage.prompt_tokens, usage.completion_tokens) == (3, 5)
+    assert usage.total_tokens == 8
+
+
+# Test model_call() rate limiting
+def test_model_call_settles_reported_usage(clock, usage_backend):
+    rate_limiter.set_limits("metered", tpm=1000)
+    model_call("q" * 40, "metered", cache=False, coalesce=False)
+    stats = rate_limiter.stats()["metered"]
+    assert stats.tokens == 100
+    assert rate_limiter._limits["metered"].tokens.level == 900
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_failed_call_settles_reported_usage(clock, async_mode):
+    def call(model, prompt, system_prompt, **params):
+        report_usage(10, 20)
+        raise KeyError("failed after usage")
+
+    async def acall(model, prompt, system_prompt, **params):
+        call(model, prompt, system_prompt, **params)
+
+    register_backend("metered-failing", call)
+    aregister_backend("metered-failing", acall)
+    rate_limiter.set_limits("metered-failing", tpm=1000)
+    with pytest.raises(ProviderError, match="failed after usage"):
+        if async_mode:
+            asyncio.run(amodel_call("q" * 400, "metered-failing",
+                                    cache=False, coalesce=False))
+        else:
+            model_call("q" * 400, "metered-failing", cache=False,
+                       coalesce=False)
+    assert rate_limiter.stats()["metered-failing"].tokens == 30
+    assert rate_limiter._limits["metered-failing"].tokens.level == 970
+
+
+def test_amodel_call_waits_for_budget(clock, usage_backend):
+    rate_limiter.set_limits("metered", "m", rpm=1)
+
+    async def calls():
+        await amodel_call("a", "metered", "m")
+        await amodel_call("b", "metered", "m")
+
+    asyncio.run(calls())
+    assert clock == [pytest.approx(60)]
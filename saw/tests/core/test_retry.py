@@ -0,0 +1,212 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Retry Policy Unit Tests
+
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from saw.core import retry as retry_module
+from saw.core.backend import (aregister_backend, aregister_stream_backend,
+                              register_backend, register_stream_backend)
+from saw.core.model_interface import (amodel_call, amodel_call_stream,
+                                      model_call, model_call_stream)
+from saw.core.retry import (LatencyTracker, RetryPolicy, is_retryable,
+                            latency_tracker)
+from saw.utils.exceptions import ProviderError
+
+
+class StatusError(Exception):
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = httpx.Response(status_code, headers=headers or {})
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    sleeps = []
+
+    async def asleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(retry_module.time, "sleep", sleeps.append)
+    monkeypatch.setattr(retry_module.asyncio, "sleep", asleep)
+    return sleeps
+
+
+@pytest.fixture
+def flaky():
+    errors = []
+
+    def call(model, prompt, system_prompt, **params):
+        if errors:
+            raise errors.pop(0)
+        return prompt
+
+    async def acall(model, prompt, system_prompt, **params):
+        return call(model, prompt, system_prompt, **params)
+
+    register_backend("flaky", call)
+    aregister_backend("flaky", acall)
+    return errors
+
+
+# Test is_retryable()
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (StatusError(429), True),
+        (StatusError(503), True),
+        (StatusError(400), False),
+        (ConnectionError(), True),
+        (httpx.ConnectTimeout("timeout"), True),
+        (ValueError(), False),
+    ],
+    ids=["rate_limited", "unavailable", "bad_request", "connection",
+         "timeout", "value_error"]
+)
+def test_is_retryable(error, expected):
+    assert is_retryable(error) == expected
+
+
+# Test RetryPolicy
+def test_backoff_capped_exponential():
+    policy = RetryPolicy(base_delay=1, max_delay=5, jitter=False)
+    delays = [policy.backoff(attempt, StatusError(503))
+              for attempt in range(1, 5)]
+    assert delays == [1, 2, 4, 5]
+
+
+def test_backoff_jitter_bounded():
+    policy = RetryPolicy(base_delay=1, max_delay=5)
+    assert all(0 <= policy.backoff(3, StatusError(503)) <= 4
+               for _ in range(20))
+
+
+def test_backoff_retry_after():
+    policy = RetryPolicy(max_delay=5)
+    error = StatusError(429, headers={"retry-after": "2"})
+    assert policy.backoff(1, error) == 2
+
+
+def test_latency_tracker_quantile():
+    tracker = LatencyTracker()
+    for seconds in range(1, 101):
+        tracker.record("key", seconds)
+    assert tracker.quantile("key", 0.95) == 95
+    assert tracker.quantile("key", 0.95, min_samples=101) is None
+
+
+# Test model_call() retries
+def test_model_call_retries_transient_errors(flaky, no_sleep):
+    flaky.extend([StatusError(503), ConnectionError()])
+    assert model_call("q", "flaky", coalesce=False) == "q"
+    assert len(no_sleep) == 2
+
+
+def test_model_call_fatal_error(flaky, no_sleep):
+    flaky.append(StatusError(400))
+    with pytest.raises(ProviderError) as info:
+        model_call("q", "flaky")
+    assert info.value.attempts == 1
+    assert isinstance(info.value.__cause__, StatusError)
+    assert not no_sleep
+
+
+def test_amodel_call_retries_exhausted(flaky, no_sleep):
+    flaky.extend([StatusError(429)] * 3)
+    with pytest.raises(ProviderError) as info:
+        asyncio.run(amodel_call("q", "flaky",
+                                retry=RetryPolicy(max_attempts=3)))
+    assert info.value.attempts == 3
+
+
+# Test hedged requests
+@pytest.fixture
+def straggler():
+    calls = []
+
+    def call(model, prompt, system_prompt, **params):
+        calls.append(prompt)
+        time.sleep(1 if len(calls) == 1 else 0.01)
+        return f"answer {len(calls)}"
+
+    async def acall(model, prompt, system_prompt, **params):
+        calls.append(prompt)
+        await asyncio.sleep(1 if len(calls) == 1 else 0.01)
+        return f"answer {len(calls)}"
+
+    register_backend("straggler", call)
+    aregister_backend("straggler", acall)
+    yield calls
+    latency_tracker.clear()
+
+
+def test_model_call_hedged(straggler):
+    policy = RetryPolicy(hedge=True, hedge_after=0.05)
+    start = time.perf_counter()
+    assert model_call("q", "straggler", retry=policy) == "answer 2"
+    assert time.perf_counter() - start < 0.5
+
+
+def test_amodel_call_hedged_from_latency_quantile(straggler):
+    for _ in range(20):
+        latency_tracker.record(("straggler", ""), 0.05)
+    policy = RetryPolicy(hedge=True)
+    start = time.perf_counter()
+    assert asyncio.run(amodel_call("q", "straggler",
+                                   retry=policy)) == "answer 2"
+    assert time.perf_counter() - start < 0.5
+
+
+# Test streaming retries
+@pytest.fixture
+def flaky_stream():
+    failures = []
+
+    def stream(model, prompt, system_prompt, **params):
+        yield "a"
+        if failures:
+            raise failures.pop(0)
+        yield "b"
+
+    def stream_before_first_chunk(model, prompt, system_prompt, **params):
+        if failures:
+            raise failures.pop(0)
+        yield from stream(model, prompt, system_prompt, **params)
+
+    async def astream(model, prompt, system_prompt, **params):
+        for chunk in stream_before_first_chunk(model, prompt,
+                                               system_prompt, **params):
+            yield chunk
+
+    register_backend("flaky-stream", lambda *args, **params: "ab")
+    register_stream_backend("flaky-stream", stream)
+    aregister_backend("flaky-stream", lambda *args, **params: "ab")
+    aregister_stream_backend("flaky-stream", astream)
+    return failures
+
+
+def test_stream_not_retried_after_first_chunk(flaky_stream, no_sleep):
+    flaky_stream.append(StatusError(503))
+    chunks = []
+    with pytest.raises(ProviderError):
+        for chunk in model_call_stream("q", "flaky-stream"):
+            chunks.append(chunk)
+    assert chunks == ["a"]
+
+
+def test_astream_retried_before_first_chunk(flaky_stream, no_sleep):
+    flaky_stream.append(StatusError(503))
+
+    async def collect():
+        return [chunk async for chunk in amodel_call_stream("q",
+                                                            "flaky-stream")]
+
+    assert asyncio.run(collect()) == ["a", "b"]
+    assert len(no_sleep) == 1
@@ -0,0 +1,119 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Single-Flight Unit Tests
+
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from saw.core.backend import aregister_backend, register_backend
+from saw.core.model_interface import amodel_call, model_call
+from saw.core.singleflight import AsyncSingleFlight, SingleFlight
+
+
+@pytest.fixture
+def slow_backend():
+    calls = []
+
+    def call(model, prompt, system_prompt, **params):
+        calls.append(prompt)
+        time.sleep(0.2)
+        return f"answer to {prompt}"
+
+    async def acall(model, prompt, system_prompt, **params):
+        calls.append(prompt)
+        await asyncio.sleep(0.2)
+        return f"answer to {prompt}"
+
+    register_backend("slow", call)
+    aregister_backend("slow", acall)
+    return calls
+
+
+def test_single_flight_shares_exception():
+    flight = SingleFlight()
+    barrier = threading.Barrier(3)
+
+    def fail():
+        time.sleep(0.1)
+        raise RuntimeError("upstream")
+
+    def run():
+        barrier.wait()
+        return flight.do("key", fail)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(run) for _ in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result()
+
+
+def test_model_call_coalesced(slow_backend):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(
+            lambda _: model_call("q", "slow"), range(4)))
+    assert results == ["answer to q"] * 4
+    assert slow_backend == ["q"]
+
+
+def test_model_call_coalesce_opt_out(slow_backend):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(
+            lambda _: model_call("q", "slow", coalesce=False), range(2)))
+    assert slow_backend == ["q", "q"]
+
+
+@pytest.mark.parametrize("temperature, n_calls", [(0, 1), (0.7, 3)],
+                         ids=["greedy", "sampled"])
+def test_model_call_coalesces_deterministic_only(slow_backend,
+                                                 temperature, n_calls):
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        list(executor.map(
+            lambda _: model_call("q", "slow", cache=False,
+                                 temperature=temperature), range(3)))
+    assert slow_backend == ["q"] * n_calls
+
+
+def test_amodel_call_sampled_not_coalesced(slow_backend):
+
+    async def calls():
+        return await asyncio.gather(
+            *[amodel_call("q", "slow", cache=False, temperature=0.7)
+              for _ in range(3)])
+
+    asyncio.run(calls())
+    assert slow_backend == ["q"] * 3
+
+
+def test_amodel_call_coalesced(slow_backend):
+
+    async def calls():
+        return await asyncio.gather(
+            *[amodel_call(p, "slow") for p in ["a", "a", "b", "a"]])
+
+    assert asyncio.run(calls()) == ["answer to a", "answer to a",
+                                    "answer to b", "answer to a"]
+    assert sorted(slow_backend) == ["a", "b"]
+
+
+def test_async_single_flight_survives_cancelled_caller():
+    flight = AsyncSingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "done"
+    assert flight.coalesced == 1
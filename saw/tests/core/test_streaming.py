@@ -0,0 +1,111 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Model Streaming Unit Tests
+
+"""
+import asyncio
+
+import pytest
+
+from saw.core.backend import (aregister_backend, aregister_stream_backend,
+                              register_backend, register_stream_backend)
+from saw.core.cache import LRUCache, set_response_cache
+from saw.core.model_interface import amodel_call_stream, model_call_stream
+from saw.core.processor import (StreamSegmenter, TaskStreamParser, extract_xml,
+                                parse_tasks)
+
+
+def words(model, prompt, system_prompt, **params):
+    for word in prompt.split():
+        yield f"{word} "
+
+
+async def awords(model, prompt, system_prompt, **params):
+    for word in prompt.split():
+        await asyncio.sleep(0)
+        yield f"{word} "
+
+
+@pytest.fixture(autouse=True)
+def streaming_backend():
+    register_stream_backend("words", words)
+    aregister_stream_backend("words", awords)
+    register_backend("whole", lambda model, prompt, system_prompt: prompt)
+
+    async def whole(model, prompt, system_prompt):
+        return prompt
+
+    aregister_backend("whole", whole)
+    yield
+    set_response_cache(None)
+
+
+def test_model_call_stream():
+    assert list(model_call_stream("a b c", "words")) == ["a ", "b ", "c "]
+
+
+def test_model_call_stream_fallback():
+    assert list(model_call_stream("a b c", "whole")) == ["a b c"]
+
+
+def test_model_call_stream_cached():
+    set_response_cache(LRUCache())
+    list(model_call_stream("a b c", "words"))
+    assert list(model_call_stream("a b c", "words")) == ["a b c "]
+
+
+def test_amodel_call_stream():
+
+    async def collect(provider):
+        return [chunk async for chunk in amodel_call_stream("a b", provider)]
+
+    assert asyncio.run(collect("words")) == ["a ", "b "]
+    assert asyncio.run(collect("whole")) == ["a b"]
+
+
+# Test StreamSegmenter
+stream_segmenter = {
+    'tokens': (2, ["a b ", "c d "], "e"),
+    'paragraph': ("paragraph", ["a b\n\n", "c d\n\n"], "e"),
+    'closing tag': ("</x>", ["<x>a b</x>", " c <x>d</x>"], "e"),
+}
+
+
+@pytest.mark.parametrize('boundary, segments, remainder',
+                         list(stream_segmenter.values()),
+                         ids=list(stream_segmenter.keys()))
+def test_stream_segmenter(boundary, segments, remainder):
+    text = {2: "a b c d e", "paragraph": "a b\n\nc d\n\ne",
+            "</x>": "<x>a b</x> c <x>d</x>e"}[boundary]
+    segmenter = StreamSegmenter(boundary)
+    completed = []
+    for char in text:
+        completed += segmenter.feed(char)
+    assert completed == segments
+    assert segmenter.flush() == remainder
+
+
+# Test TaskStreamParser
+COMPOSER_RESPONSE = (
+    "<analysis>plan <task> mentioned</analysis>\n<tasks>\n"
+    "<task><type>a</type><description>first</description></task>\n"
+    "<task><type>b</type><description>second</description></task>\n"
+    "</tasks>\n<task><type>c</type><description>late</description></task>"
+)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, len(COMPOSER_RESPONSE)],
+                         ids=['characters', 'chunks', 'whole'])
+def test_task_stream_parser(chunk_size):
+    parser = TaskStreamParser()
+    completed = []
+    for i in range(0, len(COMPOSER_RESPONSE), chunk_size):
+        completed.append(parser.feed(COMPOSER_RESPONSE[i:i + chunk_size]))
+    expected = parse_tasks(extract_xml(COMPOSER_RESPONSE, "tasks"))
+    assert [t for tasks in completed for t in tasks] == expected
+    assert parser.tasks == expected
+    assert parser.text == COMPOSER_RESPONSE
+    if chunk_size == 1:
+        # Each task is returned with the character closing it
+        closing = COMPOSER_RESPONSE.index("</task>") + len("</task>") - 1
+        assert completed[closing] == expected[:1]
@@ -0,0 +1,142 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Tracing Unit Tests
+
+"""
+import asyncio
+
+import pytest
+
+from saw.core.backend import aregister_backend, register_backend
+from saw.core.cache import LRUCache, set_response_cache
+from saw.core.model_interface import amodel_call, model_call
+from saw.core.tracing import InMemoryExporter, Tracer, tracer
+from saw.core.usage import report_usage
+from saw.workflow import AgentWorkflow
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemoryExporter()
+    tracer.add_exporter(exporter)
+    yield exporter
+    tracer.remove_exporter(exporter)
+
+
+@pytest.fixture(autouse=True)
+def metered_backend():
+    def call(model, prompt, system_prompt, **params):
+        report_usage(3, 5)
+        return prompt.splitlines()[-1]
+
+    async def acall(model, prompt, system_prompt, **params):
+        return call(model, prompt, system_prompt, **params)
+
+    register_backend("traced", call)
+    aregister_backend("traced", acall)
+
+
+def prompt_details():
+    return {"prompt": "Repeat", "functions": [], "provider": "traced",
+            "model": "m", "system_prompt": ""}
+
+
+# Test Tracer
+def test_disabled_tracer_noop():
+    disabled = Tracer()
+    with disabled.span("work", size=1) as span:
+        span.set_attribute("key", "value")
+        assert not span.recording
+    assert not disabled.current_span().recording
+
+
+def test_nested_spans(exporter):
+    with tracer.span("outer") as outer:
+        with tracer.span("inner", size=1) as inner:
+            assert tracer.current_span() is inner
+    assert [span.name for span in exporter.spans] == ["inner", "outer"]
+    assert inner.parent_id == outer.span_id
+    assert inner.trace_id == outer.trace_id == outer.span_id
+    assert inner.attributes == {"size": 1}
+    assert outer.duration >= inner.duration >= 0
+
+
+def test_span_records_error(exporter):
+    with pytest.raises(KeyError):
+        with tracer.span("failing"):
+            raise KeyError("missing")
+    assert isinstance(exporter.find("failing")[0].error, KeyError)
+
+
+# Test instrumented calls
+def test_model_call_spans(exporter):
+    set_response_cache(LRUCache())
+    try:
+        model_call("q", "traced", "m")
+        model_call("q", "traced", "m")
+    finally:
+        set_response_cache(None)
+    calls = exporter.find("model_call")
+    assert [span.attributes["cache_hit"] for span in calls] == [False, True]
+    provider_call, = exporter.find("provider_call")
+    assert provider_call.parent_id == calls[0].span_id
+    assert provider_call.attributes["prompt_tokens"] == 3
+    assert provider_call.attributes["completion_tokens"] == 5
+
+
+def test_amodel_call_spans(exporter):
+    async def call():
+        with tracer.span("root") as root:
+            await amodel_call("q", "traced", "m")
+        return root
+
+    root = asyncio.run(call())
+    model_span, = exporter.find("model_call")
+    provider_call, = exporter.find("provider_call")
+    assert model_span.parent_id == root.span_id
+    assert provider_call.trace_id == root.span_id
+
+
+@pytest.mark.parametrize(
+    "operation, step_name",
+    [
+        ("chaining", "chain.step"),
+        ("parallelization", "parallel.branch"),
+    ],
+    ids=["chaining", "parallelization"]
+)
+def test_workflow_spans_share_trace(exporter, operation, step_name):
+    AgentWorkflow(operation).execute(
+        query="q", prompts=[prompt_details(), prompt_details()],
+        coalesce=False)
+    workflow, = exporter.find("workflow")
+    steps = exporter.find(step_name)
+    assert len(steps) == 2
+    assert all(step.parent_id == workflow.span_id for step in steps)
+    assert all(span.trace_id == workflow.span_id for span in exporter.spans)
+
+
+def test_open_telemetry_exporter():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import \
+        InMemorySpanExporter
+    from saw.core.tracing import OpenTelemetryExporter
+
+    collector = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(collector))
+    exporter = OpenTelemetryExporter(tracer_provider=provider)
+    tracer.add_exporter(exporter)
+    try:
+        with tracer.span("workflow", operation="chaining"):
+            model_call("q", "traced", "m")
+    finally:
+        tracer.remove_exporter(exporter)
+
+    spans = {span.name: span for span in collector.get_finished_spans()}
+    assert spans["workflow"].attributes["operation"] == "chaining"
+    assert (spans["model_call"].parent.span_id
+            == spans["workflow"].context.span_id)
+    assert spans["provider_call"].attributes["prompt_tokens"] == 3
@@ -0,0 +1,133 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Ollama Provider Unit Tests
+
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from saw.benchmarks.ollama_batching import run_benchmark
+from saw.benchmarks.stub_server import FakeOllamaAPI, StubServer
+from saw.core.clients import client_registry
+from saw.providers import ollama
+
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    api = FakeOllamaAPI(models=["llama3:latest"])
+    with StubServer(routes=api.routes) as server:
+        monkeypatch.setenv("OLLAMA_HOST", server.url)
+        monkeypatch.setattr(ollama, "model_cache",
+                            ollama.ModelAvailabilityCache())
+        client_registry.close()
+        yield api
+        client_registry.close()
+
+
+def test_ollama_call_lists_once(fake_ollama):
+    for _ in range(3):
+        assert ollama.ollama_call("llama3", "hi", "") == "echo: hi"
+    assert fake_ollama.calls == {"/api/tags": 1, "/api/generate": 3}
+
+
+def test_ollama_call_pulls_missing_model(fake_ollama):
+    ollama.ollama_call("mistral", "hi", "")
+    ollama.ollama_call("mistral", "hi", "")
+    assert fake_ollama.calls["/api/pull"] == 1
+    assert fake_ollama.calls["/api/tags"] == 1
+
+
+def test_ollama_call_ttl_expired(fake_ollama):
+    ollama.model_cache.ttl = 0
+    ollama.ollama_call("llama3", "hi", "")
+    ollama.ollama_call("llama3", "hi", "")
+    assert fake_ollama.calls["/api/tags"] == 2
+    assert "/api/pull" not in fake_ollama.calls
+
+
+def test_aollama_call_fan_out(fake_ollama):
+
+    async def fan_out():
+        return await asyncio.gather(*[
+            ollama.aollama_call("mistral", f"q{i}", "") for i in range(5)])
+
+    results = asyncio.run(fan_out())
+    assert results == [f"echo: q{i}" for i in range(5)]
+    assert fake_ollama.calls["/api/tags"] == 1
+    assert fake_ollama.calls["/api/pull"] == 1
+    assert fake_ollama.calls["/api/generate"] == 5
+
+
+@pytest.fixture
+def batcher():
+    batcher = ollama.OllamaBatcher(n_slots=2, window=0.05)
+    ollama.set_ollama_batcher(batcher)
+    yield batcher
+    ollama.set_ollama_batcher(None)
+    batcher.close()
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_batcher_groups_requests(fake_ollama, batcher, async_mode):
+    async def fan_out():
+        return await asyncio.gather(*[
+            ollama.aollama_call("llama3", f"q{i}", "", num_ctx=2048 * (i % 2))
+            for i in range(6)])
+
+    if async_mode:
+        results = asyncio.run(fan_out())
+    else:
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(
+                lambda i: ollama.ollama_call(
+                    "llama3", f"q{i}", "", num_ctx=2048 * (i % 2)),
+                range(6)))
+
+    assert results == [f"echo: q{i}" for i in range(6)]
+    assert batcher.batch_sizes == [6]
+    assert fake_ollama.max_active <= 2
+    assert fake_ollama.loads == 2
+    assert fake_ollama.keep_alives == ["10m"] * 6
+
+
+def test_batcher_sampling_options_run_concurrently(fake_ollama, batcher):
+    fake_ollama.generate_time = 0.05
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(
+            lambda i: ollama.ollama_call(
+                "llama3", f"q{i}", "", temperature=i / 4, seed=i),
+            range(4)))
+
+    assert fake_ollama.max_active == 2
+    assert fake_ollama.loads == 1
+
+
+@pytest.mark.parametrize("use_batcher", [False, True],
+                         ids=["direct", "batched"])
+def test_keep_alive_param(fake_ollama, batcher, use_batcher):
+    if not use_batcher:
+        ollama.set_ollama_batcher(None)
+    assert ollama.ollama_call("llama3", "hi", "", keep_alive="1m") == \
+        "echo: hi"
+    assert fake_ollama.keep_alives == ["1m"]
+
+
+def test_batcher_max_batch_size(fake_ollama):
+    batcher = ollama.OllamaBatcher(n_slots=4, max_batch_size=2, window=1.0)
+    futures = [batcher.submit("llama3", f"q{i}", "") for i in range(5)]
+    assert [f.result().response for f in futures[:4]] == [
+        f"echo: q{i}" for i in range(4)]
+    batcher.close()
+    assert futures[4].result().response == "echo: q4"
+    assert batcher.batch_sizes == [2, 2, 1]
+    with pytest.raises(RuntimeError, match="closed"):
+        batcher.submit("llama3", "late", "")
+
+
+def test_batching_benchmark_saves_loads():
+    results = run_benchmark(n_rounds=1, n_requests=8, slots=2,
+                            generate_time=0.0, load_time=0.02,
+                            keep_alive=0.05)
+    assert results["batched"]["loads"] < results["per_request"]["loads"]
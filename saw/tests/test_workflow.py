@@ -0,0 +1,124 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Agent Workflow Unit Tests
+
+"""
+import asyncio
+import time
+
+import pytest
+
+from saw.core.backend import aregister_stream_backend, register_stream_backend
+from saw.workflow import AgentWorkflow
+
+
+def echo(model, prompt, system_prompt, **params):
+    for word in f"{model}: {prompt.splitlines()[-1]}".split():
+        yield f"{word} "
+
+
+async def aecho(model, prompt, system_prompt, **params):
+    for chunk in echo(model, prompt, system_prompt, **params):
+        await asyncio.sleep(0)
+        yield chunk
+
+
+@pytest.fixture(autouse=True)
+def echo_backend():
+    register_stream_backend("echo", echo)
+    aregister_stream_backend("echo", aecho)
+
+
+def prompt_details(model):
+    return {"prompt": "Repeat", "functions": [], "provider": "echo",
+            "model": model, "system_prompt": ""}
+
+
+def test_execute_stream_chaining(monkeypatch):
+    from saw.workflows.multi_llm import chaining
+    monkeypatch.setattr(chaining, "model_call",
+                        lambda prompt, **kwargs: "first")
+    workflow = AgentWorkflow("chaining")
+    chunks = list(workflow.execute(
+        query="hi", prompts=[prompt_details("a"), prompt_details("b")],
+        stream=True))
+    assert "".join(chunks) == "b: Input: first "
+
+
+def test_execute_stream_parallelization():
+    workflow = AgentWorkflow("parallelization")
+    chunks = list(workflow.execute(
+        query="hi", prompts=[prompt_details("a"), prompt_details("b")],
+        stream=True))
+    branches = {0: "", 1: ""}
+    for i, chunk in chunks:
+        branches[i] += chunk
+    assert branches == {0: "a: Input: hi ", 1: "b: Input: hi "}
+
+
+def test_execute_stream_parallelization_async():
+    workflow = AgentWorkflow("parallelization")
+
+    async def collect():
+        return [chunk async for chunk in workflow.execute(
+            query="hi", prompts=[prompt_details("a"), prompt_details("b")],
+            stream=True, async_mode=True)]
+
+    chunks = asyncio.run(collect())
+    assert [i for i, _ in chunks][:2] == [0, 1]
+    assert "".join(c for i, c in chunks if i == 1) == "b: Input: hi "
+
+
+def test_execute_stream_parallelization_async_n_workers():
+    workflow = AgentWorkflow("parallelization")
+
+    async def collect():
+        return [chunk async for chunk in workflow.execute(
+            query="hi", prompts=[prompt_details(m) for m in "abc"],
+            stream=True, async_mode=True, n_workers=1)]
+
+    chunks = asyncio.run(collect())
+    # One branch at a time, so the branches do not interleave
+    assert [i for i, _ in chunks] == sorted(i for i, _ in chunks)
+    assert "".join(c for _, c in chunks) == "".join(
+        f"{m}: Input: hi " for m in "abc")
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_execute_stream_chaining_without_prompts(async_mode):
+    stream = AgentWorkflow("chaining").execute(
+        query="hi", prompts=[], stream=True, async_mode=async_mode)
+    with pytest.raises(ValueError, match="at least one prompt"):
+        if async_mode:
+            asyncio.run(stream.__anext__())
+        else:
+            next(stream)
+
+
+def test_execute_stream_parallelization_close():
+    produced = []
+
+    def slow(model, prompt, system_prompt, **params):
+        for i in range(40):
+            produced.append(i)
+            yield f"{i} "
+            time.sleep(0.05)
+
+    register_stream_backend("slow-echo", slow)
+    prompts = [{**prompt_details(m), "provider": "slow-echo"}
+               for m in "abcd"]
+    start = time.perf_counter()
+    stream = AgentWorkflow("parallelization").execute(
+        query="hi", prompts=prompts, stream=True, n_workers=2)
+    next(stream)
+    stream.close()
+    assert time.perf_counter() - start < 0.5
+
+    time.sleep(0.2)
+    # The running branches stopped and the others never started
+    assert len(produced) < 10
+
+
+def test_execute_stream_unsupported():
+    with pytest.raises(ValueError):
+        AgentWorkflow("adaptive").execute(stream=True)
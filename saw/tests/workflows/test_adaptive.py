@@ -0,0 +1,240 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Adaptive LLM Unit Tests
+
+"""
+import asyncio
+import itertools
+import re
+import time
+
+import pytest
+
+from saw.benchmarks.fake_backend import FakeBackend
+from saw.core.backend import aregister_backend, register_backend
+from saw.core.budget import Budget
+from saw.workflows.adaptive_llm.adaptive import aadaptive, adaptive
+
+RATINGS = ["PASS", "NEEDS_IMPROVEMENT", "FAIL"]
+
+
+def respond_with(evaluations):
+    """Answers generators with their candidate number and evaluators with
+    the rating of that candidate."""
+    def respond(prompt):
+        if "<evaluation>" in prompt:
+            answer = prompt.rsplit("Content to evaluate: ", 1)[-1]
+            evaluation = evaluations.get(answer.strip(), "FAIL")
+            return (f"<evaluation>{evaluation}</evaluation>\n"
+                    f"<feedback>feedback on {answer.strip()}</feedback>")
+        number = re.search(r"candidate (\d+) of", prompt)
+        answer = f"answer-{number.group(1) if number else 0}"
+        return (f"<thoughts>thinking</thoughts>\n"
+                f"<response>{answer}</response>")
+    return respond
+
+
+def run(async_mode, **kwargs):
+    details = {"provider": "fake-adaptive", "model": "fake",
+               "system_prompt": "", "functions": []}
+    args = {"evaluator_prompt_details": {**details, "prompt": "Evaluate."},
+            "generator_prompt_details": {**details, "prompt": "Solve."},
+            "ratings": RATINGS, "task": "Write a haiku", **kwargs}
+    if async_mode:
+        return asyncio.run(aadaptive(**args))
+    return adaptive(**args)
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_first_passing_candidate_is_returned(async_mode):
+    FakeBackend(name="fake-adaptive", ttft=0.1, token_delay=0,
+                respond=respond_with({"answer-3": "PASS"})).register()
+    start = time.perf_counter()
+    result, chain_of_thought = run(async_mode, n_candidates=4)
+    elapsed = time.perf_counter() - start
+
+    assert result == "answer-3"
+    # One generation and one evaluation, with the candidates in parallel
+    assert elapsed < 0.35
+    assert chain_of_thought[-1]["evaluation"] == "PASS"
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_best_rated_candidate_without_pass(async_mode):
+    prompts = []
+
+    def respond(prompt):
+        prompts.append(prompt)
+        return respond_with({"answer-2": "NEEDS_IMPROVEMENT"})(prompt)
+
+    FakeBackend(name="fake-adaptive", ttft=0, token_delay=0,
+                respond=respond).register()
+    result, chain_of_thought = run(async_mode, n_candidates=3,
+                                   max_iterations=1)
+
+    assert result == "answer-2"
+    assert len(chain_of_thought) == 6
+    # The second round sees every failing attempt and its feedback
+    second_round = [p for p in prompts
+                    if "<thoughts>" in p and "Previous attempts" in p]
+    assert len(second_round) == 3
+    assert all(f"- answer-{n}" in p and f"feedback on answer-{n}" in p
+               for p in second_round for n in (1, 2, 3))
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_candidate_temperatures(async_mode):
+    temperatures = []
+    respond = respond_with({})
+
+    def call(model, prompt, system_prompt, **params):
+        if "<thoughts>" in prompt:
+            temperatures.append(params.get("temperature"))
+        return respond(prompt)
+
+    async def acall(model, prompt, system_prompt, **params):
+        return call(model, prompt, system_prompt, **params)
+
+    register_backend("fake-adaptive", call)
+    aregister_backend("fake-adaptive", acall)
+    run(async_mode, n_candidates=3, max_iterations=0,
+        temperatures=[0.2, 0.8])
+
+    assert sorted(temperatures) == [0.2, 0.2, 0.8]
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_single_candidate_is_serial(async_mode):
+    FakeBackend(name="fake-adaptive", ttft=0, token_delay=0,
+                respond=respond_with({"answer-0": "PASS"})).register()
+    result, chain_of_thought = run(async_mode)
+
+    assert result == "answer-0"
+    assert [(c["thoughts"], c["result"]) for c in chain_of_thought] == [
+        ("thinking", "answer-0")]
+    assert chain_of_thought[0]["prompt_tokens"] > 0
+
+
+@pytest.mark.parametrize("memory, growing", [
+    ("full", True),
+    ("window", False),
+    ("tokens", False),
+    ("summary", False),
+], ids=["full", "window", "tokens", "summary"])
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_memory_bounds_prompt_tokens(async_mode, memory, growing):
+    def respond(prompt):
+        if "Summarize the earlier attempts" in prompt:
+            return "short summary"
+        return respond_with({})(prompt) + " " + "word " * 200
+
+    FakeBackend(name="fake-adaptive", ttft=0, token_delay=0,
+                respond=respond).register()
+    _, chain_of_thought = run(async_mode, max_iterations=12, memory=memory)
+
+    tokens = [c["prompt_tokens"] for c in chain_of_thought]
+    assert len(tokens) == 13
+    if growing:
+        assert tokens[-1] > tokens[1] * 4
+    else:
+        assert tokens[-1] < tokens[1] * 4
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_default_ratings_pass(async_mode):
+    def respond(prompt):
+        if "<evaluation>" in prompt:
+            return ("<evaluation> met criteria </evaluation>\n"
+                    "<feedback>good</feedback>")
+        return respond_with({})(prompt)
+
+    FakeBackend(name="fake-adaptive", ttft=0, token_delay=0,
+                respond=respond).register()
+    result = run(async_mode, ratings=[])
+
+    assert result.stop_reason == "passed"
+    assert len(result.chain_of_thought) == 1
+
+
+@pytest.mark.parametrize("n_candidates", [1, 2], ids=["serial", "candidates"])
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_time_budget_returns_best_so_far(async_mode, n_candidates):
+    solutions = itertools.count(1)
+
+    def respond(prompt):
+        if "<evaluation>" in prompt:
+            # Only the first solution is worth keeping
+            answer = prompt.rsplit("Content to evaluate: ", 1)[-1].strip()
+            evaluation = "NEEDS_IMPROVEMENT" if answer == "sol-1" else "FAIL"
+            return (f"<evaluation>{evaluation}</evaluation>\n"
+                    f"<feedback>try again</feedback>")
+        return (f"<thoughts>thinking</thoughts>\n"
+                f"<response>sol-{next(solutions)}</response>")
+
+    FakeBackend(name="fake-adaptive", ttft=0.05, token_delay=0,
+                respond=respond).register()
+    start = time.perf_counter()
+    result, chain_of_thought = outcome = run(
+        async_mode, n_candidates=n_candidates,
+        budget=Budget(max_seconds=0.3))
+    elapsed = time.perf_counter() - start
+
+    assert outcome.stop_reason == "time"
+    assert len(chain_of_thought) > 1
+    assert elapsed < 0.45
+    assert result == "sol-1"
+
+
+def test_async_time_budget_cancels_in_flight_call():
+    FakeBackend(name="fake-adaptive", ttft=1.0, token_delay=0,
+                respond=respond_with({})).register()
+    start = time.perf_counter()
+    result = run(True, budget=Budget(max_seconds=0.1))
+
+    assert time.perf_counter() - start < 0.3
+    assert result.stop_reason == "time"
+    assert result.result is None
+
+
+@pytest.mark.parametrize("budget, reason", [
+    (Budget(max_tokens=2000), "tokens"),
+    (Budget(max_cost=0.01, input_price=5.0, output_price=15.0), "cost"),
+], ids=["tokens", "cost"])
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_usage_budgets(async_mode, budget, reason):
+    FakeBackend(name="fake-adaptive", ttft=0, token_delay=0,
+                respond=respond_with({})).register()
+    result = run(async_mode, budget=budget)
+
+    assert result.stop_reason == reason
+    assert result.usage.total_tokens >= (budget.max_tokens or 0)
+    assert result.result == "answer-0"
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_max_iterations_stop_reason(async_mode):
+    FakeBackend(name="fake-adaptive", ttft=0, token_delay=0,
+                respond=respond_with({})).register()
+    result = run(async_mode, max_iterations=2)
+
+    assert result.stop_reason == "max_iterations"
+    assert len(result.chain_of_thought) == 3
+
+
+def test_abandoned_candidates_are_charged():
+    respond = respond_with({"answer-1": "PASS"})
+
+    def call(model, prompt, system_prompt, **params):
+        # The other candidates finish after the first one passes
+        if "<thoughts>" in prompt and "candidate 1 of" not in prompt:
+            time.sleep(0.1)
+        return respond(prompt)
+
+    register_backend("fake-adaptive", call)
+    result = run(False, n_candidates=3)
+    tokens = result.usage.total_tokens
+    time.sleep(0.3)
+
+    assert result.result == "answer-1"
+    # The abandoned candidates kept running and were charged at the end
+    assert result.usage.total_tokens > tokens
@@ -0,0 +1,73 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Adaptive LLM Memory Unit Tests
+
+"""
+import asyncio
+
+import pytest
+
+from saw.benchmarks.fake_backend import FakeBackend
+from saw.workflows.adaptive_llm.memory import (AttemptMemory, SummaryMemory,
+                                               TokenBudgetMemory,
+                                               WindowMemory, create_memory,
+                                               estimate_tokens)
+
+
+def fill(memory, n):
+    for i in range(n):
+        memory.add(f"attempt {i}", f"feedback {i}")
+    return memory
+
+
+def test_full_memory_context():
+    memory = fill(AttemptMemory(), 2)
+    assert memory.context == ("Previous attempts:\n- attempt 0\n"
+                              "- attempt 1\n\nFeedback: feedback 1")
+
+
+def test_window_memory_keeps_latest():
+    context = fill(WindowMemory(size=2), 5).context
+    assert "attempt 2" not in context
+    assert "- attempt 3\n- attempt 4" in context
+
+
+def test_token_budget_memory():
+    memory = TokenBudgetMemory(max_tokens=20)
+    for i in range(10):
+        memory.add(f"attempt {i} " + "x" * 20, "feedback")
+    assert estimate_tokens(memory.attempts()) <= 20
+    assert "attempt 9" in memory.attempts()
+
+    memory.add("y" * 1000, "feedback")
+    assert memory.attempts().endswith(" ...")
+    assert estimate_tokens(memory.attempts()) <= 20
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_summary_memory_folds_old_attempts(async_mode):
+    backend = FakeBackend(name="fake-summary", ttft=0, token_delay=0,
+                          respond=lambda prompt: "tried attempts 0 and 1")
+    backend.register()
+    memory = SummaryMemory(provider="fake-summary", window=2)
+    for i in range(5):
+        if async_mode:
+            asyncio.run(memory.aadd(f"attempt {i}", f"feedback {i}"))
+        else:
+            memory.add(f"attempt {i}", f"feedback {i}")
+
+    # One summary after the fourth attempt
+    assert backend.calls == 1
+    assert memory.context.startswith(
+        "Summary of earlier attempts: tried attempts 0 and 1")
+    assert "- attempt 0" not in memory.context
+    assert "- attempt 2\n- attempt 3\n- attempt 4" in memory.context
+
+
+def test_create_memory():
+    window = fill(WindowMemory(), 2)
+    assert create_memory(window, {}) is window
+    assert window.attempts() == ""
+    assert isinstance(create_memory("tokens", {}), TokenBudgetMemory)
+    with pytest.raises(ValueError):
+        create_memory("forever", {})
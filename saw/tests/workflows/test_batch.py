@@ -0,0 +1,127 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Batch Workflow Unit Tests
+
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from saw.core.backend import aregister_backend, register_backend
+from saw.workflow import AgentWorkflow
+
+PROMPTS = [{"prompt": "Echo", "functions": [], "provider": "batch",
+            "model": "m", "system_prompt": ""}]
+
+
+@pytest.fixture(autouse=True)
+def backend():
+    """Answers after the number of seconds given by the query, failing on
+    negative ones."""
+    def delay(prompt):
+        seconds = float(prompt.rsplit("Input: ", 1)[-1])
+        if seconds < 0:
+            raise KeyError("negative delay")
+        return seconds
+
+    def call(model, prompt, system_prompt, **params):
+        seconds = delay(prompt)
+        time.sleep(seconds)
+        return f"slept {seconds}"
+
+    async def acall(model, prompt, system_prompt, **params):
+        seconds = delay(prompt)
+        await asyncio.sleep(seconds)
+        return f"slept {seconds}"
+
+    register_backend("batch", call)
+    aregister_backend("batch", acall)
+
+
+def run(async_mode, queries, **kwargs):
+    agent = AgentWorkflow(operation="chaining")
+    if not async_mode:
+        return list(agent.execute_batch(queries, prompts=PROMPTS, **kwargs))
+
+    async def collect():
+        return [result async for result in agent.aexecute_stream(
+            queries, prompts=PROMPTS, **kwargs)]
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_runs_are_concurrent(async_mode):
+    start = time.perf_counter()
+    results = run(async_mode, ["0.1"] * 20, n_concurrent=10)
+
+    assert time.perf_counter() - start < 0.35
+    assert [r.result for r in results] == ["slept 0.1"] * 20
+
+
+@pytest.mark.parametrize("ordered, order", [
+    (True, [0, 1, 2]),
+    (False, [2, 1, 0]),
+], ids=["input-order", "completion-order"])
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_result_order(async_mode, ordered, order):
+    results = run(async_mode, ["0.2", "0.1", "0"], ordered=ordered)
+    assert [r.index for r in results] == order
+    assert [r.query for r in results] == [["0.2", "0.1", "0"][i]
+                                          for i in order]
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_inputs_are_read_lazily(async_mode):
+    pulled = []
+
+    def queries():
+        for i in range(100):
+            pulled.append(i)
+            yield "0"
+
+    agent = AgentWorkflow(operation="chaining")
+    if async_mode:
+        async def first():
+            stream = agent.aexecute_stream(queries(), prompts=PROMPTS,
+                                           n_concurrent=2, max_pending=4)
+            result = await stream.__anext__()
+            await stream.aclose()
+            return result
+
+        result = asyncio.run(first())
+    else:
+        results = agent.execute_batch(queries(), prompts=PROMPTS,
+                                      n_concurrent=2, max_pending=4)
+        result = next(results)
+        results.close()
+
+    assert result.index == 0
+    assert len(pulled) <= 6
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_jsonl_queries(async_mode, tmp_path):
+    path = tmp_path / "queries.jsonl"
+    path.write_text("\n".join([
+        json.dumps("0"),
+        "",
+        json.dumps({"query": "0.01", "prompts": [
+            {**PROMPTS[0], "prompt": "Other"}]}),
+    ]) + "\n")
+
+    results = run(async_mode, path)
+    assert [(r.index, r.result) for r in results] == [
+        (0, "slept 0.0"), (1, "slept 0.01")]
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_errors(async_mode):
+    results = run(async_mode, ["0", "-1", "0"], return_exceptions=True)
+    assert [r.result for r in results] == ["slept 0.0", None, "slept 0.0"]
+    assert results[1].error is not None
+
+    with pytest.raises(Exception, match="negative delay"):
+        run(async_mode, ["0", "-1", "0"])
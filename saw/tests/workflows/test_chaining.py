@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" LLM Chaining Unit Tests
+
+"""
+import asyncio
+import time
+
+import pytest
+
+from saw.benchmarks.fake_backend import FakeBackend
+from saw.core.checkpoint import SQLiteCheckpointStore, set_checkpoint_store
+from saw.core.tracing import InMemoryExporter, tracer
+from saw.workflow import AgentWorkflow
+from saw.workflows.multi_llm.chaining import achain, chain
+
+QUERY = "one two three\n\nfour five six\n\nseven eight nine"
+
+
+@pytest.fixture
+def prompts():
+    FakeBackend(name="fake-chain", ttft=0.02, token_delay=0.01).register()
+    return [{"prompt": "Step", "functions": [], "provider": "fake-chain",
+             "model": "fake", "system_prompt": ""}] * 3
+
+
+def test_pipelined_chain_paragraphs(prompts):
+    result = chain(QUERY, prompts, pipeline="paragraph", cache=False)
+    assert result.split() == QUERY.split()
+    assert result.count("\n") == 2
+
+
+def test_pipelined_chain_tokens(prompts):
+    result = chain(QUERY, prompts, pipeline=4, cache=False)
+    assert result.split() == QUERY.split()
+
+
+def test_pipelined_chain_faster(prompts):
+    start = time.perf_counter()
+    chain(QUERY, prompts, cache=False)
+    serial = time.perf_counter() - start
+    start = time.perf_counter()
+    chain(QUERY, prompts, pipeline="paragraph", cache=False)
+    assert time.perf_counter() - start < serial
+
+
+def test_apipelined_chain(prompts):
+    result = asyncio.run(achain(QUERY, prompts, pipeline="paragraph",
+                                cache=False))
+    assert result.split() == QUERY.split()
+
+
+def test_pipelined_chain_error(prompts):
+    prompts[1] = {**prompts[1], "provider": "missing"}
+    with pytest.raises(ValueError):
+        chain(QUERY, prompts, pipeline="paragraph")
+
+
+def test_pipelined_chain_keeps_context(prompts, tmp_path):
+    store = SQLiteCheckpointStore(tmp_path / "checkpoints.db")
+    set_checkpoint_store(store)
+    exporter = InMemoryExporter()
+    tracer.add_exporter(exporter)
+    try:
+        AgentWorkflow("chaining").execute(
+            query=QUERY, prompts=prompts, run_id="pipelined",
+            pipeline="paragraph", cache=False)
+    finally:
+        tracer.remove_exporter(exporter)
+        set_checkpoint_store(None)
+
+    # One call on the query, then one per paragraph in the later steps
+    assert len(store.load("pipelined")) == 7
+    workflow, = exporter.find("workflow")
+    calls = exporter.find("model_call_stream")
+    assert len(calls) == 7
+    assert all(span.trace_id == workflow.span_id for span in calls)
+    store.close()
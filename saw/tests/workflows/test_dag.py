@@ -0,0 +1,163 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" DAG LLM Unit Tests
+
+"""
+import asyncio
+import time
+
+import pytest
+
+from saw.benchmarks.fake_backend import FakeBackend
+from saw.workflow import AgentWorkflow
+from saw.workflows.dag_llm.dag import adag, dag, stale_nodes
+
+
+def step(prompt, *inputs):
+    return {"prompt": prompt, "inputs": list(inputs),
+            "provider": "fake-dag", "model": "fake", "system_prompt": ""}
+
+
+@pytest.fixture
+def backend():
+    backend = FakeBackend(name="fake-dag", ttft=0.1, token_delay=0,
+                          respond=lambda prompt: prompt.upper())
+    backend.register()
+    return backend
+
+
+@pytest.fixture
+def diamond():
+    return {
+        "outline": step("outline {query}", "query"),
+        "pros": step("pros of {outline}", "outline"),
+        "cons": step("cons of {outline}", "outline"),
+        "report": {"function": lambda pros, cons: f"{pros} | {cons}",
+                   "inputs": ["pros", "cons"]},
+    }
+
+
+def run(async_mode, *args, **kwargs):
+    if async_mode:
+        return asyncio.run(adag(*args, **kwargs))
+    return dag(*args, **kwargs)
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_ready_nodes_run_concurrently(backend, diamond, async_mode):
+    start = time.perf_counter()
+    outputs = run(async_mode, "cats", diamond)
+    elapsed = time.perf_counter() - start
+
+    assert outputs["report"] == "PROS OF OUTLINE CATS | CONS OF OUTLINE CATS"
+    assert list(outputs) == list(diamond)
+    # The outline, then pros and cons together
+    assert 0.2 <= elapsed < 0.3
+    assert backend.calls == 3
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_concurrency_cap(backend, diamond, async_mode):
+    start = time.perf_counter()
+    run(async_mode, "cats", diamond, n_workers=1)
+    assert time.perf_counter() - start >= 0.3
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_identical_calls_are_shared(backend, diamond, async_mode):
+    diamond["outline_again"] = step("outline {query}", "query")
+    # Starts after the outline call is done
+    diamond["late_outline"] = step("outline {query}", "pros")
+    outputs = run(async_mode, "cats", diamond)
+
+    assert outputs["outline_again"] == outputs["late_outline"] == \
+        "OUTLINE CATS"
+    assert backend.calls == 3
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_calls_with_other_functions_are_not_shared(backend, async_mode):
+    def shout(prompt):
+        return prompt + "!"
+
+    async def ashout(prompt):
+        return shout(prompt)
+
+    nodes = {"plain": step("outline {query}", "query"),
+             "shouted": {**step("outline {query}", "query"),
+                         "functions": [ashout if async_mode else shout]}}
+    outputs = run(async_mode, "cats", nodes)
+
+    assert outputs == {"plain": "OUTLINE CATS", "shouted": "OUTLINE CATS!"}
+    assert backend.calls == 2
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_partial_rerun(backend, diamond, async_mode):
+    outputs = run(async_mode, "cats", diamond)
+    previous = {**outputs, "pros": "stale"}
+    backend.calls = 0
+
+    rerun = run(async_mode, "cats", diamond, outputs=previous,
+                rerun=["pros"])
+    assert rerun == outputs
+    # Only pros and the report downstream of it
+    assert backend.calls == 1
+
+    backend.calls = 0
+    missing = {name: outputs[name] for name in ("outline", "pros")}
+    assert run(async_mode, "cats", diamond, outputs=missing) == outputs
+    assert backend.calls == 1
+
+
+def test_stale_nodes(diamond):
+    assert stale_nodes(diamond) == ["outline", "pros", "cons", "report"]
+    outputs = dict.fromkeys(diamond, "done")
+    assert stale_nodes(diamond, outputs) == []
+    assert stale_nodes(diamond, outputs, rerun=["outline"]) == \
+        ["outline", "pros", "cons", "report"]
+    assert stale_nodes(diamond, outputs, rerun=["cons"]) == \
+        ["cons", "report"]
+
+
+@pytest.mark.parametrize("nodes, message", [
+    ({"a": step("{b}", "b"), "b": step("{a}", "a")}, "cycle"),
+    ({"a": step("{b}", "b")}, "unknown node"),
+    ({"query": step("x")}, "reserved"),
+    ({"a": {"inputs": []}}, "prompt or a function"),
+], ids=["cycle", "unknown-input", "reserved-name", "empty-node"])
+def test_invalid_graphs(nodes, message):
+    with pytest.raises(ValueError, match=message):
+        dag("cats", nodes)
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_node_errors_propagate(backend, diamond, async_mode):
+    def fail(pros, cons):
+        raise RuntimeError("report failed")
+
+    diamond["report"]["function"] = fail
+    with pytest.raises(RuntimeError, match="report failed"):
+        run(async_mode, "cats", diamond)
+
+
+def test_async_function_nodes(backend, diamond):
+    async def report(pros, cons, query):
+        await asyncio.sleep(0)
+        return f"{query}: {len(pros) + len(cons)}"
+
+    diamond["report"] = {"function": report,
+                         "inputs": ["pros", "cons", "query"]}
+    outputs = asyncio.run(adag("cats", diamond))
+    assert outputs["report"] == "cats: 40"
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_agent_workflow(backend, diamond, async_mode):
+    agent = AgentWorkflow(operation="dag")
+    if async_mode:
+        outputs = asyncio.run(agent.execute(query="cats", nodes=diamond,
+                                            async_mode=True))
+    else:
+        outputs = agent.execute(query="cats", nodes=diamond)
+    assert outputs["report"].startswith("PROS OF OUTLINE CATS")
@@ -0,0 +1,105 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Local Router Unit Tests
+
+"""
+import asyncio
+import time
+
+import pytest
+
+from saw.benchmarks.fake_backend import FakeBackend, scripted_response
+from saw.core.tracing import InMemoryExporter, tracer
+from saw.workflows.multi_llm.local_router import LocalRouter, local_router
+from saw.workflows.multi_llm.routing import aroute, route
+
+
+def details(provider, prompt, description):
+    return {"prompt": prompt, "functions": [], "provider": provider,
+            "model": "fake", "system_prompt": "", "description": description}
+
+
+ROUTES = {
+    "billing": details("fake-team", "You are the billing team.",
+                       "Invoices, refunds, payments, charges and pricing"),
+    "technical": details("fake-team", "You are the technical team.",
+                         "Errors, crashes, bugs, login problems and outages"),
+}
+
+
+@pytest.fixture
+def selector():
+    backend = FakeBackend(name="fake-local-selector", ttft=0, token_delay=0,
+                          respond=scripted_response).register()
+    FakeBackend(name="fake-team", ttft=0, token_delay=0,
+                respond=lambda prompt: prompt.split("\n")[0]).register()
+    return backend
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [("I was charged twice on my last invoice", "billing"),
+     ("The app crashes with an error after login", "technical")],
+    ids=["billing", "technical"],
+)
+def test_local_router_classify(query, expected):
+    decision = local_router(ROUTES).classify(query)
+    assert decision.route == expected
+    assert decision.confident
+
+
+def test_local_router_is_fast():
+    router = local_router(ROUTES)
+    assert local_router(ROUTES) is router
+    start = time.perf_counter()
+    for _ in range(100):
+        router.classify("Please refund the payment")
+    assert (time.perf_counter() - start) / 100 < 0.005
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_route_local_strategy(selector, async_mode):
+    exporter = InMemoryExporter()
+    tracer.add_exporter(exporter)
+    prompt = details("fake-local-selector", "", "")
+    try:
+        for query in ("Refund my payment please", "Hello there"):
+            args = {"prompt": {**prompt, "prompt": query},
+                    "reasoning_prompt": "Explain.", "route_prompt": "Pick.",
+                    "routes": ROUTES, "strategy": "local", "cache": False}
+            if async_mode:
+                result = asyncio.run(aroute(**args))
+            else:
+                result = route(**args)
+            assert result == "You are the billing team."
+    finally:
+        tracer.remove_exporter(exporter)
+
+    # Only the query without a confident local route asks the selector
+    assert selector.calls == 1
+    local = [span.attributes["confident"]
+             for span in exporter.find("route.select")
+             if span.attributes.get("strategy") == "local"]
+    assert local == [True, False]
+
+
+def test_route_unknown_strategy():
+    with pytest.raises(ValueError):
+        route({"prompt": ""}, "", "", ROUTES, strategy="keywords")
+
+
+def test_local_router_embeddings():
+    calls = []
+
+    def embed(texts):
+        calls.append(texts)
+        return [[text.count("refund"), text.count("crash")]
+                for text in texts]
+
+    router = LocalRouter({"billing": "refund refund", "technical": "crash"},
+                         embed=embed, min_score=0.5)
+    assert router.classify("refund me").route == "billing"
+    assert router.classify("refund me").route == "billing"
+    # The routes and the query are embedded once each
+    assert len(calls) == 2
+    assert not router.classify("hello").confident
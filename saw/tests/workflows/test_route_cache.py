@@ -0,0 +1,124 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Route Decision Cache Unit Tests
+
+"""
+import asyncio
+import time
+
+import pytest
+
+from saw.benchmarks.fake_backend import FakeBackend, scripted_response
+from saw.workflows.multi_llm.route_cache import (RouteDecisionCache,
+                                                 normalize_query,
+                                                 set_route_cache)
+from saw.workflows.multi_llm.routing import aroute, route
+
+
+def details(provider, prompt):
+    return {"prompt": prompt, "functions": [], "provider": provider,
+            "model": "fake", "system_prompt": ""}
+
+
+ROUTES = {"billing": details("fake-team", "Billing team"),
+          "technical": details("fake-team", "Tech team")}
+
+
+@pytest.fixture
+def selector():
+    backend = FakeBackend(name="fake-cached-selector", ttft=0, token_delay=0,
+                          respond=scripted_response).register()
+    FakeBackend(name="fake-team", ttft=0, token_delay=0,
+                respond=lambda prompt: prompt.split("\n")[0]).register()
+    yield backend
+    set_route_cache(None)
+
+
+def test_normalize_query():
+    assert normalize_query("  How do I RESET my password?! ") == \
+        "how do i reset my password"
+
+
+def test_route_decision_cache_exact():
+    cache = RouteDecisionCache()
+    cache.set("Where is my refund?", ROUTES, "billing", "money")
+    assert cache.get("where is my REFUND", ROUTES) == ("billing", "money")
+    assert cache.get("where is my parcel", ROUTES) is None
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+    assert cache.stats.hit_rate == 0.5
+
+
+def test_route_decision_cache_near_duplicates():
+    cache = RouteDecisionCache(similarity=0.5)
+    cache.set("how do i reset my password for the mobile app", ROUTES,
+              "technical", "")
+    assert cache.get("how can i reset my password for the mobile app",
+                     ROUTES) == ("technical", "")
+    assert cache.get("please refund the duplicate charge", ROUTES) is None
+    assert cache.stats.near_hits == 1
+
+
+def test_route_decision_cache_eviction_and_expiry(monkeypatch):
+    cache = RouteDecisionCache(max_entries=2, ttl=10)
+    for query in ("a", "b", "c"):
+        cache.set(query, ROUTES, "billing")
+    assert len(cache) == 2 and cache.stats.evictions == 1
+    assert cache.get("a", ROUTES) is None
+
+    now = time.monotonic()
+    monkeypatch.setattr("saw.workflows.multi_llm.route_cache.time.monotonic",
+                        lambda: now + 11)
+    assert cache.get("c", ROUTES) is None
+    assert cache.stats.expirations == 1
+
+
+def test_route_decision_cache_invalidation():
+    cache = RouteDecisionCache()
+    cache.set("refund", ROUTES, "billing")
+    changed = {**ROUTES, "sales": details("fake-team", "Sales team")}
+    assert cache.get("refund", changed) is None
+    cache.invalidate(ROUTES)
+    assert cache.get("refund", ROUTES) is None
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_route_skips_selector_on_hit(selector, async_mode):
+    set_route_cache(RouteDecisionCache())
+    for query in ("My invoice is wrong", "my invoice is wrong!"):
+        args = {"prompt": details("fake-cached-selector", query),
+                "reasoning_prompt": "Explain.", "route_prompt": "Pick.",
+                "routes": ROUTES}
+        if async_mode:
+            result = asyncio.run(aroute(**args))
+        else:
+            result = route(**args)
+        assert result == "Billing team"
+    assert selector.calls == 1
+
+
+@pytest.mark.parametrize("cache, route_cache, selector_calls", [
+    (False, True, 1),
+    (True, False, 2),
+], ids=["no-response-cache", "no-route-cache"])
+def test_route_cache_is_separate_from_response_cache(
+        selector, cache, route_cache, selector_calls):
+    set_route_cache(RouteDecisionCache())
+    for query in ("My invoice is wrong", "my invoice is wrong!"):
+        assert route(prompt=details("fake-cached-selector", query),
+                     reasoning_prompt="Explain.", route_prompt="Pick.",
+                     routes=ROUTES, cache=cache,
+                     route_cache=route_cache) == "Billing team"
+    assert selector.calls == selector_calls
+
+
+def test_routes_rebuilt_per_call_share_fingerprint():
+    def routes():
+        return {name: {**details, "functions": [lambda prompt: prompt]}
+                for name, details in ROUTES.items()}
+
+    cache = RouteDecisionCache()
+    cache.set("refund", routes(), "billing")
+    assert cache.get("refund", routes()) == ("billing", "")
+    changed = routes()
+    changed["billing"] = {**changed["billing"], "model": "other"}
+    assert cache.get("refund", changed) is None
@@ -0,0 +1,81 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" LLM Routing Unit Tests
+
+"""
+import asyncio
+import time
+
+import pytest
+
+from saw.benchmarks.fake_backend import FakeBackend
+from saw.core.tracing import InMemoryExporter, tracer
+from saw.workflows.multi_llm.routing import aroute, match_route, route
+
+SELECTOR_RESPONSE = ("<reasoning> about money </reasoning> <selection> "
+                     "billing </selection> " + "pad " * 40)
+
+
+@pytest.fixture
+def route_args():
+    FakeBackend(name="fake-selector", ttft=0, token_delay=0.01,
+                respond=lambda prompt: SELECTOR_RESPONSE).register()
+    FakeBackend(name="fake-team", ttft=0.05, token_delay=0,
+                respond=lambda prompt: prompt.split("\n")[0]).register()
+
+    def details(provider, prompt):
+        return {"prompt": prompt, "functions": [], "provider": provider,
+                "model": "fake", "system_prompt": ""}
+
+    return {"prompt": details("fake-selector", "My invoice is wrong"),
+            "reasoning_prompt": "Explain.",
+            "route_prompt": "Pick a team.",
+            "routes": {"billing": details("fake-team", "Billing team"),
+                       "technical": details("fake-team", "Tech team")},
+            "cache": False}
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemoryExporter()
+    tracer.add_exporter(exporter)
+    yield exporter
+    tracer.remove_exporter(exporter)
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+@pytest.mark.parametrize("speculate", [False, True],
+                         ids=["exit", "speculate"])
+def test_route_early_exit(route_args, exporter, async_mode, speculate):
+    start = time.perf_counter()
+    if async_mode:
+        result = asyncio.run(aroute(**route_args, early_exit=True,
+                                    speculate=speculate))
+    else:
+        result = route(**route_args, early_exit=True, speculate=speculate)
+    elapsed = time.perf_counter() - start
+
+    assert result == "Billing team"
+    # The 40 padding tokens after the selection are never waited for
+    assert elapsed < 0.3
+    select = exporter.find("route.select")[0]
+    assert select.attributes["selection"] == "billing"
+    assert select.attributes["speculative"] == (
+        "billing" if speculate else None)
+    assert len(exporter.find("route.dispatch")) == 1
+
+
+def test_route_without_early_exit(route_args):
+    start = time.perf_counter()
+    assert route(**route_args) == "Billing team"
+    assert time.perf_counter() - start > 0.4
+
+
+@pytest.mark.parametrize(
+    "selection, expected",
+    [("", None), ("b", "billing"), (" Tech", "technical"), ("t", None),
+     ("billing team", None)],
+    ids=["empty", "prefix", "case", "ambiguous", "no match"],
+)
+def test_match_route(selection, expected):
+    assert match_route(selection, ["billing", "technical", "tax"]) == expected
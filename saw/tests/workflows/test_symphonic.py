@@ -0,0 +1,135 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Symphonic LLM Unit Tests
+
+"""
+import asyncio
+import time
+
+import pytest
+
+from saw.benchmarks.fake_backend import FakeBackend, scripted_response
+from saw.core.backend import aregister_backend, register_backend
+from saw.workflows.symphonic_llm.symphonic import (aprocess_tasks, asymphony,
+                                                   process_tasks, symphony)
+
+TYPES = ["formal", "casual", "technical", "playful", "short"]
+
+
+@pytest.fixture
+def details():
+    FakeBackend(name="fake-symphony", ttft=0.1, token_delay=0,
+                respond=scripted_response).register()
+    common = {"provider": "fake-symphony", "model": "fake",
+              "system_prompt": ""}
+    composer = {**common, "prompt": "Compose.",
+                "tasks": {"task": "Describe a shoe", "functions": []}}
+    worker = {**common, "prompt": "Write it in a {task_type} style.",
+              "tasks": [{"type": t, "description": f"{t} tone",
+                         "functions": []} for t in TYPES]}
+    return composer, worker
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_workers_run_concurrently(details, async_mode):
+    start = time.perf_counter()
+    if async_mode:
+        result = asyncio.run(asymphony(*details))
+    else:
+        result = symphony(*details)
+    elapsed = time.perf_counter() - start
+
+    # Composer plus one worker round, not five
+    assert elapsed < 0.35
+    assert [r["type"] for r in result["worker_results"]] == TYPES
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_worker_limit(details, async_mode):
+    tasks = [{"type": t, "description": f"{t} tone"} for t in TYPES[:4]]
+    context = {**details[1], "task": "Describe a shoe", "subtasks": ""}
+    start = time.perf_counter()
+    if async_mode:
+        results = asyncio.run(aprocess_tasks(tasks, context, n_workers=2))
+    else:
+        results = process_tasks(tasks, context, n_workers=2)
+    assert time.perf_counter() - start >= 0.2
+    assert len(results) == 4
+    assert "task_type" not in context
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_worker_errors_are_isolated(details, async_mode):
+    def respond(prompt):
+        if "casual" in prompt:
+            raise RuntimeError("worker failed")
+        return "<response>ok</response>"
+
+    FakeBackend(name="fake-symphony-errors", ttft=0, token_delay=0,
+                respond=respond).register()
+    tasks = [{"type": t, "description": f"{t} tone"} for t in TYPES[:3]]
+    context = {**details[1], "task": "Describe a shoe", "subtasks": "",
+               "prompt": "Style: {task_type}",
+               "provider": "fake-symphony-errors"}
+    if async_mode:
+        results = asyncio.run(aprocess_tasks(tasks, context))
+    else:
+        results = process_tasks(tasks, context)
+    assert [r["result"] for r in results] == ["ok", None, "ok"]
+    assert "worker failed" in results[1]["error"]
+
+
+def composer_response(prompt):
+    return ("<analysis>plan</analysis> <tasks> <task><type>formal</type>"
+            "<description>formal tone</description></task> "
+            + "pad " * 30 +
+            "<task><type>casual</type><description>casual tone</description>"
+            "</task> </tasks>")
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_workers_start_while_composing(details, async_mode):
+    started = []
+
+    def respond(prompt):
+        started.append(time.perf_counter())
+        return "<response>ok</response>"
+
+    FakeBackend(name="fake-composer", ttft=0, token_delay=0.01,
+                respond=composer_response).register()
+    FakeBackend(name="fake-worker", ttft=0.05, token_delay=0,
+                respond=respond).register()
+    composer = {**details[0], "provider": "fake-composer"}
+    worker = {**details[1], "provider": "fake-worker"}
+
+    start = time.perf_counter()
+    if async_mode:
+        result = asyncio.run(asymphony(composer, worker))
+    else:
+        result = symphony(composer, worker)
+
+    assert result["analysis"] == "plan"
+    assert [r["type"] for r in result["worker_results"]] == ["formal",
+                                                             "casual"]
+    # The first worker starts long before the composer's 30 padding tokens
+    assert started[0] - start < 0.15
+    assert time.perf_counter() - start > 0.3
+
+
+@pytest.mark.parametrize("async_mode", [False, True], ids=["sync", "async"])
+def test_composer_without_streaming(details, async_mode):
+    async def acall(model, prompt, system_prompt, **params):
+        return composer_response(prompt)
+
+    register_backend("fake-composer-whole",
+                     lambda model, prompt, system_prompt, **params:
+                     composer_response(prompt))
+    aregister_backend("fake-composer-whole", acall)
+    composer = {**details[0], "provider": "fake-composer-whole"}
+
+    if async_mode:
+        result = asyncio.run(asymphony(composer, details[1]))
+    else:
+        result = symphony(composer, details[1])
+    assert [r["type"] for r in result["worker_results"]] == ["formal",
+                                                             "casual"]
@@ -26,3 +26,52 @@ class Error(Exception):
 
 class InputError(Error):
     """Exception raised for errors in the input."""
+
+
+class ProviderError(Error):
+    """
+    Exception raised when a provider call fails.
+
+    The provider exception of the last attempt is chained as the cause.
+
+    :Attributes:
+    - **expression**: *str* provider and model of the call
+    - **message**: *str* explanation of the error
+    - **attempts**: *int* number of attempts made
+
+    """
+    def __init__(
+        self,
+        expression: Optional[str] = None,
+        message: Optional[str] = None,
+        attempts: int = 1,
+    ):
+        super().__init__(expression, message)
+        self.attempts = attempts
+
+    def __str__(self) -> str:
+        return (f"{self.expression} failed after {self.attempts} "
+                f"attempt(s): {self.message}")
+
+
+class BatchRequestError(Error):
+    """
+    Exception raised when a request of a provider batch fails.
+
+    :Attributes:
+    - **expression**: *str* custom ID of the request in the batch
+    - **message**: *str* explanation of the error
+    - **status_code**: *int* HTTP status code of the request, if any
+
+    """
+    def __init__(
+        self,
+        expression: Optional[str] = None,
+        message: Optional[str] = None,
+        status_code: Optional[int] = None,
+    ):
+        super().__init__(expression, message)
+        self.status_code = status_code
+
+    def __str__(self) -> str:
+        return f"{self.expression}: {self.message}"
@@ -3,11 +3,21 @@
 """ Agent Workflow Module
 
 """
-from typing import Any, Callable, Dict, List, Optional, Union
+from contextlib import nullcontext
+from typing import (Any, AsyncIterator, Awaitable, Callable, Dict, Iterator,
+                    List, Optional, Union)
 
+from saw.core.checkpoint import acheckpoint_run, checkpoint_run
+from saw.core.tracing import tracer
 from saw.workflows.adaptive_llm.adaptive import adaptive, aadaptive
-from saw.workflows.multi_llm.chaining import chain, achain
-from saw.workflows.multi_llm.parallelization import parallel, aparallel
+from saw.workflows.batch import (BatchResult, Queries, arun_batch,
+                                 batch_arguments, read_queries, run_batch)
+from saw.workflows.dag_llm.dag import dag, adag
+from saw.workflows.multi_llm.chaining import (chain, achain, chain_stream,
+                                              achain_stream)
+from saw.workflows.multi_llm.parallelization import (parallel, aparallel,
+                                                     parallel_stream,
+                                                     aparallel_stream)
 from saw.workflows.multi_llm.routing import route, aroute
 from saw.workflows.symphonic_llm.symphonic import symphony, asymphony
 from saw.workflows.utils import build_func_args
@@ -46,7 +56,8 @@ class AgentWorkflow:
             reasoning_prompt (str): The template for the reasoning prompt.
             route_prompt (str): The template for the route prompt.
             routes (Optional[Dict[str, Dict[str, Any]]]): Routes for routing.
-            n_workers (int): The number of workers to use for parallelization.
+            n_workers (int): The number of workers to use for parallelization,
+                symphonic worker tasks and DAG nodes.
             params (Dict[str, Any]): Additional parameters.
 
         Returns:
@@ -72,12 +83,19 @@ class AgentWorkflow:
                 generator_prompt_details=params.get("generator_prompt", ""),
                 ratings=params.get("ratings", []),
                 task=params.get("task", ""),
-                max_iterations=params.get("max_iterations", None)
+                max_iterations=params.get("max_iterations", None),
+                n_candidates=params.get("n_candidates", 1),
+                temperatures=params.get("temperatures"),
+                memory=params.get("memory", "full"),
+                budget=params.get("budget")
             )
+        elif self.operation == "dag":
+            return dag(query=query, n_workers=n_workers, **params)
         elif self.operation == "symphonic":
             return symphony(
                 composer_details=params.get("composer_details", {}),
-                worker_details=params.get("worker_details", {})
+                worker_details=params.get("worker_details", {}),
+                n_workers=n_workers
             )
         else:
             raise ValueError(f"Unknown operation: {self.operation}")
@@ -89,6 +107,7 @@ class AgentWorkflow:
             reasoning_prompt: str = None,
             route_prompt: str = None,
             routes: Optional[Dict[str, Dict[str, Any]]] = None,
+            n_workers: Optional[int] = None,
             **params: Dict[str, Any]
     ) -> Union[Dict, str, List[tuple[str, Any]], tuple[str, list[dict]]]:
         """
@@ -101,6 +120,8 @@ class AgentWorkflow:
             reasoning_prompt (str): The template for the reasoning prompt.
             route_prompt (str): The template for the route prompt.
             routes (Optional[Dict[str, Dict[str, Any]]]): Routes for routing.
+            n_workers (Optional[int]): The maximum number of branches,
+                symphonic worker tasks or DAG nodes in flight.
             params (Dict[str, Any]): Additional parameters.
 
         Returns:
@@ -115,7 +136,8 @@ class AgentWorkflow:
         elif self.operation == "chaining":
             return await achain(query=query, prompts=prompts, **params)
         elif self.operation == "parallelization":
-            return await aparallel(query=query, prompts=prompts, **params)
+            return await aparallel(query=query, prompts=prompts,
+                                   n_workers=n_workers, **params)
         elif self.operation == "routing":
             return await aroute(prompt=prompts,
                                 reasoning_prompt=reasoning_prompt,
@@ -127,16 +149,109 @@ class AgentWorkflow:
                 generator_prompt_details=params.get("generator_prompt", ""),
                 ratings=params.get("ratings", []),
                 task=params.get("task", ""),
-                max_iterations=params.get("max_iterations", None)
+                max_iterations=params.get("max_iterations", None),
+                n_candidates=params.get("n_candidates", 1),
+                temperatures=params.get("temperatures"),
+                memory=params.get("memory", "full"),
+                budget=params.get("budget")
             )
+        elif self.operation == "dag":
+            return await adag(query=query, n_workers=n_workers, **params)
         elif self.operation == "symphonic":
             return await asymphony(
                 composer_details=params.get("composer_details", {}),
-                worker_details=params.get("worker_details", {})
+                worker_details=params.get("worker_details", {}),
+                n_workers=n_workers
             )
         else:
             raise ValueError(f"Unknown operation: {self.operation}")
 
+    async def _atraced(self, workflow: Awaitable[Any],
+                       run_id: Optional[str] = None) -> Any:
+        """
+        Awaits a workflow within a workflow span.
+
+        Args:
+            workflow (Awaitable[Any]): The workflow coroutine.
+            run_id (Optional[str]): The run ID to checkpoint and resume the
+                workflow under, or None to run it without checkpoints.
+
+        Returns:
+            Any: The result of the workflow.
+        """
+        with tracer.span("workflow", operation=self.operation):
+            if run_id is None:
+                return await workflow
+            try:
+                async with acheckpoint_run(run_id):
+                    return await workflow
+            finally:
+                # Closes the coroutine if the run could not start
+                workflow.close()
+
+    def _stream_workflow(
+            self,
+            query: Union[Dict, str] = None,
+            prompts: Optional[Union[dict, List[Dict[str, Any]]]] = None,
+            n_workers: int = 3,
+            **params: Dict[str, Any]
+    ) -> Iterator[Union[str, tuple[int, str]]]:
+        """
+        Execute the specified workflow synchronously, streaming its output.
+
+        Args:
+            query (dict | str): The input query.
+            prompts (Optional[Union[dict, List[Dict[str, Any]]]]):
+                Prompts for chaining.
+            n_workers (int): The number of workers to use for parallelization.
+            params (Dict[str, Any]): Additional parameters.
+
+        Returns:
+            Iterator[Union[str, tuple[int, str]]]: The response chunks of the
+                final chaining step, or the branch index and response chunks
+                of parallelization.
+        """
+        if self.operation == "chaining":
+            return chain_stream(query=query, prompts=prompts, **params)
+        elif self.operation == "parallelization":
+            return parallel_stream(query=query, prompts=prompts,
+                                   n_workers=n_workers, **params)
+        else:
+            raise ValueError(f"Streaming is not supported for operation: "
+                             f"{self.operation}")
+
+    def _astream_workflow(
+            self,
+            query: Union[Dict, str] = None,
+            prompts: Optional[Union[dict, List[Dict[str, Any]]]] = None,
+            n_workers: int = 3,
+            **params: Dict[str, Any]
+    ) -> AsyncIterator[Union[str, tuple[int, str]]]:
+        """
+        Execute the specified workflow asynchronously, streaming its output.
+
+        Args:
+            query (dict | str): The input query.
+            prompts (Optional[Union[dict, List[Dict[str, Any]]]]):
+                Prompts for chaining.
+            n_workers (int): The maximum number of parallelization branches
+                in flight.
+            params (Dict[str, Any]): Additional parameters.
+
+        Returns:
+            AsyncIterator[Union[str, tuple[int, str]]]: The response chunks
+                of the final chaining step, or the branch index and response
+                chunks of parallelization.
+        """
+        if self.operation == "chaining":
+            return achain_stream(query=query, prompts=prompts, **params)
+        elif self.operation == "parallelization":
+            return aparallel_stream(query=query, prompts=prompts,
+                                    n_workers=n_workers, **params)
+        else:
+            raise ValueError(f"Streaming is not supported for operation: "
+                             f"{self.operation}")
+
     def execute(
             self,
             query: Union[Dict, str] = None,
@@ -146,36 +261,149 @@ class AgentWorkflow:
             routes: Optional[Dict[str, Dict[str, Any]]] = None,
             n_workers: int = 3,
             async_mode: bool = False,
+            stream: bool = False,
+            run_id: Optional[str] = None,
             **params: Union[Dict[str, Any], int, list, str]
     ) -> Union[dict, str, List[tuple[str, Any]], Any]:
         """
         Execute the specified workflow.
 
+        With ``stream`` set, an iterator of response chunks is returned
+        instead, or an async iterator in ``async_mode``. Chaining streams its
+        final step and parallelization yields ``(branch index, chunk)``
+        tuples as the branches produce them.
+
+        With ``run_id`` set, every completed model call is checkpointed in
+        the store set with ``set_checkpoint_store``. Executing again with
+        the same run ID, e.g. after a crash, replays the completed calls
+        and resumes from the first step that did not complete.
+
         Args:
             async_mode (bool): Whether to execute the workflow asynchronously.
+            stream (bool): Whether to stream the output of the workflow.
+            run_id (Optional[str]): The run ID to checkpoint and resume the
+                workflow under.
             query (dict | str): The input query.
             prompts (Optional[Union[dict, List[Dict[str, Any]]]]): \
                 Prompts for chaining.
             reasoning_prompt (str): The template for the reasoning prompt.
             route_prompt (str): The template for the route prompt.
             routes (Optional[Dict[str, Dict[str, Any]]]): Routes for routing.
-            n_workers (int): The number of workers to use for parallelization.
+            n_workers (int): The number of workers to use for parallelization,
+                symphonic worker tasks and DAG nodes.
             params (Dict[str, Any]): Additional parameters.
 
         Returns:
             Union[str, List[tuple[str, Any]], Any]: The result of the operation.
+
+        Raises:
+            ValueError: If a run ID is given without a checkpoint store, or
+                together with ``stream``.
         """
-        if async_mode:
-            return self._aexecute_workflow(query=query, prompts=prompts,
-                                           reasoning_prompt=reasoning_prompt,
-                                           route_prompt=route_prompt,
-                                           routes=routes, **params)
+        if stream and run_id is not None:
+            raise ValueError("Checkpointing is not supported when streaming.")
+        if stream and async_mode:
+            return self._astream_workflow(query=query, prompts=prompts,
+                                          n_workers=n_workers, **params)
+        elif stream:
+            return self._stream_workflow(query=query, prompts=prompts,
+                                         n_workers=n_workers, **params)
+        elif async_mode:
+            return self._atraced(self._aexecute_workflow(
+                query=query, prompts=prompts,
+                reasoning_prompt=reasoning_prompt, route_prompt=route_prompt,
+                routes=routes, n_workers=n_workers, **params), run_id)
         else:
-            return self._execute_workflow(query=query, prompts=prompts,
-                                          reasoning_prompt=reasoning_prompt,
-                                          route_prompt=route_prompt,
-                                          routes=routes, n_workers=n_workers,
-                                          **params)
+            with tracer.span("workflow", operation=self.operation), \
+                    (checkpoint_run(run_id) if run_id is not None
+                     else nullcontext()):
+                return self._execute_workflow(
+                    query=query, prompts=prompts,
+                    reasoning_prompt=reasoning_prompt,
+                    route_prompt=route_prompt, routes=routes,
+                    n_workers=n_workers, **params)
+
+    def execute_batch(
+            self,
+            queries: Queries,
+            n_concurrent: int = 8,
+            ordered: bool = True,
+            max_pending: Optional[int] = None,
+            return_exceptions: bool = False,
+            **params: Union[Dict[str, Any], int, list, str]
+    ) -> Iterator[BatchResult]:
+        """
+        Execute the workflow on many queries concurrently.
+
+        Queries are read lazily as runs finish, so a generator or a JSON
+        lines file of any size is processed with at most ``max_pending``
+        queries and results in memory. A query given as a dict with a
+        "query" key holds the ``execute`` arguments of its run, e.g. its
+        ``run_id``, which override the shared ones.
+
+        Args:
+            queries (Queries): The queries, or the path of a JSON lines file
+                with one query per line.
+            n_concurrent (int): The maximum number of runs in flight.
+            ordered (bool): Whether to yield results in query order rather
+                than as they complete.
+            max_pending (Optional[int]): The maximum number of queries in
+                flight or completed but not yet yielded, or None for four
+                times ``n_concurrent``.
+            return_exceptions (bool): Whether to yield failed runs with
+                their error rather than raise it.
+            params (Dict[str, Any]): The ``execute`` arguments shared by
+                every run.
+
+        Returns:
+            Iterator[BatchResult]: The result of every query.
+        """
+        return run_batch(
+            lambda query: self.execute(**batch_arguments(query, params)),
+            read_queries(queries), n_workers=n_concurrent, ordered=ordered,
+            max_pending=max_pending, return_exceptions=return_exceptions)
+
+    def aexecute_stream(
+            self,
+            queries: Queries,
+            n_concurrent: int = 8,
+            ordered: bool = True,
+            max_pending: Optional[int] = None,
+            return_exceptions: bool = False,
+            **params: Union[Dict[str, Any], int, list, str]
+    ) -> AsyncIterator[BatchResult]:
+        """
+        Execute the workflow asynchronously on many queries concurrently,
+        streaming the results.
+
+        Works like ``execute_batch``, also taking queries from an async
+        iterable. Runs still in flight are cancelled when the stream is
+        closed early.
+
+        Args:
+            queries (Queries): The queries, or the path of a JSON lines file
+                with one query per line.
+            n_concurrent (int): The maximum number of runs in flight.
+            ordered (bool): Whether to yield results in query order rather
+                than as they complete.
+            max_pending (Optional[int]): The maximum number of queries in
+                flight or completed but not yet yielded, or None for four
+                times ``n_concurrent``.
+            return_exceptions (bool): Whether to yield failed runs with
+                their error rather than raise it.
+            params (Dict[str, Any]): The ``execute`` arguments shared by
+                every run.
+
+        Returns:
+            AsyncIterator[BatchResult]: The result of every query.
+        """
+        async def run(query: Any) -> Any:
+            return await self.execute(async_mode=True,
+                                      **batch_arguments(query, params))
+
+        return arun_batch(run, read_queries(queries), n_workers=n_concurrent,
+                          ordered=ordered, max_pending=max_pending,
+                          return_exceptions=return_exceptions)
 
 
 if __name__ == "__main__":
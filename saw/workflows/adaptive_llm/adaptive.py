@@ -3,12 +3,28 @@
 """ Adaptive LLM Module
 
 """
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from typing import Any, Dict, List, Optional, Union
+
+from saw.core.budget import (STOP_TIME, Budget, BudgetTracker,
+                             estimate_usage)
 from saw.core.model_interface import model_call, amodel_call
-from saw.core.processor import extract_xml
-from saw.workflows.adaptive_llm.templates import (EVALUATOR_PROMPT,
+from saw.core.processor import extract_tags
+from saw.core.tracing import tracer
+from saw.core.usage import Usage, record_usage
+from saw.workflows.adaptive_llm.memory import (AttemptMemory, create_memory,
+                                               estimate_tokens)
+from saw.workflows.adaptive_llm.templates import (CANDIDATE,
+                                                  EVALUATOR_PROMPT,
                                                   GENERATOR_PROMPT, TASK)
 from saw.workflows.utils import apply_functions, aapply_functions
 
+logger = logging.getLogger(__name__)
+
 DEFAULT_GENERATOR_PROMPT = ("You are an expert assistant with vast knowledge. "
                             "You are given a "
                             "task and a context to improve the solution. "
@@ -18,6 +34,12 @@ DEFAULT_EVALUATOR_PROMPT = ("Evaluate the following implementation and "
                             "solution based on criteria needed to complete "
                             "the task.")
 DEFAULT_RATINGS = "MET CRITERIA, NEEDS_IMPROVEMENT, or DID NOT MEET CRITERIA"
+DEFAULT_RATING_ORDER = ["MET CRITERIA", "NEEDS_IMPROVEMENT",
+                        "DID NOT MEET CRITERIA"]
+
+# Reasons an adaptive run stopped, besides its budget
+STOP_PASSED = "passed"
+STOP_MAX_ITERATIONS = "max_iterations"
 
 
 def _compile_full_prompt(prompt: str, task: str, context: str = "") -> str:
@@ -46,24 +68,21 @@ def _compile_generator_response(generator_response: str) -> tuple[str, str]:
     Returns:
         tuple[str, str]: The extracted thoughts and response.
     """
-    print(f"Generator Response: {generator_response}")
-    thoughts = extract_xml(generator_response, "thoughts")
-    response = extract_xml(generator_response, "response")
+    logger.debug("Generator response: %s", generator_response)
+    tags = extract_tags(generator_response, "thoughts", "response")
+    thoughts, response = tags["thoughts"], tags["response"]
     if response is not None or response != "":
         response = generator_response.split("</thoughts>", 1)[-1].strip()
         response = response.replace("<response>", "").replace(
             "</response>", "").strip()
 
-    print("\n=== GENERATION START ===")
-    print(f"Thoughts:\n{thoughts}\n")
-    print(f"Response:\n{response}")
-    print("=== GENERATION END ===\n")
+    logger.debug("Thoughts: %s\nResponse: %s", thoughts, response)
 
     return thoughts, response
 
 
-def _generator(prompt_details: dict, task: str,
-               context: str = "") -> tuple[str, str]:
+def _generator(prompt_details: dict, task: str, context: str = "",
+               **params) -> tuple[str, str, Usage]:
     """
     Generate and improve a solution based on feedback.
 
@@ -71,26 +90,36 @@ def _generator(prompt_details: dict, task: str,
         prompt_details (dict): The prompt details to generate a solution.
         task (str): The task to generate a solution for.
         context (str): The context to improve the solution.
+        params (dict): Other model parameters, such as the temperature.
 
     Returns:
-        tuple[str, str]: The thoughts and generated solution.
+        tuple[str, str, Usage]: The thoughts, the generated solution and the
+            usage of the call, as reported by the provider or else estimated.
     """
     processed_prompt = apply_functions(
         prompt=prompt_details["prompt"],
         functions=prompt_details.get("functions")
     )
     full_prompt = _compile_full_prompt(processed_prompt, task, context)
-    generator_response = model_call(
-        prompt=full_prompt,
-        provider=prompt_details["provider"],
-        model=prompt_details["model"],
-        system_prompt=prompt_details["system_prompt"]
-    )
-    return _compile_generator_response(generator_response)
-
-
-async def _agenerator(prompt_details: dict, task: str,
-                      context: str = "") -> tuple[str, str]:
+    with tracer.span("adaptive.generate", provider=prompt_details["provider"],
+                     model=prompt_details["model"]) as span, \
+            record_usage() as usage:
+        generator_response = model_call(
+            prompt=full_prompt,
+            provider=prompt_details["provider"],
+            model=prompt_details["model"],
+            system_prompt=prompt_details["system_prompt"],
+            **params
+        )
+        usage = estimate_usage(
+            usage, full_prompt + prompt_details["system_prompt"],
+            generator_response)
+        span.set_attribute("context_tokens", estimate_tokens(context))
+    return (*_compile_generator_response(generator_response), usage)
+
+
+async def _agenerator(prompt_details: dict, task: str, context: str = "",
+                      **params) -> tuple[str, str, Usage]:
     """
     Asynchronously generate and improve a solution based on feedback.
 
@@ -98,26 +127,36 @@ async def _agenerator(prompt_details: dict, task: str,
         prompt_details (dict): The prompt details to generate a solution.
         task (str): The task to generate a solution for.
         context (str): The context to improve the solution.
+        params (dict): Other model parameters, such as the temperature.
 
     Returns:
-        tuple[str, str]: The thoughts and generated solution.
+        tuple[str, str, Usage]: The thoughts, the generated solution and the
+            usage of the call, as reported by the provider or else estimated.
     """
     processed_prompt = await aapply_functions(
         prompt=prompt_details["prompt"],
-        functions=prompt_details["functions"]
+        functions=prompt_details.get("functions")
     )
     full_prompt = _compile_full_prompt(processed_prompt, task, context)
-    generator_response = await amodel_call(
-        prompt=full_prompt,
-        provider=prompt_details["provider"],
-        model=prompt_details["model"],
-        system_prompt=prompt_details["system_prompt"]
-    )
-    return _compile_generator_response(generator_response)
+    with tracer.span("adaptive.generate", provider=prompt_details["provider"],
+                     model=prompt_details["model"]) as span, \
+            record_usage() as usage:
+        generator_response = await amodel_call(
+            prompt=full_prompt,
+            provider=prompt_details["provider"],
+            model=prompt_details["model"],
+            system_prompt=prompt_details["system_prompt"],
+            **params
+        )
+        usage = estimate_usage(
+            usage, full_prompt + prompt_details["system_prompt"],
+            generator_response)
+        span.set_attribute("context_tokens", estimate_tokens(context))
+    return (*_compile_generator_response(generator_response), usage)
 
 
 def _evaluator(prompt_details: dict, content: str,
-               task: str) -> tuple[str, str]:
+               task: str) -> tuple[str, str, Usage]:
     """
     Evaluate if a solution meets requirements.
 
@@ -127,7 +166,8 @@ def _evaluator(prompt_details: dict, content: str,
         task (str): The task to evaluate a solution for.
 
     Returns:
-        tuple[str, str]: The evaluation and feedback.
+        tuple[str, str, Usage]: The evaluation, the feedback and the usage
+            of the call.
     """
     processed_prompt = apply_functions(prompt=prompt_details["prompt"],
                                        functions=prompt_details["functions"])
@@ -136,26 +176,29 @@ def _evaluator(prompt_details: dict, content: str,
                    f"the solution meets or does not meet the requirements\n"
                    f"Original task: {task}\n"
                    f"Content to evaluate: {content}")
-    evaluator_response = model_call(
-        prompt=full_prompt,
-        provider=prompt_details["provider"],
-        model=prompt_details["model"],
-        system_prompt=prompt_details["system_prompt"]
-    )
-    print(f"Evaluator Response: {evaluator_response}")
-    evaluation = extract_xml(evaluator_response, "evaluation")
-    feedback = extract_xml(evaluator_response, "feedback")
-
-    print("\n=== EVALUATION START ===")
-    print(f"Status: {evaluation}")
-    print(f"Feedback: {feedback}")
-    print("=== EVALUATION END ===\n")
-
-    return evaluation, feedback
+    with tracer.span("adaptive.evaluate", provider=prompt_details["provider"],
+                     model=prompt_details["model"]) as span, \
+            record_usage() as usage:
+        evaluator_response = model_call(
+            prompt=full_prompt,
+            provider=prompt_details["provider"],
+            model=prompt_details["model"],
+            system_prompt=prompt_details["system_prompt"]
+        )
+        usage = estimate_usage(
+            usage, full_prompt + prompt_details["system_prompt"],
+            evaluator_response)
+        tags = extract_tags(evaluator_response, "evaluation", "feedback")
+        evaluation, feedback = tags["evaluation"], tags["feedback"]
+        span.set_attribute("evaluation", evaluation)
+    logger.debug("Evaluator response: %s", evaluator_response)
+    logger.debug("Status: %s\nFeedback: %s", evaluation, feedback)
+
+    return evaluation, feedback, usage
 
 
 async def _aevaluator(prompt_details: dict, content: str,
-                      task: str) -> tuple[str, str]:
+                      task: str) -> tuple[str, str, Usage]:
     """
     Asynchronously evaluate if a solution meets requirements.
 
@@ -165,7 +208,8 @@ async def _aevaluator(prompt_details: dict, content: str,
         task (str): The task to evaluate a solution for.
 
     Returns:
-        tuple[str, str]: The evaluation and feedback.
+        tuple[str, str, Usage]: The evaluation, the feedback and the usage
+            of the call.
     """
     processed_prompt = await aapply_functions(
         prompt=prompt_details["prompt"],
@@ -176,146 +220,697 @@ async def _aevaluator(prompt_details: dict, content: str,
                    f"the solution meets or does not meet the requirements\n"
                    f"Original task: {task}\n"
                    f"Content to evaluate: {content}")
-    evaluator_response = await amodel_call(
-        prompt=full_prompt,
-        provider=prompt_details["provider"],
-        model=prompt_details["model"],
-        system_prompt=prompt_details["system_prompt"]
-    )
-    evaluation = extract_xml(evaluator_response, "evaluation")
-    feedback = extract_xml(evaluator_response, "feedback")
+    with tracer.span("adaptive.evaluate", provider=prompt_details["provider"],
+                     model=prompt_details["model"]) as span, \
+            record_usage() as usage:
+        evaluator_response = await amodel_call(
+            prompt=full_prompt,
+            provider=prompt_details["provider"],
+            model=prompt_details["model"],
+            system_prompt=prompt_details["system_prompt"]
+        )
+        usage = estimate_usage(
+            usage, full_prompt + prompt_details["system_prompt"],
+            evaluator_response)
+        tags = extract_tags(evaluator_response, "evaluation", "feedback")
+        evaluation, feedback = tags["evaluation"], tags["feedback"]
+        span.set_attribute("evaluation", evaluation)
+
+    logger.debug("Status: %s\nFeedback: %s", evaluation, feedback)
+
+    return evaluation, feedback, usage
+
+
+def _normalize_rating(rating: Optional[str]) -> str:
+    """
+    Normalize a rating for comparison, ignoring case and spacing.
 
-    print("\n=== EVALUATION START ===")
-    print(f"Status: {evaluation}")
-    print(f"Feedback: {feedback}")
-    print("=== EVALUATION END ===\n")
+    Args:
+        rating (Optional[str]): The rating.
 
-    return evaluation, feedback
+    Returns:
+        str: The uppercase rating with single spaces.
+    """
+    return " ".join((rating or "").upper().split())
 
 
-def adaptive(evaluator_prompt_details: dict,
-             generator_prompt_details: dict,
-             ratings: list[str], task: str,
-             max_iterations: int = None) -> tuple[str, list[dict]]:
+def _rating_rank(evaluation: Optional[str], ratings: List[str]) -> int:
     """
-    Keep generating and evaluating until requirements are met.
+    Rank an evaluation by the position of its rating, best first.
+
+    Args:
+        evaluation (Optional[str]): The evaluation.
+        ratings (List[str]): The possible ratings, from best to worst.
+
+    Returns:
+        int: The rank of the evaluation; unknown ratings rank last.
+    """
+    normalized = [_normalize_rating(rating) for rating in ratings]
+    evaluation = _normalize_rating(evaluation)
+    return normalized.index(evaluation) if evaluation in normalized \
+        else len(ratings)
+
+
+def _passed(evaluation: Optional[str], ratings: List[str]) -> bool:
+    """
+    Check whether an evaluation meets every criterion, that is whether it
+    is PASS or the best of the ratings.
+
+    Args:
+        evaluation (Optional[str]): The evaluation.
+        ratings (List[str]): The possible ratings, from best to worst.
+
+    Returns:
+        bool: Whether the solution passed.
+    """
+    evaluation = _normalize_rating(evaluation)
+    return evaluation == "PASS" or (
+        bool(ratings) and evaluation == _normalize_rating(ratings[0]))
+
+
+class _Best:
+    """
+    Best-rated solution of a run so far.
+    """
+
+    def __init__(self, ratings: List[str]):
+        self.ratings = ratings
+        self.result = None
+        self.rank = None
+
+    def update(self, result: str, evaluation: Optional[str]):
+        """
+        Keep a solution if it is rated better than the best so far.
+
+        Args:
+            result (str): The solution.
+            evaluation (Optional[str]): The evaluation of the solution.
+        """
+        rank = _rating_rank(evaluation, self.ratings)
+        if self.rank is None or rank < self.rank:
+            self.result, self.rank = result, rank
+
+
+class AdaptiveResult(tuple):
+    """
+    Solution and chain of thought of an adaptive run. It unpacks like a
+    ``(result, chain_of_thought)`` pair and also tells why the run stopped.
+
+    Attributes:
+        stop_reason (str): "passed", "max_iterations", or the budget limit
+            reached: "time", "tokens" or "cost".
+        usage (Usage): The tokens used by the run, as reported by the
+            providers or else estimated.
+    """
+
+    def __new__(cls, result: Optional[str], chain_of_thought: list[dict],
+                stop_reason: str, usage: Usage) -> "AdaptiveResult":
+        instance = super().__new__(cls, (result, chain_of_thought))
+        instance.stop_reason = stop_reason
+        instance.usage = usage
+        return instance
+
+    @property
+    def result(self) -> Optional[str]:
+        """
+        The chosen solution.
+
+        Returns:
+            Optional[str]: The solution, or None if none was generated.
+        """
+        return self[0]
+
+    @property
+    def chain_of_thought(self) -> list[dict]:
+        """
+        The thoughts and result of every generation.
+
+        Returns:
+            list[dict]: The chain of thought.
+        """
+        return self[1]
+
+
+def _finish(result: Optional[str], chain_of_thought: list[dict],
+            stop_reason: str, best: _Best,
+            tracker: BudgetTracker) -> AdaptiveResult:
+    """
+    Build the result of a run. A run stopped by its budget returns the
+    best-rated solution so far.
+
+    Args:
+        result (Optional[str]): The latest solution.
+        chain_of_thought (list[dict]): The chain of thought.
+        stop_reason (str): Why the run stopped.
+        best (_Best): The best-rated solution.
+        tracker (BudgetTracker): The budget of the run.
+
+    Returns:
+        AdaptiveResult: The result of the run.
+    """
+    if stop_reason not in (STOP_PASSED, STOP_MAX_ITERATIONS) and \
+            best.result is not None:
+        result = best.result
+    logger.debug("Stopped: %s after %.2fs and %d tokens", stop_reason,
+                 tracker.elapsed, tracker.usage.total_tokens)
+    tracer.current_span().set_attribute("stop_reason", stop_reason)
+    return AdaptiveResult(result, chain_of_thought, stop_reason,
+                          tracker.usage)
+
+
+def _candidate_context(context: str, index: int, total: int) -> str:
+    """
+    Add the variation hint of a candidate to the generator context, so that
+    candidates explore different solutions and are not answered from the
+    same cached or in-flight call.
+
+    Args:
+        context (str): The context to improve the solution.
+        index (int): The candidate index.
+        total (int): The number of candidates.
+
+    Returns:
+        str: The context of the candidate.
+    """
+    hint = CANDIDATE.format(index=index + 1, total=total).strip()
+    return f"{context}\n{hint}" if context else hint
+
+
+def _candidate_params(index: int,
+                      temperatures: Optional[List[float]]) -> Dict[str, Any]:
+    """
+    Choose the model parameters of a candidate.
+
+    Args:
+        index (int): The candidate index.
+        temperatures (Optional[List[float]]): The temperatures to cycle
+            through, or None to keep the model default.
+
+    Returns:
+        Dict[str, Any]: The model parameters.
+    """
+    if not temperatures:
+        return {}
+    return {"temperature": temperatures[index % len(temperatures)]}
+
+
+def _candidate(evaluator_prompt_details: dict,
+               generator_prompt_details: dict, task: str, context: str,
+               index: int, total: int,
+               temperatures: Optional[List[float]]) -> Dict[str, Any]:
+    """
+    Generate and evaluate one candidate solution.
 
     Args:
         evaluator_prompt_details (dict): The prompt details for evaluation.
         generator_prompt_details (dict): The prompt details for generation.
-        ratings (list[str]): The possible ratings for evaluation.
-        task (str): The task to evaluate a solution for.
-        max_iterations (int): The maximum number of iterations.
+        task (str): The task to generate a solution for.
+        context (str): The context to improve the solution.
+        index (int): The candidate index.
+        total (int): The number of candidates.
+        temperatures (Optional[List[float]]): The candidate temperatures.
 
     Returns:
-        tuple[str, list[dict]]: The generated solution and chain of thought.
+        Dict[str, Any]: The candidate index, thoughts, result, evaluation,
+            feedback, generator prompt tokens and the usage of both calls.
     """
-    memory = []
-    chain_of_thought = []
-    loop_count = 0
+    thoughts, result, generator_usage = _generator(
+        prompt_details=generator_prompt_details, task=task,
+        context=_candidate_context(context, index, total),
+        **_candidate_params(index, temperatures))
+    evaluation, feedback, evaluator_usage = _evaluator(
+        prompt_details=evaluator_prompt_details, content=result, task=task)
+    usage = Usage(
+        prompt_tokens=(generator_usage.prompt_tokens
+                       + evaluator_usage.prompt_tokens),
+        completion_tokens=(generator_usage.completion_tokens
+                           + evaluator_usage.completion_tokens))
+    return {"candidate": index, "thoughts": thoughts, "result": result,
+            "evaluation": evaluation, "feedback": feedback,
+            "prompt_tokens": generator_usage.prompt_tokens, "usage": usage}
+
+
+async def _acandidate(evaluator_prompt_details: dict,
+                      generator_prompt_details: dict, task: str,
+                      context: str, index: int, total: int,
+                      temperatures: Optional[List[float]]) -> Dict[str, Any]:
+    """
+    Asynchronously generate and evaluate one candidate solution.
 
-    ratings = ", ".join(ratings) if ratings else DEFAULT_RATINGS
-    evaluator_prompt_details["prompt"] = EVALUATOR_PROMPT.format(
-        evaluator_prompt=evaluator_prompt_details.get(
-            "prompt", DEFAULT_EVALUATOR_PROMPT),
-        ratings=ratings
-    )
+    Args:
+        evaluator_prompt_details (dict): The prompt details for evaluation.
+        generator_prompt_details (dict): The prompt details for generation.
+        task (str): The task to generate a solution for.
+        context (str): The context to improve the solution.
+        index (int): The candidate index.
+        total (int): The number of candidates.
+        temperatures (Optional[List[float]]): The candidate temperatures.
 
-    generator_prompt_details["prompt"] = GENERATOR_PROMPT.format(
-        generator_prompt=generator_prompt_details.get(
-            "prompt", DEFAULT_GENERATOR_PROMPT))
+    Returns:
+        Dict[str, Any]: The candidate index, thoughts, result, evaluation,
+            feedback, generator prompt tokens and the usage of both calls.
+    """
+    thoughts, result, generator_usage = await _agenerator(
+        prompt_details=generator_prompt_details, task=task,
+        context=_candidate_context(context, index, total),
+        **_candidate_params(index, temperatures))
+    evaluation, feedback, evaluator_usage = await _aevaluator(
+        prompt_details=evaluator_prompt_details, content=result, task=task)
+    usage = Usage(
+        prompt_tokens=(generator_usage.prompt_tokens
+                       + evaluator_usage.prompt_tokens),
+        completion_tokens=(generator_usage.completion_tokens
+                           + evaluator_usage.completion_tokens))
+    return {"candidate": index, "thoughts": thoughts, "result": result,
+            "evaluation": evaluation, "feedback": feedback,
+            "prompt_tokens": generator_usage.prompt_tokens, "usage": usage}
+
+
+def _failed_context(candidates: List[Dict[str, Any]]) -> str:
+    """
+    Build the generator context of the next round from failing candidates.
 
-    task = TASK.format(task=task)
-
-    thoughts, result = _generator(prompt_details=generator_prompt_details,
-                                  task=task)
-    memory.append(result)
-    chain_of_thought.append({"thoughts": thoughts, "result": result})
-
-    while max_iterations is None or loop_count < max_iterations:
-        print(f"\n=== ITERATION: {loop_count + 1} ===\n")
-        evaluation, feedback = _evaluator(
-            prompt_details=evaluator_prompt_details, content=result, task=task)
-        if evaluation == "PASS":
-            return result, chain_of_thought
-
-        context = "\n".join([
-            "Previous attempts:",
-            *[f"- {m}" for m in memory],
-            f"\nFeedback: {feedback}"
-        ])
-
-        thoughts, result = _generator(
-            prompt_details=generator_prompt_details, context=context,
-            task=task)
-        memory.append(result)
-        chain_of_thought.append({"thoughts": thoughts, "result": result})
-        loop_count += 1
+    Args:
+        candidates (List[Dict[str, Any]]): The failing candidates.
+
+    Returns:
+        str: The previous attempts and their feedback.
+    """
+    return "\n".join([
+        "Previous attempts:",
+        *[f"- {c['result']}" for c in candidates],
+        "\nFeedback:",
+        *[f"- {c['feedback']}" for c in candidates]
+    ])
 
-    return result, chain_of_thought
 
+def _charge_abandoned(futures: List[Future], tracker: BudgetTracker):
+    """
+    Charge the usage of abandoned candidates once they finish.
 
-async def aadaptive(evaluator_prompt_details: dict,
-                    generator_prompt_details: dict,
-                    ratings: list[str], task: str,
-                    max_iterations: int = None) -> tuple[str, list[dict]]:
+    Candidates that were cancelled or failed have no usage to charge, and
+    the usage of the consumed ones was already popped and charged.
+
+    Args:
+        futures (List[Future]): The futures or tasks of the candidates.
+        tracker (BudgetTracker): The budget of the run.
     """
-    Asynchronously keep generating and evaluating until requirements are met.
+    def charge(future: Future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        usage = future.result().pop("usage", None)
+        if usage is not None:
+            tracker.charge(usage)
+
+    for future in futures:
+        future.add_done_callback(charge)
+
+
+def _speculate(evaluator_prompt_details: dict,
+               generator_prompt_details: dict, ratings: List[str],
+               task: str, max_iterations: Optional[int], n_candidates: int,
+               temperatures: Optional[List[float]],
+               tracker: BudgetTracker) -> AdaptiveResult:
+    """
+    Generate and evaluate candidates in parallel rounds until one passes.
+
+    Every round generates ``n_candidates`` solutions concurrently, each
+    evaluated as soon as it is generated. The first candidate to pass is
+    returned; candidates still running are abandoned and their results
+    discarded. Model calls in threads cannot be cancelled, so abandoned
+    candidates that already started keep running. Their usage is charged
+    to the budget, and to the usage of the result, when they finish. When
+    no candidate passes, the failing candidates and their
+    feedback feed the next round. After ``max_iterations + 1`` rounds, or
+    once the budget runs out, the best-rated candidate is returned.
 
     Args:
         evaluator_prompt_details (dict): The prompt details for evaluation.
         generator_prompt_details (dict): The prompt details for generation.
-        ratings (list[str]): The possible ratings for evaluation.
-        task (str): The task to evaluate a solution for.
-        max_iterations (int): The maximum number of iterations.
+        ratings (List[str]): The possible ratings, from best to worst.
+        task (str): The task to generate a solution for.
+        max_iterations (Optional[int]): The maximum number of rounds after
+            the first, or None for no limit.
+        n_candidates (int): The number of candidates per round.
+        temperatures (Optional[List[float]]): The candidate temperatures.
+        tracker (BudgetTracker): The budget of the run.
 
     Returns:
-        tuple[str, list[dict]]: The generated solution and chain of thought.
+        AdaptiveResult: The chosen solution and chain of thought.
     """
-    memory = []
     chain_of_thought = []
+    best = _Best(ratings)
+    context = ""
     loop_count = 0
+    stop_reason = None
+    futures: List[Future] = []
+    executor = ThreadPoolExecutor(max_workers=n_candidates)
+    try:
+        while stop_reason is None:
+            stop_reason = tracker.exceeded()
+            if stop_reason:
+                break
+            logger.debug("Round %d", loop_count + 1)
+            with tracer.span("adaptive.round", round=loop_count + 1,
+                             candidates=n_candidates) as span:
+                # Each candidate runs in a copy of the caller's context so
+                # that its spans join the round
+                futures = [executor.submit(
+                    contextvars.copy_context().run, _candidate,
+                    evaluator_prompt_details, generator_prompt_details, task,
+                    context, index, n_candidates, temperatures)
+                    for index in range(n_candidates)]
+                failed = []
+                try:
+                    for future in as_completed(
+                            futures, timeout=tracker.remaining_seconds()):
+                        candidate = future.result()
+                        tracker.charge(candidate.pop("usage"))
+                        chain_of_thought.append(candidate)
+                        if _passed(candidate["evaluation"], ratings):
+                            span.set_attribute("passed",
+                                               candidate["candidate"])
+                            return _finish(candidate["result"],
+                                           chain_of_thought, STOP_PASSED,
+                                           best, tracker)
+                        failed.append(candidate)
+                        stop_reason = tracker.exceeded()
+                        if stop_reason:
+                            break
+                except FuturesTimeoutError:
+                    if tracker.exceeded() != STOP_TIME:
+                        raise
+                    stop_reason = STOP_TIME
+                failed.sort(key=lambda c: c["candidate"])
+                for candidate in failed:
+                    best.update(candidate["result"], candidate["evaluation"])
+
+            if stop_reason is None and max_iterations is not None and \
+                    loop_count >= max_iterations:
+                stop_reason = STOP_MAX_ITERATIONS
+            context = _failed_context(failed)
+            loop_count += 1
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        _charge_abandoned(futures, tracker)
+    return _finish(best.result, chain_of_thought, stop_reason, best, tracker)
+
+
+async def _aspeculate(evaluator_prompt_details: dict,
+                      generator_prompt_details: dict, ratings: List[str],
+                      task: str, max_iterations: Optional[int],
+                      n_candidates: int,
+                      temperatures: Optional[List[float]],
+                      tracker: BudgetTracker) -> AdaptiveResult:
+    """
+    Asynchronously generate and evaluate candidates in parallel rounds until
+    one passes.
+
+    Behaves like ``_speculate``, except that the candidates still running
+    when one passes or the budget runs out are cancelled. Candidates that
+    finished but were not consumed yet are still charged.
+
+    Args:
+        evaluator_prompt_details (dict): The prompt details for evaluation.
+        generator_prompt_details (dict): The prompt details for generation.
+        ratings (List[str]): The possible ratings, from best to worst.
+        task (str): The task to generate a solution for.
+        max_iterations (Optional[int]): The maximum number of rounds after
+            the first, or None for no limit.
+        n_candidates (int): The number of candidates per round.
+        temperatures (Optional[List[float]]): The candidate temperatures.
+        tracker (BudgetTracker): The budget of the run.
+
+    Returns:
+        AdaptiveResult: The chosen solution and chain of thought.
+    """
+    chain_of_thought = []
+    best = _Best(ratings)
+    context = ""
+    loop_count = 0
+    stop_reason = None
+    while stop_reason is None:
+        stop_reason = tracker.exceeded()
+        if stop_reason:
+            break
+        logger.debug("Round %d", loop_count + 1)
+        with tracer.span("adaptive.round", round=loop_count + 1,
+                         candidates=n_candidates) as span:
+            tasks = [asyncio.ensure_future(_acandidate(
+                evaluator_prompt_details, generator_prompt_details, task,
+                context, index, n_candidates, temperatures))
+                for index in range(n_candidates)]
+            failed = []
+            try:
+                for next_done in asyncio.as_completed(
+                        tasks, timeout=tracker.remaining_seconds()):
+                    candidate = await next_done
+                    tracker.charge(candidate.pop("usage"))
+                    chain_of_thought.append(candidate)
+                    if _passed(candidate["evaluation"], ratings):
+                        span.set_attribute("passed", candidate["candidate"])
+                        return _finish(candidate["result"], chain_of_thought,
+                                       STOP_PASSED, best, tracker)
+                    failed.append(candidate)
+                    stop_reason = tracker.exceeded()
+                    if stop_reason:
+                        break
+            except asyncio.TimeoutError:
+                if tracker.exceeded() != STOP_TIME:
+                    raise
+                stop_reason = STOP_TIME
+            finally:
+                for pending in tasks:
+                    pending.cancel()
+                _charge_abandoned(tasks, tracker)
+            failed.sort(key=lambda c: c["candidate"])
+            for candidate in failed:
+                best.update(candidate["result"], candidate["evaluation"])
+
+        if stop_reason is None and max_iterations is not None and \
+                loop_count >= max_iterations:
+            stop_reason = STOP_MAX_ITERATIONS
+        context = _failed_context(failed)
+        loop_count += 1
+    return _finish(best.result, chain_of_thought, stop_reason, best, tracker)
+
+
+def _prepare(evaluator_prompt_details: dict, generator_prompt_details: dict,
+             ratings: list[str], task: str) -> tuple[List[str], str]:
+    """
+    Format the evaluator and generator prompts and the task of a run.
+
+    Args:
+        evaluator_prompt_details (dict): The prompt details for evaluation.
+        generator_prompt_details (dict): The prompt details for generation.
+        ratings (list[str]): The possible ratings, from best to worst.
+        task (str): The task to generate a solution for.
 
-    ratings = ", ".join(ratings) if ratings else DEFAULT_RATINGS
+    Returns:
+        tuple[List[str], str]: The ratings, from best to worst, and the
+            formatted task.
+    """
+    rating_order = list(ratings) if ratings else DEFAULT_RATING_ORDER
     evaluator_prompt_details["prompt"] = EVALUATOR_PROMPT.format(
         evaluator_prompt=evaluator_prompt_details.get(
             "prompt", DEFAULT_EVALUATOR_PROMPT),
-        ratings=ratings
+        ratings=", ".join(ratings) if ratings else DEFAULT_RATINGS
     )
 
     generator_prompt_details["prompt"] = GENERATOR_PROMPT.format(
         generator_prompt=generator_prompt_details.get(
             "prompt", DEFAULT_GENERATOR_PROMPT))
 
-    task = TASK.format(task=task)
+    return rating_order, TASK.format(task=task)
 
-    thoughts, result = await _agenerator(
-        prompt_details=generator_prompt_details, task=task)
-    memory.append(result)
-    chain_of_thought.append({"thoughts": thoughts, "result": result})
 
-    while max_iterations is None or loop_count < max_iterations:
-        print(f"\n=== ITERATION: {loop_count + 1} ===\n")
-        evaluation, feedback = await _aevaluator(
-            prompt_details=evaluator_prompt_details,
-            content=result, task=task)
-        if evaluation == "PASS":
-            return result, chain_of_thought
+def adaptive(evaluator_prompt_details: dict,
+             generator_prompt_details: dict,
+             ratings: list[str], task: str,
+             max_iterations: int = None,
+             n_candidates: int = 1,
+             temperatures: Optional[List[float]] = None,
+             memory: Union[str, AttemptMemory] = "full",
+             budget: Optional[Budget] = None) -> AdaptiveResult:
+    """
+    Keep generating and evaluating until requirements are met.
+
+    A solution passes when it is rated PASS or the first of ``ratings``.
+    The run also stops when ``max_iterations`` or a limit of ``budget`` is
+    reached; the budget is checked before every model call, and a run
+    stopped by it returns the best-rated solution so far.
 
-        context = "\n".join([
-            "Previous attempts:",
-            *[f"- {m}" for m in memory],
-            f"\nFeedback: {feedback}"
-        ])
+    Args:
+        evaluator_prompt_details (dict): The prompt details for evaluation.
+        generator_prompt_details (dict): The prompt details for generation.
+        ratings (list[str]): The possible ratings for evaluation, from best
+            to worst.
+        task (str): The task to evaluate a solution for.
+        max_iterations (int): The maximum number of iterations.
+        n_candidates (int): The number of candidates generated and evaluated
+            in parallel per iteration. Above one, the first candidate to
+            pass is returned, or else the best-rated one, at up to
+            ``n_candidates`` times the model calls.
+        temperatures (Optional[List[float]]): The temperatures the
+            candidates cycle through, or None to only vary their prompts.
+        memory (Union[str, AttemptMemory]): The memory of previous attempts
+            given to the generator: "full", "window", "tokens", "summary"
+            or a memory instance. Candidates only remember the previous
+            iteration.
+        budget (Optional[Budget]): The wall time, token and cost limits.
 
-        thoughts, result = await _agenerator(
+    Returns:
+        AdaptiveResult: The generated solution and chain of thought, with
+            the generator prompt tokens of every iteration, and the reason
+            the run stopped.
+    """
+    tracker = BudgetTracker(budget)
+    rating_order, task = _prepare(evaluator_prompt_details,
+                                  generator_prompt_details, ratings, task)
+
+    if n_candidates > 1:
+        return _speculate(evaluator_prompt_details, generator_prompt_details,
+                          rating_order, task, max_iterations, n_candidates,
+                          temperatures, tracker)
+
+    memory = create_memory(memory, generator_prompt_details)
+    best = _Best(rating_order)
+    chain_of_thought = []
+    context, result = "", None
+    loop_count = 0
+    while True:
+        stop_reason = tracker.exceeded()
+        if stop_reason:
+            break
+        thoughts, result, usage = _generator(
             prompt_details=generator_prompt_details,
             context=context, task=task)
-        memory.append(result)
-        chain_of_thought.append({"thoughts": thoughts, "result": result})
+        tracker.charge(usage)
+        logger.debug("Generator prompt tokens: %d", usage.prompt_tokens)
+        chain_of_thought.append({"thoughts": thoughts, "result": result,
+                                 "prompt_tokens": usage.prompt_tokens})
+        if max_iterations is not None and loop_count >= max_iterations:
+            stop_reason = STOP_MAX_ITERATIONS
+            break
+
+        stop_reason = tracker.exceeded()
+        if stop_reason:
+            break
+        logger.debug("Iteration %d", loop_count + 1)
+        evaluation, feedback, usage = _evaluator(
+            prompt_details=evaluator_prompt_details,
+            content=result, task=task)
+        tracker.charge(usage)
+        if _passed(evaluation, rating_order):
+            stop_reason = STOP_PASSED
+            break
+        best.update(result, evaluation)
+
+        with record_usage() as usage:
+            memory.add(result, feedback)
+        tracker.charge(usage)
+        context = memory.context
         loop_count += 1
 
-    return result, chain_of_thought
+    return _finish(result, chain_of_thought, stop_reason, best, tracker)
+
+
+async def aadaptive(evaluator_prompt_details: dict,
+                    generator_prompt_details: dict,
+                    ratings: list[str], task: str,
+                    max_iterations: int = None,
+                    n_candidates: int = 1,
+                    temperatures: Optional[List[float]] = None,
+                    memory: Union[str, AttemptMemory] = "full",
+                    budget: Optional[Budget] = None) -> AdaptiveResult:
+    """
+    Asynchronously keep generating and evaluating until requirements are met.
+
+    Behaves like ``adaptive``, except that the model call in flight when the
+    wall time runs out is cancelled.
+
+    Args:
+        evaluator_prompt_details (dict): The prompt details for evaluation.
+        generator_prompt_details (dict): The prompt details for generation.
+        ratings (list[str]): The possible ratings for evaluation, from best
+            to worst.
+        task (str): The task to evaluate a solution for.
+        max_iterations (int): The maximum number of iterations.
+        n_candidates (int): The number of candidates generated and evaluated
+            in parallel per iteration. Above one, the first candidate to
+            pass is returned, or else the best-rated one, at up to
+            ``n_candidates`` times the model calls.
+        temperatures (Optional[List[float]]): The temperatures the
+            candidates cycle through, or None to only vary their prompts.
+        memory (Union[str, AttemptMemory]): The memory of previous attempts
+            given to the generator: "full", "window", "tokens", "summary"
+            or a memory instance. Candidates only remember the previous
+            iteration.
+        budget (Optional[Budget]): The wall time, token and cost limits.
+
+    Returns:
+        AdaptiveResult: The generated solution and chain of thought, with
+            the generator prompt tokens of every iteration, and the reason
+            the run stopped.
+    """
+    tracker = BudgetTracker(budget)
+    rating_order, task = _prepare(evaluator_prompt_details,
+                                  generator_prompt_details, ratings, task)
+
+    if n_candidates > 1:
+        return await _aspeculate(
+            evaluator_prompt_details, generator_prompt_details,
+            rating_order, task, max_iterations, n_candidates, temperatures,
+            tracker)
+
+    memory = create_memory(memory, generator_prompt_details)
+    best = _Best(rating_order)
+    chain_of_thought = []
+    context, result = "", None
+    loop_count = 0
+    try:
+        while True:
+            stop_reason = tracker.exceeded()
+            if stop_reason:
+                break
+            thoughts, result, usage = await asyncio.wait_for(
+                _agenerator(prompt_details=generator_prompt_details,
+                            context=context, task=task),
+                tracker.remaining_seconds())
+            tracker.charge(usage)
+            logger.debug("Generator prompt tokens: %d", usage.prompt_tokens)
+            chain_of_thought.append({"thoughts": thoughts, "result": result,
+                                     "prompt_tokens": usage.prompt_tokens})
+            if max_iterations is not None and loop_count >= max_iterations:
+                stop_reason = STOP_MAX_ITERATIONS
+                break
+
+            stop_reason = tracker.exceeded()
+            if stop_reason:
+                break
+            logger.debug("Iteration %d", loop_count + 1)
+            evaluation, feedback, usage = await asyncio.wait_for(
+                _aevaluator(prompt_details=evaluator_prompt_details,
+                            content=result, task=task),
+                tracker.remaining_seconds())
+            tracker.charge(usage)
+            if _passed(evaluation, rating_order):
+                stop_reason = STOP_PASSED
+                break
+            best.update(result, evaluation)
+
+            with record_usage() as usage:
+                await asyncio.wait_for(memory.aadd(result, feedback),
+                                       tracker.remaining_seconds())
+            tracker.charge(usage)
+            context = memory.context
+            loop_count += 1
+    except asyncio.TimeoutError:
+        if tracker.exceeded() != STOP_TIME:
+            raise
+        stop_reason = STOP_TIME
+
+    return _finish(result, chain_of_thought, stop_reason, best, tracker)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,282 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Adaptive LLM Memory Module
+
+Keeps the previous attempts of an adaptive run and builds the context of
+the next generation from them. ``AttemptMemory`` keeps every attempt, as
+the loop always did, so the prompt grows with every iteration. The other
+memories bound it: ``WindowMemory`` keeps the latest attempts,
+``TokenBudgetMemory`` keeps the latest attempts that fit a token budget,
+and ``SummaryMemory`` periodically folds older attempts into a summary
+written by a model.
+"""
+import logging
+import math
+from collections import deque
+from typing import Deque, Optional, Tuple, Union
+
+from saw.core.model_interface import model_call, amodel_call
+from saw.core.rate_limit import CHARS_PER_TOKEN
+from saw.workflows.adaptive_llm.templates import SUMMARY_PROMPT
+
+logger = logging.getLogger(__name__)
+
+MEMORY_STRATEGIES = ("full", "window", "tokens", "summary")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens of a text from its length.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class AttemptMemory:
+    """
+    Memory of every previous attempt of an adaptive run.
+
+    The context lists the attempts, followed by the feedback on the latest
+    one. Attempts are appended to the context as they are added, so it is
+    never rebuilt from the whole list.
+    """
+
+    def __init__(self):
+        """
+        Initializes an AttemptMemory.
+        """
+        self.clear()
+
+    def clear(self):
+        """
+        Forgets every attempt.
+        """
+        self._attempts = ""
+        self._feedback = ""
+
+    def add(self, result: str, feedback: str):
+        """
+        Remembers an attempt and its feedback.
+
+        Args:
+            result (str): The attempted solution.
+            feedback (str): The feedback on the solution.
+        """
+        self._attempts += f"\n- {result}"
+        self._feedback = feedback
+
+    async def aadd(self, result: str, feedback: str):
+        """
+        Asynchronously remembers an attempt and its feedback.
+
+        Args:
+            result (str): The attempted solution.
+            feedback (str): The feedback on the solution.
+        """
+        self.add(result, feedback)
+
+    def attempts(self) -> str:
+        """
+        Returns the remembered attempts.
+
+        Returns:
+            str: One line per attempt, each starting with a newline.
+        """
+        return self._attempts
+
+    @property
+    def context(self) -> str:
+        """
+        The context of the next generation.
+
+        Returns:
+            str: The previous attempts and the latest feedback.
+        """
+        return (f"Previous attempts:{self.attempts()}\n\n"
+                f"Feedback: {self._feedback}")
+
+
+class WindowMemory(AttemptMemory):
+    """
+    Memory of the latest attempts of an adaptive run.
+    """
+
+    def __init__(self, size: int = 3):
+        """
+        Initializes a WindowMemory.
+
+        Args:
+            size (int): The number of attempts kept.
+        """
+        self.size = size
+        super().__init__()
+
+    def clear(self):
+        super().clear()
+        self._lines: Deque[str] = deque(maxlen=self.size)
+
+    def add(self, result: str, feedback: str):
+        self._lines.append(f"\n- {result}")
+        self._feedback = feedback
+
+    def attempts(self) -> str:
+        return "".join(self._lines)
+
+
+class TokenBudgetMemory(AttemptMemory):
+    """
+    Memory of the latest attempts of an adaptive run that fit in a token
+    budget. An attempt longer than the budget on its own is truncated.
+    """
+
+    def __init__(self, max_tokens: int = 1000):
+        """
+        Initializes a TokenBudgetMemory.
+
+        Args:
+            max_tokens (int): The estimated tokens the attempts may use.
+        """
+        self.max_tokens = max_tokens
+        super().__init__()
+
+    def clear(self):
+        super().clear()
+        self._lines: Deque[Tuple[str, int]] = deque()
+        self._tokens = 0
+
+    def add(self, result: str, feedback: str):
+        line = f"\n- {result}"
+        tokens = estimate_tokens(line)
+        if tokens > self.max_tokens:
+            line = line[:self.max_tokens * CHARS_PER_TOKEN - 4] + " ..."
+            tokens = estimate_tokens(line)
+        self._lines.append((line, tokens))
+        self._tokens += tokens
+        while self._tokens > self.max_tokens:
+            self._tokens -= self._lines.popleft()[1]
+        self._feedback = feedback
+
+    def attempts(self) -> str:
+        return "".join(line for line, _ in self._lines)
+
+
+class SummaryMemory(AttemptMemory):
+    """
+    Memory of the latest attempts of an adaptive run and a summary of the
+    earlier ones.
+
+    Once ``2 * window`` attempts are kept, the oldest ``window`` of them are
+    folded into the summary with one model call, so a summary is written
+    every ``window`` iterations.
+    """
+
+    def __init__(self, provider: str, model: str = "",
+                 system_prompt: str = "", window: int = 2):
+        """
+        Initializes a SummaryMemory.
+
+        Args:
+            provider (str): The provider of the summarizing model.
+            model (str): The summarizing model.
+            system_prompt (str): The system prompt of the summarizing model.
+            window (int): The number of attempts kept verbatim after a
+                summary.
+        """
+        self.provider = provider
+        self.model = model
+        self.system_prompt = system_prompt
+        self.window = window
+        super().__init__()
+
+    def clear(self):
+        super().clear()
+        self._recent: Deque[Tuple[str, str]] = deque()
+        self.summary = ""
+
+    def _fold(self) -> Optional[str]:
+        """
+        Removes the attempts to summarize once enough are kept.
+
+        Returns:
+            Optional[str]: The summary prompt, or None if no summary is due.
+        """
+        if len(self._recent) < 2 * self.window:
+            return None
+        old = [self._recent.popleft() for _ in range(self.window)]
+        attempts = "\n".join(f"- {result}\n  Feedback: {feedback}"
+                             for result, feedback in old)
+        return SUMMARY_PROMPT.format(summary=self.summary or "None yet.",
+                                     attempts=attempts)
+
+    def add(self, result: str, feedback: str):
+        self._recent.append((result, feedback))
+        self._feedback = feedback
+        prompt = self._fold()
+        if prompt is not None:
+            self.summary = model_call(
+                prompt=prompt, provider=self.provider, model=self.model,
+                system_prompt=self.system_prompt).strip()
+            logger.debug("Summary of earlier attempts: %s", self.summary)
+
+    async def aadd(self, result: str, feedback: str):
+        self._recent.append((result, feedback))
+        self._feedback = feedback
+        prompt = self._fold()
+        if prompt is not None:
+            self.summary = (await amodel_call(
+                prompt=prompt, provider=self.provider, model=self.model,
+                system_prompt=self.system_prompt)).strip()
+            logger.debug("Summary of earlier attempts: %s", self.summary)
+
+    def attempts(self) -> str:
+        return "".join(f"\n- {result}" for result, _ in self._recent)
+
+    @property
+    def context(self) -> str:
+        context = super().context
+        if self.summary:
+            return f"Summary of earlier attempts: {self.summary}\n{context}"
+        return context
+
+
+def create_memory(memory: Union[str, AttemptMemory, None],
+                  prompt_details: dict) -> AttemptMemory:
+    """
+    Creates the memory of an adaptive run.
+
+    Args:
+        memory (Union[str, AttemptMemory, None]): A memory, or the name of
+            a strategy in ``MEMORY_STRATEGIES`` to create with its default
+            settings. None keeps every attempt.
+        prompt_details (dict): The generator prompt details, whose model
+            writes the summaries of the "summary" strategy.
+
+    Returns:
+        AttemptMemory: The memory, cleared for a new run.
+
+    Raises:
+        ValueError: If the strategy is unknown.
+    """
+    if isinstance(memory, AttemptMemory):
+        memory.clear()
+        return memory
+    if memory in (None, "full"):
+        return AttemptMemory()
+    if memory == "window":
+        return WindowMemory()
+    if memory == "tokens":
+        return TokenBudgetMemory()
+    if memory == "summary":
+        return SummaryMemory(provider=prompt_details["provider"],
+                             model=prompt_details.get("model", ""))
+    raise ValueError(f"Unknown memory strategy: {memory}. "
+                     f"Choose from {', '.join(MEMORY_STRATEGIES)}.")
+
+
+if __name__ == '__main__':
+    pass
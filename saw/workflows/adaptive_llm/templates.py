@@ -50,3 +50,23 @@ TASK = """
 {task}
 </user input>
 """
+
+CANDIDATE = """
+You are writing candidate {index} of {total} solutions to this task. \
+Take an approach that differs from the other candidates.
+"""
+
+SUMMARY_PROMPT = """
+Summarize the earlier attempts at a task and the feedback they received. \
+Keep what was tried, what failed and why, and drop everything else.
+
+<summary>
+{summary}
+</summary>
+
+<attempts>
+{attempts}
+</attempts>
+
+Output only the updated summary.
+"""
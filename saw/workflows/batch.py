@@ -0,0 +1,291 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Batch Workflow Module
+
+Runs one workflow over many inputs. Inputs are pulled from a list, a
+generator or a JSON lines file only as fast as they are processed, so at
+most ``max_pending`` inputs and results are held at any time. Every
+workflow instance makes its model calls through the shared concurrency
+controller and rate limiter, so the provider limits hold across the batch.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                wait)
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (Any, AsyncIterable, AsyncIterator, Awaitable, Callable,
+                    Dict, Iterable, Iterator, Optional, Tuple, Union)
+
+logger = logging.getLogger(__name__)
+
+Queries = Union[Iterable[Any], AsyncIterable[Any], str, os.PathLike]
+
+
+@dataclass
+class BatchResult:
+    """
+    The outcome of one input of a batch.
+
+    Attributes:
+        index (int): The position of the input in the batch.
+        query (Any): The input.
+        result (Any): The result of the workflow, or None if it failed.
+        error (Optional[BaseException]): The exception the workflow
+            raised, or None if it succeeded.
+    """
+    index: int
+    query: Any
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+def read_queries(queries: Queries) -> Union[Iterable[Any], AsyncIterable[Any]]:
+    """
+    Returns the inputs of a batch, reading a JSON lines file lazily.
+
+    Args:
+        queries (Queries): The inputs, or the path of a JSON lines file
+            with one input per line.
+
+    Returns:
+        Union[Iterable[Any], AsyncIterable[Any]]: The inputs.
+    """
+    if isinstance(queries, (str, os.PathLike)):
+        return _read_jsonl(Path(queries))
+    return queries
+
+
+def _read_jsonl(path: Path) -> Iterator[Any]:
+    """
+    Yields the values of a JSON lines file, skipping blank lines.
+
+    Args:
+        path (Path): The file.
+
+    Yields:
+        Any: The value of every line.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def batch_arguments(query: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the ``execute`` arguments of one input.
+
+    A dict input with a "query" key holds the arguments of its own run,
+    e.g. its ``run_id``, which override the shared ones. Any other input is
+    the query itself.
+
+    Args:
+        query (Any): The input.
+        params (Dict[str, Any]): The arguments shared by every input.
+
+    Returns:
+        Dict[str, Any]: The arguments of the run.
+    """
+    if isinstance(query, dict) and "query" in query:
+        return {**params, **query}
+    return {**params, "query": query}
+
+
+def _outcome(index: int, query: Any, result: Any,
+             error: Optional[BaseException],
+             return_exceptions: bool) -> BatchResult:
+    """
+    Builds the result of an input, raising its error unless collected.
+
+    Args:
+        index (int): The position of the input.
+        query (Any): The input.
+        result (Any): The result of the workflow.
+        error (Optional[BaseException]): The exception of the workflow.
+        return_exceptions (bool): Whether to return errors as results.
+
+    Returns:
+        BatchResult: The result.
+    """
+    if error is not None and not return_exceptions:
+        raise error
+    return BatchResult(index=index, query=query, result=result, error=error)
+
+
+def _limits(n_workers: int, max_pending: Optional[int]) -> int:
+    """
+    Returns the maximum number of inputs in flight or awaiting output.
+
+    Args:
+        n_workers (int): The maximum number of runs in flight.
+        max_pending (Optional[int]): The requested maximum, or None for
+            four times ``n_workers``.
+
+    Returns:
+        int: The maximum, at least ``n_workers``.
+
+    Raises:
+        ValueError: If ``n_workers`` is not positive.
+    """
+    if n_workers < 1:
+        raise ValueError("n_workers must be at least 1.")
+    return max(max_pending or 4 * n_workers, n_workers)
+
+
+def run_batch(func: Callable[[Any], Any], queries: Iterable[Any],
+              n_workers: int = 8, ordered: bool = True,
+              max_pending: Optional[int] = None,
+              return_exceptions: bool = False) -> Iterator[BatchResult]:
+    """
+    Runs a function over many inputs in a thread pool.
+
+    Args:
+        func (Callable[[Any], Any]): Runs the workflow on one input.
+        queries (Iterable[Any]): The inputs.
+        n_workers (int): The maximum number of runs in flight.
+        ordered (bool): Whether to yield results in input order rather
+            than as they complete.
+        max_pending (Optional[int]): The maximum number of inputs in flight
+            or completed but not yet yielded, or None for four times
+            ``n_workers``. In input order, a slow input holds back the
+            inputs after it once this many are pending.
+        return_exceptions (bool): Whether to yield failed inputs with their
+            error rather than raise it.
+
+    Yields:
+        BatchResult: The result of every input.
+    """
+    max_pending = _limits(n_workers, max_pending)
+    source = enumerate(queries)
+    executor = ThreadPoolExecutor(max_workers=n_workers)
+    running: Dict[Future, Tuple[int, Any]] = {}
+    done: Dict[int, BatchResult] = {}
+    next_index = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(running) < n_workers and \
+                    len(running) + len(done) < max_pending:
+                try:
+                    index, query = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                # Each run gets a copy of the caller's context so that its
+                # spans and checkpoints are its own
+                future = executor.submit(contextvars.copy_context().run,
+                                         func, query)
+                running[future] = (index, query)
+            if not running:
+                return
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index, query = running.pop(future)
+                error = future.exception()
+                outcome = _outcome(index, query,
+                                   None if error else future.result(),
+                                   error, return_exceptions)
+                if ordered:
+                    done[index] = outcome
+                else:
+                    yield outcome
+            while next_index in done:
+                yield done.pop(next_index)
+                next_index += 1
+    finally:
+        # Runs already started finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _aiterate(queries: Union[Iterable[Any], AsyncIterable[Any]]
+                    ) -> AsyncIterator[Any]:
+    """
+    Iterates over synchronous or asynchronous inputs.
+
+    Args:
+        queries (Union[Iterable[Any], AsyncIterable[Any]]): The inputs.
+
+    Yields:
+        Any: Every input.
+    """
+    if hasattr(queries, "__aiter__"):
+        async for query in queries:
+            yield query
+    else:
+        for query in queries:
+            yield query
+
+
+async def arun_batch(func: Callable[[Any], Awaitable[Any]],
+                     queries: Union[Iterable[Any], AsyncIterable[Any]],
+                     n_workers: int = 8, ordered: bool = True,
+                     max_pending: Optional[int] = None,
+                     return_exceptions: bool = False
+                     ) -> AsyncIterator[BatchResult]:
+    """
+    Runs a coroutine function over many inputs as concurrent tasks.
+
+    Args:
+        func (Callable[[Any], Awaitable[Any]]): Runs the workflow on one
+            input.
+        queries (Union[Iterable[Any], AsyncIterable[Any]]): The inputs.
+        n_workers (int): The maximum number of runs in flight.
+        ordered (bool): Whether to yield results in input order rather
+            than as they complete.
+        max_pending (Optional[int]): The maximum number of inputs in flight
+            or completed but not yet yielded, or None for four times
+            ``n_workers``.
+        return_exceptions (bool): Whether to yield failed inputs with their
+            error rather than raise it.
+
+    Yields:
+        BatchResult: The result of every input.
+    """
+    max_pending = _limits(n_workers, max_pending)
+    source = _aiterate(queries)
+    running: Dict[asyncio.Future, Tuple[int, Any]] = {}
+    done: Dict[int, BatchResult] = {}
+    next_index = 0
+    index = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(running) < n_workers and \
+                    len(running) + len(done) < max_pending:
+                try:
+                    query = await source.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                running[asyncio.ensure_future(func(query))] = (index, query)
+                index += 1
+            if not running:
+                return
+
+            finished, _ = await asyncio.wait(
+                running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                task_index, query = running.pop(task)
+                error = task.exception()
+                outcome = _outcome(task_index, query,
+                                   None if error else task.result(),
+                                   error, return_exceptions)
+                if ordered:
+                    done[task_index] = outcome
+                else:
+                    yield outcome
+            while next_index in done:
+                yield done.pop(next_index)
+                next_index += 1
+    finally:
+        for task in running:
+            task.cancel()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,418 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" DAG LLM Module
+
+Runs a directed acyclic graph of steps. Every node is either a model call,
+whose prompt is formatted with the outputs of the nodes it depends on, or a
+Python function called with those outputs. Nodes run as soon as their
+inputs are ready, concurrently up to a limit.
+"""
+import asyncio
+import contextvars
+import inspect
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor
+from concurrent.futures import wait
+from contextlib import nullcontext
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from saw.core.model_interface import model_call, amodel_call
+from saw.core.tracing import tracer
+from saw.workflows.symphonic_llm.symphonic import format_prompt
+from saw.workflows.utils import apply_functions, aapply_functions
+
+logger = logging.getLogger(__name__)
+
+# Input name of the query, available to every node
+QUERY = "query"
+
+
+def node_inputs(details: Dict[str, Any]) -> List[str]:
+    """
+    Returns the nodes a node depends on.
+
+    Args:
+        details (Dict[str, Any]): The node details.
+
+    Returns:
+        List[str]: The names of the nodes whose outputs the node takes.
+    """
+    return [name for name in details.get("inputs", []) if name != QUERY]
+
+
+def topological_order(nodes: Dict[str, Dict[str, Any]]) -> List[str]:
+    """
+    Orders the nodes of a graph so that every node follows its inputs.
+
+    Args:
+        nodes (Dict[str, Dict[str, Any]]): The node details keyed by name.
+
+    Returns:
+        List[str]: The node names in dependency order.
+
+    Raises:
+        ValueError: If a node is named ``query``, is neither a model call
+            nor a function, takes an unknown input, or the graph has a cycle.
+    """
+    if QUERY in nodes:
+        raise ValueError(f"'{QUERY}' is reserved for the query input.")
+    for name, details in nodes.items():
+        if "function" not in details and "prompt" not in details:
+            raise ValueError(f"Node {name} needs a prompt or a function.")
+        for dependency in node_inputs(details):
+            if dependency not in nodes:
+                raise ValueError(f"Node {name} takes the output of unknown "
+                                 f"node {dependency}.")
+
+    remaining = {name: len(set(node_inputs(details)))
+                 for name, details in nodes.items()}
+    dependents = downstream_nodes(nodes)
+    order = [name for name, count in remaining.items() if not count]
+    for name in order:
+        for dependent in dependents[name]:
+            remaining[dependent] -= 1
+            if not remaining[dependent]:
+                order.append(dependent)
+    if len(order) < len(nodes):
+        cycle = sorted(set(nodes) - set(order))
+        raise ValueError(f"The graph has a cycle through {cycle}.")
+    return order
+
+
+def downstream_nodes(nodes: Dict[str, Dict[str, Any]]
+                     ) -> Dict[str, List[str]]:
+    """
+    Returns the nodes that directly take the output of every node, in the
+    order the nodes are declared.
+
+    Args:
+        nodes (Dict[str, Dict[str, Any]]): The node details keyed by name.
+
+    Returns:
+        Dict[str, List[str]]: The direct dependents keyed by node.
+    """
+    dependents = {name: [] for name in nodes}
+    for name, details in nodes.items():
+        for dependency in dict.fromkeys(node_inputs(details)):
+            dependents[dependency].append(name)
+    return dependents
+
+
+def stale_nodes(nodes: Dict[str, Dict[str, Any]],
+                outputs: Optional[Dict[str, Any]] = None,
+                rerun: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Chooses the nodes to run, in dependency order.
+
+    Nodes without an output run, as do the nodes to rerun and every node
+    downstream of a node that runs.
+
+    Args:
+        nodes (Dict[str, Dict[str, Any]]): The node details keyed by name.
+        outputs (Optional[Dict[str, Any]]): The outputs of a previous run.
+        rerun (Optional[Iterable[str]]): The nodes to run again.
+
+    Returns:
+        List[str]: The nodes to run.
+
+    Raises:
+        ValueError: If the graph is invalid or a node to rerun is unknown.
+    """
+    order = topological_order(nodes)
+    stale = set(rerun or [])
+    unknown = stale - set(nodes)
+    if unknown:
+        raise ValueError(f"Unknown nodes to rerun: {sorted(unknown)}.")
+    outputs = outputs or {}
+    for name in order:
+        if name not in outputs or any(dependency in stale for dependency
+                                      in node_inputs(nodes[name])):
+            stale.add(name)
+    return [name for name in order if name in stale]
+
+
+def _prepare_node(details: Dict[str, Any], inputs: Dict[str, Any],
+                  params: Dict[str, Any]) -> Tuple[Optional[Tuple], Dict]:
+    """
+    Builds the call of a model node.
+
+    Args:
+        details (Dict[str, Any]): The node details.
+        inputs (Dict[str, Any]): The query and the outputs of the node
+            inputs.
+        params (Dict[str, Any]): The model parameters of the run.
+
+    Returns:
+        Tuple[Optional[Tuple], Dict]: The key identifying the call, or None
+            for a function node, and the model call arguments.
+    """
+    if "function" in details:
+        return None, {}
+    call = {"prompt": format_prompt(details["prompt"], **inputs),
+            "provider": details["provider"],
+            "model": details.get("model", ""),
+            "system_prompt": details.get("system_prompt", ""),
+            **params, **details.get("params", {})}
+    # The functions applied to the prompt at run time are part of the call,
+    # so nodes that only differ in them are not merged
+    key = (tuple(sorted((k, repr(v)) for k, v in call.items())),
+           tuple(details.get("functions", [])))
+    return key, call
+
+
+def _function_args(details: Dict[str, Any],
+                   inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Selects the keyword arguments of a function node: the outputs of its
+    inputs, and the query if it is listed as an input.
+
+    Args:
+        details (Dict[str, Any]): The node details.
+        inputs (Dict[str, Any]): The query and the outputs of the node
+            inputs.
+
+    Returns:
+        Dict[str, Any]: The function arguments.
+    """
+    return {name: inputs[name] for name in details.get("inputs", [])}
+
+
+def run_node(name: str, details: Dict[str, Any], inputs: Dict[str, Any],
+             call: Dict[str, Any]) -> Any:
+    """
+    Runs a single node.
+
+    Args:
+        name (str): The node name.
+        details (Dict[str, Any]): The node details.
+        inputs (Dict[str, Any]): The query and the outputs of the node
+            inputs.
+        call (Dict[str, Any]): The model call arguments of a model node.
+
+    Returns:
+        Any: The output of the node.
+    """
+    if "function" in details:
+        with tracer.span("dag.node", node=name, kind="function"):
+            output = details["function"](**_function_args(details, inputs))
+    else:
+        prompt = apply_functions(prompt=call.pop("prompt"),
+                                 functions=details.get("functions", []))
+        with tracer.span("dag.node", node=name, kind="model",
+                         provider=call["provider"], model=call["model"]):
+            output = model_call(prompt=prompt, **call)
+    logger.debug("Node %s output: %s", name, output)
+    return output
+
+
+async def arun_node(name: str, details: Dict[str, Any],
+                    inputs: Dict[str, Any], call: Dict[str, Any]) -> Any:
+    """
+    Asynchronously runs a single node. Functions may be coroutine functions.
+
+    Args:
+        name (str): The node name.
+        details (Dict[str, Any]): The node details.
+        inputs (Dict[str, Any]): The query and the outputs of the node
+            inputs.
+        call (Dict[str, Any]): The model call arguments of a model node.
+
+    Returns:
+        Any: The output of the node.
+    """
+    if "function" in details:
+        with tracer.span("dag.node", node=name, kind="function"):
+            output = details["function"](**_function_args(details, inputs))
+            if inspect.isawaitable(output):
+                output = await output
+    else:
+        prompt = await aapply_functions(
+            prompt=call.pop("prompt"),
+            functions=details.get("functions", []))
+        with tracer.span("dag.node", node=name, kind="model",
+                         provider=call["provider"], model=call["model"]):
+            output = await amodel_call(prompt=prompt, **call)
+    logger.debug("Node %s output: %s", name, output)
+    return output
+
+
+def _node_input_values(name: str, details: Dict[str, Any],
+                       values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Collects the inputs of a node.
+
+    Args:
+        name (str): The node name.
+        details (Dict[str, Any]): The node details.
+        values (Dict[str, Any]): The query and the outputs so far.
+
+    Returns:
+        Dict[str, Any]: The query and the outputs of the node inputs.
+    """
+    return {QUERY: values[QUERY],
+            **{dependency: values[dependency]
+               for dependency in node_inputs(details)}}
+
+
+def dag(query: Any, nodes: Dict[str, Dict[str, Any]],
+        n_workers: Optional[int] = None,
+        outputs: Optional[Dict[str, Any]] = None,
+        rerun: Optional[Iterable[str]] = None,
+        **params: dict) -> Dict[str, Any]:
+    """
+    Runs a graph of model calls and functions.
+
+    A model node has the usual prompt details, with a ``prompt`` formatted
+    with ``{query}`` and the outputs of its ``inputs`` by node name, and
+    optional model ``params``. A function node has a ``function`` called
+    with the outputs of its ``inputs`` as keyword arguments; ``query`` may
+    be listed as an input.
+    Every node starts as soon as its inputs are done. Model nodes making
+    the same call share one call.
+
+    With ``outputs`` from a previous run, only the nodes without an output,
+    the nodes in ``rerun`` and the nodes downstream of them run again.
+
+    Args:
+        query (Any): The input query.
+        nodes (Dict[str, Dict[str, Any]]): The node details keyed by name.
+        n_workers (Optional[int]): The maximum number of nodes running at
+            once, or None for no limit.
+        outputs (Optional[Dict[str, Any]]): The outputs of a previous run.
+        rerun (Optional[Iterable[str]]): The nodes to run again.
+        params (dict): A dictionary of other model parameters.
+
+    Returns:
+        Dict[str, Any]: The output of every node keyed by name.
+    """
+    to_run = stale_nodes(nodes, outputs, rerun)
+    values = {**(outputs or {}), QUERY: query}
+    waiting = {name: set(node_inputs(nodes[name])) & set(to_run)
+               for name in to_run}
+    if not to_run:
+        return {name: values[name] for name in nodes}
+
+    running: Dict[Future, List[str]] = {}
+    calls: Dict[Tuple, Future] = {}
+
+    def complete(name: str, output: Any):
+        values[name] = output
+        for pending in waiting.values():
+            pending.discard(name)
+
+    with ThreadPoolExecutor(max_workers=n_workers or len(to_run)) \
+            as executor:
+        try:
+            while waiting or running:
+                for name in [name for name, pending in waiting.items()
+                             if not pending]:
+                    del waiting[name]
+                    inputs = _node_input_values(name, nodes[name], values)
+                    key, call = _prepare_node(nodes[name], inputs, params)
+                    if key in calls:
+                        logger.debug("Node %s shares a call", name)
+                        if calls[key] in running:
+                            running[calls[key]].append(name)
+                        else:
+                            complete(name, calls[key].result())
+                        continue
+                    # Each node runs in a copy of the caller's context so
+                    # that its spans join the caller's trace
+                    future = executor.submit(
+                        contextvars.copy_context().run, run_node, name,
+                        nodes[name], inputs, call)
+                    running[future] = [name]
+                    if key is not None:
+                        calls[key] = future
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    output = future.result()
+                    for name in running.pop(future):
+                        complete(name, output)
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+    return {name: values[name] for name in nodes}
+
+
+async def adag(query: Any, nodes: Dict[str, Dict[str, Any]],
+               n_workers: Optional[int] = None,
+               outputs: Optional[Dict[str, Any]] = None,
+               rerun: Optional[Iterable[str]] = None,
+               **params: dict) -> Dict[str, Any]:
+    """
+    Asynchronously runs a graph of model calls and functions.
+
+    See ``dag``; functions may also be coroutine functions.
+
+    Args:
+        query (Any): The input query.
+        nodes (Dict[str, Dict[str, Any]]): The node details keyed by name.
+        n_workers (Optional[int]): The maximum number of nodes running at
+            once, or None for no limit.
+        outputs (Optional[Dict[str, Any]]): The outputs of a previous run.
+        rerun (Optional[Iterable[str]]): The nodes to run again.
+        params (dict): A dictionary of other model parameters.
+
+    Returns:
+        Dict[str, Any]: The output of every node keyed by name.
+    """
+    to_run = stale_nodes(nodes, outputs, rerun)
+    values = {**(outputs or {}), QUERY: query}
+    waiting = {name: set(node_inputs(nodes[name])) & set(to_run)
+               for name in to_run}
+    semaphore = asyncio.Semaphore(n_workers) if n_workers else nullcontext()
+
+    async def run(name: str, inputs: Dict[str, Any],
+                  call: Dict[str, Any]) -> Any:
+        async with semaphore:
+            return await arun_node(name, nodes[name], inputs, call)
+
+    running: Dict[asyncio.Future, List[str]] = {}
+    calls: Dict[Tuple, asyncio.Future] = {}
+
+    def complete(name: str, output: Any):
+        values[name] = output
+        for pending in waiting.values():
+            pending.discard(name)
+
+    try:
+        while waiting or running:
+            for name in [name for name, pending in waiting.items()
+                         if not pending]:
+                del waiting[name]
+                inputs = _node_input_values(name, nodes[name], values)
+                key, call = _prepare_node(nodes[name], inputs, params)
+                if key in calls:
+                    logger.debug("Node %s shares a call", name)
+                    if calls[key] in running:
+                        running[calls[key]].append(name)
+                    else:
+                        complete(name, calls[key].result())
+                    continue
+                task = asyncio.ensure_future(run(name, inputs, call))
+                running[task] = [name]
+                if key is not None:
+                    calls[key] = task
+            if not running:
+                continue
+
+            done, _ = await asyncio.wait(running,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                output = task.result()
+                for name in running.pop(task):
+                    complete(name, output)
+    except BaseException:
+        for task in running:
+            task.cancel()
+        raise
+    return {name: values[name] for name in nodes}
+
+
+if __name__ == '__main__':
+    pass
@@ -3,13 +3,29 @@
 """ LLM Chaining Module
 
 """
-from saw.core.model_interface import model_call, amodel_call
+import asyncio
+import contextvars
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, Optional, Union
+
+from saw.core.model_interface import (model_call, amodel_call,
+                                      model_call_stream, amodel_call_stream)
+from saw.core.processor import StreamSegmenter
+from saw.core.tracing import tracer
 from saw.workflows.utils import apply_functions, aapply_functions
 
+logger = logging.getLogger(__name__)
+
+# Marks the end of the segments passed between pipelined chain steps
+_END = object()
+
 
 def chain(
         query: str,
         prompts: list[dict],
+        pipeline: Optional[Union[int, str]] = None,
         **params: dict
 ) -> str:
     """Chains multiple prompts together to process a query.
@@ -17,33 +33,44 @@ def chain(
     Args:
         query (str): The input query.
         prompts (list[dict]): A list of dictionaries containing prompt details.
+        pipeline (Optional[Union[int, str]]): The segment boundary used to
+            pipeline the steps, see ``pipelined_chain``. Steps run one after
+            another when None.
         params (dict): A dictionary of other parameters.
 
     Returns:
         str: The processed query.
     """
+    if pipeline is not None:
+        return pipelined_chain(query=query, prompts=prompts,
+                               boundary=pipeline, **params)
+
     result = query
     for i, prompt_details in enumerate(prompts, 1):
         processed_prompt = apply_functions(
             prompt=prompt_details["prompt"],
             functions=prompt_details["functions"]
         )
-        print(f'Model: {prompt_details["provider"]}-{prompt_details["model"]}')
-
-        print(f"\nStep {i}: {processed_prompt}")
-        result = model_call(
-            prompt=f"{processed_prompt}\nInput: {result}",
-            provider=prompt_details["provider"],
-            model=prompt_details["model"],
-            system_prompt=prompt_details["system_prompt"],
-            **params
-        )
-        print(f"\nResult: {result}")
+        logger.debug("Step %d (%s-%s): %s", i, prompt_details["provider"],
+                     prompt_details["model"], processed_prompt)
+        with tracer.span("chain.step", step=i,
+                         provider=prompt_details["provider"],
+                         model=prompt_details["model"]):
+            result = model_call(
+                prompt=f"{processed_prompt}\nInput: {result}",
+                provider=prompt_details["provider"],
+                model=prompt_details["model"],
+                system_prompt=prompt_details["system_prompt"],
+                **params
+            )
+        logger.debug("Step %d result: %s", i, result)
     return result
 
+
 async def achain(
         query: str,
         prompts: list[dict],
+        pipeline: Optional[Union[int, str]] = None,
         **params: dict
 ) -> str:
     """Asynchronous chain multiple prompts together to process a query.
@@ -51,29 +78,252 @@ async def achain(
     Args:
         query (str): The input query.
         prompts (list[dict]): A list of dictionaries containing prompt details.
+        pipeline (Optional[Union[int, str]]): The segment boundary used to
+            pipeline the steps, see ``pipelined_chain``. Steps run one after
+            another when None.
         params (dict): A dictionary of other parameters.
 
     Returns:
         str: The processed query.
     """
+    if pipeline is not None:
+        return await apipelined_chain(query=query, prompts=prompts,
+                                      boundary=pipeline, **params)
+
     result = query
     for i, prompt_details in enumerate(prompts, 1):
         processed_prompt = await aapply_functions(
             prompt=prompt_details["prompt"],
             functions=prompt_details["functions"]
         )
-        print(f'Model: {prompt_details["provider"]}-{prompt_details["model"]}')
+        logger.debug("Step %d (%s-%s): %s", i, prompt_details["provider"],
+                     prompt_details["model"], processed_prompt)
+        with tracer.span("chain.step", step=i,
+                         provider=prompt_details["provider"],
+                         model=prompt_details["model"]):
+            result = await amodel_call(
+                prompt=f"{processed_prompt}\nInput: {result}",
+                provider=prompt_details["provider"],
+                model=prompt_details["model"],
+                system_prompt=prompt_details["system_prompt"],
+                **params
+            )
+        logger.debug("Step %d result: %s", i, result)
+    return result
+
+
+def chain_stream(
+        query: str,
+        prompts: list[dict],
+        **params: dict
+) -> Iterator[str]:
+    """Chains multiple prompts together, streaming the final step.
+
+    Args:
+        query (str): The input query.
+        prompts (list[dict]): A list of dictionaries containing prompt details.
+        params (dict): A dictionary of other parameters.
+
+    Yields:
+        str: The response chunks of the final step.
 
-        print(f"\nStep {i}: {processed_prompt}")
-        result = await amodel_call(
+    Raises:
+        ValueError: If there are no prompts.
+    """
+    if not prompts:
+        raise ValueError("Streaming a chain needs at least one prompt.")
+    result = chain(query=query, prompts=prompts[:-1], **params)
+    prompt_details = prompts[-1]
+    processed_prompt = apply_functions(
+        prompt=prompt_details["prompt"],
+        functions=prompt_details["functions"]
+    )
+    yield from model_call_stream(
+        prompt=f"{processed_prompt}\nInput: {result}",
+        provider=prompt_details["provider"],
+        model=prompt_details["model"],
+        system_prompt=prompt_details["system_prompt"],
+        **params
+    )
+
+
+async def achain_stream(
+        query: str,
+        prompts: list[dict],
+        **params: dict
+) -> AsyncIterator[str]:
+    """Asynchronously chains multiple prompts, streaming the final step.
+
+    Args:
+        query (str): The input query.
+        prompts (list[dict]): A list of dictionaries containing prompt details.
+        params (dict): A dictionary of other parameters.
+
+    Yields:
+        str: The response chunks of the final step.
+
+    Raises:
+        ValueError: If there are no prompts.
+    """
+    if not prompts:
+        raise ValueError("Streaming a chain needs at least one prompt.")
+    result = await achain(query=query, prompts=prompts[:-1], **params)
+    prompt_details = prompts[-1]
+    processed_prompt = await aapply_functions(
+        prompt=prompt_details["prompt"],
+        functions=prompt_details["functions"]
+    )
+    async for chunk in amodel_call_stream(
             prompt=f"{processed_prompt}\nInput: {result}",
             provider=prompt_details["provider"],
             model=prompt_details["model"],
             system_prompt=prompt_details["system_prompt"],
-            **params
-        )
-        print(f"\nResult: {result}")
-    return result
+            **params):
+        yield chunk
+
+
+def pipelined_chain(
+        query: str,
+        prompts: list[dict],
+        boundary: Union[int, str] = "paragraph",
+        **params: dict
+) -> str:
+    """Chains prompts as a pipeline that streams segments between steps.
+
+    Each step streams its output and hands every completed segment to the
+    next step as soon as the boundary is reached, so step N+1 starts while
+    step N is still generating. Each segment is processed by its own call,
+    which suits steps that transform their input piece by piece.
+
+    Args:
+        query (str): The input query.
+        prompts (list[dict]): A list of dictionaries containing prompt details.
+        boundary (Union[int, str]): The segment boundary: a number of tokens,
+            ``"paragraph"`` or a closing tag such as ``"</section>"``.
+        params (dict): A dictionary of other parameters.
+
+    Returns:
+        str: The outputs of the final step joined by newlines.
+    """
+    if not prompts:
+        return query
+
+    queues = [queue.Queue() for _ in range(len(prompts) + 1)]
+    queues[0].put(query)
+    queues[0].put(_END)
+
+    def run_step(i: int, prompt_details: dict):
+        last_step = i == len(prompts) - 1
+        try:
+            processed_prompt = apply_functions(
+                prompt=prompt_details["prompt"],
+                functions=prompt_details["functions"]
+            )
+            while (segment := queues[i].get()) is not _END:
+                segmenter = StreamSegmenter(boundary)
+                chunks = []
+                for chunk in model_call_stream(
+                        prompt=f"{processed_prompt}\nInput: {segment}",
+                        provider=prompt_details["provider"],
+                        model=prompt_details["model"],
+                        system_prompt=prompt_details["system_prompt"],
+                        **params):
+                    if last_step:
+                        chunks.append(chunk)
+                        continue
+                    for completed in segmenter.feed(chunk):
+                        queues[i + 1].put(completed)
+                remainder = ("".join(chunks) if last_step
+                             else segmenter.flush())
+                if remainder is not None:
+                    queues[i + 1].put(remainder)
+        finally:
+            queues[i + 1].put(_END)
+
+    with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+        # Each step runs in a copy of the caller's context so that its
+        # spans, checkpoints and usage belong to the caller's run
+        futures = [executor.submit(contextvars.copy_context().run,
+                                   run_step, i, prompt_details)
+                   for i, prompt_details in enumerate(prompts)]
+        outputs = []
+        while (output := queues[-1].get()) is not _END:
+            outputs.append(output)
+        for future in futures:
+            future.result()
+    return "\n".join(output.strip() for output in outputs)
+
+
+async def apipelined_chain(
+        query: str,
+        prompts: list[dict],
+        boundary: Union[int, str] = "paragraph",
+        **params: dict
+) -> str:
+    """Asynchronously chains prompts as a pipeline that streams segments
+    between steps.
+
+    Each step streams its output and hands every completed segment to the
+    next step as soon as the boundary is reached, so step N+1 starts while
+    step N is still generating. Each segment is processed by its own call,
+    which suits steps that transform their input piece by piece.
+
+    Args:
+        query (str): The input query.
+        prompts (list[dict]): A list of dictionaries containing prompt details.
+        boundary (Union[int, str]): The segment boundary: a number of tokens,
+            ``"paragraph"`` or a closing tag such as ``"</section>"``.
+        params (dict): A dictionary of other parameters.
+
+    Returns:
+        str: The outputs of the final step joined by newlines.
+    """
+    if not prompts:
+        return query
+
+    queues = [asyncio.Queue() for _ in range(len(prompts) + 1)]
+    queues[0].put_nowait(query)
+    queues[0].put_nowait(_END)
+
+    async def run_step(i: int, prompt_details: dict):
+        last_step = i == len(prompts) - 1
+        try:
+            processed_prompt = await aapply_functions(
+                prompt=prompt_details["prompt"],
+                functions=prompt_details["functions"]
+            )
+            while (segment := await queues[i].get()) is not _END:
+                segmenter = StreamSegmenter(boundary)
+                chunks = []
+                async for chunk in amodel_call_stream(
+                        prompt=f"{processed_prompt}\nInput: {segment}",
+                        provider=prompt_details["provider"],
+                        model=prompt_details["model"],
+                        system_prompt=prompt_details["system_prompt"],
+                        **params):
+                    if last_step:
+                        chunks.append(chunk)
+                        continue
+                    for completed in segmenter.feed(chunk):
+                        queues[i + 1].put_nowait(completed)
+                remainder = ("".join(chunks) if last_step
+                             else segmenter.flush())
+                if remainder is not None:
+                    queues[i + 1].put_nowait(remainder)
+        finally:
+            queues[i + 1].put_nowait(_END)
+
+    tasks = [asyncio.create_task(run_step(i, prompt_details))
+             for i, prompt_details in enumerate(prompts)]
+    try:
+        outputs = []
+        while (output := await queues[-1].get()) is not _END:
+            outputs.append(output)
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return "\n".join(output.strip() for output in outputs)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,306 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Local Router Module
+
+Chooses a route without a model call by comparing the query with the
+description of every route. Texts are turned into hashed word and
+character n-gram TF-IDF vectors, or into vectors of an embedding function,
+and the route with the highest cosine similarity wins. Decisions below a
+confidence threshold are left to the LLM selector.
+"""
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Embeds a list of texts into one vector per text
+Embedding_Function = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+@dataclass
+class RouteDecision:
+    """
+    Route chosen by a LocalRouter.
+
+    Attributes:
+        route (str): The route with the highest score.
+        score (float): The cosine similarity of the query and the route.
+        margin (float): The score difference with the second best route.
+        confident (bool): Whether the decision clears the thresholds.
+    """
+    route: str
+    score: float
+    margin: float
+    confident: bool
+
+
+def route_document(key: str, details: Dict) -> str:
+    """
+    Builds the text describing a route.
+
+    The text is made of the route key, its optional ``description`` and
+    ``examples``, and its prompt.
+
+    Args:
+        key (str): The route key.
+        details (Dict): The prompt details of the route.
+
+    Returns:
+        str: The route text.
+    """
+    parts = [key.replace("_", " "), details.get("description", ""),
+             *details.get("examples", []), details.get("prompt", "")]
+    return "\n".join(part for part in parts if part)
+
+
+class HashingVectorizer:
+    """
+    Hashes word unigrams and bigrams and character n-grams of texts into
+    fixed-size count vectors, so no vocabulary has to be fitted.
+    """
+
+    def __init__(self, n_features: int = 2 ** 14,
+                 char_ngrams: Tuple[int, int] = (3, 5)):
+        """
+        Initializes a HashingVectorizer.
+
+        Args:
+            n_features (int): The vector size.
+            char_ngrams (Tuple[int, int]): The smallest and largest
+                character n-gram lengths.
+        """
+        self.n_features = n_features
+        self.char_ngrams = char_ngrams
+
+    def features(self, text: str) -> List[str]:
+        """
+        Returns the n-grams of a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            List[str]: The word and character n-grams.
+        """
+        words = re.findall(r"\w+", text.lower())
+        grams = [f"w:{word}" for word in words]
+        grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        low, high = self.char_ngrams
+        for word in words:
+            padded = f" {word} "
+            for n in range(low, min(high, len(padded)) + 1):
+                grams += [padded[i:i + n]
+                          for i in range(len(padded) - n + 1)]
+        return grams
+
+    def buckets(self, text: str) -> np.ndarray:
+        """
+        Returns the hashed n-grams of a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            np.ndarray: The bucket of every n-gram.
+        """
+        return np.array([zlib.crc32(gram.encode()) % self.n_features
+                         for gram in self.features(text)], dtype=np.int64)
+
+    def transform(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Counts the hashed n-grams of texts.
+
+        Args:
+            texts (Sequence[str]): The texts.
+
+        Returns:
+            np.ndarray: One count vector per text.
+        """
+        vectors = np.zeros((len(texts), self.n_features))
+        for row, text in enumerate(texts):
+            vectors[row] = np.bincount(self.buckets(text),
+                                       minlength=self.n_features)
+        return vectors
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scales vectors to unit length.
+
+    Args:
+        vectors (np.ndarray): The vectors, one per row.
+
+    Returns:
+        np.ndarray: The normalized vectors; zero vectors stay zero.
+    """
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class LocalRouter:
+    """
+    Routes queries by their similarity to the route descriptions.
+
+    By default texts are compared as TF-IDF weighted hashed n-gram vectors,
+    with the document frequencies taken over the route texts. With an
+    embedding function, they are compared as embeddings instead; the route
+    embeddings are computed once and query embeddings are cached.
+    """
+
+    def __init__(self, documents: Dict[str, str],
+                 min_score: float = 0.1,
+                 min_margin: float = 0.05,
+                 embed: Optional[Embedding_Function] = None,
+                 max_cached_queries: int = 1024):
+        """
+        Initializes a LocalRouter.
+
+        Args:
+            documents (Dict[str, str]): The text describing each route,
+                keyed by route.
+            min_score (float): The lowest similarity of a confident
+                decision.
+            min_margin (float): The lowest difference between the best and
+                second best similarity of a confident decision.
+            embed (Optional[Embedding_Function]): Embeds texts in place of
+                the hashed n-gram vectors.
+            max_cached_queries (int): The number of query embeddings kept.
+        """
+        if not documents:
+            raise ValueError("A LocalRouter needs at least one route.")
+        self.routes = list(documents)
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.embed = embed
+        self.max_cached_queries = max_cached_queries
+        self._queries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+        texts = list(documents.values())
+        if embed is None:
+            self._vectorizer = HashingVectorizer()
+            counts = self._vectorizer.transform(texts)
+            frequencies = np.count_nonzero(counts, axis=0)
+            self._idf = np.log((1 + len(texts)) / (1 + frequencies)) + 1
+            self._matrix = _normalize(counts * self._idf)
+        else:
+            self._matrix = _normalize(np.asarray(embed(texts), dtype=float))
+
+    @classmethod
+    def from_routes(cls, routes: Dict[str, Dict], **kwargs) -> "LocalRouter":
+        """
+        Builds a LocalRouter from the prompt details of routes.
+
+        Args:
+            routes (Dict[str, Dict]): The prompt details keyed by route.
+            kwargs (dict): The other LocalRouter arguments.
+
+        Returns:
+            LocalRouter: The router.
+        """
+        return cls({key: route_document(key, details)
+                    for key, details in routes.items()}, **kwargs)
+
+    def _similarities(self, query: str) -> np.ndarray:
+        """
+        Returns the cosine similarity of a query with every route.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            np.ndarray: The similarities in the order of the routes.
+        """
+        if self.embed is None:
+            # Only the columns of the query's n-grams are needed
+            buckets, counts = np.unique(self._vectorizer.buckets(query),
+                                        return_counts=True)
+            weights = counts * self._idf[buckets]
+            norm = np.linalg.norm(weights)
+            if not norm:
+                return np.zeros(len(self.routes))
+            return self._matrix[:, buckets] @ weights / norm
+
+        with self._lock:
+            vector = self._queries.get(query)
+            if vector is not None:
+                self._queries.move_to_end(query)
+        if vector is None:
+            vector = _normalize(np.asarray(self.embed([query])[0],
+                                           dtype=float))
+            with self._lock:
+                self._queries[query] = vector
+                if len(self._queries) > self.max_cached_queries:
+                    self._queries.popitem(last=False)
+        return self._matrix @ vector
+
+    def scores(self, query: str) -> Dict[str, float]:
+        """
+        Returns the similarity of a query with every route.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            Dict[str, float]: The cosine similarity keyed by route.
+        """
+        return dict(zip(self.routes, self._similarities(query).tolist()))
+
+    def classify(self, query: str) -> RouteDecision:
+        """
+        Chooses the route of a query.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            RouteDecision: The best route and whether it is confident.
+        """
+        similarities = self._similarities(query)
+        order = np.argsort(similarities)[::-1]
+        score = float(similarities[order[0]])
+        margin = (score - float(similarities[order[1]])
+                  if len(order) > 1 else score)
+        return RouteDecision(
+            route=self.routes[order[0]], score=score, margin=margin,
+            confident=score >= self.min_score and margin >= self.min_margin)
+
+
+@lru_cache(maxsize=32)
+def _cached_router(documents: Tuple[Tuple[str, str], ...]) -> LocalRouter:
+    """
+    Builds a LocalRouter for route texts.
+
+    Args:
+        documents (Tuple[Tuple[str, str], ...]): The route keys and texts.
+
+    Returns:
+        LocalRouter: The router.
+    """
+    return LocalRouter(dict(documents))
+
+
+def local_router(routes: Dict[str, Dict]) -> LocalRouter:
+    """
+    Returns the hashed n-gram router of a set of routes.
+
+    Routers are cached by the text of their routes, so routing repeatedly
+    over the same routes builds the router once.
+
+    Args:
+        routes (Dict[str, Dict]): The prompt details keyed by route.
+
+    Returns:
+        LocalRouter: The router.
+    """
+    return _cached_router(tuple((key, route_document(key, details))
+                                for key, details in routes.items()))
+
+
+if __name__ == '__main__':
+    pass
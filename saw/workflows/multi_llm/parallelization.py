@@ -4,12 +4,21 @@
 
 """
 import asyncio
+import contextvars
+import logging
+import queue
+import threading
 from concurrent.futures import ThreadPoolExecutor
-from typing import Any
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Iterator, Optional
 
-from saw.core.model_interface import model_call, amodel_call
+from saw.core.model_interface import (model_call, amodel_call,
+                                      model_call_stream, amodel_call_stream)
+from saw.core.tracing import tracer
 from saw.workflows.utils import apply_functions, aapply_functions
 
+logger = logging.getLogger(__name__)
+
 
 def parallel(query: str,
              prompts: list[dict],
@@ -26,10 +35,10 @@ def parallel(query: str,
     Returns:
         list[tuple[str, Any]]: A list of processed outputs.
     """
-    with ThreadPoolExecutor(max_workers=n_workers) as executor:
-        futures = [
-            executor.submit(
-                model_call,
+    def run_branch(i: int, x: dict) -> Any:
+        with tracer.span("parallel.branch", branch=i, provider=x["provider"],
+                         model=x["model"]):
+            return model_call(
                 f"""{apply_functions(prompt=x['prompt'],
                                      functions=x['functions'])
                 }\nInput: {query}""",
@@ -37,7 +46,14 @@ def parallel(query: str,
                 x["model"],
                 x["system_prompt"],
                 **params
-            ) for x in prompts
+            )
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        # Each branch runs in a copy of the caller's context so that its
+        # spans join the caller's trace
+        futures = [
+            executor.submit(contextvars.copy_context().run, run_branch, i, x)
+            for i, x in enumerate(prompts)
         ]
         results = [
             (apply_functions(prompt=prompts[i]["prompt"],
@@ -46,49 +62,163 @@ def parallel(query: str,
         ]
 
         for inp, result in results:
-            print(f"\nInput: {inp}")
-            print(f"Result: {result}")
+            logger.debug("Input: %s\nResult: %s", inp, result)
 
         return results
 
 
 async def aparallel(query: str,
                     prompts: list[dict],
+                    n_workers: Optional[int] = None,
                     **params: dict) -> list[tuple[str, Any]]:
     """Asynchronously parallelizes the processing of multiple inputs.
 
     Args:
         query (str): The input query.
         prompts (list[dict]): A list of dictionaries containing prompt details.
+        n_workers (Optional[int]): The maximum number of branches in flight,
+            or None for no limit beyond the concurrency controller.
         params (dict): A dictionary of other parameters.
 
     Returns:
         list[tuple[str, Any]]: A list of processed outputs.
     """
-    tasks = [
-        asyncio.create_task(
-            amodel_call(
-                f"""{await apply_functions(prompt=x['prompt'],
-                                           functions=x['functions'])
+    semaphore = asyncio.Semaphore(n_workers) if n_workers else nullcontext()
+
+    async def run_branch(i: int, x: dict) -> tuple[str, Any]:
+        processed_prompt = await aapply_functions(prompt=x['prompt'],
+                                                  functions=x['functions'])
+        async with semaphore:
+            with tracer.span("parallel.branch", branch=i,
+                             provider=x["provider"], model=x["model"]):
+                result = await amodel_call(
+                    f"{processed_prompt}\nInput: {query}",
+                    x["provider"], x["model"], x["system_prompt"], **params)
+        return processed_prompt, result
+
+    results = await asyncio.gather(*[run_branch(i, x)
+                                     for i, x in enumerate(prompts)])
+
+    for inp, result in results:
+        logger.debug("Input: %s\nResult: %s", inp, result)
+
+    return list(results)
+
+
+def parallel_stream(query: str,
+                    prompts: list[dict],
+                    n_workers: int = 3,
+                    **params: dict) -> Iterator[tuple[int, str]]:
+    """Parallelizes the processing of multiple inputs, streaming each branch.
+
+    Chunks of the branches are interleaved in the order they arrive.
+    Closing the generator early returns without waiting for the branches:
+    branches not yet started are cancelled, and running ones stop their
+    stream at their next chunk.
+
+    Args:
+        query (str): The input query.
+        prompts (list[dict]): A list of dictionaries containing prompt details.
+        n_workers (int): The number of workers to use.
+        params (dict): A dictionary of other parameters.
+
+    Yields:
+        tuple[int, str]: The index of the branch in ``prompts`` and a chunk
+            of its response.
+    """
+    chunks: queue.Queue = queue.Queue()
+    closed = threading.Event()
+
+    def stream_branch(i: int, x: dict):
+        try:
+            stream = model_call_stream(
+                f"""{apply_functions(prompt=x['prompt'],
+                                     functions=x['functions'])
                 }\nInput: {query}""",
                 x["provider"],
                 x["model"],
                 x["system_prompt"],
-                **params
-            )
-        ) for x in prompts
-    ]
-    results = await asyncio.gather(*tasks)
-    results = [
-        (await aapply_functions(prompt=prompts[i]["prompt"],
-                             functions=prompts[i]["functions"]), result)
-        for i, result in enumerate(results)]
+                **params)
+            try:
+                for chunk in stream:
+                    if closed.is_set():
+                        break
+                    chunks.put((i, chunk))
+            finally:
+                stream.close()
+        finally:
+            chunks.put((i, None))
+
+    executor = ThreadPoolExecutor(max_workers=n_workers)
+    try:
+        futures = [executor.submit(contextvars.copy_context().run,
+                                   stream_branch, i, x)
+                   for i, x in enumerate(prompts)]
+        remaining = len(futures)
+        while remaining:
+            i, chunk = chunks.get()
+            if chunk is None:
+                remaining -= 1
+                futures[i].result()
+            else:
+                yield i, chunk
+    finally:
+        closed.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def aparallel_stream(query: str,
+                           prompts: list[dict],
+                           n_workers: Optional[int] = None,
+                           **params: dict) -> AsyncIterator[tuple[int, str]]:
+    """Asynchronously parallelizes the processing of multiple inputs,
+    streaming each branch.
+
+    Chunks of the branches are interleaved in the order they arrive.
 
-    for inp, result in results:
-        print(f"\nInput: {inp}")
-        print(f"Result: {result}")
+    Args:
+        query (str): The input query.
+        prompts (list[dict]): A list of dictionaries containing prompt details.
+        n_workers (Optional[int]): The maximum number of branches in flight,
+            or None for no limit beyond the concurrency controller.
+        params (dict): A dictionary of other parameters.
 
-    return results
+    Yields:
+        tuple[int, str]: The index of the branch in ``prompts`` and a chunk
+            of its response.
+    """
+    chunks: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(n_workers) if n_workers else nullcontext()
+
+    async def stream_branch(i: int, x: dict):
+        try:
+            processed_prompt = await aapply_functions(
+                prompt=x['prompt'], functions=x['functions'])
+            async with semaphore:
+                async for chunk in amodel_call_stream(
+                        f"{processed_prompt}\nInput: {query}",
+                        x["provider"],
+                        x["model"],
+                        x["system_prompt"],
+                        **params):
+                    await chunks.put((i, chunk))
+        finally:
+            await chunks.put((i, None))
+
+    tasks = [asyncio.create_task(stream_branch(i, x))
+             for i, x in enumerate(prompts)]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            i, chunk = await chunks.get()
+            if chunk is None:
+                remaining -= 1
+                await tasks[i]
+            else:
+                yield i, chunk
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 if __name__ == '__main__':
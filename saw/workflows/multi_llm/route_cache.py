@@ -0,0 +1,379 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Route Decision Cache Module
+
+Remembers the route chosen for a query, so that the same question, or the
+same question worded slightly differently, is routed without asking the
+selector again. Queries are matched on their normalized text, and
+optionally on the MinHash signature of their words for near duplicates.
+Decisions are scoped to the set of routes they were made for.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from saw.core.cache import CacheStats
+
+# Mersenne prime of the MinHash permutations
+_PRIME = np.uint64((1 << 61) - 1)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a query for matching: case, punctuation and whitespace are
+    ignored.
+
+    Args:
+        query (str): The query.
+
+    Returns:
+        str: The lowercase words of the query separated by single spaces.
+    """
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+def _function_name(function: Callable) -> str:
+    """
+    Returns the stable name of a prompt function.
+
+    Args:
+        function (Callable): The function.
+
+    Returns:
+        str: The module and qualified name of the function, which unlike
+            its repr is the same for functions rebuilt on every call.
+    """
+    return (f"{getattr(function, '__module__', '')}."
+            f"{getattr(function, '__qualname__', type(function).__name__)}")
+
+
+@lru_cache(maxsize=256)
+def _digest(fields: Tuple) -> str:
+    """
+    Hashes the stable fields of a set of routes.
+
+    Args:
+        fields (Tuple): The fields, see ``routes_fingerprint``.
+
+    Returns:
+        str: The hex digest of the fields.
+    """
+    return hashlib.sha256(json.dumps(fields).encode()).hexdigest()
+
+
+def routes_fingerprint(routes: Dict[str, Dict]) -> str:
+    """
+    Builds a hash of a set of routes, which changes whenever a route is
+    added, removed, or given another prompt, provider, model, system prompt
+    or prompt functions.
+
+    Only these fields are hashed, and the digest of each distinct set of
+    routes is computed once.
+
+    Args:
+        routes (Dict[str, Dict]): The prompt details keyed by route.
+
+    Returns:
+        str: The hex digest of the routes.
+    """
+    fields = tuple(sorted(
+        (name, str(details.get("prompt", "")),
+         str(details.get("provider", "")), str(details.get("model", "")),
+         str(details.get("system_prompt", "")),
+         tuple(_function_name(function)
+               for function in details.get("functions", [])))
+        for name, details in routes.items()))
+    return _digest(fields)
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures of the word unigrams and bigrams of texts,
+    whose agreement estimates the Jaccard similarity of the texts.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 0):
+        """
+        Initializes a MinHasher.
+
+        Args:
+            num_perm (int): The signature length.
+            seed (int): The seed of the hash permutations.
+        """
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Computes the signature of a normalized text.
+
+        Args:
+            text (str): The normalized text.
+
+        Returns:
+            np.ndarray: The minimum of every hash permutation over the
+                shingles of the text.
+        """
+        words = text.split()
+        shingles = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        if not shingles:
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        hashes = np.array([zlib.crc32(s.encode()) for s in shingles],
+                          dtype=np.uint64)
+        # Both factors are below 2 ** 32, so the products fit in 64 bits
+        permuted = (np.outer(hashes, self._a) + self._b) % _PRIME
+        return permuted.min(axis=0)
+
+
+@dataclass
+class RouteCacheStats(CacheStats):
+    """
+    Hit and miss counters of a route decision cache.
+
+    Attributes:
+        near_hits (int): The hits answered by a similar query rather than
+            the same normalized query.
+        expirations (int): The number of entries found expired.
+    """
+    near_hits: int = 0
+    expirations: int = 0
+
+
+@dataclass
+class _Entry:
+    """
+    Cached route decision.
+    """
+    selection: str
+    reasoning: str
+    expiry: float
+    signature: Optional[np.ndarray]
+    bands: List[Tuple]
+
+
+class RouteDecisionCache:
+    """
+    LRU cache of route decisions with optional expiry and near-duplicate
+    matching.
+
+    Entries are keyed by the normalized query and the fingerprint of the
+    routes, so a decision is never reused once the routes change. With
+    ``similarity`` set, a query also matches a cached query whose estimated
+    Jaccard similarity over words and word pairs is at least
+    ``similarity``; candidates are found with locality-sensitive hashing of
+    the MinHash signatures.
+    """
+
+    def __init__(self, max_entries: int = 4096,
+                 ttl: Optional[float] = None,
+                 similarity: Optional[float] = None,
+                 num_perm: int = 64,
+                 bands: int = 16):
+        """
+        Initializes a RouteDecisionCache.
+
+        Args:
+            max_entries (int): The maximum number of cached decisions.
+            ttl (Optional[float]): Seconds before a decision expires.
+            similarity (Optional[float]): The lowest estimated similarity
+                of a near-duplicate match, or None to only match the same
+                normalized query.
+            num_perm (int): The MinHash signature length.
+            bands (int): The number of locality-sensitive hashing bands,
+                which must divide ``num_perm``.
+        """
+        if num_perm % bands:
+            raise ValueError("The number of bands must divide num_perm.")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.stats = RouteCacheStats()
+        self._bands = bands
+        self._hasher = MinHasher(num_perm) if similarity else None
+        self._entries: OrderedDict[Tuple[str, str], _Entry] = OrderedDict()
+        self._index: Dict[Tuple, Set[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, routes_key: str,
+                   signature: np.ndarray) -> List[Tuple]:
+        """
+        Splits a signature into its locality-sensitive hashing buckets.
+
+        Args:
+            routes_key (str): The fingerprint of the routes.
+            signature (np.ndarray): The MinHash signature.
+
+        Returns:
+            List[Tuple]: The bucket of every band.
+        """
+        return [(routes_key, i, band.tobytes())
+                for i, band in enumerate(np.split(signature, self._bands))]
+
+    def _remove(self, key: Tuple[str, str]):
+        """
+        Removes an entry while holding the lock.
+
+        Args:
+            key (Tuple[str, str]): The routes fingerprint and query.
+        """
+        entry = self._entries.pop(key)
+        for band in entry.bands:
+            keys = self._index.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[band]
+
+    def _live(self, key: Tuple[str, str]) -> Optional[_Entry]:
+        """
+        Returns an entry unless it has expired, while holding the lock.
+
+        Args:
+            key (Tuple[str, str]): The routes fingerprint and query.
+
+        Returns:
+            Optional[_Entry]: The entry, or None if absent or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expiry < time.monotonic():
+            self._remove(key)
+            self.stats.expirations += 1
+            return None
+        return entry
+
+    def get(self, query: str,
+            routes: Dict[str, Dict]) -> Optional[Tuple[str, str]]:
+        """
+        Looks up the route decision of a query.
+
+        Args:
+            query (str): The query.
+            routes (Dict[str, Dict]): The routes to choose from.
+
+        Returns:
+            Optional[Tuple[str, str]]: The selection and reasoning, or None
+                on a miss.
+        """
+        routes_key = routes_fingerprint(routes)
+        text = normalize_query(query)
+        with self._lock:
+            entry = self._live((routes_key, text))
+            if entry is not None:
+                self._entries.move_to_end((routes_key, text))
+                self.stats.hits += 1
+                return entry.selection, entry.reasoning
+
+            if self._hasher is not None:
+                signature = self._hasher.signature(text)
+                candidates = set()
+                for band in self._band_keys(routes_key, signature):
+                    candidates |= self._index.get(band, set())
+                best, best_similarity = None, self.similarity
+                for key in candidates:
+                    entry = self._live(key)
+                    if entry is None:
+                        continue
+                    similarity = float(np.mean(entry.signature == signature))
+                    if similarity >= best_similarity:
+                        best, best_similarity = key, similarity
+                if best is not None:
+                    entry = self._entries[best]
+                    self._entries.move_to_end(best)
+                    self.stats.hits += 1
+                    self.stats.near_hits += 1
+                    return entry.selection, entry.reasoning
+
+            self.stats.misses += 1
+            return None
+
+    def set(self, query: str, routes: Dict[str, Dict], selection: str,
+            reasoning: str = ""):
+        """
+        Stores the route decision of a query.
+
+        Args:
+            query (str): The query.
+            routes (Dict[str, Dict]): The routes chosen from.
+            selection (str): The selected route.
+            reasoning (str): The reasoning of the selection.
+        """
+        routes_key = routes_fingerprint(routes)
+        key = (routes_key, normalize_query(query))
+        signature, bands = None, []
+        if self._hasher is not None:
+            signature = self._hasher.signature(key[1])
+            bands = self._band_keys(routes_key, signature)
+        expiry = (time.monotonic() + self.ttl
+                  if self.ttl is not None else float("inf"))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(selection, reasoning, expiry,
+                                        signature, bands)
+            for band in bands:
+                self._index.setdefault(band, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats.evictions += 1
+
+    def invalidate(self, routes: Optional[Dict[str, Dict]] = None):
+        """
+        Removes the decisions made for a set of routes.
+
+        Args:
+            routes (Optional[Dict[str, Dict]]): The routes, or None to
+                remove every decision.
+        """
+        with self._lock:
+            if routes is None:
+                self._entries.clear()
+                self._index.clear()
+                return
+            routes_key = routes_fingerprint(routes)
+            for key in [key for key in self._entries
+                        if key[0] == routes_key]:
+                self._remove(key)
+
+
+_route_cache: Optional[RouteDecisionCache] = None
+
+
+def set_route_cache(cache: Optional[RouteDecisionCache]):
+    """
+    Sets the route decision cache used by ``route`` and ``aroute``.
+
+    Args:
+        cache (Optional[RouteDecisionCache]): The cache, or None to disable.
+    """
+    global _route_cache
+    _route_cache = cache
+
+
+def get_route_cache() -> Optional[RouteDecisionCache]:
+    """
+    Returns the route decision cache used by ``route`` and ``aroute``.
+
+    Returns:
+        Optional[RouteDecisionCache]: The cache, or None when disabled.
+    """
+    return _route_cache
+
+
+if __name__ == '__main__':
+    pass
@@ -3,33 +3,256 @@
 """ LLM Routing Module
 
 """
-from saw.core.model_interface import model_call, amodel_call
-from saw.core.processor import extract_xml
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from saw.core.model_interface import (model_call, amodel_call,
+                                      model_call_stream, amodel_call_stream)
+from saw.core.processor import XMLTagExtractor, extract_tags
+from saw.core.tracing import tracer
+from saw.workflows.multi_llm.local_router import LocalRouter, local_router
+from saw.workflows.multi_llm.route_cache import get_route_cache
 from saw.workflows.multi_llm.templates import SELECTOR_TEMPLATE
 from saw.workflows.utils import apply_functions, aapply_functions
 
+logger = logging.getLogger(__name__)
+
+# Ways of choosing a route: the LLM selector, or the local router with the
+# LLM selector as fallback
+ROUTING_STRATEGIES = ("llm", "local")
+
+
+def match_route(selection: str, routes: Iterable[str]) -> Optional[str]:
+    """Returns the only route a partial selection can still turn into.
+
+    Args:
+        selection (str): The selection generated so far.
+        routes (Iterable[str]): The route keys.
+
+    Returns:
+        Optional[str]: The route, or None if the selection is empty or
+            matches no route or several.
+    """
+    selection = selection.strip().lower()
+    if not selection:
+        return None
+    candidates = [key for key in routes if key.startswith(selection)]
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def dispatch_route(selection: str,
+                   prompt: dict,
+                   routes: dict[str, dict],
+                   **params: dict) -> str:
+    """Calls the specialized prompt of a route.
+
+    Args:
+        selection (str): The selected route key.
+        prompt (dict): The input prompt details.
+        routes (dict[str, dict]): \
+            A dictionary mapping route keys to prompt details.
+        params (dict): A dictionary of other parameters.
+
+    Returns:
+        str: The response from the selected support team.
+    """
+    # Process prompt with selected specialized prompt
+    selected_prompt_details = routes[selection]
+    selected_processed = apply_functions(
+        prompt=selected_prompt_details["prompt"],
+        functions=selected_prompt_details["functions"]
+    )
+
+    with tracer.span("route.dispatch", route=selection,
+                     provider=selected_prompt_details["provider"],
+                     model=selected_prompt_details["model"]):
+        return model_call(
+            prompt=f"{selected_processed}\nQuery: {prompt['prompt']}",
+            provider=selected_prompt_details["provider"],
+            model=selected_prompt_details["model"],
+            system_prompt=selected_prompt_details["system_prompt"],
+            **params
+        )
+
+
+async def adispatch_route(selection: str,
+                          prompt: dict,
+                          routes: dict[str, dict],
+                          **params: dict) -> str:
+    """Asynchronously calls the specialized prompt of a route.
+
+    Args:
+        selection (str): The selected route key.
+        prompt (dict): The input prompt details.
+        routes (dict[str, dict]): \
+            A dictionary mapping route keys to prompt details.
+        params (dict): A dictionary of other parameters.
+
+    Returns:
+        str: The response from the selected support team.
+    """
+    # Process prompt with selected specialized prompt
+    selected_prompt_details = routes[selection]
+    selected_processed = await aapply_functions(
+        prompt=selected_prompt_details["prompt"],
+        functions=selected_prompt_details["functions"]
+    )
+
+    with tracer.span("route.dispatch", route=selection,
+                     provider=selected_prompt_details["provider"],
+                     model=selected_prompt_details["model"]):
+        return await amodel_call(
+            prompt=f"{selected_processed}\nQuery: {prompt['prompt']}",
+            provider=selected_prompt_details["provider"],
+            model=selected_prompt_details["model"],
+            system_prompt=selected_prompt_details["system_prompt"],
+            **params
+        )
+
+
+def select_cached(prompt: dict,
+                  routes: dict[str, dict],
+                  use_cache: bool = True) -> Optional[str]:
+    """Looks up the route decision cache, if one is set.
+
+    Args:
+        prompt (dict): The input prompt details.
+        routes (dict[str, dict]): \
+            A dictionary mapping route keys to prompt details.
+        use_cache (bool): Whether to use the route decision cache.
+
+    Returns:
+        Optional[str]: The cached route, or None on a miss.
+    """
+    route_cache = get_route_cache()
+    if route_cache is None or not use_cache:
+        return None
+    decision = route_cache.get(prompt["prompt"], routes)
+    if decision is None or decision[0] not in routes:
+        return None
+    selection, reasoning = decision
+    with tracer.span("route.select", strategy="cache", selection=selection):
+        logger.debug("Cached reasoning: %s\nSelection: %s", reasoning,
+                     selection)
+    return selection
+
+
+def store_selection(prompt: dict,
+                    routes: dict[str, dict],
+                    selection: str,
+                    reasoning: str,
+                    use_cache: bool = True):
+    """Stores a selector decision in the route decision cache, if one is set.
+
+    Args:
+        prompt (dict): The input prompt details.
+        routes (dict[str, dict]): \
+            A dictionary mapping route keys to prompt details.
+        selection (str): The selected route.
+        reasoning (str): The reasoning of the selection.
+        use_cache (bool): Whether to use the route decision cache.
+    """
+    route_cache = get_route_cache()
+    if (route_cache is None or not use_cache
+            or selection not in routes):
+        return
+    route_cache.set(prompt["prompt"], routes, selection, reasoning)
+
+
+def select_local(prompt: dict,
+                 routes: dict[str, dict],
+                 strategy: str,
+                 router: Optional[LocalRouter]) -> Optional[str]:
+    """Chooses a route without the LLM selector, if the strategy allows.
+
+    Args:
+        prompt (dict): The input prompt details.
+        routes (dict[str, dict]): \
+            A dictionary mapping route keys to prompt details.
+        strategy (str): The routing strategy.
+        router (Optional[LocalRouter]): The local router, or None for the
+            hashed n-gram router of the routes.
+
+    Returns:
+        Optional[str]: The route, or None if the LLM selector has to
+            choose.
+    """
+    if strategy not in ROUTING_STRATEGIES:
+        raise ValueError(f"Unknown routing strategy: {strategy}. Expected "
+                         f"one of {ROUTING_STRATEGIES}.")
+    if strategy == "llm":
+        return None
+    with tracer.span("route.select", strategy=strategy) as span:
+        decision = (router or local_router(routes)).classify(prompt["prompt"])
+        span.set_attributes(selection=decision.route, score=decision.score,
+                            margin=decision.margin,
+                            confident=decision.confident)
+    if not decision.confident:
+        logger.debug("Local route %s is not confident (score %.3f, margin "
+                     "%.3f), asking the LLM selector", decision.route,
+                     decision.score, decision.margin)
+        return None
+    return decision.route
+
 
 def route(
         prompt: dict,
         reasoning_prompt: str,
         route_prompt: str,
         routes: dict[str, dict],
+        early_exit: bool = False,
+        speculate: bool = True,
+        strategy: str = "llm",
+        router: Optional[LocalRouter] = None,
+        route_cache: bool = True,
         **params: dict
 ) -> str:
     """Routes a prompt to the most appropriate model call based on the content.
 
+    With ``early_exit``, the selector response is streamed and stops as soon
+    as its ``</selection>`` tag arrives, and the selected route is called
+    right away. With ``speculate`` as well, the route is called as soon as
+    the partial selection matches a single route; if the final selection
+    differs, that response is discarded and the selected route is called.
+    A model call cannot be stopped once it is running, so a mispredicted
+    route keeps running in the background and is still billed.
+
     Args:
         prompt (dict): The input prompt details.
         reasoning_prompt (str): The template for the reasoning prompt.
         route_prompt (str): The template for the route prompt.
         routes (dict[str, dict]): \
             A dictionary mapping route keys to prompt details.
+        early_exit (bool): Whether to dispatch as soon as the selection is
+            complete.
+        speculate (bool): Whether to dispatch an early exit speculatively
+            once the selection can only match one route. Saves latency at
+            the cost of an extra, uncancellable route call whenever the
+            prediction is wrong.
+        strategy (str): ``"llm"`` to let the LLM selector choose, or
+            ``"local"`` to choose with the local router and only ask the
+            LLM selector when the router is not confident.
+        router (Optional[LocalRouter]): The router of the ``"local"``
+            strategy, or None for the hashed n-gram router of the routes.
+        route_cache (bool): Whether to use the route decision cache, if one
+            is set. The ``cache`` parameter only controls the response
+            cache of the model calls.
         params (dict): A dictionary of other parameters.
 
     Returns:
         str: The response from the selected support team.
     """
-    print(f"\nAvailable routes: {list(routes.keys())}")
+    logger.debug("Available routes: %s", list(routes))
+
+    selection = (select_cached(prompt, routes, route_cache)
+                 or select_local(prompt, routes, strategy, router))
+    if selection is not None:
+        result = dispatch_route(selection, prompt, routes, **params)
+        logger.debug("Result: %s", result)
+        return result
 
     selector_prompt = SELECTOR_TEMPLATE.format(
         routes=list(routes.keys()),
@@ -40,36 +263,101 @@ def route(
 
     selector_processed = apply_functions(selector_prompt,
                                          functions=prompt["functions"])
-    route_response = model_call(prompt=selector_processed,
-                                provider=prompt["provider"],
-                                model=prompt["model"],
-                                system_prompt=prompt["system_prompt"],
-                                **params)
+    if early_exit:
+        return _route_early_exit(selector_processed, prompt, routes,
+                                 speculate, route_cache, **params)
 
-    reasoning = extract_xml(route_response, "reasoning")
-    selection = extract_xml(route_response, "selection").strip().lower()
+    with tracer.span("route.select", provider=prompt["provider"],
+                     model=prompt["model"]) as span:
+        route_response = model_call(prompt=selector_processed,
+                                    provider=prompt["provider"],
+                                    model=prompt["model"],
+                                    system_prompt=prompt["system_prompt"],
+                                    **params)
 
-    print("\nRouting Analysis:")
-    print(f"Reasoning: {reasoning}")
-    print(f"Selection: {selection}")
+        tags = extract_tags(route_response, "reasoning", "selection")
+        reasoning = tags["reasoning"]
+        selection = tags["selection"].strip().lower()
+        span.set_attribute("selection", selection)
+    logger.debug("Reasoning: %s\nSelection: %s", reasoning, selection)
+    store_selection(prompt, routes, selection, reasoning,
+                    route_cache)
 
-    # Process prompt with selected specialized prompt
-    selected_prompt_details = routes[selection]
-    selected_processed = apply_functions(
-        prompt=selected_prompt_details["prompt"],
-        functions=selected_prompt_details["functions"]
-    )
-    print(f"Model: {selected_prompt_details['provider']}-"
-          f"{selected_prompt_details['model']}")
-
-    result = model_call(
-        prompt=f"{selected_processed}\nQuery: {prompt['prompt']}",
-        provider=selected_prompt_details["provider"],
-        model=selected_prompt_details["model"],
-        system_prompt=selected_prompt_details["system_prompt"],
-        **params
-    )
-    print(f"Result: {result}")
+    result = dispatch_route(selection, prompt, routes, **params)
+    logger.debug("Result: %s", result)
+    return result
+
+
+def _route_early_exit(selector_processed: str,
+                      prompt: dict,
+                      routes: dict[str, dict],
+                      speculate: bool,
+                      route_cache: bool,
+                      **params: dict) -> str:
+    """Streams the selector and dispatches as soon as the selection allows.
+
+    Args:
+        selector_processed (str): The selector prompt.
+        prompt (dict): The input prompt details.
+        routes (dict[str, dict]): \
+            A dictionary mapping route keys to prompt details.
+        speculate (bool): Whether to dispatch speculatively.
+        route_cache (bool): Whether to store the selection in the route
+            decision cache.
+        params (dict): A dictionary of other parameters.
+
+    Returns:
+        str: The response from the selected support team.
+    """
+    speculative: Optional[tuple[str, Future]] = None
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        with tracer.span("route.select", provider=prompt["provider"],
+                         model=prompt["model"], early_exit=True) as span:
+            extractor = XMLTagExtractor(("reasoning", "selection"))
+            stream = model_call_stream(prompt=selector_processed,
+                                       provider=prompt["provider"],
+                                       model=prompt["model"],
+                                       system_prompt=prompt["system_prompt"],
+                                       **params)
+            try:
+                for chunk in stream:
+                    # Stopping the stream cancels the rest of the selector
+                    # generation
+                    if "selection" in extractor.feed(chunk):
+                        break
+                    if speculate and speculative is None:
+                        candidate = match_route(
+                            extractor.partial("selection"), routes)
+                        if candidate is not None:
+                            speculative = (candidate, executor.submit(
+                                contextvars.copy_context().run,
+                                dispatch_route, candidate, prompt, routes,
+                                **params))
+            finally:
+                stream.close()
+            reasoning = extractor.get("reasoning")
+            selection = extractor.get("selection").strip().lower()
+            span.set_attributes(
+                selection=selection,
+                speculative=speculative[0] if speculative else None)
+        logger.debug("Reasoning: %s\nSelection: %s", reasoning, selection)
+        store_selection(prompt, routes, selection, reasoning,
+                        route_cache)
+
+        if speculative is not None and speculative[0] == selection:
+            result = speculative[1].result()
+        else:
+            if speculative is not None:
+                logger.debug("Discarding speculative route %s",
+                             speculative[0])
+                # Only stops a call that has not started yet; a running one
+                # finishes in the background and is still billed
+                speculative[1].cancel()
+            result = dispatch_route(selection, prompt, routes, **params)
+    finally:
+        executor.shutdown(wait=False)
+    logger.debug("Result: %s", result)
     return result
 
 
@@ -78,22 +366,55 @@ async def aroute(
         reasoning_prompt: str,
         route_prompt: str,
         routes: dict[str, dict],
+        early_exit: bool = False,
+        speculate: bool = True,
+        strategy: str = "llm",
+        router: Optional[LocalRouter] = None,
+        route_cache: bool = True,
         **params: dict
 ) -> str:
     """Asynchronously routes a prompt to the most appropriate model call.
 
+    With ``early_exit``, the selector response is streamed and stops as soon
+    as its ``</selection>`` tag arrives, and the selected route is called
+    right away. With ``speculate`` as well, the route is called as soon as
+    the partial selection matches a single route; if the final selection
+    differs, that call is cancelled and the selected route is called. The
+    tokens it generated before the cancellation are still billed.
+
     Args:
         prompt (dict): The input prompt details.
         reasoning_prompt (str): The template for the reasoning prompt.
         route_prompt (str): The template for the route prompt.
         routes (dict[str, dict]): \
             A dictionary mapping route keys to prompt details.
+        early_exit (bool): Whether to dispatch as soon as the selection is
+            complete.
+        speculate (bool): Whether to dispatch an early exit speculatively
+            once the selection can only match one route. Saves latency at
+            the cost of a partial route call whenever the prediction is
+            wrong.
+        strategy (str): ``"llm"`` to let the LLM selector choose, or
+            ``"local"`` to choose with the local router and only ask the
+            LLM selector when the router is not confident.
+        router (Optional[LocalRouter]): The router of the ``"local"``
+            strategy, or None for the hashed n-gram router of the routes.
+        route_cache (bool): Whether to use the route decision cache, if one
+            is set. The ``cache`` parameter only controls the response
+            cache of the model calls.
         params (dict): A dictionary of other parameters.
 
     Returns:
         str: The response from the selected support team.
     """
-    print(f"\nAvailable routes: {list(routes.keys())}")
+    logger.debug("Available routes: %s", list(routes))
+
+    selection = (select_cached(prompt, routes, route_cache)
+                 or select_local(prompt, routes, strategy, router))
+    if selection is not None:
+        result = await adispatch_route(selection, prompt, routes, **params)
+        logger.debug("Result: %s", result)
+        return result
 
     selector_prompt = SELECTOR_TEMPLATE.format(
         routes=list(routes.keys()),
@@ -104,38 +425,105 @@ async def aroute(
 
     selector_processed = await aapply_functions(prompt=selector_prompt,
                                                 functions=prompt["functions"])
-    route_response = await amodel_call(
-        prompt=selector_processed,
-        provider=prompt["provider"],
-        model=prompt["model"],
-        system_prompt=prompt["system_prompt"],
-        **params
-    )
+    if early_exit:
+        return await _aroute_early_exit(selector_processed, prompt, routes,
+                                        speculate, route_cache, **params)
 
-    reasoning = extract_xml(route_response, "reasoning")
-    selection = extract_xml(route_response, "selection").strip().lower()
+    with tracer.span("route.select", provider=prompt["provider"],
+                     model=prompt["model"]) as span:
+        route_response = await amodel_call(
+            prompt=selector_processed,
+            provider=prompt["provider"],
+            model=prompt["model"],
+            system_prompt=prompt["system_prompt"],
+            **params
+        )
 
-    print("\nRouting Analysis:")
-    print(f"Reasoning: {reasoning}")
-    print(f"Selection: {selection}")
+        tags = extract_tags(route_response, "reasoning", "selection")
+        reasoning = tags["reasoning"]
+        selection = tags["selection"].strip().lower()
+        span.set_attribute("selection", selection)
+    logger.debug("Reasoning: %s\nSelection: %s", reasoning, selection)
+    store_selection(prompt, routes, selection, reasoning,
+                    route_cache)
 
-    # Process prompt with selected specialized prompt
-    selected_prompt_details = routes[selection]
-    selected_processed = await aapply_functions(
-        prompt=selected_prompt_details["prompt"],
-        functions=selected_prompt_details["functions"]
-    )
-    print(f"Model: {selected_prompt_details['provider']}-"
-          f"{selected_prompt_details['model']}")
-
-    result = await amodel_call(
-        prompt=f"{selected_processed}\nQuery: {prompt['prompt']}",
-        provider=selected_prompt_details["provider"],
-        model=selected_prompt_details["model"],
-        system_prompt=selected_prompt_details["system_prompt"],
-        **params
-    )
-    print(f"Result: {result}")
+    result = await adispatch_route(selection, prompt, routes, **params)
+    logger.debug("Result: %s", result)
+    return result
+
+
+async def _aroute_early_exit(selector_processed: str,
+                             prompt: dict,
+                             routes: dict[str, dict],
+                             speculate: bool,
+                             route_cache: bool,
+                             **params: dict) -> str:
+    """Asynchronously streams the selector and dispatches as soon as the
+    selection allows.
+
+    Args:
+        selector_processed (str): The selector prompt.
+        prompt (dict): The input prompt details.
+        routes (dict[str, dict]): \
+            A dictionary mapping route keys to prompt details.
+        speculate (bool): Whether to dispatch speculatively.
+        route_cache (bool): Whether to store the selection in the route
+            decision cache.
+        params (dict): A dictionary of other parameters.
+
+    Returns:
+        str: The response from the selected support team.
+    """
+    speculative: Optional[tuple[str, asyncio.Task]] = None
+    try:
+        with tracer.span("route.select", provider=prompt["provider"],
+                         model=prompt["model"], early_exit=True) as span:
+            extractor = XMLTagExtractor(("reasoning", "selection"))
+            stream = amodel_call_stream(
+                prompt=selector_processed,
+                provider=prompt["provider"],
+                model=prompt["model"],
+                system_prompt=prompt["system_prompt"],
+                **params
+            )
+            try:
+                async for chunk in stream:
+                    # Stopping the stream cancels the rest of the selector
+                    # generation
+                    if "selection" in extractor.feed(chunk):
+                        break
+                    if speculate and speculative is None:
+                        candidate = match_route(
+                            extractor.partial("selection"), routes)
+                        if candidate is not None:
+                            speculative = (candidate, asyncio.create_task(
+                                adispatch_route(candidate, prompt, routes,
+                                                **params)))
+            finally:
+                await stream.aclose()
+            reasoning = extractor.get("reasoning")
+            selection = extractor.get("selection").strip().lower()
+            span.set_attributes(
+                selection=selection,
+                speculative=speculative[0] if speculative else None)
+        logger.debug("Reasoning: %s\nSelection: %s", reasoning, selection)
+        store_selection(prompt, routes, selection, reasoning,
+                        route_cache)
+
+        if speculative is not None and speculative[0] == selection:
+            result = await speculative[1]
+        else:
+            if speculative is not None:
+                logger.debug("Discarding speculative route %s",
+                             speculative[0])
+                speculative[1].cancel()
+            result = await adispatch_route(selection, prompt, routes,
+                                           **params)
+    except BaseException:
+        if speculative is not None:
+            speculative[1].cancel()
+        raise
+    logger.debug("Result: %s", result)
     return result
 
 if __name__ == '__main__':
@@ -3,14 +3,23 @@
 """ Symphonic LLM Module
 
 """
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from typing import Any, Dict, List, Optional, Tuple
 
-from saw.core.model_interface import model_call, amodel_call
-from saw.core.processor import extract_xml, parse_tasks
+from saw.core.model_interface import (model_call, amodel_call,
+                                      model_call_stream, amodel_call_stream)
+from saw.core.processor import TaskStreamParser, extract_xml
+from saw.core.tracing import tracer
 from saw.workflows.symphonic_llm.templates import (COMPOSER_PROMPT,
                                                           WORKER_PROMPT)
 from saw.workflows.utils import apply_functions, aapply_functions
 
+logger = logging.getLogger(__name__)
+
 
 def format_prompt(template: str, **kwargs) -> str:
     """
@@ -45,7 +54,7 @@ def handle_worker_response(worker_response: str,
     if not result:
         result = worker_response
 
-    print(f"Worker Response: {result}")
+    logger.debug("Worker response: %s", result)
 
     return {
         "type": task_info["type"],
@@ -54,93 +63,184 @@ def handle_worker_response(worker_response: str,
     }
 
 
-def process_tasks(tasks: List[Dict[str, Any]],
-                  context: Dict[str, Any]) -> List[Dict[str, Any]]:
+def prepare_task_context(task_info: Dict[str, Any],
+                         context: Dict[str, Any]) -> Tuple[Dict[str, Any],
+                                                           List[Any]]:
     """
-    Process each task using the worker LLM.
+    Prepare the context and functions of a single task.
+
+    The worker context is copied, so tasks can run concurrently, and the
+    worker prompt is formatted with the task variables.
 
     Args:
-        tasks (List[Dict[str, Any]]): List of task dictionaries.
+        task_info (Dict[str, Any]): The task information.
         context (Dict[str, Any]): Context dictionary.
 
     Returns:
-        List[Dict[str, Any]]: List of worker results.
+        Tuple[Dict[str, Any], List[Any]]: The task context and the functions
+            of the task type.
+    """
+    task_functions = []
+    for s in context['tasks']:
+        if task_info['type'] in s['type']:
+            task_functions = s['functions']
+    task_context = {**context,
+                    'original_task': context['task'],
+                    'task_type': task_info['type'],
+                    'task_description': task_info['description']}
+    task_context['prompt'] = format_prompt(context['prompt'], **task_context)
+    return task_context, task_functions
+
+
+def handle_worker_error(error: Exception,
+                        task_info: Dict[str, Any]) -> Dict[str, Any]:
     """
-    worker_results = []
+    Handle a failed worker task without failing the other tasks.
 
-    for task_info in tasks:
-        task_functions = []
-        for s in context['tasks']:
-            if task_info['type'] in s['type']:
-                task_functions = s['functions']
-        context['original_task'] = context['task']
-        context['task_type'] = task_info['type']
-        context['task_description'] = task_info['description']
+    Args:
+        error (Exception): The error raised by the task.
+        task_info (Dict[str, Any]): The task information.
 
-        task_info["prompt"] = format_prompt(WORKER_PROMPT, **context)
+    Returns:
+        Dict[str, Any]: The worker result with the error.
+    """
+    logger.warning("Worker task %s failed: %r", task_info["type"], error)
+    return {
+        "type": task_info["type"],
+        "description": task_info["description"],
+        "result": None,
+        "error": repr(error)
+    }
 
+
+def process_task(task_info: Dict[str, Any],
+                 context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Process a single task using the worker LLM.
+
+    Args:
+        task_info (Dict[str, Any]): The task information.
+        context (Dict[str, Any]): Context dictionary.
+
+    Returns:
+        Dict[str, Any]: The worker result.
+    """
+    task_context, task_functions = prepare_task_context(task_info, context)
+    try:
         processed_prompt = apply_functions(
-            prompt=task_info["prompt"],
+            prompt=format_prompt(WORKER_PROMPT, **task_context),
             functions=task_functions
         )
 
-        worker_response = model_call(
-            prompt=processed_prompt,
-            provider=context['provider'],
-            model=context['model'],
-            system_prompt=context['system_prompt']
-        )
+        with tracer.span("symphony.worker", task_type=task_info['type'],
+                         provider=context['provider'],
+                         model=context['model']):
+            worker_response = model_call(
+                prompt=processed_prompt,
+                provider=context['provider'],
+                model=context['model'],
+                system_prompt=context['system_prompt']
+            )
+    except Exception as e:
+        return handle_worker_error(e, task_info)
 
-        worker_response_constructed = handle_worker_response(
-            worker_response=worker_response, task_info=task_info)
+    return handle_worker_response(worker_response=worker_response,
+                                  task_info=task_info)
 
-        worker_results.append(worker_response_constructed)
 
-    return worker_results
+async def aprocess_task(task_info: Dict[str, Any],
+                        context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Asynchronously process a single task using the worker LLM.
 
+    Args:
+        task_info (Dict[str, Any]): The task information.
+        context (Dict[str, Any]): Context dictionary.
 
-async def aprocess_tasks(tasks: List[Dict[str, Any]],
-                         context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    Returns:
+        Dict[str, Any]: The worker result.
     """
-    Asynchronously process each task using the worker LLM.
+    task_context, task_functions = prepare_task_context(task_info, context)
+    try:
+        processed_prompt = await aapply_functions(
+            prompt=format_prompt(WORKER_PROMPT, **task_context),
+            functions=task_functions
+        )
+
+        with tracer.span("symphony.worker", task_type=task_info['type'],
+                         provider=context['provider'],
+                         model=context['model']):
+            worker_response = await amodel_call(
+                prompt=processed_prompt,
+                provider=context['provider'],
+                model=context['model'],
+                system_prompt=context['system_prompt']
+            )
+    except Exception as e:
+        return handle_worker_error(e, task_info)
+
+    return handle_worker_response(worker_response=worker_response,
+                                  task_info=task_info)
+
+
+def process_tasks(tasks: List[Dict[str, Any]],
+                  context: Dict[str, Any],
+                  n_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Process the tasks concurrently using the worker LLM.
+
+    A failed task is returned with its error instead of failing the others.
 
     Args:
         tasks (List[Dict[str, Any]]): List of task dictionaries.
         context (Dict[str, Any]): Context dictionary.
+        n_workers (Optional[int]): The maximum number of tasks in flight, or
+            None to run every task at once.
 
     Returns:
-        List[Dict[str, Any]]: List of worker results.
+        List[Dict[str, Any]]: List of worker results in the order of the
+            tasks.
     """
-    worker_results = []
-
-    for task_info in tasks:
-        task_functions = []
-        for s in context['tasks']:
-            if task_info['type'] in s['type']:
-                task_functions = s['functions']
-        context['original_task'] = context['task']
-        context['task_type'] = task_info['type']
-        context['task_description'] = task_info['description']
+    if not tasks:
+        return []
+
+    with ThreadPoolExecutor(max_workers=n_workers or len(tasks)) as executor:
+        # Each task runs in a copy of the caller's context so that its spans
+        # join the caller's trace
+        futures = [executor.submit(contextvars.copy_context().run,
+                                   process_task, task_info, context)
+                   for task_info in tasks]
+        return [future.result() for future in futures]
+
+
+async def aprocess_tasks(
+        tasks: List[Dict[str, Any]],
+        context: Dict[str, Any],
+        n_workers: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Asynchronously process the tasks concurrently using the worker LLM.
 
-        task_info["prompt"] = format_prompt(WORKER_PROMPT, **context)
+    A failed task is returned with its error instead of failing the others.
 
-        processed_prompt = await aapply_functions(
-            prompt=task_info["prompt"],
-            functions=task_functions
-        )
-        worker_response = await amodel_call(
-            prompt=processed_prompt,
-            provider=context['provider'],
-            model=context['model'],
-            system_prompt=context['system_prompt']
-        )
+    Args:
+        tasks (List[Dict[str, Any]]): List of task dictionaries.
+        context (Dict[str, Any]): Context dictionary.
+        n_workers (Optional[int]): The maximum number of tasks in flight, or
+            None to run every task at once.
 
-        worker_response_constructed = handle_worker_response(
-            worker_response=worker_response, task_info=task_info)
+    Returns:
+        List[Dict[str, Any]]: List of worker results in the order of the
+            tasks.
+    """
+    semaphore = asyncio.Semaphore(n_workers) if n_workers else nullcontext()
 
-        worker_results.append(worker_response_constructed)
+    async def run_task(task_info: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            return await aprocess_task(task_info, context)
 
-    return worker_results
+    return list(await asyncio.gather(*[run_task(task_info)
+                                       for task_info in tasks]))
 
 
 def prepare_context(
@@ -211,27 +311,59 @@ def prepare_contexts(
     return composer_context, worker_context
 
 
-def get_composer_response(context: Dict[str, Any]) -> str:
+def prepare_composer_prompt(context: Dict[str, Any]) -> str:
     """
-    Get the composer response.
+    Prepare the composer prompt.
 
     Args:
         context (Dict[str, Any]): A dictionary of context variables.
 
     Returns:
-        str: The composer response.
+        str: The composer prompt.
     """
     composer_input = format_prompt(COMPOSER_PROMPT, **context)
-    processed_prompt = apply_functions(
+    return apply_functions(
         prompt=composer_input,
         functions=context['tasks']['functions']
     )
-    composer_response = model_call(
-        prompt=processed_prompt,
-        provider=context['provider'],
-        model=context['model'],
-        system_prompt=context['system_prompt']
+
+
+async def aprepare_composer_prompt(context: Dict[str, Any]) -> str:
+    """
+    Asynchronously prepare the composer prompt.
+
+    Args:
+        context (Dict[str, Any]): A dictionary of context variables.
+
+    Returns:
+        str: The composer prompt.
+    """
+    composer_input = format_prompt(COMPOSER_PROMPT, **context)
+    return await aapply_functions(
+        prompt=composer_input,
+        functions=context['tasks']['functions']
     )
+
+
+def get_composer_response(context: Dict[str, Any]) -> str:
+    """
+    Get the composer response.
+
+    Args:
+        context (Dict[str, Any]): A dictionary of context variables.
+
+    Returns:
+        str: The composer response.
+    """
+    processed_prompt = prepare_composer_prompt(context)
+    with tracer.span("symphony.compose", provider=context['provider'],
+                     model=context['model']):
+        composer_response = model_call(
+            prompt=processed_prompt,
+            provider=context['provider'],
+            model=context['model'],
+            system_prompt=context['system_prompt']
+        )
     return composer_response
 
 
@@ -245,28 +377,34 @@ async def aget_composer_response(context: Dict[str, Any]) -> str:
     Returns:
         str: The composer response.
     """
-    composer_input = format_prompt(COMPOSER_PROMPT, **context)
-    processed_prompt = await apply_functions(
-        prompt=composer_input,
-        functions=context['tasks']['functions']
-    )
-    composer_response = await amodel_call(
-        prompt=processed_prompt,
-        provider=context['provider'],
-        model=context['model'],
-        system_prompt=context['system_prompt']
-    )
+    processed_prompt = await aprepare_composer_prompt(context)
+    with tracer.span("symphony.compose", provider=context['provider'],
+                     model=context['model']):
+        composer_response = await amodel_call(
+            prompt=processed_prompt,
+            provider=context['provider'],
+            model=context['model'],
+            system_prompt=context['system_prompt']
+        )
     return composer_response
 
 
 def symphony(composer_details: Dict[str, Any],
-             worker_details: Dict[str, Any]) -> Dict[str, Any]:
+             worker_details: Dict[str, Any],
+             n_workers: Optional[int] = None) -> Dict[str, Any]:
     """
     Process task by breaking it down and running subtasks.
 
+    The composer response is streamed, and each task is handed to a worker
+    as soon as the composer has finished writing it, so the workers run
+    while the composer is still generating. Providers that do not stream
+    return the whole response at once, and the tasks then start together.
+
     Args:
         composer_details (Dict[str, Any]): Details for the composer task.
         worker_details (Dict[str, Any]): Details for the worker tasks.
+        n_workers (Optional[int]): The maximum number of worker tasks in
+            flight, or None to run every task at once.
 
     Returns:
         Dict[str, Any]: A dictionary of results.
@@ -279,24 +417,52 @@ def symphony(composer_details: Dict[str, Any],
         composer_details=composer_details,
         worker_details=worker_details
     )
-    composer_response = get_composer_response(composer_context)
-    analysis = extract_xml(composer_response, "analysis")
-    tasks_xml = extract_xml(composer_response, "tasks")
-    tasks = parse_tasks(tasks_xml)
-    worker_results = process_tasks(tasks, worker_context)
+    processed_prompt = prepare_composer_prompt(composer_context)
+    parser = TaskStreamParser()
+    # The composer may return more tasks than requested, which then queue
+    max_workers = n_workers or max(1, len(subtasks))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        try:
+            with tracer.span("symphony.compose",
+                             provider=composer_context['provider'],
+                             model=composer_context['model']):
+                for chunk in model_call_stream(
+                        prompt=processed_prompt,
+                        provider=composer_context['provider'],
+                        model=composer_context['model'],
+                        system_prompt=composer_context['system_prompt']):
+                    for task_info in parser.feed(chunk):
+                        futures.append(executor.submit(
+                            contextvars.copy_context().run,
+                            process_task, task_info, worker_context))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        worker_results = [future.result() for future in futures]
     return {
-        "analysis": analysis,
+        "analysis": extract_xml(parser.text, "analysis"),
         "worker_results": worker_results,
     }
 
+
 async def asymphony(composer_details: Dict[str, Any],
-                    worker_details: Dict[str, Any]) -> Dict[str, Any]:
+                    worker_details: Dict[str, Any],
+                    n_workers: Optional[int] = None) -> Dict[str, Any]:
     """
     Asynchronously process task by breaking it down and running subtasks.
 
+    The composer response is streamed, and each task is handed to a worker
+    as soon as the composer has finished writing it, so the workers run
+    while the composer is still generating. Providers that do not stream
+    return the whole response at once, and the tasks then start together.
+
     Args:
         composer_details (Dict[str, Any]): Details for the composer task.
         worker_details (Dict[str, Any]): Details for the worker tasks.
+        n_workers (Optional[int]): The maximum number of worker tasks in
+            flight, or None to run every task at once.
 
     Returns:
         Dict[str, Any]: A dictionary of results.
@@ -309,13 +475,33 @@ async def asymphony(composer_details: Dict[str, Any],
         composer_details=composer_details,
         worker_details=worker_details
     )
-    composer_response = await aget_composer_response(composer_context)
-    analysis = extract_xml(composer_response, "analysis")
-    tasks_xml = extract_xml(composer_response, "tasks")
-    tasks = parse_tasks(tasks_xml)
-    worker_results = await aprocess_tasks(tasks, worker_context)
+    processed_prompt = await aprepare_composer_prompt(composer_context)
+    parser = TaskStreamParser()
+    semaphore = asyncio.Semaphore(n_workers) if n_workers else nullcontext()
+
+    async def run_task(task_info: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            return await aprocess_task(task_info, worker_context)
+
+    tasks = []
+    try:
+        with tracer.span("symphony.compose",
+                         provider=composer_context['provider'],
+                         model=composer_context['model']):
+            async for chunk in amodel_call_stream(
+                    prompt=processed_prompt,
+                    provider=composer_context['provider'],
+                    model=composer_context['model'],
+                    system_prompt=composer_context['system_prompt']):
+                for task_info in parser.feed(chunk):
+                    tasks.append(asyncio.create_task(run_task(task_info)))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    worker_results = list(await asyncio.gather(*tasks))
     return {
-        "analysis": analysis,
+        "analysis": extract_xml(parser.text, "analysis"),
         "worker_results": worker_results,
     }
 
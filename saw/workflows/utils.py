@@ -3,8 +3,11 @@
 """ Workflow Utilities Module
 
 """
+import logging
 from typing import Any, Callable, Dict, List, Optional, Union
 
+logger = logging.getLogger(__name__)
+
 
 def apply_functions(prompt: str, functions: List[Callable],
                     **kwargs) -> str:
@@ -80,5 +83,5 @@ def build_func_args(
             func_args[key] = routes
         elif key != "return" and key in params:
             func_args[key] = params[key]
-    print(f"Function Arguments: {func_args}")
+    logger.debug("Function arguments: %s", func_args)
     return func_args